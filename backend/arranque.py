@@ -0,0 +1,62 @@
+"""
+Precalentamiento de workers.
+
+Con gunicorn --preload la app se importa una sola vez en el proceso maestro
+y los workers la heredan tras el fork (copy-on-write). precalentar() fuerza
+además la carga perezosa que Django/DRF harían en el primer request
+(URLconf, vistas, clases de settings de DRF, serializers), para que el
+primer cliente tras un arranque en frío no la pague.
+"""
+
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def precalentar(conectar_bd: bool = False) -> float:
+    """
+    Carga todo lo que el primer request cargaría de forma perezosa.
+
+    Args:
+        conectar_bd: Abrir (y devolver al pool) una conexión por alias.
+            Solo en los workers, nunca antes del fork.
+
+    Returns:
+        Segundos empleados
+    """
+    inicio = time.perf_counter()
+
+    from django.urls import get_resolver
+    from rest_framework.settings import api_settings
+
+    # Importa backend.urls, stock.urls y todas las vistas
+    get_resolver().url_patterns
+    # Clases que DRF resuelve al primer acceso
+    for nombre in (
+        'DEFAULT_RENDERER_CLASSES',
+        'DEFAULT_PARSER_CLASSES',
+        'DEFAULT_AUTHENTICATION_CLASSES',
+        'DEFAULT_PERMISSION_CLASSES',
+        'EXCEPTION_HANDLER',
+    ):
+        getattr(api_settings, nombre)
+
+    from stock.serializers import MovimientoSerializer, StockSerializer
+    # Los campos de un ModelSerializer se construyen (introspección) al usarlos
+    StockSerializer().fields
+    MovimientoSerializer().fields
+
+    if conectar_bd:
+        from django.db import connections
+        for conexion in connections.all():
+            try:
+                conexion.ensure_connection()
+            except Exception:
+                logger.warning(f"No se pudo precalentar la conexión '{conexion.alias}'", exc_info=True)
+            finally:
+                conexion.close()
+
+    segundos = time.perf_counter() - inicio
+    logger.info(f"Precalentamiento completado en {segundos * 1000:.0f} ms")
+    return segundos
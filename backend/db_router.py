@@ -0,0 +1,181 @@
+"""
+Enrutamiento de lecturas a réplicas.
+
+- Las escrituras y las lecturas con bloqueo (select_for_update) van siempre
+  a la primaria ('default').
+- Solo se leen réplicas dentro de leer_de_replica() (viewsets de solo
+  lectura) o con alias_lectura() (servicios de reportes).
+- Dentro de un request todas las lecturas van a la misma réplica.
+- Tras una escritura, el mismo cliente queda fijado a la primaria durante
+  DATABASE_REPLICA_VENTANA segundos (lectura de lo propio escrito). La
+  ventana viaja en una cookie firmada con marca de tiempo, así que vale
+  en cualquier worker y no depende de la IP del cliente.
+- Una réplica con retraso mayor a DATABASE_REPLICA_MAX_LAG, o que no
+  responde, se descarta y se lee de la primaria.
+"""
+
+import contextvars
+import logging
+import random
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+
+_lectura_replica = contextvars.ContextVar('lectura_replica', default=False)
+_primaria_fijada = contextvars.ContextVar('primaria_fijada', default=False)
+# Réplica elegida en el request actual: None fuera de un request (cada
+# lectura elige), '' dentro de uno hasta la primera lectura
+_replica_request = contextvars.ContextVar('replica_request', default=None)
+
+# Estado de salud por réplica: alias -> (sana, comprobado_en)
+_salud = {}
+
+
+def _replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+@contextmanager
+def leer_de_replica():
+    """Las lecturas sin bloqueo dentro del bloque pueden ir a una réplica"""
+    token = _lectura_replica.set(True)
+    try:
+        yield
+    finally:
+        _lectura_replica.reset(token)
+
+
+def fijar_primaria() -> None:
+    """Fuerza que el resto del contexto (request) lea de la primaria"""
+    _primaria_fijada.set(True)
+
+
+def _lag_segundos(alias):
+    """Retraso de replicación de la réplica (None si no se puede determinar)"""
+    connection = connections[alias]
+    if connection.vendor != 'mysql':
+        # Réplicas locales (p. ej. SQLite en pruebas): sin replicación real
+        return 0
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+        except Exception:
+            # MySQL < 8.0.22
+            cursor.execute("SHOW SLAVE STATUS")
+        fila = cursor.fetchone()
+        if fila is None:
+            return None
+        estado = dict(zip([col[0] for col in cursor.description], fila))
+    return estado.get('Seconds_Behind_Source', estado.get('Seconds_Behind_Master'))
+
+
+def replica_sana(alias) -> bool:
+    """Comprueba (con caché de unos segundos) que la réplica responde y no va retrasada"""
+    intervalo = getattr(settings, 'DATABASE_REPLICA_INTERVALO_CHEQUEO', 5)
+    ahora = time.monotonic()
+    estado = _salud.get(alias)
+    if estado is not None and ahora - estado[1] < intervalo:
+        return estado[0]
+
+    try:
+        lag = _lag_segundos(alias)
+        sana = lag is not None and lag <= getattr(settings, 'DATABASE_REPLICA_MAX_LAG', 5)
+    except Exception:
+        logger.warning(f"Réplica {alias} no disponible; se usa la primaria", exc_info=True)
+        sana = False
+
+    if not sana and (estado is None or estado[0]):
+        logger.warning(f"Réplica {alias} descartada (retraso excesivo o sin respuesta)")
+    _salud[alias] = (sana, ahora)
+    return sana
+
+
+def alias_lectura() -> str:
+    """
+    Alias desde el que leer en este contexto: una réplica sana si el
+    cliente no está fijado a la primaria; si no, la primaria. Dentro de un
+    request se mantiene la réplica de la primera lectura mientras siga
+    sana, para no mezclar réplicas con distinto retraso en una respuesta.
+    """
+    if _primaria_fijada.get():
+        return DEFAULT_DB_ALIAS
+    elegida = _replica_request.get()
+    if elegida and elegida in _replicas() and replica_sana(elegida):
+        return elegida
+    sanas = [alias for alias in _replicas() if replica_sana(alias)]
+    if not sanas:
+        return DEFAULT_DB_ALIAS
+    alias = random.choice(sanas)  # nosec B311 - reparto de carga
+    if elegida is not None:
+        _replica_request.set(alias)
+    return alias
+
+
+class ReplicaRouter:
+    """Router de Django: ver docstring del módulo"""
+
+    def db_for_read(self, model, **hints):
+        if _lectura_replica.get():
+            return alias_lectura()
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Incluye select_for_update(): las lecturas bloqueantes usan db_for_write
+        fijar_primaria()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Las réplicas reciben el esquema por replicación
+        return db not in _replicas()
+
+
+class ReplicaMiddleware:
+    """
+    Ventana de lectura de lo propio escrito: si un cliente escribió hace
+    menos de DATABASE_REPLICA_VENTANA segundos, sus lecturas van a la
+    primaria. La ventana la lleva el propio cliente en una cookie firmada
+    con marca de tiempo: no hay estado en el servidor (vale en cualquier
+    worker) y dos clientes detrás de la misma IP no se fijan entre sí.
+    """
+
+    METODOS_ESCRITURA = {'POST', 'PUT', 'PATCH', 'DELETE'}
+    COOKIE = 'replica_escritura'
+    SAL = 'backend.db_router.escritura'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def _en_ventana(self, request) -> bool:
+        # get_signed_cookie verifica firma y antigüedad (max_age)
+        return request.get_signed_cookie(
+            self.COOKIE, default=None, salt=self.SAL,
+            max_age=getattr(settings, 'DATABASE_REPLICA_VENTANA', 5),
+        ) is not None
+
+    def __call__(self, request):
+        con_replicas = bool(_replicas())
+        # Se restaura siempre, también sin réplicas: db_for_write fija la
+        # primaria en el contexto del hilo y no debe pasar al request siguiente
+        token = _primaria_fijada.set(con_replicas and self._en_ventana(request))
+        token_replica = _replica_request.set('')
+        try:
+            response = self.get_response(request)
+        finally:
+            _replica_request.reset(token_replica)
+            _primaria_fijada.reset(token)
+
+        if con_replicas and request.method in self.METODOS_ESCRITURA and response.status_code < 400:
+            response.set_signed_cookie(
+                self.COOKIE, '1', salt=self.SAL,
+                max_age=getattr(settings, 'DATABASE_REPLICA_VENTANA', 5),
+                httponly=True, samesite='Lax', secure=request.is_secure(),
+            )
+        return response
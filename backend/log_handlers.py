@@ -0,0 +1,37 @@
+"""
+Handlers de logging que no tocan el sistema de archivos al configurarse.
+En requests muestreadas (ver backend.trazas) cada emisión es un span.
+"""
+
+import logging
+import os
+from logging.handlers import RotatingFileHandler
+
+from .trazas import span
+
+
+class EmisionTrazada:
+    """Mixin: mide la emisión de cada registro como span 'logging'"""
+
+    def handle(self, record):
+        with span(f'logging {type(self).__name__}', 'logging', logger=record.name):
+            return super().handle(record)
+
+
+class StreamHandlerTrazado(EmisionTrazada, logging.StreamHandler):
+    """StreamHandler con la emisión trazada"""
+
+
+class RotatingFileHandlerDiferido(EmisionTrazada, RotatingFileHandler):
+    """
+    RotatingFileHandler que abre el archivo (y crea su directorio) al
+    escribir el primer registro, no al configurar el logging.
+    """
+
+    def __init__(self, filename, *args, **kwargs):
+        kwargs['delay'] = True
+        super().__init__(filename, *args, **kwargs)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
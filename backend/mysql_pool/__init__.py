@@ -0,0 +1,7 @@
+"""
+Backend MySQL con pool de conexiones.
+
+Uso en settings.DATABASES:
+    'ENGINE': 'backend.mysql_pool',
+    'POOL': {'TAMANO_MAXIMO': 10, 'MAX_INACTIVIDAD': 300, ...}
+"""
@@ -0,0 +1,86 @@
+"""
+DatabaseWrapper MySQL que toma las conexiones de un pool por proceso en
+lugar de abrir una nueva (connect + handshake) en cada request.
+
+Django sigue gestionando el ciclo de vida: cuando cierra la conexión al
+final del request (CONN_MAX_AGE=0) esta vuelve al pool en lugar de
+cerrarse.
+"""
+
+import os
+import threading
+
+import pymysql
+
+pymysql.install_as_MySQLdb()
+
+from django.db.backends.mysql import base as mysql_base  # noqa: E402
+
+from .pool import PoolDeConexiones  # noqa: E402
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def obtener_pool(alias, crear, opciones):
+    """Pool compartido por los hilos del proceso (uno por alias y PID)"""
+    # Incluir el PID evita reutilizar conexiones heredadas tras un fork (gunicorn --preload)
+    clave = (alias, os.getpid())
+    with _pools_lock:
+        if clave not in _pools:
+            _pools[clave] = PoolDeConexiones(
+                crear,
+                validar=_ping,
+                tamano_maximo=opciones.get('TAMANO_MAXIMO', 10),
+                max_inactividad=opciones.get('MAX_INACTIVIDAD', 300),
+                timeout_espera=opciones.get('TIMEOUT_ESPERA', 10),
+                ping_tras_inactividad=opciones.get('PING_TRAS_INACTIVIDAD', 1),
+            )
+        return _pools[clave]
+
+
+def metricas_pools():
+    """Métricas de los pools de este proceso, por alias"""
+    pid = os.getpid()
+    with _pools_lock:
+        pools = {alias: pool for (alias, dueno), pool in _pools.items() if dueno == pid}
+    return {alias: pool.metricas() for alias, pool in pools.items()}
+
+
+def _ping(conexion) -> bool:
+    conexion.ping(reconnect=False)
+    return True
+
+
+class DatabaseWrapper(mysql_base.DatabaseWrapper):
+
+    def _pool(self, conn_params=None):
+        def crear():
+            return super(DatabaseWrapper, self).get_new_connection(conn_params)
+        return obtener_pool(self.alias, crear, self.settings_dict.get('POOL', {}))
+
+    def get_new_connection(self, conn_params):
+        return self._pool(conn_params).obtener()
+
+    def _close(self):
+        if self.connection is None:
+            return
+        pool = self._pool()
+        conexion = self.connection
+        if self.in_atomic_block:
+            # Django conserva la referencia a la conexión cerrada dentro de un
+            # bloque atómico: no puede volver al pool
+            pool.descartar(conexion)
+            return
+        try:
+            # No devolver al pool una transacción a medio terminar
+            if not self.autocommit:
+                conexion.rollback()
+        except Exception:
+            pool.descartar(conexion)
+            return
+        if self.errors_occurred and not self.is_usable():
+            pool.descartar(conexion)
+        else:
+            pool.devolver(conexion)
@@ -0,0 +1,217 @@
+"""
+Pool de conexiones acotado y seguro entre hilos.
+Independiente del driver: recibe una función que crea conexiones y otra
+que comprueba si siguen vivas (pre-ping).
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PoolAgotadoError(Exception):
+    """No se obtuvo una conexión libre dentro del tiempo de espera"""
+    pass
+
+
+class PoolDeConexiones:
+    """
+    Pool con tamaño máximo, pre-ping de conexiones que estuvieron inactivas
+    y desalojo de conexiones inactivas por demasiado tiempo.
+
+    Las conexiones libres se reutilizan en orden LIFO: las más usadas se
+    mantienen calientes y las que sobran envejecen hasta ser desalojadas.
+    """
+
+    def __init__(
+        self,
+        crear: Callable[[], Any],
+        validar: Optional[Callable[[Any], bool]] = None,
+        tamano_maximo: int = 10,
+        max_inactividad: float = 300,
+        timeout_espera: float = 10,
+        ping_tras_inactividad: float = 1,
+    ):
+        self._crear = crear
+        self._validar = validar
+        self.tamano_maximo = tamano_maximo
+        self.max_inactividad = max_inactividad
+        self.timeout_espera = timeout_espera
+        self.ping_tras_inactividad = ping_tras_inactividad
+
+        self._libres = deque()  # (conexión, momento en que se devolvió)
+        self._total = 0
+        self._condicion = threading.Condition()
+        self._metricas = {
+            'obtenidas': 0,
+            'creadas': 0,
+            'esperas': 0,
+            'agotado': 0,
+            'desalojadas': 0,
+            'descartadas_por_ping': 0,
+            'espera_total_ms': 0.0,
+            'espera_max_ms': 0.0,
+            'obtencion_total_ms': 0.0,
+            'obtencion_max_ms': 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    # Obtener / devolver
+    # ------------------------------------------------------------------
+
+    def obtener(self):
+        """
+        Entrega una conexión libre o crea una nueva si hay cupo.
+
+        Raises:
+            PoolAgotadoError: Si no hay conexión disponible en timeout_espera
+        """
+        inicio = time.perf_counter()
+        while True:
+            conexion, devuelta_en, espera = self._reservar()
+            if conexion is None:
+                conexion = self._crear_conexion()
+                break
+            inactiva = time.monotonic() - devuelta_en
+            if inactiva < self.ping_tras_inactividad or self._esta_viva(conexion):
+                break
+            with self._condicion:
+                self._metricas['descartadas_por_ping'] += 1
+            self.descartar(conexion)
+
+        transcurrido = (time.perf_counter() - inicio) * 1000
+        with self._condicion:
+            m = self._metricas
+            m['obtenidas'] += 1
+            m['obtencion_total_ms'] += transcurrido
+            m['obtencion_max_ms'] = max(m['obtencion_max_ms'], transcurrido)
+            if espera:
+                m['esperas'] += 1
+                m['espera_total_ms'] += espera
+                m['espera_max_ms'] = max(m['espera_max_ms'], espera)
+        return conexion
+
+    def devolver(self, conexion) -> None:
+        """Devuelve una conexión sana al pool"""
+        with self._condicion:
+            self._libres.append((conexion, time.monotonic()))
+            self._condicion.notify()
+
+    def descartar(self, conexion) -> None:
+        """Cierra una conexión rota o sobrante y libera su cupo"""
+        with self._condicion:
+            self._total -= 1
+            self._condicion.notify()
+        self._cerrar(conexion)
+
+    def cerrar_todas(self) -> None:
+        """Cierra las conexiones libres (las prestadas se cierran al devolverse)"""
+        with self._condicion:
+            libres = [conexion for conexion, _ in self._libres]
+            self._libres.clear()
+            self._total -= len(libres)
+        for conexion in libres:
+            self._cerrar(conexion)
+
+    # ------------------------------------------------------------------
+    # Internos
+    # ------------------------------------------------------------------
+
+    def _reservar(self):
+        """Toma una conexión libre o un cupo para crear una (conexión=None)"""
+        espera_ms = 0.0
+        limite = time.monotonic() + self.timeout_espera
+        with self._condicion:
+            desalojadas = self._desalojar_inactivas()
+            while True:
+                if self._libres:
+                    conexion, devuelta_en = self._libres.pop()
+                    break
+                if self._total < self.tamano_maximo:
+                    self._total += 1
+                    conexion, devuelta_en = None, None
+                    break
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    self._metricas['agotado'] += 1
+                    raise PoolAgotadoError(
+                        f"Sin conexiones libres tras {self.timeout_espera}s "
+                        f"(tamaño máximo {self.tamano_maximo})"
+                    )
+                antes = time.perf_counter()
+                self._condicion.wait(restante)
+                espera_ms += (time.perf_counter() - antes) * 1000
+
+        for vieja in desalojadas:
+            self._cerrar(vieja)
+        return conexion, devuelta_en, espera_ms
+
+    def _desalojar_inactivas(self):
+        """Saca del pool las conexiones inactivas por más de max_inactividad (con el lock tomado)"""
+        ahora = time.monotonic()
+        desalojadas = []
+        # Las más antiguas están al inicio de la cola
+        while self._libres and ahora - self._libres[0][1] > self.max_inactividad:
+            desalojadas.append(self._libres.popleft()[0])
+        self._total -= len(desalojadas)
+        self._metricas['desalojadas'] += len(desalojadas)
+        return desalojadas
+
+    def _crear_conexion(self):
+        try:
+            conexion = self._crear()
+        except BaseException:
+            with self._condicion:
+                self._total -= 1
+                self._condicion.notify()
+            raise
+        with self._condicion:
+            self._metricas['creadas'] += 1
+        return conexion
+
+    def _esta_viva(self, conexion) -> bool:
+        if self._validar is None:
+            return True
+        try:
+            return self._validar(conexion)
+        except Exception:
+            return False
+
+    @staticmethod
+    def _cerrar(conexion) -> None:
+        try:
+            conexion.close()
+        except Exception:
+            logger.debug("Error al cerrar una conexión del pool", exc_info=True)
+
+    # ------------------------------------------------------------------
+    # Métricas
+    # ------------------------------------------------------------------
+
+    def metricas(self) -> Dict[str, Any]:
+        """Tamaño del pool, conexiones en uso y latencias de espera/obtención"""
+        with self._condicion:
+            m = dict(self._metricas)
+            libres = len(self._libres)
+            total = self._total
+        obtenidas = m['obtenidas'] or 1
+        return {
+            'tamano': total,
+            'tamano_maximo': self.tamano_maximo,
+            'libres': libres,
+            'en_uso': total - libres,
+            'obtenidas': m['obtenidas'],
+            'creadas': m['creadas'],
+            'desalojadas': m['desalojadas'],
+            'descartadas_por_ping': m['descartadas_por_ping'],
+            'agotado': m['agotado'],
+            'esperas': m['esperas'],
+            'espera_promedio_ms': round(m['espera_total_ms'] / (m['esperas'] or 1), 3),
+            'espera_max_ms': round(m['espera_max_ms'], 3),
+            'obtencion_promedio_ms': round(m['obtencion_total_ms'] / obtenidas, 3),
+            'obtencion_max_ms': round(m['obtencion_max_ms'], 3),
+        }
@@ -6,10 +6,11 @@ ENDPOINTS PÚBLICOS - Permite acceso desde cualquier frontend
 
 from pathlib import Path
 import os
-from decouple import config
-import pymysql
+from decouple import config, Csv
 
-pymysql.install_as_MySQLdb()
+# Sin trabajo de E/S ni imports pesados al importar este módulo: cada worker
+# lo importa al arrancar. PyMySQL se instala desde backend.mysql_pool al
+# cargar el backend de BD; el directorio de logs se crea al primer registro.
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -30,8 +31,6 @@ railway_host = os.environ.get("RAILWAY_PUBLIC_DOMAIN")
 if railway_host:
     ALLOWED_HOSTS.append(railway_host)
 
-print(">>> ALLOWED_HOSTS EN RUNTIME:", ALLOWED_HOSTS)
-
 
 # ==============================================================================
 # APPLICATION DEFINITION
@@ -48,20 +47,26 @@ INSTALLED_APPS = [
     # Third party apps
     'corsheaders',
     'rest_framework',
-    'rest_framework.authtoken',
-    'drf_yasg',  # Para documentación de API
     
     # Local apps
     'stock',
 ]
 
+# Apps opcionales: solo se cargan si se activan (menos imports al arrancar).
+# API_DOCS=True agrega drf_yasg y publica /swagger/ y /redoc/.
+API_DOCS = config('API_DOCS', default=False, cast=bool)
+if API_DOCS:
+    INSTALLED_APPS.append('drf_yasg')
+INSTALLED_APPS += config('OPTIONAL_APPS', default='', cast=Csv())
+
 # ==============================================================================
 # REST FRAMEWORK - CONFIGURACIÓN PÚBLICA
 # ==============================================================================
 
 REST_FRAMEWORK = {
+    # JWT con el estado del usuario cacheado en memoria (sin consulta por request)
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'stock.authentication.CachedJWTAuthentication',
     ),
     # ✅ ENDPOINTS PÚBLICOS - Sin autenticación requerida por defecto
     'DEFAULT_PERMISSION_CLASSES': (
@@ -69,16 +74,129 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
+    # JSON sigue siendo el formato por defecto; MessagePack y JSON columnar
+    # se negocian con Accept / Content-Type (clientes con enlaces lentos)
     'DEFAULT_RENDERER_CLASSES': (
         'rest_framework.renderers.JSONRenderer',
+        'stock.renderers.MessagePackRenderer',
+        'stock.renderers.ColumnarJSONRenderer',
     ),
     'DEFAULT_PARSER_CLASSES': (
         'rest_framework.parsers.JSONParser',
+        'stock.parsers.MessagePackParser',
+        'stock.parsers.ColumnarJSONParser',
         'rest_framework.parsers.FormParser',
         'rest_framework.parsers.MultiPartParser',
     ),
     'EXCEPTION_HANDLER': 'stock.exceptions.custom_exception_handler',
+    # Proxies de confianza delante de la app (Render: 1). La IP con la que se
+    # limita la tasa sale de X-Forwarded-For contando desde el final; con 0 se
+    # usa REMOTE_ADDR y la cabecera (la puede inventar el cliente) se ignora
+    'NUM_PROXIES': config('NUM_PROXIES', default=0, cast=int),
+}
+
+# Segundos que se reutiliza un conteo cacheado (?conteo=estimado) antes de
+# recalcularlo en segundo plano
+STOCK_CONTEO_CACHE_TTL = config('STOCK_CONTEO_CACHE_TTL', default=60, cast=int)
+
+# Segundos que un hueco en la secuencia de IDs de Movimiento o CambioProducto
+# puede ser una transacción sin confirmar: ni los resúmenes ni el feed de
+# cambios (/api/cambios/) lo pasan antes. Debe superar con margen el timeout
+# de espera de bloqueos (innodb_lock_wait_timeout, 50 s)
+STOCK_HUECOS_ESPERA_SEGUNDOS = config('STOCK_HUECOS_ESPERA_SEGUNDOS', default=90, cast=int)
+
+# Limitación de tasa de /api/stock/: token bucket por cliente y endpoint,
+# (ráfaga, tokens por segundo). STOCK_LIMITES_ALMACEN='cache' comparte los
+# buckets entre workers vía CACHES.
+STOCK_LIMITES_TASA = {
+    'lectura': (
+        config('STOCK_LIMITE_LECTURA_RAFAGA', default=120, cast=int),
+        config('STOCK_LIMITE_LECTURA_POR_SEGUNDO', default=20, cast=float),
+    ),
+    'escritura': (
+        config('STOCK_LIMITE_ESCRITURA_RAFAGA', default=30, cast=int),
+        config('STOCK_LIMITE_ESCRITURA_POR_SEGUNDO', default=5, cast=float),
+    ),
 }
+STOCK_LIMITES_ALMACEN = config('STOCK_LIMITES_ALMACEN', default='memoria')
+# Escrituras simultáneas por producto (subtract/restock) antes de responder
+# 503, y latencia media de las escrituras con bloqueo a partir de la cual se
+# descarta carga
+STOCK_CONCURRENCIA_POR_PRODUCTO = config('STOCK_CONCURRENCIA_POR_PRODUCTO', default=4, cast=int)
+STOCK_LATENCIA_MAX_MS = config('STOCK_LATENCIA_MAX_MS', default=500, cast=int)
+
+# Ubicación que recibe las escrituras sin ubicación (subtract/restock,
+# ajustes por lote, edición de la cantidad) de los productos que ya tienen
+# existencias por ubicación: el total sigue siendo la suma de sus ubicaciones
+STOCK_UBICACION_PREDETERMINADA = config('STOCK_UBICACION_PREDETERMINADA', default='GENERAL')
+
+# Stream de eventos (/api/eventos/): eventos guardados para Last-Event-ID,
+# eventos pendientes por cliente antes de desconectarlo, latido y duración
+# máxima de cada conexión (el cliente reconecta solo). Cada stream ocupa un
+# hilo de gunicorn: STOCK_EVENTOS_MAX_CONEXIONES limita los streams por worker
+# (los demás reciben 503) para no dejar sin hilos al resto de la API.
+# STOCK_EVENTOS_DIR (directorio compartido por los workers) activa la difusión
+# entre procesos; gunicorn.conf.py lo define si hay más de un worker.
+STOCK_EVENTOS_BUFFER = config('STOCK_EVENTOS_BUFFER', default=1000, cast=int)
+STOCK_EVENTOS_COLA = config('STOCK_EVENTOS_COLA', default=100, cast=int)
+STOCK_EVENTOS_LATIDO = config('STOCK_EVENTOS_LATIDO', default=15, cast=int)
+STOCK_EVENTOS_DURACION_MAX = config('STOCK_EVENTOS_DURACION_MAX', default=300, cast=int)
+STOCK_EVENTOS_MAX_CONEXIONES = config('STOCK_EVENTOS_MAX_CONEXIONES', default=4, cast=int)
+STOCK_EVENTOS_DIR = config('STOCK_EVENTOS_DIR', default=None)
+
+# Pronóstico de demanda (/api/stock/sugerencias-reorden/): días de historial,
+# plazo de reposición y periodo de revisión (días), z del nivel de servicio
+# (1.65 ~ 95%) y segundos tras los que se encola el recálculo (el resultado
+# vive en la tabla PronosticoProducto, compartido por todos los workers)
+STOCK_PRONOSTICO_DIAS = config('STOCK_PRONOSTICO_DIAS', default=90, cast=int)
+STOCK_PRONOSTICO_PLAZO_DIAS = config('STOCK_PRONOSTICO_PLAZO_DIAS', default=7, cast=int)
+STOCK_PRONOSTICO_REVISION_DIAS = config('STOCK_PRONOSTICO_REVISION_DIAS', default=7, cast=int)
+STOCK_PRONOSTICO_NIVEL_SERVICIO_Z = config('STOCK_PRONOSTICO_NIVEL_SERVICIO_Z', default=1.65, cast=float)
+STOCK_PRONOSTICO_TTL = config('STOCK_PRONOSTICO_TTL', default=3600, cast=int)
+
+# Análisis ABC (/api/analisis/): días de historial, cortes del valor acumulado
+# para las clases A y B, y productos por consulta/transacción al calcular
+STOCK_ANALISIS_DIAS = config('STOCK_ANALISIS_DIAS', default=365, cast=int)
+STOCK_ANALISIS_CORTES = (
+    config('STOCK_ANALISIS_CORTE_A', default=0.8, cast=float),
+    config('STOCK_ANALISIS_CORTE_B', default=0.95, cast=float),
+)
+STOCK_ANALISIS_LOTE = config('STOCK_ANALISIS_LOTE', default=50000, cast=int)
+
+# Resumen del tablero (/api/tablero/): segundos que se reutiliza la respuesta
+# completa (0 desactiva la caché)
+STOCK_TABLERO_CACHE_TTL = config('STOCK_TABLERO_CACHE_TTL', default=5, cast=int)
+
+# Trabajos en segundo plano (manage.py trabajador): espera base y máxima entre
+# reintentos (s, exponencial), segundos sin latido tras los que un trabajo en
+# curso se da por abandonado, y carpeta de los archivos exportados
+STOCK_TRABAJOS_REINTENTO_BASE = config('STOCK_TRABAJOS_REINTENTO_BASE', default=5, cast=int)
+STOCK_TRABAJOS_REINTENTO_MAX = config('STOCK_TRABAJOS_REINTENTO_MAX', default=600, cast=int)
+STOCK_TRABAJOS_LATIDO_MAX = config('STOCK_TRABAJOS_LATIDO_MAX', default=120, cast=int)
+STOCK_TRABAJOS_DIR = config('STOCK_TRABAJOS_DIR', default=str(BASE_DIR / 'media' / 'exportaciones'))
+# Tareas periódicas que encola el trabajador (segundos entre ejecuciones, 0
+# las desactiva): resúmenes de movimientos al día, conciliación de los
+# últimos STOCK_RESUMEN_CONCILIACION_DIAS días y purga de los trabajos
+# terminados y archivos exportados de más de STOCK_TRABAJOS_RETENCION_DIAS
+STOCK_RESUMEN_INTERVALO = config('STOCK_RESUMEN_INTERVALO', default=60, cast=int)
+STOCK_RESUMEN_CONCILIACION_INTERVALO = config('STOCK_RESUMEN_CONCILIACION_INTERVALO', default=3600, cast=int)
+STOCK_RESUMEN_CONCILIACION_DIAS = config('STOCK_RESUMEN_CONCILIACION_DIAS', default=2, cast=int)
+STOCK_TRABAJOS_PURGA_INTERVALO = config('STOCK_TRABAJOS_PURGA_INTERVALO', default=3600, cast=int)
+STOCK_TRABAJOS_RETENCION_DIAS = config('STOCK_TRABAJOS_RETENCION_DIAS', default=7, cast=int)
+
+# Reintentos ante deadlocks / lock wait timeouts (stock.reintentos): máximo
+# por transacción, espera base y tope (ms, exponencial con jitter) y
+# presupuesto del proceso (reintentos por llamada y máximo acumulable)
+STOCK_REINTENTOS_MAX = config('STOCK_REINTENTOS_MAX', default=3, cast=int)
+STOCK_REINTENTOS_BASE_MS = config('STOCK_REINTENTOS_BASE_MS', default=20, cast=int)
+STOCK_REINTENTOS_TOPE_MS = config('STOCK_REINTENTOS_TOPE_MS', default=500, cast=int)
+STOCK_REINTENTOS_PRESUPUESTO = config('STOCK_REINTENTOS_PRESUPUESTO', default=0.2, cast=float)
+STOCK_REINTENTOS_PRESUPUESTO_MAX = config('STOCK_REINTENTOS_PRESUPUESTO_MAX', default=20, cast=int)
+
+# Trazas (backend.trazas): fracción de requests muestreadas (0 = apagado) y
+# archivo al que se agregan, en formato Trace Event de Chrome (Perfetto)
+STOCK_TRAZAS_MUESTREO = config('STOCK_TRAZAS_MUESTREO', default=0.0, cast=float)
+STOCK_TRAZAS_ARCHIVO = config('STOCK_TRAZAS_ARCHIVO', default=str(BASE_DIR / 'logs' / 'trazas.json'))
 
 # ==============================================================================
 # JWT CONFIGURATION
@@ -96,6 +214,10 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# Segundos que se reutiliza el estado cacheado de un administrador al
+# autenticar (cota del retraso con que otros workers ven un cambio)
+STOCK_AUTH_CACHE_TTL = config('STOCK_AUTH_CACHE_TTL', default=30, cast=int)
+
 # ==============================================================================
 # MIDDLEWARE
 # ==============================================================================
@@ -110,6 +232,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'backend.db_router.ReplicaMiddleware',
+    'backend.trazas.TrazasMiddleware',  # ← Debe estar último (traza la vista)
 ]
 
 # ==============================================================================
@@ -183,7 +307,8 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
+        # MySQL con pool de conexiones por proceso (ver backend/mysql_pool)
+        'ENGINE': 'backend.mysql_pool',
         'NAME': config('DB_NAME', default='stockmanagerdb'),
         'USER': config('DB_USER', default='root'),
         'PASSWORD': config('DB_PASSWORD'),
@@ -193,9 +318,35 @@ DATABASES = {
             'charset': 'utf8mb4',
             'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
         },
+        # Django "cierra" la conexión al final de cada request y vuelve al pool
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'TAMANO_MAXIMO': config('DB_POOL_SIZE', default=10, cast=int),
+            'MAX_INACTIVIDAD': config('DB_POOL_MAX_IDLE', default=300, cast=int),
+            'TIMEOUT_ESPERA': config('DB_POOL_TIMEOUT', default=10, cast=int),
+            'PING_TRAS_INACTIVIDAD': config('DB_POOL_PING_AFTER', default=1, cast=int),
+        },
     }
 }
 
+# Réplicas de lectura (opcional): DB_REPLICA_HOSTS=host1,host2
+# Se agregan como alias replica_1, replica_2... con las mismas credenciales.
+DATABASE_REPLICAS = []
+for numero, replica_host in enumerate(config('DB_REPLICA_HOSTS', default='', cast=Csv()), start=1):
+    alias = f'replica_{numero}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': replica_host,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['backend.db_router.ReplicaRouter']
+# Segundos que un cliente lee de la primaria después de escribir (cookie firmada)
+DATABASE_REPLICA_VENTANA = config('DB_REPLICA_WINDOW', default=5, cast=int)
+# Retraso máximo tolerado (segundos) antes de descartar una réplica
+DATABASE_REPLICA_MAX_LAG = config('DB_REPLICA_MAX_LAG', default=5, cast=int)
+
 # ==============================================================================
 # PASSWORD VALIDATION
 # ==============================================================================
@@ -251,9 +402,8 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # LOGGING CONFIGURATION
 # ==============================================================================
 
-# Crear directorio de logs si no existe
+# El directorio se crea al escribir el primer registro (no al importar)
 LOG_DIR = BASE_DIR / "logs"
-LOG_DIR.mkdir(parents=True, exist_ok=True)
 
 LOGGING = {
     'version': 1,
@@ -266,12 +416,12 @@ LOGGING = {
     },
     'handlers': {
         'console': {
-            'class': 'logging.StreamHandler',
+            'class': 'backend.log_handlers.StreamHandlerTrazado',
             'formatter': 'verbose',
         },
         'file': {
-            'class': 'logging.handlers.RotatingFileHandler',
-            'filename': BASE_DIR / 'logs' / 'django.log',
+            'class': 'backend.log_handlers.RotatingFileHandlerDiferido',
+            'filename': LOG_DIR / 'django.log',
             'maxBytes': 1024 * 1024 * 5,  # 5 MB
             'backupCount': 5,
             'formatter': 'verbose',
@@ -0,0 +1,238 @@
+"""
+Trazas (tracing) de requests con spans anidados.
+
+- TrazasMiddleware decide por request si se muestrea (fracción
+  STOCK_TRAZAS_MUESTREO, entre 0 y 1) y agrega la cabecera X-Trace-Id a
+  todas las respuestas (se respeta un X-Trace-Id entrante válido).
+- En una request muestreada se registran spans para: la request completa,
+  el dispatch de la vista DRF, los métodos decorados con @trazar /
+  @trazar_metodos (servicios, validadores), las lecturas bloqueantes
+  (select_for_update), cada sentencia SQL, la escritura de la unidad de
+  trabajo, el COMMIT y la emisión de logs.
+- Al terminar, la traza se agrega a STOCK_TRAZAS_ARCHIVO en el formato
+  Trace Event (JSON) de Chrome: se abre con Perfetto (ui.perfetto.dev),
+  chrome://tracing o speedscope. El archivo es un arreglo JSON sin cerrar,
+  como admite el formato, para poder agregar eventos sin reescribirlo.
+
+Sin muestreo, span() y los métodos decorados solo leen una ContextVar y no
+se instala el wrapper de SQL.
+"""
+
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+CABECERA = 'X-Trace-Id'
+# Largo máximo del SQL guardado en cada span
+LIMITE_SQL = 2000
+
+_ID_VALIDO = re.compile(r'^[0-9a-fA-F]{8,32}$')
+_traza_actual = contextvars.ContextVar('traza_actual', default=None)
+_SPAN_NULO = contextlib.nullcontext()
+_escritura = threading.Lock()
+
+
+class Traza:
+    """Eventos (spans terminados) de una request muestreada"""
+
+    __slots__ = ('id', 'eventos', 'pid', 'tid', '_epoca_us', '_inicio_ns')
+
+    def __init__(self, traza_id: str):
+        self.id = traza_id
+        self.eventos = []
+        self.pid = os.getpid()
+        self.tid = threading.get_native_id()
+        # Marca de tiempo absoluta (µs) con la resolución de perf_counter
+        self._epoca_us = time.time_ns() // 1000
+        self._inicio_ns = time.perf_counter_ns()
+
+    def microsegundos(self, perf_ns: int) -> float:
+        return self._epoca_us + (perf_ns - self._inicio_ns) / 1000
+
+
+class Span:
+    """Intervalo medido; al cerrarse queda como evento 'X' (completo) de la traza"""
+
+    __slots__ = ('traza', 'nombre', 'categoria', 'atributos', '_inicio')
+
+    def __init__(self, traza: Traza, nombre: str, categoria: str, atributos=None):
+        self.traza = traza
+        self.nombre = nombre
+        self.categoria = categoria
+        self.atributos = atributos or {}
+
+    def __enter__(self):
+        self._inicio = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        fin = time.perf_counter_ns()
+        if exc_type is not None:
+            self.atributos['error'] = exc_type.__name__
+        self.traza.eventos.append({
+            'name': self.nombre,
+            'cat': self.categoria,
+            'ph': 'X',
+            'ts': round(self.traza.microsegundos(self._inicio), 3),
+            'dur': round((fin - self._inicio) / 1000, 3),
+            'pid': self.traza.pid,
+            'tid': self.traza.tid,
+            'args': self.atributos,
+        })
+        return False
+
+
+def traza_actual():
+    """Traza muestreada activa en este contexto (o None)"""
+    return _traza_actual.get()
+
+
+def span(nombre: str, categoria: str = 'app', **atributos):
+    """
+    Context manager que mide un bloque como span de la traza activa. Sin
+    traza activa devuelve un context manager nulo compartido.
+
+    Uso:
+        with span('select_for_update StockItem', 'bloqueo', pk=pk):
+            item = queryset.get(pk=pk)
+    """
+    traza = _traza_actual.get()
+    if traza is None:
+        return _SPAN_NULO
+    return Span(traza, nombre, categoria, atributos)
+
+
+def trazar(nombre: str = None, categoria: str = 'servicio'):
+    """Decorador: cada llamada a la función es un span (nombre: su qualname)"""
+    def decorador(func):
+        etiqueta = nombre or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            traza = _traza_actual.get()
+            if traza is None:
+                return func(*args, **kwargs)
+            with Span(traza, etiqueta, categoria):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorador
+
+
+def trazar_metodos(categoria: str = 'servicio'):
+    """Decorador de clase: aplica @trazar a sus métodos públicos"""
+    def decorador(cls):
+        for nombre, valor in list(vars(cls).items()):
+            if nombre.startswith('_') or isinstance(valor, type):
+                continue
+            envolver = trazar(f'{cls.__name__}.{nombre}', categoria)
+            if isinstance(valor, (staticmethod, classmethod)):
+                setattr(cls, nombre, type(valor)(envolver(valor.__func__)))
+            elif callable(valor):
+                setattr(cls, nombre, envolver(valor))
+        return cls
+    return decorador
+
+
+def _envolver_sql(execute, sql, params, many, context):
+    """execute_wrapper de Django: un span por sentencia"""
+    traza = _traza_actual.get()
+    if traza is None:
+        return execute(sql, params, many, context)
+    verbo = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else 'SQL'
+    if 'FOR UPDATE' in sql:
+        verbo = f'{verbo} FOR UPDATE'
+    atributos = {'sql': sql[:LIMITE_SQL], 'db': context['connection'].alias}
+    if many:
+        atributos['many'] = True
+    with Span(traza, verbo, 'sql', atributos):
+        return execute(sql, params, many, context)
+
+
+def exportar(traza: Traza) -> None:
+    """Agrega los eventos de la traza a STOCK_TRAZAS_ARCHIVO (si está configurado)"""
+    ruta = getattr(settings, 'STOCK_TRAZAS_ARCHIVO', None)
+    if not ruta or not traza.eventos:
+        return
+    # Los spans se cierran de adentro hacia afuera: se ordenan por inicio
+    eventos = sorted(traza.eventos, key=lambda evento: evento['ts'])
+    texto = ''.join(
+        json.dumps(evento, separators=(',', ':'), default=str) + ',\n' for evento in eventos
+    )
+    try:
+        with _escritura:
+            os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+            with open(ruta, 'a', encoding='utf-8') as archivo:
+                if archivo.tell() == 0:
+                    archivo.write('[\n')
+                archivo.write(texto)
+    except OSError:
+        logger.warning(f"No se pudo exportar la traza {traza.id} a {ruta}", exc_info=True)
+
+
+class TrazasMiddleware:
+    """
+    Muestrea requests y las traza (ver docstring del módulo). Debe ir
+    último en MIDDLEWARE: en las requests muestreadas process_view llama a
+    la vista DRF dentro de su span.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Con ATOMIC_REQUESTS la vista debe pasar por make_view_atomic del handler
+        self.span_vista = not any(
+            db.get('ATOMIC_REQUESTS') for db in settings.DATABASES.values()
+        )
+
+    @staticmethod
+    def _muestrear() -> bool:
+        tasa = getattr(settings, 'STOCK_TRAZAS_MUESTREO', 0.0)
+        return tasa > 0 and random.random() < tasa  # nosec B311 - muestreo, no criptografía
+
+    def __call__(self, request):
+        entrante = request.headers.get(CABECERA, '')
+        traza_id = entrante.lower() if _ID_VALIDO.match(entrante) else os.urandom(8).hex()
+
+        if not self._muestrear():
+            response = self.get_response(request)
+            response[CABECERA] = traza_id
+            return response
+
+        from django.db import connections
+
+        traza = Traza(traza_id)
+        token = _traza_actual.set(traza)
+        try:
+            with contextlib.ExitStack() as pila:
+                for alias in connections:
+                    pila.enter_context(connections[alias].execute_wrapper(_envolver_sql))
+                atributos = {'trace_id': traza_id, 'method': request.method, 'path': request.path}
+                with Span(traza, f'{request.method} {request.path}', 'http', atributos):
+                    response = self.get_response(request)
+                    atributos['status'] = response.status_code
+        finally:
+            _traza_actual.reset(token)
+            exportar(traza)
+        response[CABECERA] = traza_id
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        traza = _traza_actual.get()
+        vista = getattr(view_func, 'cls', None)
+        if traza is None or vista is None or not self.span_vista:
+            return None
+        acciones = getattr(view_func, 'actions', None) or {}
+        accion = acciones.get(request.method.lower(), request.method.lower())
+        with Span(traza, f'{vista.__name__}.{accion}', 'drf'):
+            return view_func(request, *view_args, **view_kwargs)
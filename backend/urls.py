@@ -1,6 +1,7 @@
 """
 URL configuration for backend project with optional Swagger documentation.
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 from django.http import JsonResponse
@@ -41,6 +42,23 @@ urlpatterns = [
     path("api/auth/verify/", TokenVerifyView.as_view(), name="token_verify"),
 ]
 
+# Documentación (API_DOCS=True). Import diferido: drf_yasg solo se carga si
+# está activa, para no pagar su import en cada arranque
+if settings.API_DOCS:
+    from drf_yasg import openapi
+    from drf_yasg.views import get_schema_view
+    from rest_framework.permissions import AllowAny
+
+    schema_view = get_schema_view(
+        openapi.Info(title="Stock Manager API", default_version="v1"),
+        public=True,
+        permission_classes=[AllowAny],
+    )
+    urlpatterns += [
+        path("swagger/", schema_view.with_ui("swagger", cache_timeout=0), name="schema-swagger-ui"),
+        path("redoc/", schema_view.with_ui("redoc", cache_timeout=0), name="schema-redoc"),
+    ]
+
 # TEMPORAL: fallback para cualquier ruta no encontrada.
 # Esto ayuda a diagnosticar por qué la raíz devuelve 404 en el despliegue.
 # Mantén esto solo mientras depuramos; retirarlo en producción si no es necesario.
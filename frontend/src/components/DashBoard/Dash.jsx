@@ -1,8 +1,10 @@
 "use client"
 
-import { useState, useEffect } from "react"
+import { useState, useEffect, useRef } from "react"
 import { fetchProducts, updateProduct, deleteProduct } from "../../services/stockService"
 import { fetchMovements } from "../../services/movementService"
+import { fetchDashboardSummary } from "../../services/dashboardService"
+import { subscribeStockEvents } from "../../services/eventService"
 import ProductList from "./ProductList"
 import AddProduct from "./AddProduct"
 import MovementHistory from "./MovementHistory"
@@ -10,6 +12,8 @@ import Tabs from "./Tabs"
 import "./Dash.css"
 
 const AUTO_REFRESH_MS = 10000
+// Rafagas de eventos se agrupan en una sola recarga
+const EVENT_REFRESH_DEBOUNCE_MS = 500
 
 function StatusBanner({ status }) {
   if (!status) return null
@@ -32,6 +36,29 @@ function Modal({ title, onClose, children }) {
   )
 }
 
+// Totales del tablero (una sola llamada a /api/tablero/)
+function SummaryCards({ summary }) {
+  if (!summary) return null
+  const cards = [
+    { label: "Productos", value: summary.productos },
+    { label: "Unidades", value: summary.unidades },
+    { label: "Valor del inventario", value: `$${summary.valorTotal.toFixed(2)}` },
+    { label: "Bajo stock", value: summary.bajoStock.total },
+    { label: "Entradas hoy", value: summary.hoy.entradas },
+    { label: "Salidas hoy", value: summary.hoy.salidas },
+  ]
+  return (
+    <div className="summary-cards">
+      {cards.map((card) => (
+        <div key={card.label} className="summary-card">
+          <span className="summary-label">{card.label}</span>
+          <span className="summary-value">{card.value}</span>
+        </div>
+      ))}
+    </div>
+  )
+}
+
 // Componente del Sidebar
 function AppSidebar({ activeSection, setActiveSection, onLogout }) {
   return (
@@ -75,6 +102,7 @@ export default function Dashboard({ onLogout }) {
   const [activeTab, setActiveTab] = useState("products")
   const [products, setProducts] = useState([])
   const [movements, setMovements] = useState([])
+  const [summary, setSummary] = useState(null)
   const [loading, setLoading] = useState(true)
   const [status, setStatus] = useState(null)
   const [editingProduct, setEditingProduct] = useState(null)
@@ -115,12 +143,19 @@ export default function Dashboard({ onLogout }) {
         id: editingProduct.id,
         precio: editForm.precio,
         cantidad: editForm.cantidad,
+        version: editingProduct.version,
       })
       notify("success", "Producto actualizado")
       closeEditModal()
       refreshData()
     } catch (err) {
       console.error("updateProduct error", err)
+      if (err?.response?.status === 409) {
+        notify("error", "El producto fue modificado por otro usuario; se recargaron los datos")
+        closeEditModal()
+        refreshData()
+        return
+      }
       notify("error", "No se pudo actualizar el producto")
     }
   }
@@ -159,12 +194,19 @@ export default function Dashboard({ onLogout }) {
       await updateProduct({
         id: editingPriceProduct.id,
         precio: priceForm.precio,
+        version: editingPriceProduct.version,
       })
       notify("success", "Precio actualizado")
       closePriceModal()
       refreshData()
     } catch (err) {
       console.error("update price error", err)
+      if (err?.response?.status === 409) {
+        notify("error", "El producto fue modificado por otro usuario; se recargaron los datos")
+        closePriceModal()
+        refreshData()
+        return
+      }
       notify("error", "No se pudo actualizar el precio")
     }
   }
@@ -193,11 +235,21 @@ export default function Dashboard({ onLogout }) {
     }
   }
 
+  // Funcion para cargar el resumen del tablero
+  const loadSummary = async () => {
+    try {
+      setSummary(await fetchDashboardSummary())
+    } catch (error) {
+      // El resumen es informativo: sin el, el resto del tablero sigue funcionando
+      console.error("Error loading summary:", error)
+    }
+  }
+
   // Cargar datos iniciales
   useEffect(() => {
     const loadData = async () => {
       setLoading(true)
-      await Promise.all([loadProducts(), loadMovements()])
+      await Promise.all([loadProducts(), loadMovements(), loadSummary()])
       setLoading(false)
     }
     loadData()
@@ -206,13 +258,35 @@ export default function Dashboard({ onLogout }) {
   const refreshData = () => {
     loadProducts()
     loadMovements()
+    loadSummary()
   }
 
+  const pendingRefresh = useRef({ products: null, movements: null, summary: null })
+
   useEffect(() => {
-    const interval = setInterval(() => {
-      refreshData()
-    }, AUTO_REFRESH_MS)
-    return () => clearInterval(interval)
+    const schedule = (key, load) => {
+      if (pendingRefresh.current[key]) return
+      pendingRefresh.current[key] = setTimeout(() => {
+        pendingRefresh.current[key] = null
+        load()
+      }, EVENT_REFRESH_DEBOUNCE_MS)
+    }
+
+    // Recarga solo cuando el backend avisa de un cambio confirmado
+    const close = subscribeStockEvents((type) => {
+      if (type === "movimiento") schedule("movements", loadMovements)
+      else schedule("products", loadProducts)
+      schedule("summary", loadSummary)
+    })
+
+    // Sin EventSource: polling como antes
+    const interval = close ? null : setInterval(refreshData, AUTO_REFRESH_MS)
+
+    return () => {
+      if (close) close()
+      if (interval) clearInterval(interval)
+      Object.values(pendingRefresh.current).forEach((timer) => timer && clearTimeout(timer))
+    }
   }, [])
 
   if (loading) {
@@ -294,6 +368,8 @@ export default function Dashboard({ onLogout }) {
         </header>
 
         <main className="dashboard-main">
+          {activeSection === "stock" && <SummaryCards summary={summary} />}
+
           {activeSection === "stock" && (
             <Tabs activeTab={activeTab} setActiveTab={setActiveTab}>
               {activeTab === "products" && (
@@ -0,0 +1,22 @@
+import api from "./api";
+
+// Resumen del tablero en una sola llamada (totales, bajo stock, movimientos de hoy y recientes)
+export const fetchDashboardSummary = async (params = {}) => {
+  const { data } = await api.get("/api/tablero/", { params });
+  return {
+    productos: Number(data?.productos ?? 0),
+    unidades: Number(data?.unidades ?? 0),
+    valorTotal: Number(data?.valor_total ?? 0),
+    bajoStock: data?.bajo_stock ?? { umbral: 0, total: 0, productos: [] },
+    hoy: {
+      fecha: data?.hoy?.fecha ?? null,
+      entradas: Number(data?.hoy?.entradas ?? 0),
+      salidas: Number(data?.hoy?.salidas ?? 0),
+    },
+    ultimosMovimientos: data?.ultimos_movimientos ?? [],
+  };
+};
+
+export default {
+  fetchDashboardSummary,
+};
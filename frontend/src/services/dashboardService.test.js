@@ -0,0 +1,34 @@
+import api from "./api";
+import { fetchDashboardSummary } from "./dashboardService";
+
+jest.mock("./api", () => ({
+  __esModule: true,
+  default: {
+    get: jest.fn(),
+  },
+}));
+
+describe("dashboardService", () => {
+  beforeEach(() => jest.clearAllMocks());
+
+  test("fetchDashboardSummary normaliza el resumen", async () => {
+    api.get.mockResolvedValue({
+      data: {
+        productos: 2,
+        unidades: 21,
+        valor_total: "57.00",
+        bajo_stock: { umbral: 10, total: 1, productos: [{ id: 2, codigo: "B", cantidad: 5 }] },
+        hoy: { fecha: "2025-01-01", entradas: 2, salidas: 4 },
+        ultimos_movimientos: [{ id: 9, tipo: "entrada" }],
+      },
+    });
+
+    const summary = await fetchDashboardSummary({ ultimos: 5 });
+
+    expect(api.get).toHaveBeenCalledWith("/api/tablero/", { params: { ultimos: 5 } });
+    expect(summary.valorTotal).toBe(57);
+    expect(summary.bajoStock.total).toBe(1);
+    expect(summary.hoy).toEqual({ fecha: "2025-01-01", entradas: 2, salidas: 4 });
+    expect(summary.ultimosMovimientos).toHaveLength(1);
+  });
+});
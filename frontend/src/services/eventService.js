@@ -0,0 +1,28 @@
+import env from "../config/env";
+
+const EVENT_TYPES = ["stock", "stock_eliminado", "movimiento"];
+
+// Suscribe al stream de cambios (/api/eventos/, Server-Sent Events).
+// El navegador reconecta solo enviando Last-Event-ID, asi que no se pierden
+// eventos. Devuelve una funcion para cerrar la conexion, o null si el
+// navegador no soporta EventSource.
+export const subscribeStockEvents = (onEvent) => {
+  if (typeof EventSource === "undefined") return null;
+  const source = new EventSource(`${env.API_BASE}/api/eventos/`);
+  EVENT_TYPES.forEach((type) => {
+    source.addEventListener(type, (event) => {
+      let data;
+      try {
+        data = JSON.parse(event.data);
+      } catch {
+        return;
+      }
+      onEvent(type, data);
+    });
+  });
+  return () => source.close();
+};
+
+export default {
+  subscribeStockEvents,
+};
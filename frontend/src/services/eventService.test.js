@@ -0,0 +1,42 @@
+import { subscribeStockEvents } from "./eventService";
+
+class FakeEventSource {
+  constructor(url) {
+    this.url = url;
+    this.listeners = {};
+    this.closed = false;
+    FakeEventSource.last = this;
+  }
+  addEventListener(type, cb) {
+    this.listeners[type] = cb;
+  }
+  close() {
+    this.closed = true;
+  }
+}
+
+describe("eventService", () => {
+  afterEach(() => {
+    delete global.EventSource;
+  });
+
+  test("subscribeStockEvents entrega eventos parseados y permite cerrar", () => {
+    global.EventSource = FakeEventSource;
+    const onEvent = jest.fn();
+
+    const close = subscribeStockEvents(onEvent);
+    const source = FakeEventSource.last;
+    source.listeners.stock({ data: '{"id":1,"cantidad":5}' });
+    source.listeners.movimiento({ data: "no-json" });
+    close();
+
+    expect(source.url).toMatch(/\/api\/eventos\/$/);
+    expect(onEvent).toHaveBeenCalledTimes(1);
+    expect(onEvent).toHaveBeenCalledWith("stock", { id: 1, cantidad: 5 });
+    expect(source.closed).toBe(true);
+  });
+
+  test("subscribeStockEvents devuelve null sin EventSource", () => {
+    expect(subscribeStockEvents(jest.fn())).toBeNull();
+  });
+});
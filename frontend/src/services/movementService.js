@@ -12,16 +12,12 @@ const normalizeMovement = (movement) => ({
   hora: movement.hora || movement.time || movement.created_time || "N/A",
 });
 
+// Filtros del servidor: producto, tipo, desde, hasta (YYYY-MM-DD o ISO 8601) y
+// orden ("-fecha" por defecto, mas recientes primero). Los items llegan ya ordenados.
 export const fetchMovements = async (params = {}) => {
   const { data } = await api.get("/api/movimientos/", { params });
   const items = Array.isArray(data) ? data : data?.results || [];
-  const normalized = items
-    .map(normalizeMovement)
-    .sort((a, b) => {
-      const dateA = new Date(`${a.fecha} ${a.hora}`);
-      const dateB = new Date(`${b.fecha} ${b.hora}`);
-      return dateB - dateA;
-    });
+  const normalized = items.map(normalizeMovement);
   const meta = {
     count: data?.count ?? normalized.length,
     next: data?.next ?? null,
@@ -11,13 +11,13 @@ jest.mock("./api", () => ({
 describe("movementService", () => {
   beforeEach(() => jest.clearAllMocks());
 
-  test("fetchMovements devuelve items ordenados y meta", async () => {
+  test("fetchMovements conserva el orden del servidor y devuelve meta", async () => {
     api.get.mockResolvedValue({
       data: {
         count: 2,
         results: [
-          { id: 1, fecha: "2025-01-01", hora: "10:00:00", tipo: "salida" },
           { id: 2, fecha: "2025-02-01", hora: "09:00:00", tipo: "entrada" },
+          { id: 1, fecha: "2025-01-01", hora: "10:00:00", tipo: "salida" },
         ],
       },
     });
@@ -29,4 +29,13 @@ describe("movementService", () => {
     expect(items[0].id).toBe(2); // mas reciente primero
     expect(items[1].id).toBe(1);
   });
+
+  test("fetchMovements envia los filtros al servidor", async () => {
+    api.get.mockResolvedValue({ data: { results: [] } });
+    const params = { producto: 7, tipo: "salida", desde: "2025-01-01", hasta: "2025-01-07" };
+
+    await fetchMovements(params);
+
+    expect(api.get).toHaveBeenCalledWith("/api/movimientos/", { params });
+  });
 });
@@ -40,13 +40,19 @@ export const subtractProduct = async ({ id, cantidad }) => {
   return api.put(`/api/stock/${id}/subtract/`, payload);
 };
 
-export const updateProduct = async ({ id, nombre, descripcion, precio, cantidad }) => {
+export const updateProduct = async ({ id, nombre, descripcion, precio, cantidad, version }) => {
   const payload = {
     ...(nombre !== undefined ? { nombre } : {}),
     ...(descripcion !== undefined ? { descripcion } : {}),
     ...(precio !== undefined ? { precio: Number.parseFloat(precio) } : {}),
     ...(cantidad !== undefined ? { cantidad: Number.parseInt(cantidad) } : {}),
   };
+  if (version !== undefined) {
+    // El backend responde 409 si el producto cambio desde que se leyo
+    return api.patch(`/api/stock/${id}/`, payload, {
+      headers: { "If-Match": `"${version}"` },
+    });
+  }
   return api.patch(`/api/stock/${id}/`, payload);
 };
 
@@ -51,6 +51,16 @@ describe("stockService", () => {
     });
   });
 
+  test("updateProduct envia If-Match con la version", async () => {
+    api.patch.mockResolvedValue({ data: {} });
+    await updateProduct({ id: 1, precio: 12.5, version: 3 });
+    expect(api.patch).toHaveBeenCalledWith(
+      "/api/stock/1/",
+      { precio: 12.5 },
+      { headers: { "If-Match": '"3"' } }
+    );
+  });
+
   test("deleteProduct llama al endpoint correcto", async () => {
     api.delete.mockResolvedValue({ data: {} });
     await deleteProduct(4);
@@ -0,0 +1,40 @@
+"""
+Configuración de gunicorn (gunicorn -c gunicorn.conf.py backend.wsgi:application)
+
+Perfil de arranque en frío: la app se importa una vez en el maestro
+(preload_app) y se precalienta antes del fork; cada worker solo abre su
+conexión a la BD al iniciar. Todo se ajusta por variables de entorno.
+"""
+
+import os
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+# Hilos: los streams SSE (/api/eventos/) mantienen la conexión abierta
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '8'))
+# Con varios workers, los eventos SSE se difunden entre procesos por sockets
+# Unix (stock/eventos.py); sin esto cada cliente solo vería su worker
+if workers > 1:
+    puerto = bind.rsplit(':', 1)[1]
+    os.environ.setdefault(
+        'STOCK_EVENTOS_DIR', os.path.join(tempfile.gettempdir(), f'stock-eventos-{puerto}')
+    )
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '60'))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+accesslog = '-'
+
+
+def when_ready(server):
+    # Maestro, antes de crear workers: solo imports (sin conexiones a la BD)
+    if preload_app:
+        from backend.arranque import precalentar
+        segundos = precalentar(conectar_bd=False)
+        server.log.info(f"App precalentada en el maestro en {segundos * 1000:.0f} ms")
+
+
+def post_worker_init(worker):
+    from backend.arranque import precalentar
+    # Sin preload cada worker importa la app por su cuenta; con preload ya está
+    precalentar(conectar_bd=os.environ.get('GUNICORN_WARMUP_DB', '1') == '1')
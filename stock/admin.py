@@ -1,17 +1,119 @@
+from datetime import datetime, time, timedelta
+
 from django.contrib import admin
-from .models import StockItem, Movimiento, Administrador
+from django.utils import timezone
+
+from .models import (
+    StockItem, Movimiento, Administrador, Ubicacion, StockUbicacion, AnalisisProducto, Trabajo,
+)
+from .pagination import PaginadorConteoEstimado
+
+
+class FechaRecienteFilter(admin.SimpleListFilter):
+    """
+    Filtro de fecha acotado por defecto a los últimos 7 días, para que el
+    listado no recorra todo el historial. El límite es el inicio del día,
+    así el SQL (y su conteo cacheado) no cambia entre requests del mismo día.
+    """
+    title = 'fecha'
+    parameter_name = 'periodo'
+    OPCIONES = {'7': 7, '30': 30, '365': 365}
+
+    def __init__(self, request, params, model, model_admin):
+        # Con la jerarquía de fechas activa manda la jerarquía
+        self.jerarquia = any(
+            parametro.startswith(f'{model_admin.date_hierarchy}__') for parametro in request.GET
+        )
+        super().__init__(request, params, model, model_admin)
+
+    def lookups(self, request, model_admin):
+        return [
+            ('7', 'Últimos 7 días'),
+            ('30', 'Últimos 30 días'),
+            ('365', 'Último año'),
+            ('todos', 'Todo el historial'),
+        ]
+
+    def choices(self, changelist):
+        # Sin la opción "Todo" de Django: el valor por defecto es 7 días
+        for valor, titulo in self.lookup_choices:
+            yield {
+                'selected': (self.value() or '7') == valor and not self.jerarquia,
+                'query_string': changelist.get_query_string({self.parameter_name: valor}),
+                'display': titulo,
+            }
+
+    def queryset(self, request, queryset):
+        valor = self.value() or '7'
+        if self.jerarquia or valor not in self.OPCIONES:
+            return queryset
+        desde = timezone.localdate() - timedelta(days=self.OPCIONES[valor] - 1)
+        return queryset.filter(fecha__gte=timezone.make_aware(datetime.combine(desde, time.min)))
+
 
 # Registrar StockItem
-admin.site.register(StockItem)
+@admin.register(StockItem)
+class StockItemAdmin(admin.ModelAdmin):
+    list_display = ['id', 'codigo', 'nombre', 'precio', 'cantidad', 'version']
+    # Prefijos: usan los índices de codigo y nombre (sin LIKE '%...%')
+    search_fields = ['^codigo', '^nombre']
+    readonly_fields = ['version']
+    ordering = ['id']
+    paginator = PaginadorConteoEstimado
+    show_full_result_count = False
 
 # Registrar Movimiento
 @admin.register(Movimiento)
 class MovimientoAdmin(admin.ModelAdmin):
-    list_display = ['id', 'producto', 'tipo', 'cantidad', 'fecha', 'hora']
-    list_filter = ['tipo', 'fecha']
-    search_fields = ['producto__nombre']
+    list_display = ['id', 'producto', 'tipo', 'cantidad', 'ubicacion', 'fecha', 'hora']
+    list_filter = [FechaRecienteFilter, 'tipo', 'ubicacion']
+    list_select_related = ['producto', 'ubicacion']
+    date_hierarchy = 'fecha'
+    search_fields = ['^producto__codigo', '^producto__nombre']
+    autocomplete_fields = ['producto', 'ubicacion']
     readonly_fields = ['fecha', 'hora']
     ordering = ['-fecha', '-hora']
+    paginator = PaginadorConteoEstimado
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
 
 # Registrar Administrador
-admin.site.register(Administrador)
\ No newline at end of file
+admin.site.register(Administrador)
+
+# Registrar Ubicacion y existencias por ubicación
+@admin.register(Ubicacion)
+class UbicacionAdmin(admin.ModelAdmin):
+    list_display = ['codigo', 'nombre', 'activa']
+    list_filter = ['activa']
+    search_fields = ['codigo', 'nombre']
+
+@admin.register(StockUbicacion)
+class StockUbicacionAdmin(admin.ModelAdmin):
+    list_display = ['producto', 'ubicacion', 'cantidad']
+    list_filter = ['ubicacion']
+    search_fields = ['producto__nombre', 'producto__codigo']
+    list_select_related = ['producto', 'ubicacion']
+
+# Registrar análisis ABC (solo lectura: lo escribe calcular_analisis)
+@admin.register(AnalisisProducto)
+class AnalisisProductoAdmin(admin.ModelAdmin):
+    list_display = ['producto', 'clase', 'valor_movido', 'unidades_salida', 'rotacion', 'ultimo_movimiento']
+    list_filter = ['clase']
+    search_fields = ['producto__nombre', 'producto__codigo']
+    list_select_related = ['producto']
+    ordering = ['-valor_movido']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+# Registrar trabajos en segundo plano (los escribe el trabajador)
+@admin.register(Trabajo)
+class TrabajoAdmin(admin.ModelAdmin):
+    list_display = ['id', 'tipo', 'estado', 'progreso', 'intentos', 'creado', 'terminado']
+    list_filter = ['estado', 'tipo']
+    ordering = ['-id']
+    exclude = ['parametros']
+    readonly_fields = ['resultado', 'error']
@@ -0,0 +1,103 @@
+"""
+Autenticación JWT con caché del usuario
+JWTAuthentication consulta Administrador en cada request. Esta clase
+resuelve el usuario desde el claim user_id del token y una caché en memoria
+del proceso (TTL corto) con su estado: is_active, is_staff, is_superuser.
+Con la caché caliente, autenticar no ejecuta ninguna consulta.
+
+Los cambios hechos vía AdministradorViewSet o AdministradorService
+invalidan la entrada en el proceso que los hace; en los demás workers
+expira a los STOCK_AUTH_CACHE_TTL segundos.
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import Administrador
+
+
+# En el orden de los campos del modelo, como espera Model.from_db()
+CAMPOS_CACHEADOS = tuple(
+    campo.attname for campo in Administrador._meta.concrete_fields
+    if campo.attname in {'id', 'username', 'is_active', 'is_staff', 'is_superuser'}
+)
+
+_cache: Dict[str, Tuple[Optional[tuple], float]] = {}
+_lock = threading.Lock()
+_estadisticas = {'aciertos': 0, 'fallos': 0}
+
+
+def _ttl() -> int:
+    return getattr(settings, 'STOCK_AUTH_CACHE_TTL', 30)
+
+
+def invalidar_usuario(user_id=None) -> None:
+    """Descarta el estado cacheado de un administrador (o de todos si es None)"""
+    with _lock:
+        if user_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(str(user_id), None)
+
+
+def estadisticas_cache() -> Dict[str, int]:
+    with _lock:
+        return {**_estadisticas, 'entradas': len(_cache)}
+
+
+def _estado_usuario(user_id) -> Optional[tuple]:
+    clave = str(user_id)
+    ahora = time.monotonic()
+    with _lock:
+        entrada = _cache.get(clave)
+        if entrada is not None and entrada[1] > ahora:
+            _estadisticas['aciertos'] += 1
+            return entrada[0]
+        _estadisticas['fallos'] += 1
+
+    valores = Administrador.objects.filter(
+        **{api_settings.USER_ID_FIELD: user_id}
+    ).values_list(*CAMPOS_CACHEADOS).first()
+
+    with _lock:
+        # Cota de memoria: con muchos usuarios distintos se empieza de cero
+        if len(_cache) >= getattr(settings, 'STOCK_AUTH_CACHE_MAX', 10000):
+            _cache.clear()
+        # Los usuarios inexistentes también se cachean (evita martillar la BD)
+        _cache[clave] = (valores, ahora + _ttl())
+    return valores
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication con el usuario resuelto desde la caché del proceso.
+    El usuario devuelto es una instancia de Administrador cargada solo con
+    CAMPOS_CACHEADOS; cualquier otro campo se lee de la BD al accederlo.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            # Requiere el hash de la contraseña actual: sin caché
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        valores = _estado_usuario(user_id)
+        if valores is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        user = Administrador.from_db(DEFAULT_DB_ALIAS, CAMPOS_CACHEADOS, valores)
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
@@ -0,0 +1,263 @@
+"""
+Eventos - Difusión de cambios de stock en tiempo real
+Los cambios confirmados (niveles de stock y movimientos nuevos) se publican
+en un hub en memoria al que se suscriben los streams SSE (/api/eventos/).
+
+- Cada evento tiene un ID creciente; el hub guarda los últimos N en un
+  buffer circular para que un cliente que reconecta con Last-Event-ID
+  reciba lo que se perdió.
+- Cada suscriptor tiene una cola acotada. Publicar nunca bloquea: si la
+  cola de un cliente lento se llena, se le desconecta y al reconectar se
+  pone al día desde el buffer.
+- Con varios workers, STOCK_EVENTOS_DIR activa un pub/sub local por
+  sockets Unix de datagramas: cada proceso escucha en un socket del
+  directorio y reenvía sus eventos a los demás. gunicorn.conf.py lo
+  define por defecto cuando hay más de un worker.
+- Cada stream ocupa un hilo del worker mientras dure: el hub admite a lo
+  sumo STOCK_EVENTOS_MAX_CONEXIONES suscriptores por proceso, para que
+  siempre queden hilos libres para el resto de la API.
+"""
+
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from django.conf import settings
+from rest_framework.utils.encoders import JSONEncoder
+
+logger = logging.getLogger(__name__)
+
+
+class Evento(NamedTuple):
+    id: int
+    tipo: str
+    datos: Dict[str, Any]
+
+    def a_sse(self) -> str:
+        """Formato text/event-stream"""
+        datos = json.dumps(self.datos, cls=JSONEncoder, separators=(',', ':'))
+        return f"id: {self.id}\nevent: {self.tipo}\ndata: {datos}\n\n"
+
+
+class EventosSaturados(Exception):
+    """No quedan lugares para otro stream en este worker"""
+
+
+class Suscripcion:
+    """Cola de eventos de un cliente conectado"""
+
+    def __init__(self, tamano_cola: int):
+        self.cola = queue.Queue(maxsize=tamano_cola)
+        self.desbordada = False
+
+    def entregar(self, evento: Evento) -> None:
+        if self.desbordada:
+            return
+        try:
+            self.cola.put_nowait(evento)
+        except queue.Full:
+            # Cliente lento: se corta su stream en lugar de frenar al publicador
+            self.desbordada = True
+
+    def siguiente(self, timeout: float) -> Optional[Evento]:
+        """Próximo evento o None si no llegó ninguno en timeout segundos"""
+        try:
+            return self.cola.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class HubEventos:
+    """Hub de difusión en memoria de un proceso"""
+
+    def __init__(self, tamano_buffer: int = 1000, tamano_cola: int = 100,
+                 max_suscripciones: Optional[int] = None):
+        self._lock = threading.Lock()
+        self._buffer = deque(maxlen=tamano_buffer)
+        self._suscripciones = set()
+        self._ultimo_id = 0
+        self._rechazadas = 0
+        self.tamano_cola = tamano_cola
+        self.max_suscripciones = max_suscripciones
+        self.transporte: Optional['TransporteUnix'] = None
+
+    def _nuevo_id(self) -> int:
+        # Marca de tiempo en µs: comparable entre workers de la misma máquina
+        with self._lock:
+            self._ultimo_id = max(self._ultimo_id + 1, time.time_ns() // 1000)
+            return self._ultimo_id
+
+    def publicar(self, tipo: str, datos: Dict[str, Any]) -> Evento:
+        """Publica un evento en este proceso y en los demás workers"""
+        evento = Evento(self._nuevo_id(), tipo, datos)
+        self.recibir(evento)
+        if self.transporte is not None:
+            self.transporte.enviar(evento)
+        return evento
+
+    def recibir(self, evento: Evento) -> None:
+        """Entrega un evento (local o de otro worker) a los suscriptores"""
+        with self._lock:
+            self._ultimo_id = max(self._ultimo_id, evento.id)
+            self._buffer.append(evento)
+            suscripciones = list(self._suscripciones)
+        for suscripcion in suscripciones:
+            suscripcion.entregar(evento)
+
+    def suscribir(self, desde_id: Optional[int] = None):
+        """
+        Registra un cliente.
+
+        Args:
+            desde_id: Último ID recibido por el cliente (Last-Event-ID)
+
+        Returns:
+            Tupla (suscripción, eventos pendientes del buffer)
+
+        Raises:
+            EventosSaturados: Si el worker ya tiene max_suscripciones streams
+        """
+        suscripcion = Suscripcion(self.tamano_cola)
+        with self._lock:
+            if (self.max_suscripciones is not None
+                    and len(self._suscripciones) >= self.max_suscripciones):
+                self._rechazadas += 1
+                raise EventosSaturados(
+                    f"Máximo de {self.max_suscripciones} streams por worker alcanzado"
+                )
+            self._suscripciones.add(suscripcion)
+            pendientes = [] if desde_id is None else [
+                evento for evento in self._buffer if evento.id > desde_id
+            ]
+        return suscripcion, pendientes
+
+    def cancelar(self, suscripcion: Suscripcion) -> None:
+        with self._lock:
+            self._suscripciones.discard(suscripcion)
+
+    def metricas(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'suscriptores': len(self._suscripciones),
+                'max_suscriptores': self.max_suscripciones,
+                'rechazadas': self._rechazadas,
+                'eventos_en_buffer': len(self._buffer),
+                'ultimo_id': self._ultimo_id,
+            }
+
+
+class TransporteUnix:
+    """
+    Pub/sub entre workers de la misma máquina: cada proceso escucha en
+    <directorio>/<pid>.sock y envía cada evento a los demás sockets.
+    Los envíos son no bloqueantes: si el buffer del receptor está lleno,
+    el evento se pierde para ese worker en lugar de frenar la escritura.
+    """
+
+    def __init__(self, hub: HubEventos, directorio: str, nombre: Optional[str] = None):
+        self.hub = hub
+        self.directorio = directorio
+        os.makedirs(directorio, exist_ok=True)
+        self.ruta = os.path.join(directorio, f'{nombre or os.getpid()}.sock')
+        if os.path.exists(self.ruta):
+            os.unlink(self.ruta)
+
+        self._entrada = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._entrada.bind(self.ruta)
+        self._salida = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._salida.setblocking(False)
+
+        threading.Thread(target=self._escuchar, name='eventos-unix', daemon=True).start()
+
+    def _destinos(self) -> List[str]:
+        try:
+            nombres = os.listdir(self.directorio)
+        except FileNotFoundError:
+            return []
+        return [
+            os.path.join(self.directorio, nombre) for nombre in nombres
+            if nombre.endswith('.sock') and os.path.join(self.directorio, nombre) != self.ruta
+        ]
+
+    def enviar(self, evento: Evento) -> None:
+        mensaje = json.dumps(
+            [evento.id, evento.tipo, evento.datos], cls=JSONEncoder
+        ).encode('utf-8')
+        for destino in self._destinos():
+            try:
+                self._salida.sendto(mensaje, destino)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Worker terminado: se limpia su socket
+                try:
+                    os.unlink(destino)
+                except OSError:
+                    pass
+            except (BlockingIOError, OSError):
+                logger.warning(f"Evento {evento.id} descartado para {destino}")
+
+    def _escuchar(self) -> None:
+        while True:
+            try:
+                mensaje = self._entrada.recv(65536)
+                id_evento, tipo, datos = json.loads(mensaje)
+                self.hub.recibir(Evento(id_evento, tipo, datos))
+            except Exception:
+                logger.exception("Error recibiendo evento de otro worker")
+
+
+_hub = None
+_hub_pid = None
+_hub_lock = threading.Lock()
+
+
+def obtener_hub() -> HubEventos:
+    """Hub del proceso actual (se crea tras el fork de cada worker)"""
+    global _hub, _hub_pid
+    if _hub is None or _hub_pid != os.getpid():
+        with _hub_lock:
+            if _hub is None or _hub_pid != os.getpid():
+                hub = HubEventos(
+                    tamano_buffer=getattr(settings, 'STOCK_EVENTOS_BUFFER', 1000),
+                    tamano_cola=getattr(settings, 'STOCK_EVENTOS_COLA', 100),
+                    max_suscripciones=getattr(settings, 'STOCK_EVENTOS_MAX_CONEXIONES', None),
+                )
+                directorio = getattr(settings, 'STOCK_EVENTOS_DIR', None)
+                if directorio:
+                    hub.transporte = TransporteUnix(hub, directorio)
+                _hub, _hub_pid = hub, os.getpid()
+    return _hub
+
+
+def publicar_cambios(productos=(), movimientos=(), eliminados=()) -> None:
+    """
+    Publica los cambios de una transacción confirmada. Nunca propaga
+    errores: la escritura ya se confirmó.
+    """
+    try:
+        hub = obtener_hub()
+        for item in productos:
+            hub.publicar('stock', {
+                'id': item.pk,
+                'nombre': item.nombre,
+                'cantidad': item.cantidad,
+                'precio': item.precio,
+                'version': item.version,
+            })
+        for pk in eliminados:
+            hub.publicar('stock_eliminado', {'id': pk})
+        for movimiento in movimientos:
+            hub.publicar('movimiento', {
+                'id': movimiento.pk,
+                'producto': movimiento.producto_id,
+                'tipo': movimiento.tipo,
+                'cantidad': movimiento.cantidad,
+                'fecha': movimiento.fecha,
+            })
+    except Exception:
+        logger.exception("No se pudieron publicar los eventos de stock")
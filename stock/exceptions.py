@@ -42,7 +42,10 @@ def custom_exception_handler(exc, context):
             )
         
         # Manejo de excepciones personalizadas del servicio
-        from .services import StockInsuficienteError, ProductoNoEncontradoError
+        from .services import (
+            StockInsuficienteError, ProductoNoEncontradoError, ConflictoDeVersionError,
+            UbicacionNoEncontradaError,
+        )
         
         if isinstance(exc, StockInsuficienteError):
             logger.warning(f"StockInsuficienteError: {exc}")
@@ -66,6 +69,71 @@ def custom_exception_handler(exc, context):
                 status=status.HTTP_404_NOT_FOUND
             )
         
+        if isinstance(exc, UbicacionNoEncontradaError):
+            logger.error(f"UbicacionNoEncontradaError: {exc}")
+            return Response(
+                {
+                    'error': 'Ubicación no encontrada',
+                    'detail': str(exc),
+                    'success': False
+                },
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        # Bloqueos: NOWAIT ocupado -> 409; contención persistente -> 503 (transitorio)
+        from .reintentos import (
+            ContencionDeBloqueosError, RecursoBloqueadoError, es_bloqueo_ocupado, es_reintentable,
+        )
+        
+        if isinstance(exc, RecursoBloqueadoError) or es_bloqueo_ocupado(exc):
+            logger.warning(f"RecursoBloqueadoError: {exc}")
+            return Response(
+                {
+                    'error': 'Recurso bloqueado',
+                    'detail': str(exc),
+                    'success': False
+                },
+                status=status.HTTP_409_CONFLICT
+            )
+        
+        if isinstance(exc, ContencionDeBloqueosError) or es_reintentable(exc):
+            logger.warning(f"ContencionDeBloqueosError: {exc}")
+            return Response(
+                {
+                    'error': 'Contención de bloqueos',
+                    'detail': 'Demasiada contención sobre los datos; intente nuevamente',
+                    'success': False
+                },
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': '1'}
+            )
+        
+        # Sin conexiones libres en el pool: sobrecarga transitoria, no un 500
+        from backend.mysql_pool.pool import PoolAgotadoError
+        
+        if isinstance(exc, PoolAgotadoError):
+            logger.warning(f"PoolAgotadoError: {exc}")
+            return Response(
+                {
+                    'error': 'Servicio saturado',
+                    'detail': 'No hay conexiones a la base de datos disponibles; intente nuevamente',
+                    'success': False
+                },
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': '1'}
+            )
+        
+        if isinstance(exc, ConflictoDeVersionError):
+            logger.warning(f"ConflictoDeVersionError: {exc}")
+            return Response(
+                {
+                    'error': 'Conflicto de versión',
+                    'detail': str(exc),
+                    'success': False
+                },
+                status=status.HTTP_409_CONFLICT
+            )
+        
         # Excepciones no manejadas
         logger.exception(f"Excepción no manejada: {exc}")
         return Response(
@@ -0,0 +1,34 @@
+"""
+Actualiza los resúmenes horarios/diarios de movimientos desde la marca de
+agua. Pensado para ejecutarse periódicamente (cron) o tras cargas masivas.
+
+Uso:
+    python manage.py actualizar_resumenes [--lote 50000] [--conciliar DIAS] [--reconstruir]
+"""
+
+from django.core.management.base import BaseCommand
+
+from stock.services import ResumenMovimientosService
+
+
+class Command(BaseCommand):
+    help = 'Actualiza los resúmenes de movimientos (rollups por hora y por día)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=50000,
+                            help='Movimientos procesados por transacción')
+        parser.add_argument('--conciliar', type=int, metavar='DIAS',
+                            help='Además, recalcular los resúmenes de los últimos DIAS días')
+        parser.add_argument('--reconstruir', action='store_true',
+                            help='Borrar los resúmenes y recalcularlos desde cero')
+
+    def handle(self, *args, **options):
+        service = ResumenMovimientosService()
+        if options['reconstruir']:
+            procesados = service.reconstruir()
+        else:
+            procesados = service.ponerse_al_dia(lote=options['lote'])
+            if options['conciliar']:
+                conciliados = service.conciliar(options['conciliar'])
+                self.stdout.write(f'{conciliados} movimientos conciliados')
+        self.stdout.write(self.style.SUCCESS(f'{procesados} movimientos resumidos'))
@@ -0,0 +1,101 @@
+"""
+Compara tiempo de codificación y tamaño del payload de los formatos de
+respuesta (JSON, MessagePack, JSON columnar) sobre el catálogo y el
+historial de movimientos.
+
+Uso:
+    python manage.py benchmark_formatos --filas 5000 --repeticiones 5
+"""
+
+import time
+from datetime import datetime, time as dtime, timezone
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from stock.models import StockItem, Movimiento
+from stock.renderers import MessagePackRenderer, ColumnarJSONRenderer
+from stock.serializers import StockSerializer, MovimientoSerializer
+
+
+FORMATOS = [
+    ('json', JSONRenderer()),
+    ('msgpack', MessagePackRenderer()),
+    ('columnar', ColumnarJSONRenderer()),
+]
+
+
+class Command(BaseCommand):
+    help = 'Mide tiempo de codificación y tamaño de payload por formato de respuesta'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=2000,
+                            help='Filas sintéticas por listado (por defecto 2000)')
+        parser.add_argument('--repeticiones', type=int, default=5,
+                            help='Repeticiones por medición (se reporta la mejor)')
+        parser.add_argument('--desde-bd', action='store_true',
+                            help='Usar los datos reales de la base en lugar de datos sintéticos')
+
+    def handle(self, *args, **options):
+        productos, movimientos = self._cargar_datos(options['filas'], options['desde_bd'])
+
+        listados = {
+            'stock': StockSerializer(productos, many=True).data,
+            'movimientos': MovimientoSerializer(movimientos, many=True).data,
+        }
+
+        for nombre, datos in listados.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\n{nombre} ({len(datos)} filas)'))
+            self.stdout.write(f"{'formato':<10} {'bytes':>12} {'vs json':>8} {'encode ms':>10}")
+
+            tamano_json = None
+            for formato, renderer in FORMATOS:
+                payload, segundos = self._medir(renderer, datos, options['repeticiones'])
+                tamano_json = tamano_json or len(payload)
+                self.stdout.write(
+                    f"{formato:<10} {len(payload):>12} "
+                    f"{len(payload) / tamano_json:>7.0%} {segundos * 1000:>10.2f}"
+                )
+
+    def _medir(self, renderer, datos, repeticiones):
+        mejor = None
+        payload = b''
+        for _ in range(max(repeticiones, 1)):
+            inicio = time.perf_counter()
+            payload = renderer.render(datos)
+            transcurrido = time.perf_counter() - inicio
+            mejor = transcurrido if mejor is None else min(mejor, transcurrido)
+        return payload, mejor
+
+    def _cargar_datos(self, filas, desde_bd):
+        if desde_bd:
+            productos = list(StockItem.objects.all()[:filas])
+            movimientos = list(Movimiento.objects.select_related('producto')[:filas])
+            return productos, movimientos
+
+        # Datos sintéticos en memoria: no requieren base de datos
+        productos = [
+            StockItem(
+                id=i,
+                codigo=f'SKU-{i:08d}',
+                nombre=f'Producto {i}',
+                descripcion=f'Descripción del producto {i}',
+                precio=Decimal(f'{(i % 997) + 1}.{i % 100:02d}'),
+                cantidad=i % 500,
+            )
+            for i in range(1, filas + 1)
+        ]
+        fecha = datetime(2025, 1, 1, 12, 0, tzinfo=timezone.utc)
+        movimientos = [
+            Movimiento(
+                id=i,
+                producto=productos[i % len(productos)],
+                tipo=('entrada', 'salida')[i % 2],
+                cantidad=(i % 20) + 1,
+                fecha=fecha,
+                hora=dtime(12, 0),
+            )
+            for i in range(1, filas + 1)
+        ]
+        return productos, movimientos
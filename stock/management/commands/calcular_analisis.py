@@ -0,0 +1,29 @@
+"""
+Recalcula el análisis ABC y de rotación de todo el catálogo y lo materializa
+en AnalisisProducto. Pensado para ejecutarse periódicamente (cron), p. ej.
+cada noche.
+
+Uso:
+    python manage.py calcular_analisis [--lote 50000]
+"""
+
+from django.core.management.base import BaseCommand
+
+from stock.services import AnalisisService
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el análisis ABC y de rotación de los productos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=None,
+                            help='Productos por consulta y por transacción (STOCK_ANALISIS_LOTE)')
+
+    def handle(self, *args, **options):
+        resumen = AnalisisService().calcular(lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"{resumen['productos']} productos analizados"))
+        for clase, datos in resumen['clases'].items():
+            self.stdout.write(
+                f"  {clase}: {datos['productos']} productos, "
+                f"{datos['valor_movido']} ({datos['porcentaje_valor']}% del valor movido)"
+            )
@@ -0,0 +1,44 @@
+"""
+Recalcula el pronóstico de demanda y las sugerencias de reorden de todos los
+productos y lo guarda en PronosticoProducto, compartido por todos los
+procesos. Pensado para ejecutarse periódicamente (cron) con una frecuencia
+menor que STOCK_PRONOSTICO_TTL, así los requests nunca esperan el cálculo.
+
+Uso:
+    python manage.py calcular_pronostico [--hoy 2025-06-30] [--top 10]
+"""
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from stock.services import PronosticoService
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el pronóstico de demanda y las sugerencias de reorden'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hoy', type=str, default=None,
+                            help='Día de referencia (AAAA-MM-DD); la ventana termina el día anterior')
+        parser.add_argument('--top', type=int, default=0,
+                            help='Listar las N sugerencias más urgentes')
+
+    def handle(self, *args, **options):
+        hoy = None
+        if options['hoy']:
+            try:
+                hoy = date.fromisoformat(options['hoy'])
+            except ValueError:
+                raise CommandError('--hoy debe tener formato AAAA-MM-DD')
+
+        service = PronosticoService()
+        resultado = service.calcular(hoy)
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['productos']} productos pronosticados, {resultado['a_reponer']} a reponer"
+        ))
+        for fila in map(service.fila, service.sugerencias()[:options['top']]):
+            self.stdout.write(
+                f"  {fila['nombre']}: stock {fila['stock']}, "
+                f"{fila['dias_cobertura']} días de cobertura, reponer {fila['cantidad_sugerida']}"
+            )
@@ -0,0 +1,273 @@
+"""
+Genera un conjunto de datos sintético para pruebas de carga: productos con
+código único y un historial de movimientos con popularidad sesgada (Zipf)
+y marcas de tiempo con patrón horario y semanal.
+
+- Inserción por bloques con executemany (un INSERT multi-fila por bloque
+  en MySQL) y una transacción por bloque.
+- Los bloques se reparten entre varios procesos.
+- Reproducible: cada bloque usa su propia semilla derivada de --semilla,
+  así que el resultado no depende de la cantidad de procesos.
+- Al terminar pone al día los resúmenes de movimientos y la valoración.
+
+Uso:
+    python manage.py generar_datos --productos 1000000 --movimientos 10000000 --procesos 8
+"""
+
+import itertools
+import multiprocessing
+import random
+import time
+from datetime import date, datetime, time as dtime, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from stock.models import StockItem, Movimiento
+from stock.services import CambiosService, ResumenMovimientosService, ValoracionService
+
+
+CATEGORIAS = [
+    'Tornillo', 'Tuerca', 'Arandela', 'Cable', 'Cinta', 'Pintura', 'Brocha',
+    'Lija', 'Martillo', 'Llave', 'Taladro', 'Broca', 'Foco', 'Enchufe',
+    'Tubo', 'Codo', 'Válvula', 'Manguera', 'Guante', 'Candado',
+]
+VARIANTES = [
+    'pequeño', 'mediano', 'grande', 'reforzado', 'económico', 'industrial',
+    'galvanizado', 'plástico', 'metálico', 'premium',
+]
+
+TIPOS = ('entrada', 'salida', 'ajuste')
+PESOS_TIPO = (0.30, 0.62, 0.08)
+
+# Actividad relativa por hora del día (horario comercial) y por día de la semana
+PESOS_HORA = [
+    0.02, 0.01, 0.01, 0.01, 0.01, 0.03, 0.10, 0.35, 0.80, 1.00, 1.00, 0.95,
+    0.70, 0.85, 1.00, 0.95, 0.85, 0.65, 0.40, 0.25, 0.15, 0.08, 0.05, 0.03,
+]
+PESOS_DIA = [1.00, 1.00, 1.00, 1.00, 1.05, 0.60, 0.20]
+_PESO_MAXIMO = max(PESOS_HORA) * max(PESOS_DIA)
+
+# Estado de cada proceso del pool (se fija en _inicializar_worker)
+_ids_productos = []
+_pesos_acumulados = []
+
+
+def _semilla_bloque(semilla: int, tipo: str, bloque: int) -> int:
+    return semilla * 1_000_003 + (0 if tipo == 'productos' else 500_009) + bloque
+
+
+def _insertar(modelo, campos, filas) -> None:
+    """INSERT por executemany (sin instanciar modelos)"""
+    opciones = modelo._meta
+    columnas = [opciones.get_field(campo).column for campo in campos]
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        connection.ops.quote_name(opciones.db_table),
+        ', '.join(connection.ops.quote_name(columna) for columna in columnas),
+        ', '.join(['%s'] * len(columnas)),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, filas)
+
+
+def _codigo(prefijo: str, numero: int) -> str:
+    # Con ceros a la izquierda el orden alfabético coincide con el numérico
+    return f'{prefijo}{numero:09d}'
+
+
+def _bloque_productos(tarea) -> int:
+    """Inserta un bloque de productos y registra su alta en el feed de cambios"""
+    semilla, bloque, desde, hasta, prefijo = tarea
+    rng = random.Random(_semilla_bloque(semilla, 'productos', bloque))
+    filas = []
+    for numero in range(desde, hasta):
+        precio = Decimal(min(rng.lognormvariate(3.0, 1.1), 99_999.0)).quantize(Decimal('0.01'))
+        filas.append((
+            _codigo(prefijo, numero),
+            f'{rng.choice(CATEGORIAS)} {rng.choice(VARIANTES)} {numero}',
+            '',
+            connection.ops.adapt_decimalfield_value(precio, 10, 2),
+            rng.randint(0, 500),
+            1,
+        ))
+
+    with transaction.atomic():
+        _insertar(StockItem, ['codigo', 'nombre', 'descripcion', 'precio', 'cantidad', 'version'], filas)
+        creados = StockItem.objects.filter(
+            codigo__gte=_codigo(prefijo, desde), codigo__lte=_codigo(prefijo, hasta - 1)
+        )
+        CambiosService().registrar([(item, 'crear') for item in creados], [])
+    return len(filas)
+
+
+def _marcas_de_tiempo(rng: random.Random, inicio, fin, cantidad: int) -> list:
+    """Marcas de tiempo ordenadas en [inicio, fin) con patrón horario y semanal"""
+    segundos = (fin - inicio).total_seconds()
+    marcas = []
+    while len(marcas) < cantidad:
+        marca = inicio + timedelta(seconds=rng.random() * segundos)
+        local = timezone.localtime(marca)
+        # Muestreo por rechazo según la actividad de esa hora y día
+        if rng.random() * _PESO_MAXIMO <= PESOS_HORA[local.hour] * PESOS_DIA[local.weekday()]:
+            marcas.append(local)
+    marcas.sort()
+    return marcas
+
+
+def _cantidad(rng: random.Random, tipo: str) -> int:
+    if tipo == 'entrada':
+        return rng.choice((6, 12, 24, 50, 100)) * rng.randint(1, 4)
+    if tipo == 'salida':
+        return 1 + int(rng.expovariate(0.5))
+    return rng.randint(1, 10)
+
+
+def _bloque_movimientos(tarea) -> int:
+    """Inserta un bloque de movimientos que cubre el intervalo [inicio, fin)"""
+    semilla, bloque, cantidad, inicio, fin = tarea
+    rng = random.Random(_semilla_bloque(semilla, 'movimientos', bloque))
+    productos = rng.choices(_ids_productos, cum_weights=_pesos_acumulados, k=cantidad)
+    tipos = rng.choices(TIPOS, weights=PESOS_TIPO, k=cantidad)
+    ops = connection.ops
+    filas = [
+        (producto, tipo, _cantidad(rng, tipo), ops.adapt_datetimefield_value(marca),
+         ops.adapt_timefield_value(marca.time()))
+        for producto, tipo, marca in zip(productos, tipos, _marcas_de_tiempo(rng, inicio, fin, cantidad))
+    ]
+    with transaction.atomic():
+        _insertar(Movimiento, ['producto', 'tipo', 'cantidad', 'fecha', 'hora'], filas)
+    return len(filas)
+
+
+def _inicializar_worker(ids_productos, pesos_acumulados) -> None:
+    global _ids_productos, _pesos_acumulados
+    _ids_productos = ids_productos
+    _pesos_acumulados = pesos_acumulados
+
+
+def _popularidad(ids: list, semilla: int, exponente: float):
+    """
+    IDs en orden de popularidad (barajados: el más vendido no es el primero
+    creado) y sus pesos acumulados según una ley de Zipf.
+    """
+    random.Random(semilla).shuffle(ids)
+    pesos = itertools.accumulate(1 / rango ** exponente for rango in range(1, len(ids) + 1))
+    return ids, list(pesos)
+
+
+class Command(BaseCommand):
+    help = 'Genera productos y movimientos sintéticos para pruebas de carga'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=10000,
+                            help='Productos a crear (0 usa el catálogo existente)')
+        parser.add_argument('--movimientos', type=int, default=100000,
+                            help='Movimientos a crear')
+        parser.add_argument('--dias', type=int, default=365,
+                            help='Días de historial')
+        parser.add_argument('--hasta', type=date.fromisoformat, default=None,
+                            help='Último día del historial, AAAA-MM-DD (por defecto ayer)')
+        parser.add_argument('--semilla', type=int, default=42,
+                            help='Semilla de generación (mismo valor, mismos datos)')
+        parser.add_argument('--prefijo', default=None,
+                            help='Prefijo de los códigos (por defecto SIM<semilla>-)')
+        parser.add_argument('--zipf', type=float, default=1.1,
+                            help='Exponente de la ley de Zipf de popularidad de productos')
+        parser.add_argument('--lote', type=int, default=10000,
+                            help='Filas por INSERT/transacción (forma parte de la semilla de cada bloque)')
+        parser.add_argument('--procesos', type=int, default=multiprocessing.cpu_count(),
+                            help='Procesos en paralelo (1 ejecuta en este proceso)')
+        parser.add_argument('--sin-resumenes', action='store_true',
+                            help='No actualizar resúmenes ni valoración al terminar')
+
+    def handle(self, *args, **options):
+        semilla = options['semilla']
+        lote = max(1, options['lote'])
+        prefijo = options['prefijo'] or f'SIM{semilla}-'
+        options['hasta'] = options['hasta'] or timezone.localdate() - timedelta(days=1)
+        if options['productos'] < 0 or options['movimientos'] < 0:
+            raise CommandError('--productos y --movimientos no pueden ser negativos')
+
+        if options['productos']:
+            if StockItem.objects.filter(codigo__startswith=prefijo).exists():
+                raise CommandError(
+                    f"Ya existen productos con el prefijo '{prefijo}'; use otro --prefijo o --semilla"
+                )
+            tareas = [
+                (semilla, bloque, desde, min(desde + lote, options['productos']), prefijo)
+                for bloque, desde in enumerate(range(0, options['productos'], lote))
+            ]
+            self._ejecutar('productos', _bloque_productos, tareas, options['procesos'], (), options['productos'])
+            productos = StockItem.objects.filter(codigo__startswith=prefijo)
+        else:
+            productos = StockItem.objects.all()
+        # Orden por código: con inserción en paralelo los IDs dependen del
+        # orden en que terminan los procesos
+        ids = productos.order_by('codigo', 'id').values_list('id', flat=True)
+
+        if options['movimientos']:
+            ids, pesos = _popularidad(list(ids), semilla, options['zipf'])
+            if not ids:
+                raise CommandError('No hay productos para generar movimientos')
+            # Hasta el final del día indicado (ayer por defecto: todo el historial queda en el pasado), no "ahora":
+            # con la misma semilla y --hasta se obtienen las mismas fechas
+            fin = timezone.make_aware(datetime.combine(options['hasta'], dtime.min) + timedelta(days=1))
+            inicio = fin - timedelta(days=options['dias'])
+            # Cada bloque cubre un tramo consecutivo del periodo: los IDs de
+            # un bloque crecen con la fecha, como en producción
+            bloques = -(-options['movimientos'] // lote)
+            tramo = (fin - inicio) / bloques
+            tareas = [
+                (semilla, bloque, min(lote, options['movimientos'] - bloque * lote),
+                 inicio + tramo * bloque, inicio + tramo * (bloque + 1))
+                for bloque in range(bloques)
+            ]
+            self._ejecutar('movimientos', _bloque_movimientos, tareas, options['procesos'],
+                           (ids, pesos), options['movimientos'])
+
+        if not options['sin_resumenes']:
+            inicio = time.perf_counter()
+            resumidos = ResumenMovimientosService().ponerse_al_dia()
+            ValoracionService().verificar(corregir=True)
+            self.stdout.write(
+                f'Resúmenes ({resumidos} movimientos) y valoración al día '
+                f'en {time.perf_counter() - inicio:.1f} s'
+            )
+
+    def _ejecutar(self, nombre, funcion, tareas, procesos, estado, total):
+        """Ejecuta los bloques (en paralelo si procesos > 1) reportando el avance"""
+        inicio = time.perf_counter()
+        if procesos > 1:
+            # Los hijos no deben heredar las conexiones abiertas del padre
+            connections.close_all()
+            contexto = multiprocessing.get_context('fork')
+            # Al salir del with (también por error) se terminan los procesos
+            inicializar = _inicializar_worker if estado else None
+            with contexto.Pool(procesos, initializer=inicializar, initargs=estado) as pool:
+                insertadas = self._reportar(nombre, pool.imap_unordered(funcion, tareas), total, inicio)
+        else:
+            if estado:
+                _inicializar_worker(*estado)
+            insertadas = self._reportar(nombre, map(funcion, tareas), total, inicio)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{insertadas} {nombre} en {time.perf_counter() - inicio:.1f} s'
+        ))
+
+    def _reportar(self, nombre, resultados, total, inicio) -> int:
+        insertadas = 0
+        ultimo_reporte = 0.0
+        for filas in resultados:
+            insertadas += filas
+            transcurrido = time.perf_counter() - inicio
+            if transcurrido - ultimo_reporte >= 1 or insertadas == total:
+                ultimo_reporte = transcurrido
+                ritmo = insertadas / transcurrido if transcurrido else 0
+                restante = (total - insertadas) / ritmo if ritmo else 0
+                self.stdout.write(
+                    f'{nombre}: {insertadas}/{total} ({insertadas / total:.0%}) '
+                    f'- {ritmo:,.0f} filas/s - faltan {restante:.0f} s'
+                )
+        return insertadas
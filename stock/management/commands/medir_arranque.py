@@ -0,0 +1,114 @@
+"""
+Mide el arranque en frío de un worker: importa la app WSGI en un proceso
+nuevo con `python -X importtime` y reporta el tiempo total y el desglose
+de imports por paquete y por módulo.
+
+Uso:
+    python manage.py medir_arranque [--repeticiones 5] [--top 15] [--precalentar] [--json]
+"""
+
+import json
+import os
+import re
+import statistics
+import subprocess  # nosec B404 - ejecuta el propio intérprete
+import sys
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+# "import time:       self [us] |  cumulative | imported package"
+_LINEA = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+_SCRIPT = """
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+if {precalentar}:
+    from backend.arranque import precalentar
+    precalentar()
+"""
+
+
+def _desglose(salida: str):
+    """Convierte la salida de -X importtime en [(modulo, propio_us, acumulado_us, nivel)]"""
+    modulos = []
+    for linea in salida.splitlines():
+        coincidencia = _LINEA.match(linea)
+        if coincidencia:
+            propio, acumulado, sangria, modulo = coincidencia.groups()
+            modulos.append((modulo, int(propio), int(acumulado), len(sangria) // 2))
+    return modulos
+
+
+class Command(BaseCommand):
+    help = 'Mide el tiempo de arranque (import de la app) y su desglose por import'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=3,
+                            help='Arranques a medir (se reporta la mediana)')
+        parser.add_argument('--top', type=int, default=15,
+                            help='Cantidad de paquetes/módulos a listar')
+        parser.add_argument('--precalentar', action='store_true',
+                            help='Incluir backend.arranque.precalentar() en la medición')
+        parser.add_argument('--json', action='store_true',
+                            help='Salida en JSON (para comparar entre versiones)')
+
+    def _arrancar(self, precalentar: bool):
+        entorno = dict(os.environ)
+        entorno.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+        inicio = time.perf_counter()
+        proceso = subprocess.run(  # nosec B603 - argumentos fijos
+            [sys.executable, '-X', 'importtime', '-c', _SCRIPT.format(precalentar=precalentar)],
+            capture_output=True, text=True, env=entorno,
+        )
+        total = time.perf_counter() - inicio
+        if proceso.returncode != 0:
+            raise CommandError(f"El arranque falló:\n{proceso.stderr[-2000:]}")
+        return total, _desglose(proceso.stderr)
+
+    def handle(self, *args, **options):
+        totales = []
+        modulos = []
+        for _ in range(max(1, options['repeticiones'])):
+            total, modulos = self._arrancar(options['precalentar'])
+            totales.append(total)
+
+        # Desglose de la última ejecución (la caché de bytecode ya está caliente)
+        por_paquete = defaultdict(int)
+        for modulo, propio, _acumulado, _nivel in modulos:
+            por_paquete[modulo.split('.')[0]] += propio
+        imports_us = sum(propio for _, propio, _, _ in modulos)
+
+        reporte = {
+            'arranque_ms_mediana': round(statistics.median(totales) * 1000, 1),
+            'arranque_ms': [round(t * 1000, 1) for t in totales],
+            'imports_ms': round(imports_us / 1000, 1),
+            'modulos_importados': len(modulos),
+            'paquetes': [
+                {'paquete': paquete, 'ms': round(us / 1000, 1)}
+                for paquete, us in sorted(por_paquete.items(), key=lambda x: -x[1])[:options['top']]
+            ],
+            'modulos': [
+                {'modulo': modulo, 'propio_ms': round(propio / 1000, 1), 'acumulado_ms': round(acumulado / 1000, 1)}
+                for modulo, propio, acumulado, _ in sorted(modulos, key=lambda x: -x[1])[:options['top']]
+            ],
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(reporte, indent=2))
+            return
+
+        self.stdout.write(
+            f"Arranque (mediana de {len(totales)}): {reporte['arranque_ms_mediana']} ms "
+            f"- imports {reporte['imports_ms']} ms en {reporte['modulos_importados']} módulos"
+        )
+        self.stdout.write('\nPor paquete (tiempo propio):')
+        for fila in reporte['paquetes']:
+            self.stdout.write(f"  {fila['ms']:>8.1f} ms  {fila['paquete']}")
+        self.stdout.write('\nMódulos más lentos (propio / acumulado):')
+        for fila in reporte['modulos']:
+            self.stdout.write(
+                f"  {fila['propio_ms']:>8.1f} / {fila['acumulado_ms']:>8.1f} ms  {fila['modulo']}"
+            )
@@ -0,0 +1,105 @@
+"""
+Ejecuta los trabajos en segundo plano encolados en la tabla Trabajo (ver
+stock.trabajos) con un pool de hilos o de procesos. Varios trabajadores
+pueden correr a la vez, en una o varias máquinas: cada trabajo lo toma
+uno solo. SIGTERM/SIGINT dejan de tomar trabajos y esperan los en curso.
+También encola las tareas periódicas (ver trabajos.PERIODICAS).
+
+Uso:
+    python manage.py trabajador [--concurrencia 2] [--modo hilos|procesos]
+                                [--intervalo 1] [--una-vez]
+"""
+
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from stock import trabajos
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta los trabajos en segundo plano (importaciones, exportaciones, reportes...)'
+
+    # Segundos entre renovaciones de latido y búsquedas de trabajos abandonados
+    MANTENIMIENTO = 15
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrencia', type=int, default=2,
+                            help='Trabajos ejecutados a la vez')
+        parser.add_argument('--modo', choices=['hilos', 'procesos'], default='hilos',
+                            help='Pool de hilos (E/S, BD) o de procesos (cálculo intensivo)')
+        parser.add_argument('--intervalo', type=float, default=1.0,
+                            help='Segundos de espera cuando la cola está vacía')
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Procesar lo disponible y terminar (cron, pruebas)')
+
+    def _detener(self, signum, frame):
+        self.stdout.write('Deteniendo: se esperan los trabajos en curso...')
+        self.detener = True
+
+    def _pool(self, modo: str, concurrencia: int):
+        if modo == 'hilos':
+            return ThreadPoolExecutor(concurrencia, thread_name_prefix='trabajo')
+        # 'spawn': los procesos no heredan las conexiones abiertas del padre
+        connections.close_all()
+        return ProcessPoolExecutor(
+            concurrencia, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup
+        )
+
+    def handle(self, *args, **options):
+        nombre = f'{socket.gethostname()}:{os.getpid()}'
+        concurrencia = max(1, options['concurrencia'])
+        self.detener = False
+        anteriores = {
+            senal: signal.signal(senal, self._detener) for senal in (signal.SIGTERM, signal.SIGINT)
+        }
+        en_curso = {}
+        completados = 0
+        ultimo_mantenimiento = 0.0
+        self.stdout.write(f"Trabajador {nombre}: {concurrencia} {options['modo']}")
+
+        try:
+            with self._pool(options['modo'], concurrencia) as pool:
+                while not self.detener:
+                    # Antes de tomar trabajos: los abandonados vuelven a la cola
+                    # antes de que este trabajador elija los siguientes
+                    if time.monotonic() - ultimo_mantenimiento > self.MANTENIMIENTO:
+                        trabajos.renovar_latidos(en_curso.values())
+                        trabajos.reencolar_abandonados()
+                        trabajos.programar_periodicas()
+                        ultimo_mantenimiento = time.monotonic()
+
+                    tomados = 0
+                    while len(en_curso) < concurrencia:
+                        trabajo = trabajos.tomar(nombre)
+                        if trabajo is None:
+                            break
+                        en_curso[pool.submit(trabajos.ejecutar_por_id, trabajo.pk)] = trabajo.pk
+                        tomados += 1
+
+                    if options['una_vez'] and not en_curso and not tomados:
+                        break
+                    if en_curso:
+                        terminados, _ = wait(en_curso, timeout=options['intervalo'], return_when=FIRST_COMPLETED)
+                        for futuro in terminados:
+                            trabajo_id = en_curso.pop(futuro)
+                            completados += 1
+                            if futuro.exception() is not None:
+                                self.stderr.write(f"Trabajo {trabajo_id}: {futuro.exception()}")
+                    elif not tomados:
+                        time.sleep(options['intervalo'])
+
+                wait(en_curso)
+                completados += len(en_curso)
+        finally:
+            for senal, anterior in anteriores.items():
+                signal.signal(senal, anterior)
+
+        self.stdout.write(self.style.SUCCESS(f'{completados} trabajos procesados'))
@@ -0,0 +1,36 @@
+"""
+Recalcula el valor del inventario (y sus unidades y productos) desde cero
+y lo compara con los totales mantenidos por deltas. Sale con error si hay deriva (útil en cron/alertas).
+
+Uso:
+    python manage.py verificar_valoracion [--corregir]
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from stock.services import ValoracionService
+
+
+class Command(BaseCommand):
+    help = 'Verifica (y opcionalmente corrige) el valor mantenido del inventario'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corregir', action='store_true',
+                            help='Reemplazar el valor mantenido por el recalculado si hay deriva')
+
+    def handle(self, *args, **options):
+        resultado = ValoracionService().verificar(corregir=options['corregir'])
+
+        self.stdout.write(f"Valor mantenido:   {resultado['valor_mantenido']}")
+        self.stdout.write(f"Valor recalculado: {resultado['valor_recalculado']}")
+        self.stdout.write(f"Deriva:            {resultado['deriva']}")
+        self.stdout.write(f"Deriva unidades:   {resultado['deriva_unidades']}")
+        self.stdout.write(f"Deriva productos:  {resultado['deriva_productos']}")
+
+        hay_deriva = resultado['deriva'] or resultado['deriva_unidades'] or resultado['deriva_productos']
+        if resultado['corregido']:
+            self.stdout.write(self.style.WARNING('Valor mantenido corregido'))
+        elif hay_deriva:
+            raise CommandError('Los totales mantenidos no coinciden con los recalculados')
+        else:
+            self.stdout.write(self.style.SUCCESS('Sin deriva'))
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.1 on 2026-10-19 13:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0002_stockitem_codigo_alter_movimiento_tipo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarcaDeAgua',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50, unique=True)),
+                ('ultimo_id', models.BigIntegerField(default=0)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ResumenMovimientoDia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('entrada', 'Entrada'), ('salida', 'Salida'), ('ajuste', 'Ajuste')], max_length=10)),
+                ('cantidad_total', models.BigIntegerField(default=0)),
+                ('num_movimientos', models.IntegerField(default=0)),
+                ('periodo', models.DateField()),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='stock.stockitem')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['periodo', 'producto'], name='resumen_dia_periodo_idx')],
+                'constraints': [models.UniqueConstraint(fields=('producto', 'tipo', 'periodo'), name='resumen_dia_unico')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenMovimientoHora',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('entrada', 'Entrada'), ('salida', 'Salida'), ('ajuste', 'Ajuste')], max_length=10)),
+                ('cantidad_total', models.BigIntegerField(default=0)),
+                ('num_movimientos', models.IntegerField(default=0)),
+                ('periodo', models.DateTimeField()),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='stock.stockitem')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['periodo', 'producto'], name='resumen_hora_periodo_idx')],
+                'constraints': [models.UniqueConstraint(fields=('producto', 'tipo', 'periodo'), name='resumen_hora_unico')],
+            },
+        ),
+    ]
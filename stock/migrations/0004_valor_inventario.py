@@ -0,0 +1,42 @@
+# Generated by Django 5.2.1 on 2026-10-19 13:34
+
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+
+
+FRAGMENTOS = 8
+
+
+def inicializar_valor(apps, schema_editor):
+    StockItem = apps.get_model('stock', 'StockItem')
+    ValorInventario = apps.get_model('stock', 'ValorInventario')
+    total = StockItem.objects.aggregate(
+        total=Sum(ExpressionWrapper(
+            F('precio') * F('cantidad'),
+            output_field=DecimalField(max_digits=20, decimal_places=2),
+        ))
+    )['total'] or 0
+    ValorInventario.objects.bulk_create([
+        ValorInventario(fragmento=i, valor_total=total if i == 0 else 0)
+        for i in range(FRAGMENTOS)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0003_resumenes_movimientos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ValorInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fragmento', models.PositiveSmallIntegerField(unique=True)),
+                ('valor_total', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(inicializar_valor, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-19 13:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0004_valor_inventario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockitem',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.1 on 2026-10-19 13:49
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def registrar_catalogo_inicial(apps, schema_editor):
+    # Los productos existentes entran al registro como altas para que una
+    # sincronización desde cero (desde=0) reciba el catálogo completo
+    StockItem = apps.get_model('stock', 'StockItem')
+    CambioProducto = apps.get_model('stock', 'CambioProducto')
+    CambioProducto.objects.bulk_create(
+        [
+            CambioProducto(
+                producto_id=item.pk,
+                operacion='crear',
+                datos={
+                    'id': item.pk,
+                    'codigo': item.codigo,
+                    'nombre': item.nombre,
+                    'descripcion': item.descripcion,
+                    'precio': str(Decimal(item.precio).quantize(Decimal('0.01'))),
+                    'cantidad': item.cantidad,
+                    'version': item.version,
+                },
+            )
+            for item in StockItem.objects.order_by('pk').iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0005_stockitem_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CambioProducto',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('producto_id', models.BigIntegerField()),
+                ('operacion', models.CharField(choices=[('crear', 'Crear'), ('actualizar', 'Actualizar'), ('eliminar', 'Eliminar')], max_length=10)),
+                ('datos', models.JSONField(null=True)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RunPython(registrar_catalogo_inicial, migrations.RunPython.noop),
+    ]
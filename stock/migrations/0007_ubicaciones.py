@@ -0,0 +1,46 @@
+# Generated by Django 5.2.1 on 2026-10-19 14:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0006_cambios_productos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Ubicacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.CharField(max_length=20, unique=True)),
+                ('nombre', models.CharField(max_length=100)),
+                ('activa', models.BooleanField(default=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='movimiento',
+            name='transferencia',
+            field=models.UUIDField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='movimiento',
+            name='ubicacion',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='movimientos', to='stock.ubicacion'),
+        ),
+        migrations.CreateModel(
+            name='StockUbicacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.IntegerField(default=0)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='existencias', to='stock.stockitem')),
+                ('ubicacion', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='existencias', to='stock.ubicacion')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ubicacion', 'producto'], name='stock_ubicacion_idx')],
+                'constraints': [models.UniqueConstraint(fields=('producto', 'ubicacion'), name='stock_ubicacion_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-19 14:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0007_ubicaciones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalisisProducto',
+            fields=[
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='analisis', serialize=False, to='stock.stockitem')),
+                ('clase', models.CharField(choices=[('A', 'A'), ('B', 'B'), ('C', 'C')], max_length=1)),
+                ('valor_movido', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('unidades_salida', models.BigIntegerField(default=0)),
+                ('rotacion', models.FloatField(null=True)),
+                ('ultimo_movimiento', models.DateTimeField(null=True)),
+                ('calculado', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['clase', 'valor_movido'], name='analisis_clase_valor_idx'), models.Index(fields=['valor_movido'], name='analisis_valor_idx'), models.Index(fields=['ultimo_movimiento'], name='analisis_ultimo_mov_idx')],
+            },
+        ),
+    ]
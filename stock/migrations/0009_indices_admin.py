@@ -0,0 +1,21 @@
+# Generated by Django 5.2.1 on 2026-10-19 14:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0008_analisis_producto'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['fecha', 'hora'], name='movimiento_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockitem',
+            index=models.Index(fields=['nombre'], name='stockitem_nombre_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.1 on 2026-10-19 14:26
+
+import django.core.serializers.json
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0009_indices_admin'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Trabajo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=50)),
+                ('parametros', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_curso', 'En curso'), ('completado', 'Completado'), ('fallido', 'Fallido'), ('cancelado', 'Cancelado')], default='pendiente', max_length=12)),
+                ('progreso', models.FloatField(default=0)),
+                ('mensaje', models.CharField(blank=True, max_length=200)),
+                ('resultado', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('max_intentos', models.PositiveSmallIntegerField(default=3)),
+                ('cancelar', models.BooleanField(default=False)),
+                ('disponible_desde', models.DateTimeField(default=django.utils.timezone.now)),
+                ('trabajador', models.CharField(blank=True, max_length=100)),
+                ('latido', models.DateTimeField(null=True)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('iniciado', models.DateTimeField(null=True)),
+                ('terminado', models.DateTimeField(null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estado', 'disponible_desde'], name='trabajo_cola_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.1 on 2026-10-19 14:31
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def inicializar_totales(apps, schema_editor):
+    StockItem = apps.get_model('stock', 'StockItem')
+    ValorInventario = apps.get_model('stock', 'ValorInventario')
+    totales = StockItem.objects.aggregate(unidades=Sum('cantidad'), productos=Count('id'))
+    # Los demás fragmentos quedan en 0: el total es la suma de todos
+    ValorInventario.objects.filter(fragmento=0).update(
+        unidades=totales['unidades'] or 0, productos=totales['productos'],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0010_trabajos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='valorinventario',
+            name='productos',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='valorinventario',
+            name='unidades',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='stockitem',
+            index=models.Index(fields=['cantidad'], name='stockitem_cantidad_idx'),
+        ),
+        migrations.RunPython(inicializar_totales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.1 on 2026-10-19 14:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0011_totales_inventario'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['producto', 'fecha', 'hora'], name='movimiento_prod_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['tipo', 'fecha', 'hora'], name='movimiento_tipo_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['producto', 'tipo', 'fecha', 'hora'], name='movimiento_prod_tipo_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.1 on 2026-10-19 16:02
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Sum
+
+
+def ubicar_sin_asignar(apps, schema_editor):
+    """Lo que el total de cada producto tiene sin ubicar pasa a la ubicación predeterminada"""
+    StockItem = apps.get_model('stock', 'StockItem')
+    StockUbicacion = apps.get_model('stock', 'StockUbicacion')
+    Ubicacion = apps.get_model('stock', 'Ubicacion')
+    sumas = dict(
+        StockUbicacion.objects.values('producto_id').annotate(suma=Sum('cantidad'))
+        .values_list('producto_id', 'suma')
+    )
+    if not sumas:
+        return
+    codigo = getattr(settings, 'STOCK_UBICACION_PREDETERMINADA', 'GENERAL')
+    ubicacion, _ = Ubicacion.objects.get_or_create(
+        codigo=codigo, defaults={'nombre': 'Sin ubicación asignada'}
+    )
+    for producto_id, cantidad in StockItem.objects.filter(pk__in=sumas).values_list('pk', 'cantidad'):
+        diferencia = cantidad - (sumas[producto_id] or 0)
+        if diferencia > 0:
+            existencia, _ = StockUbicacion.objects.get_or_create(
+                producto_id=producto_id, ubicacion=ubicacion, defaults={'cantidad': 0}
+            )
+            existencia.cantidad += diferencia
+            existencia.save(update_fields=['cantidad'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0012_indices_movimientos'),
+    ]
+
+    operations = [
+        migrations.RunPython(ubicar_sin_asignar, migrations.RunPython.noop),
+    ]
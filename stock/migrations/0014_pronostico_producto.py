@@ -0,0 +1,30 @@
+# Generated by Django 5.2.1 on 2026-10-19 15:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0013_ubicacion_predeterminada'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PronosticoProducto',
+            fields=[
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='pronostico', serialize=False, to='stock.stockitem')),
+                ('stock', models.IntegerField()),
+                ('demanda_diaria', models.FloatField()),
+                ('desviacion', models.FloatField()),
+                ('dias_cobertura', models.FloatField(null=True)),
+                ('punto_reorden', models.FloatField()),
+                ('cantidad_sugerida', models.BigIntegerField(default=0)),
+                ('calculado', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['dias_cobertura', 'producto'], name='pronostico_cobertura_idx'), models.Index(fields=['calculado'], name='pronostico_calculado_idx')],
+            },
+        ),
+    ]
@@ -1,5 +1,7 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
+from django.utils import timezone
 
 class AdminUserManager(BaseUserManager):
     def create_user(self, username, password=None):
@@ -41,10 +43,50 @@ class StockItem(models.Model):
     descripcion = models.TextField(blank=True)
     precio = models.DecimalField(max_digits=10, decimal_places=2)
     cantidad = models.IntegerField(default=0)
+    # Control de concurrencia optimista: se incrementa en cada escritura
+    version = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            # Búsqueda por prefijo de nombre (admin, autocompletado)
+            models.Index(fields=['nombre'], name='stockitem_nombre_idx'),
+            # Productos con bajo stock (tablero, alertas)
+            models.Index(fields=['cantidad'], name='stockitem_cantidad_idx'),
+        ]
 
     def __str__(self):
         return self.nombre
     
+# Ubicaciones (tiendas, bodegas)
+class Ubicacion(models.Model):
+    codigo = models.CharField(max_length=20, unique=True)
+    nombre = models.CharField(max_length=100)
+    activa = models.BooleanField(default=True)
+
+    def __str__(self):
+        return f"{self.codigo} - {self.nombre}"
+
+
+# Existencias de un producto en una ubicación. StockItem.cantidad es el total
+# y se mantiene al escribir (no se suma al leer). Los productos sin
+# existencias por ubicación solo tienen el total; desde la primera, las
+# operaciones sin ubicación van a la ubicación predeterminada.
+class StockUbicacion(models.Model):
+    producto = models.ForeignKey(StockItem, on_delete=models.CASCADE, related_name='existencias')
+    ubicacion = models.ForeignKey(Ubicacion, on_delete=models.PROTECT, related_name='existencias')
+    cantidad = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # También sirve de índice para las existencias de un producto
+            models.UniqueConstraint(fields=['producto', 'ubicacion'], name='stock_ubicacion_unico'),
+        ]
+        indexes = [models.Index(fields=['ubicacion', 'producto'], name='stock_ubicacion_idx')]
+
+    def __str__(self):
+        return f"{self.producto_id} @ {self.ubicacion_id}: {self.cantidad}"
+
+
 # Modelo Movimientos de Stock
 class Movimiento(models.Model):
     Tipo_Choices = (
@@ -57,6 +99,199 @@ class Movimiento(models.Model):
     cantidad = models.IntegerField()
     fecha = models.DateTimeField(auto_now_add=True)
     hora = models.TimeField(auto_now_add=True)
+    # Ubicación afectada (None: movimiento sobre el total, sin ubicación)
+    ubicacion = models.ForeignKey(
+        Ubicacion, on_delete=models.PROTECT, related_name='movimientos', null=True, blank=True
+    )
+    # Las dos filas (salida en origen, entrada en destino) de una transferencia
+    transferencia = models.UUIDField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        # Listados por fecha (más recientes primero) y filtros por rango; uno
+        # por combinación de filtros de /api/movimientos/ (producto, tipo)
+        indexes = [
+            models.Index(fields=['fecha', 'hora'], name='movimiento_fecha_idx'),
+            models.Index(fields=['producto', 'fecha', 'hora'], name='movimiento_prod_fecha_idx'),
+            models.Index(fields=['tipo', 'fecha', 'hora'], name='movimiento_tipo_fecha_idx'),
+            models.Index(
+                fields=['producto', 'tipo', 'fecha', 'hora'], name='movimiento_prod_tipo_fecha_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.tipo.capitalize()} - {self.producto.nombre} ({self.cantidad})"
+
+
+# Resúmenes (rollups) de movimientos para reportes
+class ResumenMovimiento(models.Model):
+    producto = models.ForeignKey(StockItem, on_delete=models.CASCADE, related_name='+')
+    tipo = models.CharField(max_length=10, choices=Movimiento.Tipo_Choices)
+    cantidad_total = models.BigIntegerField(default=0)
+    num_movimientos = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class ResumenMovimientoHora(ResumenMovimiento):
+    periodo = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['producto', 'tipo', 'periodo'], name='resumen_hora_unico'
+            ),
+        ]
+        indexes = [models.Index(fields=['periodo', 'producto'], name='resumen_hora_periodo_idx')]
+
+
+class ResumenMovimientoDia(ResumenMovimiento):
+    periodo = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['producto', 'tipo', 'periodo'], name='resumen_dia_unico'
+            ),
+        ]
+        indexes = [models.Index(fields=['periodo', 'producto'], name='resumen_dia_periodo_idx')]
+
+
+# Marca de agua (último Movimiento.id ya resumido) de los procesos incrementales
+class MarcaDeAgua(models.Model):
+    nombre = models.CharField(max_length=50, unique=True)
+    ultimo_id = models.BigIntegerField(default=0)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.nombre}: {self.ultimo_id}"
+
+
+# Valor del inventario (sum(precio * cantidad)) mantenido por deltas.
+# Se reparte en varios fragmentos para que las escrituras concurrentes no
+# compitan por una única fila; el total es la suma de los fragmentos.
+class ValorInventario(models.Model):
+    fragmento = models.PositiveSmallIntegerField(unique=True)
+    valor_total = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    # Suma de StockItem.cantidad y cantidad de productos, mantenidas con los mismos deltas
+    unidades = models.BigIntegerField(default=0)
+    productos = models.BigIntegerField(default=0)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Fragmento {self.fragmento}: {self.valor_total}"
+
+
+# Registro de cambios del catálogo para sincronización incremental.
+# seq es monotónico: un cliente guarda el último seq visto y pide lo posterior.
+# Los movimientos no se registran aquí: son de solo inserción y su propio ID
+# ya es un cursor monotónico.
+class CambioProducto(models.Model):
+    Operacion_Choices = (
+        ('crear', 'Crear'),
+        ('actualizar', 'Actualizar'),
+        ('eliminar', 'Eliminar'),
+    )
+    seq = models.BigAutoField(primary_key=True)
+    # Sin ForeignKey: el registro (lápida) sobrevive a la baja del producto
+    producto_id = models.BigIntegerField()
+    operacion = models.CharField(max_length=10, choices=Operacion_Choices)
+    # Estado del producto tras el cambio (None en las bajas)
+    datos = models.JSONField(null=True)
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"#{self.seq} {self.operacion} producto {self.producto_id}"
+
+
+# Análisis ABC y rotación por producto, materializado por AnalisisService
+# (una fila por producto, reemplazada en cada cálculo).
+class AnalisisProducto(models.Model):
+    Clase_Choices = (
+        ('A', 'A'),
+        ('B', 'B'),
+        ('C', 'C'),
+    )
+    producto = models.OneToOneField(
+        StockItem, on_delete=models.CASCADE, primary_key=True, related_name='analisis'
+    )
+    clase = models.CharField(max_length=1, choices=Clase_Choices)
+    # Valor de las salidas de la ventana (unidades * precio actual)
+    valor_movido = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    unidades_salida = models.BigIntegerField(default=0)
+    # Rotación anualizada: salidas por año / stock actual (None sin stock)
+    rotacion = models.FloatField(null=True)
+    ultimo_movimiento = models.DateTimeField(null=True)
+    calculado = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['clase', 'valor_movido'], name='analisis_clase_valor_idx'),
+            models.Index(fields=['valor_movido'], name='analisis_valor_idx'),
+            models.Index(fields=['ultimo_movimiento'], name='analisis_ultimo_mov_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id}: {self.clase}"
+
+
+# Pronóstico de demanda por producto, materializado por PronosticoService
+# (una fila por producto, reemplazada en cada cálculo).
+class PronosticoProducto(models.Model):
+    producto = models.OneToOneField(
+        StockItem, on_delete=models.CASCADE, primary_key=True, related_name='pronostico'
+    )
+    stock = models.IntegerField()
+    demanda_diaria = models.FloatField()
+    desviacion = models.FloatField()
+    # Días hasta agotarse al ritmo actual (None sin demanda)
+    dias_cobertura = models.FloatField(null=True)
+    punto_reorden = models.FloatField()
+    cantidad_sugerida = models.BigIntegerField(default=0)
+    calculado = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['dias_cobertura', 'producto'], name='pronostico_cobertura_idx'),
+            models.Index(fields=['calculado'], name='pronostico_calculado_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id}: {self.cantidad_sugerida}"
+
+
+# Trabajos en segundo plano (ver stock.trabajos): los encola la API y los
+# ejecuta 'manage.py trabajador'.
+class Trabajo(models.Model):
+    Estado_Choices = (
+        ('pendiente', 'Pendiente'),
+        ('en_curso', 'En curso'),
+        ('completado', 'Completado'),
+        ('fallido', 'Fallido'),
+        ('cancelado', 'Cancelado'),
+    )
+    tipo = models.CharField(max_length=50)
+    parametros = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    estado = models.CharField(max_length=12, choices=Estado_Choices, default='pendiente')
+    # Fracción completada (0 a 1) y último mensaje informado por la tarea
+    progreso = models.FloatField(default=0)
+    mensaje = models.CharField(max_length=200, blank=True)
+    resultado = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    max_intentos = models.PositiveSmallIntegerField(default=3)
+    # Cancelación pedida mientras está en curso (la tarea la atiende al avanzar)
+    cancelar = models.BooleanField(default=False)
+    # No se toma antes de esta fecha (espera entre reintentos)
+    disponible_desde = models.DateTimeField(default=timezone.now)
+    trabajador = models.CharField(max_length=100, blank=True)
+    latido = models.DateTimeField(null=True)
+    creado = models.DateTimeField(auto_now_add=True)
+    iniciado = models.DateTimeField(null=True)
+    terminado = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['estado', 'disponible_desde'], name='trabajo_cola_idx')]
+
+    def __str__(self):
+        return f"#{self.pk} {self.tipo} ({self.estado})"
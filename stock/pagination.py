@@ -0,0 +1,229 @@
+"""
+Paginación sin COUNT(*)
+Para listados grandes el conteo exacto cuesta más que la propia página.
+Esta paginación obtiene page_size + 1 filas para saber si hay siguiente
+página y solo cuenta cuando el cliente lo pide:
+
+    ?conteo=exacto    -> SELECT COUNT(*) (opt-in)
+    ?conteo=estimado  -> estadísticas de la tabla o conteo cacheado
+
+El admin, que siempre necesita un total para paginar, usa
+PaginadorConteoEstimado.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+logger = logging.getLogger(__name__)
+
+
+CONTEO_EXACTO = 'exacto'
+CONTEO_ESTIMADO = 'estimado'
+
+
+def _segundos_cache_conteo() -> int:
+    return getattr(settings, 'STOCK_CONTEO_CACHE_TTL', 60)
+
+
+def _clave_conteo(queryset) -> str:
+    sql = f'{queryset.db}:{queryset.query}'
+    digest = hashlib.md5(sql.encode('utf-8'), usedforsecurity=False).hexdigest()
+    return f'stock:conteo:{digest}'
+
+
+def contar_por_estadisticas(queryset):
+    """
+    Estima el total de filas desde las estadísticas del motor.
+    Solo aplica a querysets sin filtros (la estadística es de toda la tabla).
+
+    Returns:
+        Entero estimado o None si el motor/queryset no lo permite
+    """
+    if queryset.query.where:
+        return None
+
+    connection = connections[queryset.db]
+    tabla = queryset.model._meta.db_table
+
+    if connection.vendor == 'mysql':
+        sql = (
+            "SELECT TABLE_ROWS FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s"
+        )
+    elif connection.vendor == 'postgresql':
+        sql = "SELECT reltuples::bigint FROM pg_class WHERE relname = %s"
+    else:
+        return None
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [tabla])
+        fila = cursor.fetchone()
+    if not fila or fila[0] is None or fila[0] < 0:
+        return None
+    return int(fila[0])
+
+
+def _refrescar_conteo(queryset, clave: str) -> int:
+    total = queryset.count()
+    # El valor vive más que el TTL "blando" para poder servirlo mientras se refresca
+    cache.set(clave, (total, time.monotonic()), _segundos_cache_conteo() * 10)
+    return total
+
+
+def _refrescar_en_segundo_plano(queryset, clave: str) -> None:
+    # Evita que varios requests lancen el mismo refresco a la vez
+    if not cache.add(f'{clave}:refrescando', True, _segundos_cache_conteo()):
+        return
+
+    def tarea():
+        try:
+            _refrescar_conteo(queryset, clave)
+        except Exception:
+            logger.exception("No se pudo refrescar el conteo cacheado")
+        finally:
+            cache.delete(f'{clave}:refrescando')
+            connections.close_all()
+
+    threading.Thread(target=tarea, daemon=True).start()
+
+
+def contar_en_cache(queryset) -> int:
+    """
+    Devuelve un conteo exacto cacheado. Si está vencido se sirve el valor
+    anterior y se recalcula en segundo plano; solo el primer request paga
+    el COUNT(*).
+    """
+    clave = _clave_conteo(queryset)
+    cacheado = cache.get(clave)
+    if cacheado is None:
+        return _refrescar_conteo(queryset, clave)
+
+    total, calculado_en = cacheado
+    if time.monotonic() - calculado_en > _segundos_cache_conteo():
+        _refrescar_en_segundo_plano(queryset, clave)
+    return total
+
+
+def contar_estimado(queryset) -> int:
+    """Estadísticas de la tabla si están disponibles; si no, conteo cacheado"""
+    estimado = contar_por_estadisticas(queryset)
+    if estimado is not None:
+        return estimado
+    return contar_en_cache(queryset)
+
+
+class PaginacionSinConteo(BasePagination):
+    """
+    Paginación por número de página que no ejecuta COUNT(*) por defecto.
+    Mantiene la forma de respuesta de PageNumberPagination
+    (count/next/previous/results); count es null salvo que se pida.
+    """
+    page_size = None
+    page_query_param = 'page'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    conteo_query_param = 'conteo'
+
+    def get_page_size(self, request):
+        page_size = self.page_size or settings.REST_FRAMEWORK.get('PAGE_SIZE', 20)
+        try:
+            solicitado = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return page_size
+        if solicitado <= 0:
+            return page_size
+        return min(solicitado, self.max_page_size)
+
+    def _numero_pagina(self, request) -> int:
+        valor = request.query_params.get(self.page_query_param, 1)
+        try:
+            numero = int(valor)
+        except (TypeError, ValueError):
+            raise NotFound('Página inválida.')
+        if numero < 1:
+            raise NotFound('Página inválida.')
+        return numero
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.tamano = self.get_page_size(request)
+        self.numero = self._numero_pagina(request)
+
+        inicio = (self.numero - 1) * self.tamano
+        filas = list(queryset[inicio:inicio + self.tamano + 1])
+
+        if not filas and self.numero > 1:
+            raise NotFound('Página inválida.')
+
+        self.hay_siguiente = len(filas) > self.tamano
+        self.conteo = self._contar(queryset, request)
+        return filas[:self.tamano]
+
+    def _contar(self, queryset, request):
+        modo = request.query_params.get(self.conteo_query_param)
+        if modo in (CONTEO_EXACTO, CONTEO_ESTIMADO) and not hasattr(queryset, 'query'):
+            # Listas y vistas en memoria (sin QuerySet): el conteo no cuesta
+            return len(queryset)
+        if modo == CONTEO_EXACTO:
+            return queryset.count()
+        if modo == CONTEO_ESTIMADO:
+            return contar_estimado(queryset)
+        return None
+
+    def get_next_link(self):
+        if not self.hay_siguiente:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.page_query_param, self.numero + 1)
+
+    def get_previous_link(self):
+        if self.numero <= 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.numero == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.numero - 1)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.conteo,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'count': {'type': 'integer', 'nullable': True},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class PaginadorConteoEstimado(Paginator):
+    """
+    Paginator de Django (para el admin) cuyo total es estimado: estadísticas
+    de la tabla sin filtros, conteo cacheado con filtros. Las últimas
+    páginas pueden quedar vacías o faltar si el total está desactualizado.
+    """
+
+    @cached_property
+    def count(self):
+        return contar_estimado(self.object_list)
@@ -0,0 +1,70 @@
+"""
+Parsers - Formatos de entrada compactos
+Contraparte de los renderers: acepta cuerpos en MessagePack y JSON columnar
+según la cabecera Content-Type
+"""
+
+import msgpack
+from rest_framework import parsers
+from rest_framework.exceptions import ParseError
+
+from .renderers import ColumnarJSONRenderer
+
+
+def columnas_a_filas(columnas: dict) -> list:
+    """
+    Convierte un diccionario {campo: [valores]} en una lista de objetos.
+
+    Args:
+        columnas: Diccionario con un arreglo por campo
+
+    Returns:
+        Lista de diccionarios, uno por fila
+
+    Raises:
+        ParseError: Si las columnas no son arreglos de la misma longitud
+    """
+    if not isinstance(columnas, dict):
+        raise ParseError('El cuerpo columnar debe ser un objeto {campo: [valores]}')
+
+    longitudes = set()
+    for campo, valores in columnas.items():
+        if not isinstance(valores, list):
+            raise ParseError(f"La columna '{campo}' debe ser un arreglo")
+        longitudes.add(len(valores))
+
+    if len(longitudes) > 1:
+        raise ParseError('Todas las columnas deben tener la misma longitud')
+
+    total = longitudes.pop() if longitudes else 0
+    return [
+        {campo: valores[i] for campo, valores in columnas.items()}
+        for i in range(total)
+    ]
+
+
+class MessagePackParser(parsers.BaseParser):
+    """Parsea cuerpos application/msgpack"""
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except ValueError as exc:
+            raise ParseError(f'MessagePack inválido: {exc}')
+
+
+class ColumnarJSONParser(parsers.JSONParser):
+    """
+    Parsea cuerpos en JSON columnar. Una sola fila se entrega como objeto
+    (creación/actualización normal); varias filas como lista (operaciones
+    por lote).
+    """
+    media_type = ColumnarJSONRenderer.media_type
+    renderer_class = ColumnarJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        filas = columnas_a_filas(super().parse(stream, media_type, parser_context))
+        if len(filas) == 1:
+            return filas[0]
+        return filas
@@ -0,0 +1,217 @@
+"""
+Reintentos de transacciones ante errores transitorios de bloqueo
+Bajo concurrencia, los SELECT ... FOR UPDATE de las escrituras de stock
+pueden terminar en deadlock o en lock wait timeout. Son errores
+transitorios: la transacción completa puede repetirse. Aquí se define:
+
+- qué errores de la BD son reintentables (deadlock, lock wait timeout,
+  fallo de serialización, SQLite ocupada) y cuáles indican que un bloqueo
+  NOWAIT no estaba libre (fallo rápido, no se reintenta)
+- la política: se repite el bloque atómico completo con espera exponencial
+  con jitter, hasta STOCK_REINTENTOS_MAX veces y siempre que quede
+  presupuesto. El presupuesto se recarga con cada llamada
+  (STOCK_REINTENTOS_PRESUPUESTO reintentos por llamada) y evita que, con la
+  BD saturada, los reintentos multipliquen la carga.
+- métricas del proceso (ver estadisticas_reintentos)
+
+Solo se reintenta un bloque que abre la transacción: dentro de una
+transacción ya abierta un deadlock la invalida entera, así que el error
+sube hasta quien la abrió.
+"""
+
+import logging
+import random
+import threading
+import time
+from typing import Any, Callable, Dict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, transaction
+
+from backend.trazas import span
+
+logger = logging.getLogger(__name__)
+
+
+# MySQL: ER_LOCK_WAIT_TIMEOUT, ER_LOCK_DEADLOCK / ER_LOCK_NOWAIT
+CODIGOS_MYSQL_REINTENTABLES = {1205, 1213}
+CODIGOS_MYSQL_BLOQUEO_OCUPADO = {3572}
+# PostgreSQL (SQLSTATE): serialization_failure, deadlock_detected / lock_not_available
+CODIGOS_PG_REINTENTABLES = {'40001', '40P01'}
+CODIGOS_PG_BLOQUEO_OCUPADO = {'55P03'}
+
+
+class RecursoBloqueadoError(Exception):
+    """Un bloqueo pedido sin espera (NOWAIT) estaba tomado por otra transacción"""
+    pass
+
+
+class ContencionDeBloqueosError(Exception):
+    """Se agotaron los reintentos (o el presupuesto) ante errores de bloqueo"""
+    pass
+
+
+def _codigo(exc: BaseException):
+    """Código del motor: número de error de MySQL o SQLSTATE de PostgreSQL"""
+    causa = exc.__cause__ or exc
+    pgcode = getattr(causa, 'pgcode', None) or getattr(getattr(causa, 'diag', None), 'sqlstate', None)
+    if pgcode:
+        return pgcode
+    if exc.args and isinstance(exc.args[0], int):
+        return exc.args[0]
+    return None
+
+
+def es_bloqueo_ocupado(exc: BaseException) -> bool:
+    """True si el error es un NOWAIT que encontró la fila bloqueada"""
+    if not isinstance(exc, DatabaseError):
+        return False
+    codigo = _codigo(exc)
+    return codigo in CODIGOS_MYSQL_BLOQUEO_OCUPADO or codigo in CODIGOS_PG_BLOQUEO_OCUPADO
+
+
+def es_reintentable(exc: BaseException) -> bool:
+    """True si el error de la BD es transitorio y la transacción puede repetirse"""
+    if not isinstance(exc, DatabaseError):
+        return False
+    codigo = _codigo(exc)
+    if codigo in CODIGOS_MYSQL_REINTENTABLES or codigo in CODIGOS_PG_REINTENTABLES:
+        return True
+    # SQLite (desarrollo): otra conexión tiene la base de datos bloqueada
+    return 'database is locked' in str(exc) or 'database table is locked' in str(exc)
+
+
+class PresupuestoReintentos:
+    """
+    Presupuesto de reintentos del proceso: cada llamada deposita una
+    fracción de reintento (proporcion) y cada reintento consume uno, con un
+    máximo acumulable. Así los reintentos quedan acotados a una fracción del
+    tráfico, sin importar cuántas llamadas fallen a la vez.
+    """
+
+    def __init__(self, proporcion: float, maximo: float):
+        self.proporcion = proporcion
+        self.maximo = maximo
+        self._saldo = maximo
+        self._lock = threading.Lock()
+
+    def depositar(self) -> None:
+        with self._lock:
+            self._saldo = min(self.maximo, self._saldo + self.proporcion)
+
+    def retirar(self) -> bool:
+        with self._lock:
+            if self._saldo < 1:
+                return False
+            self._saldo -= 1
+            return True
+
+    @property
+    def saldo(self) -> float:
+        return self._saldo
+
+
+_presupuesto = None
+_presupuesto_lock = threading.Lock()
+_estadisticas_lock = threading.Lock()
+_estadisticas = {
+    'llamadas': 0,
+    'reintentos': 0,
+    'recuperadas': 0,
+    'agotadas': 0,
+    'sin_presupuesto': 0,
+    'bloqueo_ocupado': 0,
+}
+_errores_por_codigo: Dict[str, int] = {}
+
+
+def _presupuesto_actual() -> PresupuestoReintentos:
+    global _presupuesto
+    with _presupuesto_lock:
+        proporcion = getattr(settings, 'STOCK_REINTENTOS_PRESUPUESTO', 0.2)
+        maximo = getattr(settings, 'STOCK_REINTENTOS_PRESUPUESTO_MAX', 20)
+        if _presupuesto is None or (_presupuesto.proporcion, _presupuesto.maximo) != (proporcion, maximo):
+            _presupuesto = PresupuestoReintentos(proporcion, maximo)
+        return _presupuesto
+
+
+def _contar(clave: str, exc: BaseException = None) -> None:
+    with _estadisticas_lock:
+        _estadisticas[clave] += 1
+        if exc is not None:
+            codigo = str(_codigo(exc) or type(exc).__name__)
+            _errores_por_codigo[codigo] = _errores_por_codigo.get(codigo, 0) + 1
+
+
+def estadisticas_reintentos() -> Dict[str, Any]:
+    """Totales del proceso: llamadas, reintentos, recuperadas, agotadas, errores por código"""
+    with _estadisticas_lock:
+        datos = dict(_estadisticas)
+        datos['errores_por_codigo'] = dict(_errores_por_codigo)
+    datos['presupuesto_disponible'] = round(_presupuesto_actual().saldo, 2)
+    return datos
+
+
+def espera_reintento(intento: int) -> float:
+    """Segundos antes del reintento N (1, 2, ...): exponencial con jitter completo"""
+    base = getattr(settings, 'STOCK_REINTENTOS_BASE_MS', 20) / 1000
+    tope = getattr(settings, 'STOCK_REINTENTOS_TOPE_MS', 500) / 1000
+    return random.uniform(0, min(tope, base * 2 ** (intento - 1)))  # nosec B311 - jitter, no criptografía
+
+
+def con_reintentos(bloque: Callable[[], Any], using: str = DEFAULT_DB_ALIAS) -> Any:
+    """
+    Ejecuta bloque (que abre y cierra su propia transacción) y lo repite
+    ante errores reintentables de la BD.
+
+    Args:
+        bloque: Función sin argumentos que ejecuta la transacción completa
+        using: Alias de la BD de la transacción
+
+    Returns:
+        Lo que devuelva bloque
+
+    Raises:
+        RecursoBloqueadoError: Si un bloqueo NOWAIT estaba tomado
+        ContencionDeBloqueosError: Si se agotaron los reintentos o el presupuesto
+    """
+    # Dentro de una transacción ajena no se puede repetir solo este tramo
+    reintentar = not transaction.get_connection(using).in_atomic_block
+    presupuesto = _presupuesto_actual()
+    presupuesto.depositar()
+    _contar('llamadas')
+    maximo = getattr(settings, 'STOCK_REINTENTOS_MAX', 3)
+    intento = 0
+    while True:
+        try:
+            resultado = bloque()
+        except DatabaseError as exc:
+            if es_bloqueo_ocupado(exc):
+                _contar('bloqueo_ocupado', exc)
+                raise RecursoBloqueadoError(
+                    "El recurso está bloqueado por otra operación; intente nuevamente"
+                ) from exc
+            if not es_reintentable(exc) or not reintentar:
+                raise
+            if intento >= maximo:
+                _contar('agotadas', exc)
+                logger.warning(f"Reintentos agotados ({intento}) ante error de bloqueo: {exc}")
+                raise ContencionDeBloqueosError(
+                    "Demasiada contención sobre los datos; intente nuevamente"
+                ) from exc
+            if not presupuesto.retirar():
+                _contar('sin_presupuesto', exc)
+                logger.warning(f"Sin presupuesto de reintentos ante error de bloqueo: {exc}")
+                raise ContencionDeBloqueosError(
+                    "Demasiada contención sobre los datos; intente nuevamente"
+                ) from exc
+            intento += 1
+            _contar('reintentos', exc)
+            espera = espera_reintento(intento)
+            logger.info(f"Error de bloqueo reintentable ({exc}); reintento {intento} en {espera * 1000:.0f} ms")
+            with span('reintento', 'reintentos', intento=intento, codigo=str(_codigo(exc))):
+                time.sleep(espera)
+            continue
+        if intento:
+            _contar('recuperadas')
+        return resultado
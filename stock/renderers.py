@@ -0,0 +1,77 @@
+"""
+Renderers - Formatos de respuesta compactos
+Permite negociar, vía cabecera Accept, formatos más ligeros que el JSON
+por filas para clientes con enlaces lentos (MessagePack y JSON columnar)
+"""
+
+import msgpack
+from rest_framework import renderers
+from rest_framework.utils.encoders import JSONEncoder
+
+
+_json_encoder = JSONEncoder()
+
+
+def _msgpack_default(obj):
+    """Convierte tipos no nativos (Decimal, fechas, UUID...) igual que el JSON"""
+    return _json_encoder.default(obj)
+
+
+def filas_a_columnas(filas: list) -> dict:
+    """
+    Convierte una lista de objetos en un diccionario con un arreglo por campo.
+
+    Args:
+        filas: Lista de diccionarios con los mismos campos
+
+    Returns:
+        Dict {campo: [valor_fila_0, valor_fila_1, ...]}
+    """
+    columnas = {}
+    for indice, fila in enumerate(filas):
+        for campo in fila:
+            if campo not in columnas:
+                # Campo que no aparecía en filas anteriores: rellenar con None
+                columnas[campo] = [None] * indice
+        for campo, valores in columnas.items():
+            valores.append(fila.get(campo))
+    return columnas
+
+
+def _son_filas(datos) -> bool:
+    """Lista de objetos (convertible a columnas)"""
+    return isinstance(datos, list) and all(isinstance(fila, dict) for fila in datos)
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    """
+    Renderiza la respuesta en MessagePack (application/msgpack).
+    Mismo contenido que el JSON, codificado en binario.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_msgpack_default, use_bin_type=True)
+
+
+class ColumnarJSONRenderer(renderers.JSONRenderer):
+    """
+    Renderiza listados en JSON columnar: un arreglo por campo en lugar
+    de un objeto por fila. Los objetos individuales, los errores y las
+    listas que no son de objetos (p. ej. mensajes) se devuelven sin cambios.
+    """
+    media_type = 'application/vnd.stock.columnar+json'
+    format = 'columnar'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if _son_filas(data):
+            data = filas_a_columnas(data)
+        elif isinstance(data, dict) and _son_filas(data.get('results')):
+            data = dict(data)
+            data['results'] = filas_a_columnas(data['results'])
+        return super().render(data, accepted_media_type, renderer_context)
@@ -1,10 +1,30 @@
+from django.utils import timezone
 from rest_framework import serializers
-from .models import StockItem, Administrador, Movimiento
+from .models import (
+    StockItem, Administrador, Movimiento, Ubicacion, StockUbicacion, AnalisisProducto, Trabajo,
+)
+from .unit_of_work import transaccional, unidad_de_trabajo_actual
 
 class StockSerializer(serializers.ModelSerializer):
     class Meta:
         model = StockItem
         fields = '__all__'
+        read_only_fields = ['version']
+
+    @transaccional
+    def update(self, instance, validated_data):
+        # Solo se escriben los campos que cambiaron; el UPDATE se difiere al
+        # final de la unidad de trabajo y solo se aplica si la versión leída
+        # sigue vigente (ver UnidadDeTrabajo.flush)
+        campos = [
+            campo for campo, valor in validated_data.items()
+            if getattr(instance, campo) != valor
+        ]
+        for campo in campos:
+            setattr(instance, campo, validated_data[campo])
+
+        unidad_de_trabajo_actual().registrar_cambio(instance, *campos)
+        return instance
 
 class AdministradorSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
@@ -26,7 +46,48 @@ class MovimientoSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Movimiento
-        fields = ['id', 'tipo', 'producto', 'producto_nombre', 'producto_descripcion', 'producto_precio', 'cantidad', 'fecha', 'hora']
+        fields = ['id', 'tipo', 'producto', 'producto_nombre', 'producto_descripcion', 'producto_precio', 'cantidad', 'fecha', 'hora', 'ubicacion', 'transferencia']
         read_only_fields = ['producto_nombre', 'producto_descripcion', 'producto_precio']
 
-        
\ No newline at end of file
+
+class UbicacionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Ubicacion
+        fields = '__all__'
+
+
+class StockUbicacionSerializer(serializers.ModelSerializer):
+    producto_nombre = serializers.ReadOnlyField(source='producto.nombre')
+    ubicacion_codigo = serializers.ReadOnlyField(source='ubicacion.codigo')
+
+    class Meta:
+        model = StockUbicacion
+        fields = ['producto', 'producto_nombre', 'ubicacion', 'ubicacion_codigo', 'cantidad']
+
+
+class AnalisisProductoSerializer(serializers.ModelSerializer):
+    producto_codigo = serializers.ReadOnlyField(source='producto.codigo')
+    producto_nombre = serializers.ReadOnlyField(source='producto.nombre')
+    dias_sin_movimiento = serializers.SerializerMethodField()
+
+    class Meta:
+        model = AnalisisProducto
+        fields = [
+            'producto', 'producto_codigo', 'producto_nombre', 'clase', 'valor_movido',
+            'unidades_salida', 'rotacion', 'ultimo_movimiento', 'dias_sin_movimiento', 'calculado',
+        ]
+
+    def get_dias_sin_movimiento(self, obj):
+        if obj.ultimo_movimiento is None:
+            return None
+        return (timezone.localdate() - timezone.localdate(obj.ultimo_movimiento)).days
+
+
+class TrabajoSerializer(serializers.ModelSerializer):
+    # Los parámetros pueden ser grandes (filas de una importación): no se devuelven
+    class Meta:
+        model = Trabajo
+        fields = [
+            'id', 'tipo', 'estado', 'progreso', 'mensaje', 'error', 'intentos', 'max_intentos',
+            'cancelar', 'disponible_desde', 'creado', 'iniciado', 'terminado',
+        ]
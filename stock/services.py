@@ -4,14 +4,41 @@ Implementa el patrón Service Layer para mantener la lógica de negocio
 separada de la capa de presentación (views)
 """
 
-from typing import Protocol, Optional, Dict, Any
+from typing import Protocol, Optional, Dict, Any, List, Tuple
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
 from decimal import Decimal
-from django.db import transaction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, models, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Max, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncDate, TruncHour
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 import logging
+import math
+import random
+import uuid
 
-from .models import StockItem, Movimiento, Administrador
-from .validators import StockValidator, MovimientoValidator
+from .models import (
+    StockItem,
+    Movimiento,
+    Administrador,
+    ResumenMovimientoHora,
+    ResumenMovimientoDia,
+    MarcaDeAgua,
+    ValorInventario,
+    CambioProducto,
+    Ubicacion,
+    StockUbicacion,
+    AnalisisProducto,
+    PronosticoProducto,
+    Trabajo,
+)
+from .authentication import invalidar_usuario
+from .validators import ValidatorFactory
+from backend.db_router import alias_lectura
+from backend.trazas import span, trazar_metodos
+from .unit_of_work import transaccional, unidad_de_trabajo_actual
 
 logger = logging.getLogger(__name__)
 
@@ -46,25 +73,42 @@ class ProductoNoEncontradoError(Exception):
     pass
 
 
+class ConflictoDeVersionError(Exception):
+    """Excepción lanzada cuando el producto cambió desde que el cliente lo leyó"""
+    pass
+
+
+class UbicacionNoEncontradaError(Exception):
+    """Excepción lanzada cuando no se encuentra una ubicación activa"""
+    pass
+
+
 # ==============================================================================
 # SERVICIOS
 # ==============================================================================
 
+@trazar_metodos()
 class StockService:
     """
     Servicio para manejar operaciones de stock.
     Implementa la lógica de negocio para operaciones de inventario.
+    Las escrituras se registran en la unidad de trabajo activa
+    (ver unit_of_work.transaccional).
     """
     
     def __init__(self):
-        self.validator = StockValidator()
+        # Validadores y servicios sin estado: instancias compartidas
+        self.validator = ValidatorFactory.compartido('stock')
+        self.movimiento_service = MovimientoService.compartido()
+        self.existencias_service = ExistenciasService()
     
-    @transaction.atomic
+    @transaccional(reintentar=True)
     def restar_stock(
         self, 
         item_id: int, 
         cantidad: int,
-        crear_movimiento: bool = True
+        crear_movimiento: bool = True,
+        sin_espera: bool = False
     ) -> Dict[str, Any]:
         """
         Resta stock de un producto y opcionalmente crea un movimiento.
@@ -73,24 +117,28 @@ class StockService:
             item_id: ID del producto
             cantidad: Cantidad a restar
             crear_movimiento: Si debe crear un registro de movimiento
+            sin_espera: Fallar de inmediato si el producto está bloqueado (NOWAIT)
             
         Returns:
             Dict con mensaje y nuevo stock
             
         Raises:
             ProductoNoEncontradoError: Si el producto no existe
-            StockInsuficienteError: Si no hay suficiente stock
+            StockInsuficienteError: Si no hay suficiente stock (o, con
+                existencias por ubicación, en la ubicación predeterminada)
             ValidationError: Si los datos son inválidos
+            RecursoBloqueadoError: Con sin_espera, si el producto está bloqueado
         """
+        # Validar cantidad antes de tomar el bloqueo
+        self.validator.validar_cantidad_positiva(cantidad)
+        
+        uow = unidad_de_trabajo_actual()
         try:
-            item = StockItem.objects.select_for_update().get(pk=item_id)
+            item = uow.obtener_producto(item_id, sin_espera=sin_espera)
         except StockItem.DoesNotExist:
             logger.error(f"Producto con ID {item_id} no encontrado")
             raise ProductoNoEncontradoError(f"Producto con ID {item_id} no existe")
         
-        # Validar cantidad
-        self.validator.validar_cantidad_positiva(cantidad)
-        
         # Validar stock suficiente
         if item.cantidad < cantidad:
             logger.warning(
@@ -101,9 +149,11 @@ class StockService:
                 f"Stock insuficiente. Disponible: {item.cantidad}, Solicitado: {cantidad}"
             )
         
-        # Restar stock
+        # Restar stock (y de la ubicación predeterminada, si tiene ubicaciones)
+        ubicacion = self.existencias_service.mover_sin_ubicacion(uow, item, -cantidad)
         item.cantidad -= cantidad
-        item.save()
+        uow.registrar_cambio(item, 'cantidad')
+        uow.registrar_delta_valor(-valor_item(item.precio, cantidad), unidades=-cantidad)
         
         logger.info(
             f"Stock reducido para {item.nombre}. "
@@ -112,10 +162,11 @@ class StockService:
         
         # Crear movimiento si se solicita
         if crear_movimiento:
-            MovimientoService().crear_movimiento(
+            self.movimiento_service.crear_movimiento(
                 producto=item,
                 tipo='salida',
-                cantidad=cantidad
+                cantidad=cantidad,
+                ubicacion=ubicacion
             )
         
         return {
@@ -125,12 +176,13 @@ class StockService:
             'nuevo_stock': item.cantidad
         }
     
-    @transaction.atomic
+    @transaccional(reintentar=True)
     def agregar_stock(
         self,
         item_id: int,
         cantidad: int,
-        crear_movimiento: bool = True
+        crear_movimiento: bool = True,
+        sin_espera: bool = False
     ) -> Dict[str, Any]:
         """
         Agrega stock a un producto y opcionalmente crea un movimiento.
@@ -139,6 +191,7 @@ class StockService:
             item_id: ID del producto
             cantidad: Cantidad a agregar
             crear_movimiento: Si debe crear un registro de movimiento
+            sin_espera: Fallar de inmediato si el producto está bloqueado (NOWAIT)
             
         Returns:
             Dict con mensaje y nuevo stock
@@ -146,19 +199,23 @@ class StockService:
         Raises:
             ProductoNoEncontradoError: Si el producto no existe
             ValidationError: Si los datos son inválidos
+            RecursoBloqueadoError: Con sin_espera, si el producto está bloqueado
         """
+        # Validar cantidad antes de tomar el bloqueo
+        self.validator.validar_cantidad_positiva(cantidad)
+        
+        uow = unidad_de_trabajo_actual()
         try:
-            item = StockItem.objects.select_for_update().get(pk=item_id)
+            item = uow.obtener_producto(item_id, sin_espera=sin_espera)
         except StockItem.DoesNotExist:
             logger.error(f"Producto con ID {item_id} no encontrado")
             raise ProductoNoEncontradoError(f"Producto con ID {item_id} no existe")
         
-        # Validar cantidad
-        self.validator.validar_cantidad_positiva(cantidad)
-        
-        # Agregar stock
+        # Agregar stock (y a la ubicación predeterminada, si tiene ubicaciones)
+        ubicacion = self.existencias_service.mover_sin_ubicacion(uow, item, cantidad)
         item.cantidad += cantidad
-        item.save()
+        uow.registrar_cambio(item, 'cantidad')
+        uow.registrar_delta_valor(valor_item(item.precio, cantidad), unidades=cantidad)
         
         logger.info(
             f"Stock agregado para {item.nombre}. "
@@ -167,10 +224,11 @@ class StockService:
         
         # Crear movimiento si se solicita
         if crear_movimiento:
-            MovimientoService().crear_movimiento(
+            self.movimiento_service.crear_movimiento(
                 producto=item,
                 tipo='entrada',
-                cantidad=cantidad
+                cantidad=cantidad,
+                ubicacion=ubicacion
             )
         
         return {
@@ -180,6 +238,181 @@ class StockService:
             'nuevo_stock': item.cantidad
         }
     
+    @transaccional(reintentar=True)
+    def importar_productos(self, filas: list) -> Dict[str, Any]:
+        """
+        Crea productos por lote. Las filas se validan en una sola pasada con
+        el pipeline 'producto'; las válidas se insertan con bulk_create y las
+        inválidas se reportan por índice.
+        
+        Args:
+            filas: Lista de dicts con codigo, nombre, precio, cantidad y descripcion
+            
+        Returns:
+            Dict con cantidad de productos creados y errores por fila
+        """
+        resultado = ValidatorFactory.pipeline('producto').validate_batch(filas)
+        errores = dict(resultado.errores)
+        
+        codigos = [fila['codigo'] for _, fila in resultado.validos]
+        existentes = set(
+            StockItem.objects.filter(codigo__in=codigos).values_list('codigo', flat=True)
+        )
+        vistos = set()
+        nuevos = []
+        for indice, fila in resultado.validos:
+            codigo = fila['codigo']
+            if codigo in existentes or codigo in vistos:
+                errores[indice] = {'codigo': [f"El código '{codigo}' ya existe"]}
+                continue
+            vistos.add(codigo)
+            nuevos.append(StockItem(
+                codigo=codigo,
+                nombre=fila['nombre'],
+                descripcion=fila.get('descripcion', ''),
+                precio=fila['precio'],
+                cantidad=fila.get('cantidad', 0),
+            ))
+        
+        StockItem.objects.bulk_create(nuevos)
+        
+        # MySQL no devuelve los IDs de bulk_create: se recuperan por código
+        ids = dict(
+            StockItem.objects.filter(codigo__in=vistos).values_list('codigo', 'id')
+        )
+        uow = unidad_de_trabajo_actual()
+        for item in nuevos:
+            item.pk = ids[item.codigo]
+            uow.notificar_producto(item, 'crear')
+            if item.cantidad:
+                uow.registrar_movimiento(item, 'entrada', item.cantidad)
+            uow.registrar_delta_valor(
+                valor_item(item.precio, item.cantidad), unidades=item.cantidad, productos=1
+            )
+        
+        logger.info(f"Importación: {len(nuevos)} productos creados, {len(errores)} filas con error")
+        return {
+            'creados': len(nuevos),
+            'errores': errores,
+        }
+    
+    @transaccional(reintentar=True)
+    def ajustar_lote(
+        self,
+        ajustes: list,
+        todo_o_nada: bool = False,
+        omitir_bloqueados: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Aplica entradas/salidas a varios productos en una transacción.
+        Los productos se bloquean en una sola consulta (en orden de ID para
+        evitar deadlocks) y los cambios se escriben con bulk_update/bulk_create.
+        En los productos con existencias por ubicación el ajuste se aplica
+        también a la ubicación predeterminada (y una salida debe caber en ella).
+        
+        Args:
+            ajustes: Lista de dicts con id, tipo ('entrada'/'salida') y cantidad
+            todo_o_nada: Si alguna fila falla, no se aplica ninguna
+            omitir_bloqueados: Saltear (SKIP LOCKED) los productos que otra
+                transacción tiene bloqueados; sus filas se reportan como error
+            
+        Returns:
+            Dict con cantidad de ajustes aplicados y errores por fila
+        """
+        resultado = ValidatorFactory.pipeline('ajuste').validate_batch(ajustes)
+        errores = dict(resultado.errores)
+        
+        ids = {fila['id'] for _, fila in resultado.validos}
+        with span('select_for_update StockItem', 'bloqueo', productos=len(ids)):
+            items = {
+                item.id: item
+                for item in StockItem.objects.select_for_update(skip_locked=omitir_bloqueados)
+                .filter(pk__in=ids).order_by('pk')
+            }
+        bloqueados = set()
+        if omitir_bloqueados and len(items) < len(ids):
+            # Los que faltan y existen estaban bloqueados (lectura sin bloqueo)
+            bloqueados = set(
+                StockItem.objects.filter(pk__in=ids - items.keys()).values_list('pk', flat=True)
+            )
+        
+        # Productos con existencias por ubicación: el ajuste va a la ubicación
+        # predeterminada (ver ExistenciasService), bloqueada en una consulta
+        con_ubicaciones = set(
+            StockUbicacion.objects.filter(producto_id__in=items).values_list('producto_id', flat=True)
+        )
+        predeterminada, existencias = None, {}
+        if con_ubicaciones:
+            existencias = ExistenciasService.existencias_predeterminadas(con_ubicaciones)
+            predeterminada = (
+                next(iter(existencias.values())).ubicacion if existencias
+                else ExistenciasService.ubicacion_predeterminada()
+            )
+        
+        aplicados = []
+        for indice, fila in resultado.validos:
+            item = items.get(fila['id'])
+            if item is None and fila['id'] in bloqueados:
+                errores[indice] = {'id': [f"Producto con ID {fila['id']} bloqueado por otra operación"]}
+                continue
+            if item is None:
+                errores[indice] = {'id': [f"Producto con ID {fila['id']} no existe"]}
+                continue
+            signo = 1 if fila['tipo'] == 'entrada' else -1
+            existencia = None
+            if item.id in con_ubicaciones:
+                existencia = existencias.get(item.id) or existencias.setdefault(
+                    item.id, StockUbicacion(producto=item, ubicacion=predeterminada, cantidad=0)
+                )
+            disponible = item.cantidad if existencia is None else existencia.cantidad
+            if signo < 0 and disponible < fila['cantidad']:
+                donde = '' if existencia is None else f" en {predeterminada.codigo}"
+                errores[indice] = {'cantidad': [
+                    f"Stock insuficiente{donde}. Disponible: {disponible}, Solicitado: {fila['cantidad']}"
+                ]}
+                continue
+            item.cantidad += signo * fila['cantidad']
+            if existencia is not None:
+                existencia.cantidad += signo * fila['cantidad']
+            aplicados.append((item, fila))
+        
+        # Dentro de una unidad ajena (otro servicio o el request), un punto de
+        # guardado limita la reversión al lote; en la unidad propia no hace
+        # falta y se ahorran el SAVEPOINT y su RELEASE
+        uow = unidad_de_trabajo_actual()
+        with transaction.atomic(savepoint=uow.anidamiento > 0):
+            if errores and todo_o_nada:
+                transaction.set_rollback(True)
+                return {'aplicados': 0, 'errores': errores}
+            
+            modificados = {item.id: item for item, _ in aplicados}
+            for item in modificados.values():
+                item.version += 1
+            # Las filas están bloqueadas: la versión leída sigue vigente
+            StockItem.objects.bulk_update(modificados.values(), ['cantidad', 'version'])
+            ubicadas = [existencias[pk] for pk in modificados if pk in existencias]
+            StockUbicacion.objects.bulk_update(
+                [existencia for existencia in ubicadas if existencia.pk], ['cantidad']
+            )
+            StockUbicacion.objects.bulk_create([existencia for existencia in ubicadas if not existencia.pk])
+        for item in modificados.values():
+            uow.notificar_producto(item)
+        for item, fila in aplicados:
+            uow.registrar_movimiento(
+                item, fila['tipo'], fila['cantidad'],
+                ubicacion=predeterminada if item.id in con_ubicaciones else None,
+            )
+            signo = 1 if fila['tipo'] == 'entrada' else -1
+            uow.registrar_delta_valor(
+                valor_item(item.precio, signo * fila['cantidad']), unidades=signo * fila['cantidad']
+            )
+        
+        logger.info(f"Ajuste por lote: {len(aplicados)} aplicados, {len(errores)} filas con error")
+        return {
+            'aplicados': len(aplicados),
+            'errores': errores,
+        }
+    
     def obtener_productos_bajo_stock(self, umbral: int = 10) -> list:
         """
         Obtiene productos con stock por debajo del umbral especificado.
@@ -190,8 +423,11 @@ class StockService:
         Returns:
             Lista de productos con bajo stock
         """
-        return StockItem.objects.filter(cantidad__lt=umbral).order_by('cantidad')
+        return StockItem.objects.using(alias_lectura()).filter(
+            cantidad__lt=umbral
+        ).order_by('cantidad')
     
+    @transaccional(reintentar=True)
     def crear_producto(self, data: Dict[str, Any]) -> StockItem:
         """
         Crea un nuevo producto validando los datos.
@@ -209,24 +445,46 @@ class StockService:
         self.validator.validar_cantidad_positiva(data.get('cantidad', 0))
         
         producto = StockItem.objects.create(**data)
+        uow = unidad_de_trabajo_actual()
+        uow.notificar_producto(producto, 'crear')
+        uow.registrar_delta_valor(
+            valor_item(producto.precio, producto.cantidad), unidades=producto.cantidad, productos=1
+        )
         logger.info(f"Producto creado: {producto.nombre}")
         
         return producto
 
 
+@trazar_metodos()
 class MovimientoService:
     """
     Servicio para manejar operaciones de movimientos de inventario.
     """
     
+    _instancia = None
+    # El ID desempata movimientos del mismo instante (paginación estable)
+    ORDENES = {
+        '-fecha': ('-fecha', '-hora', '-id'),
+        'fecha': ('fecha', 'hora', 'id'),
+    }
+    
     def __init__(self):
-        self.validator = MovimientoValidator()
+        self.validator = ValidatorFactory.compartido('movimiento')
     
+    @classmethod
+    def compartido(cls) -> 'MovimientoService':
+        """Instancia reutilizable (el servicio no guarda estado por llamada)"""
+        if cls._instancia is None:
+            cls._instancia = cls()
+        return cls._instancia
+    
+    @transaccional(reintentar=True)
     def crear_movimiento(
         self,
         producto: StockItem,
         tipo: str,
-        cantidad: int
+        cantidad: int,
+        ubicacion: Optional[Ubicacion] = None
     ) -> Movimiento:
         """
         Crea un nuevo movimiento de inventario.
@@ -235,9 +493,10 @@ class MovimientoService:
             producto: Instancia del producto
             tipo: Tipo de movimiento ('entrada' o 'salida')
             cantidad: Cantidad del movimiento
+            ubicacion: Ubicación afectada (None: movimiento sobre el total)
             
         Returns:
-            Instancia del movimiento creado
+            Instancia del movimiento (se inserta al escribir la unidad de trabajo)
             
         Raises:
             ValidationError: Si los datos son inválidos
@@ -245,10 +504,11 @@ class MovimientoService:
         self.validator.validar_tipo_movimiento(tipo)
         self.validator.validar_cantidad_positiva(cantidad)
         
-        movimiento = Movimiento.objects.create(
+        movimiento = unidad_de_trabajo_actual().registrar_movimiento(
             producto=producto,
             tipo=tipo,
-            cantidad=cantidad
+            cantidad=cantidad,
+            ubicacion=ubicacion
         )
         
         logger.info(
@@ -273,12 +533,58 @@ class MovimientoService:
         Returns:
             Lista de movimientos
         """
-        queryset = Movimiento.objects.filter(producto_id=producto_id)
+        return self.filtrar_movimientos(producto_id=producto_id, tipo=tipo or None)
+    
+    def filtrar_movimientos(
+        self,
+        producto_id: Optional[int] = None,
+        tipo: Optional[str] = None,
+        desde: Optional[datetime] = None,
+        hasta: Optional[datetime] = None,
+        orden: str = '-fecha'
+    ):
+        """
+        Movimientos filtrados por producto, tipo y rango de fecha/hora.
         
-        if tipo:
-            queryset = queryset.filter(tipo=tipo)
+        Cada combinación de filtros tiene un índice que termina en
+        (fecha, hora): el rango y el orden por fecha se resuelven recorriendo
+        ese índice, sin ordenar en memoria ni leer el resto del historial.
+        
+        Args:
+            producto_id: Filtrar por producto (opcional)
+            tipo: 'entrada', 'salida' o 'ajuste' (opcional)
+            desde: Inicio del rango, incluido (opcional)
+            hasta: Fin del rango, excluido (opcional)
+            orden: '-fecha' (más recientes primero) o 'fecha'
+            
+        Returns:
+            QuerySet de movimientos con su producto
+            
+        Raises:
+            ValidationError: Si el tipo, el orden o el rango no son válidos
+        """
+        if orden not in self.ORDENES:
+            raise ValidationError(
+                f"Orden inválido. Valores permitidos: {', '.join(self.ORDENES)}"
+            )
+        tipos = dict(Movimiento.Tipo_Choices)
+        if tipo is not None and tipo not in tipos:
+            raise ValidationError(
+                f"Tipo inválido. Valores permitidos: {', '.join(tipos)}"
+            )
+        if desde is not None and hasta is not None and desde >= hasta:
+            raise ValidationError("El inicio del rango debe ser anterior a su fin")
         
-        return queryset.order_by('-fecha', '-hora')
+        queryset = Movimiento.objects.using(alias_lectura()).select_related('producto')
+        if producto_id is not None:
+            queryset = queryset.filter(producto_id=producto_id)
+        if tipo is not None:
+            queryset = queryset.filter(tipo=tipo)
+        if desde is not None:
+            queryset = queryset.filter(fecha__gte=desde)
+        if hasta is not None:
+            queryset = queryset.filter(fecha__lt=hasta)
+        return queryset.order_by(*self.ORDENES[orden])
     
     def obtener_resumen_movimientos(
         self,
@@ -293,15 +599,14 @@ class MovimientoService:
         Returns:
             Dict con resumen de entradas, salidas y total
         """
-        entradas = Movimiento.objects.filter(
-            producto_id=producto_id,
-            tipo='entrada'
-        ).aggregate(total=models.Sum('cantidad'))['total'] or 0
-        
-        salidas = Movimiento.objects.filter(
-            producto_id=producto_id,
-            tipo='salida'
-        ).aggregate(total=models.Sum('cantidad'))['total'] or 0
+        totales = Movimiento.objects.using(alias_lectura()).filter(
+            producto_id=producto_id
+        ).aggregate(
+            entradas=models.Sum('cantidad', filter=models.Q(tipo='entrada')),
+            salidas=models.Sum('cantidad', filter=models.Q(tipo='salida')),
+        )
+        entradas = totales['entradas'] or 0
+        salidas = totales['salidas'] or 0
         
         return {
             'producto_id': producto_id,
@@ -311,6 +616,1347 @@ class MovimientoService:
         }
 
 
+@trazar_metodos()
+class ExistenciasService:
+    """
+    Servicio para el stock por ubicación.
+    Cada operación bloquea solo las filas StockUbicacion afectadas
+    (producto, ubicación), así que las tiendas no compiten entre sí por el
+    mismo producto. El total StockItem.cantidad se ajusta con un UPDATE
+    relativo al escribir la unidad de trabajo, sin bloquear el producto
+    durante la operación.
+    
+    Desde que un producto tiene existencias por ubicación, su total es la
+    suma de ellas: el stock que tenía sin ubicar pasa a la ubicación
+    predeterminada (STOCK_UBICACION_PREDETERMINADA) y las escrituras sin
+    ubicación se reflejan en ella (ver mover_sin_ubicacion).
+    """
+    
+    def __init__(self):
+        self.validator = ValidatorFactory.compartido('stock')
+    
+    @staticmethod
+    def ubicacion_predeterminada(using: str = 'default') -> Ubicacion:
+        """Ubicación de las escrituras sin ubicación (se crea la primera vez)"""
+        codigo = getattr(settings, 'STOCK_UBICACION_PREDETERMINADA', 'GENERAL')
+        ubicacion, _ = Ubicacion.objects.using(using).get_or_create(
+            codigo=codigo, defaults={'nombre': 'Sin ubicación asignada'}
+        )
+        return ubicacion
+    
+    @staticmethod
+    def _producto(uow, producto_id) -> StockItem:
+        try:
+            # Sin bloqueo: solo se necesita el precio y el total se ajusta por delta
+            return uow.obtener_producto(producto_id, bloquear=False)
+        except StockItem.DoesNotExist:
+            raise ProductoNoEncontradoError(f"Producto con ID {producto_id} no existe")
+    
+    @staticmethod
+    def _ubicacion(ubicacion_id) -> Ubicacion:
+        try:
+            return Ubicacion.objects.get(pk=Ubicacion._meta.pk.to_python(ubicacion_id), activa=True)
+        except Ubicacion.DoesNotExist:
+            raise UbicacionNoEncontradaError(f"Ubicación con ID {ubicacion_id} no existe o está inactiva")
+    
+    @classmethod
+    def _existencia(cls, uow, producto: StockItem, ubicacion: Ubicacion, crear: bool = False):
+        """
+        Fila de existencias bloqueada (SELECT ... FOR UPDATE). Con crear=True
+        la crea si no existe; si otra transacción la crea a la vez, se
+        bloquea la de esa transacción.
+        
+        Returns:
+            StockUbicacion o None si no existe y crear=False
+        """
+        existencias = StockUbicacion.objects.using(uow.using)
+        try:
+            with span('select_for_update StockUbicacion', 'bloqueo', ubicacion=ubicacion.pk):
+                return existencias.select_for_update().get(producto=producto, ubicacion=ubicacion)
+        except StockUbicacion.DoesNotExist:
+            if not crear:
+                return None
+        if not existencias.filter(producto=producto).exists() and cls._ubicar_total(uow, producto):
+            # El total sin ubicar pudo quedar justo en esta ubicación
+            return cls._existencia(uow, producto, ubicacion, crear=True)
+        try:
+            with transaction.atomic(using=uow.using):
+                return existencias.create(producto=producto, ubicacion=ubicacion, cantidad=0)
+        except IntegrityError:
+            return existencias.select_for_update().get(producto=producto, ubicacion=ubicacion)
+    
+    @classmethod
+    def _ubicar_total(cls, uow, producto: StockItem) -> bool:
+        """
+        Primera existencia por ubicación del producto: su total sin ubicar
+        pasa a la ubicación predeterminada. Se bloquea el producto para que
+        una escritura sin ubicación simultánea no cambie el total a la vez.
+        
+        Returns:
+            True si se creó la fila de la ubicación predeterminada
+        """
+        with span('select_for_update StockItem', 'bloqueo', pk=producto.pk):
+            total = StockItem.objects.using(uow.using).select_for_update().values_list(
+                'cantidad', flat=True
+            ).get(pk=producto.pk)
+        existencias = StockUbicacion.objects.using(uow.using)
+        if total <= 0 or existencias.filter(producto=producto).exists():
+            return False
+        existencias.create(
+            producto=producto, ubicacion=cls.ubicacion_predeterminada(uow.using), cantidad=total
+        )
+        return True
+    
+    @staticmethod
+    def existencias_predeterminadas(producto_ids, using: str = 'default') -> Dict[Any, StockUbicacion]:
+        """
+        Filas de la ubicación predeterminada de los productos dados,
+        bloqueadas en una consulta (en orden de producto) y con su ubicación.
+        
+        Returns:
+            Dict producto_id -> StockUbicacion (sin los productos que no tienen fila)
+        """
+        codigo = getattr(settings, 'STOCK_UBICACION_PREDETERMINADA', 'GENERAL')
+        filas = StockUbicacion.objects.using(using).filter(
+            producto_id__in=producto_ids,
+            ubicacion=Subquery(Ubicacion.objects.using(using).filter(codigo=codigo).values('pk')[:1]),
+        ).order_by('producto_id')
+        caracteristicas = connections[using].features
+        if caracteristicas.has_select_for_update_of or not caracteristicas.has_select_for_update:
+            # La ubicación en la misma consulta, bloqueando solo las existencias
+            filas = filas.select_related('ubicacion').select_for_update(of=('self',))
+        else:
+            filas = filas.select_for_update()
+        with span('select_for_update StockUbicacion', 'bloqueo', ubicacion=codigo):
+            return {existencia.producto_id: existencia for existencia in filas}
+    
+    def mover_sin_ubicacion(self, uow, producto: StockItem, delta: int) -> Optional[Ubicacion]:
+        """
+        Refleja en la ubicación predeterminada un cambio del total hecho sin
+        ubicación (el llamador tiene el producto bloqueado y escribe el total).
+        
+        Args:
+            uow: Unidad de trabajo activa
+            producto: Producto cuyo total cambia
+            delta: Cambio del total
+            
+        Returns:
+            La ubicación predeterminada, o None si el producto no tiene
+            existencias por ubicación (el total es todo su stock)
+            
+        Raises:
+            StockInsuficienteError: Si la ubicación predeterminada no cubre una salida
+        """
+        if not delta:
+            return None
+        existencia = self.existencias_predeterminadas([producto.pk], uow.using).get(producto.pk)
+        if existencia is not None:
+            ubicacion = existencia.ubicacion
+        elif not StockUbicacion.objects.using(uow.using).filter(producto=producto).exists():
+            return None
+        else:
+            ubicacion = self.ubicacion_predeterminada(uow.using)
+            existencia = self._existencia(uow, producto, ubicacion, crear=delta > 0)
+        if delta < 0:
+            self._restar(existencia, ubicacion, -delta)
+        else:
+            existencia.cantidad += delta
+            existencia.save(update_fields=['cantidad'])
+        return ubicacion
+    
+    @staticmethod
+    def _restar(existencia, ubicacion: Ubicacion, cantidad: int) -> None:
+        disponible = existencia.cantidad if existencia is not None else 0
+        if disponible < cantidad:
+            raise StockInsuficienteError(
+                f"Stock insuficiente en {ubicacion.codigo}. "
+                f"Disponible: {disponible}, Solicitado: {cantidad}"
+            )
+        existencia.cantidad -= cantidad
+        existencia.save(update_fields=['cantidad'])
+    
+    @transaccional(reintentar=True)
+    def restar(self, producto_id: int, ubicacion_id: int, cantidad: int) -> Dict[str, Any]:
+        """
+        Resta stock de un producto en una ubicación y crea el movimiento de salida.
+        
+        Returns:
+            Dict con producto, ubicación, stock en la ubicación y movimiento
+            
+        Raises:
+            ProductoNoEncontradoError: Si el producto no existe
+            UbicacionNoEncontradaError: Si la ubicación no existe o está inactiva
+            StockInsuficienteError: Si la ubicación no tiene suficiente stock
+            ValidationError: Si los datos son inválidos
+        """
+        self.validator.validar_cantidad_positiva(cantidad)
+        uow = unidad_de_trabajo_actual()
+        producto = self._producto(uow, producto_id)
+        ubicacion = self._ubicacion(ubicacion_id)
+        
+        existencia = self._existencia(uow, producto, ubicacion)
+        self._restar(existencia, ubicacion, cantidad)
+        
+        uow.registrar_delta_cantidad(producto, -cantidad)
+        uow.registrar_delta_valor(-valor_item(producto.precio, cantidad), unidades=-cantidad)
+        movimiento = uow.registrar_movimiento(producto, 'salida', cantidad, ubicacion=ubicacion)
+        logger.info(f"Stock reducido para {producto.nombre} en {ubicacion.codigo}: -{cantidad}")
+        return {
+            'producto': producto.nombre,
+            'ubicacion': ubicacion.codigo,
+            'nuevo_stock': existencia.cantidad,
+            'movimiento': movimiento,
+        }
+    
+    @transaccional(reintentar=True)
+    def agregar(self, producto_id: int, ubicacion_id: int, cantidad: int) -> Dict[str, Any]:
+        """
+        Agrega stock de un producto en una ubicación y crea el movimiento de entrada.
+        
+        Returns:
+            Dict con producto, ubicación, stock en la ubicación y movimiento
+            
+        Raises:
+            ProductoNoEncontradoError: Si el producto no existe
+            UbicacionNoEncontradaError: Si la ubicación no existe o está inactiva
+            ValidationError: Si los datos son inválidos
+        """
+        self.validator.validar_cantidad_positiva(cantidad)
+        uow = unidad_de_trabajo_actual()
+        producto = self._producto(uow, producto_id)
+        ubicacion = self._ubicacion(ubicacion_id)
+        
+        existencia = self._existencia(uow, producto, ubicacion, crear=True)
+        existencia.cantidad += cantidad
+        existencia.save(update_fields=['cantidad'])
+        
+        uow.registrar_delta_cantidad(producto, cantidad)
+        uow.registrar_delta_valor(valor_item(producto.precio, cantidad), unidades=cantidad)
+        movimiento = uow.registrar_movimiento(producto, 'entrada', cantidad, ubicacion=ubicacion)
+        logger.info(f"Stock agregado para {producto.nombre} en {ubicacion.codigo}: +{cantidad}")
+        return {
+            'producto': producto.nombre,
+            'ubicacion': ubicacion.codigo,
+            'nuevo_stock': existencia.cantidad,
+            'movimiento': movimiento,
+        }
+    
+    @transaccional(reintentar=True)
+    def transferir(
+        self,
+        producto_id: int,
+        origen_id: int,
+        destino_id: int,
+        cantidad: int
+    ) -> Dict[str, Any]:
+        """
+        Mueve stock entre dos ubicaciones: una salida en el origen y una
+        entrada en el destino con el mismo ID de transferencia. El total
+        del producto no cambia, así que no se escribe StockItem.
+        
+        Returns:
+            Dict con el stock resultante en origen y destino, la
+            transferencia y los dos movimientos
+            
+        Raises:
+            ProductoNoEncontradoError: Si el producto no existe
+            UbicacionNoEncontradaError: Si alguna ubicación no existe o está inactiva
+            StockInsuficienteError: Si el origen no tiene suficiente stock
+            ValidationError: Si los datos son inválidos
+        """
+        self.validator.validar_cantidad_positiva(cantidad)
+        uow = unidad_de_trabajo_actual()
+        producto = self._producto(uow, producto_id)
+        origen = self._ubicacion(origen_id)
+        destino = self._ubicacion(destino_id)
+        if origen.pk == destino.pk:
+            raise ValidationError("El origen y el destino deben ser ubicaciones distintas")
+        
+        # Bloqueos en orden de ubicación: dos transferencias opuestas no se
+        # bloquean mutuamente
+        existencias = {}
+        for ubicacion in sorted((origen, destino), key=lambda u: u.pk):
+            existencias[ubicacion.pk] = self._existencia(
+                uow, producto, ubicacion, crear=ubicacion is destino
+            )
+        self._restar(existencias[origen.pk], origen, cantidad)
+        existencias[destino.pk].cantidad += cantidad
+        existencias[destino.pk].save(update_fields=['cantidad'])
+        
+        transferencia = uuid.uuid4()
+        salida = uow.registrar_movimiento(
+            producto, 'salida', cantidad, ubicacion=origen, transferencia=transferencia
+        )
+        entrada = uow.registrar_movimiento(
+            producto, 'entrada', cantidad, ubicacion=destino, transferencia=transferencia
+        )
+        logger.info(
+            f"Transferencia {transferencia}: {cantidad} de {producto.nombre} "
+            f"de {origen.codigo} a {destino.codigo}"
+        )
+        return {
+            'producto': producto.nombre,
+            'transferencia': transferencia,
+            'origen': {'ubicacion': origen.codigo, 'nuevo_stock': existencias[origen.pk].cantidad},
+            'destino': {'ubicacion': destino.codigo, 'nuevo_stock': existencias[destino.pk].cantidad},
+            'movimientos': [salida, entrada],
+        }
+    
+    def existencias_producto(self, producto_id: int):
+        """Existencias de un producto en cada ubicación (índice único producto, ubicación)"""
+        return StockUbicacion.objects.using(alias_lectura()).filter(
+            producto_id=producto_id
+        ).select_related('producto', 'ubicacion').order_by('ubicacion_id')
+    
+    def existencias_ubicacion(self, ubicacion_id: int):
+        """Existencias de todos los productos en una ubicación (índice ubicación, producto)"""
+        return StockUbicacion.objects.using(alias_lectura()).filter(
+            ubicacion_id=ubicacion_id
+        ).select_related('producto', 'ubicacion').order_by('producto_id')
+
+
+def valor_item(precio, cantidad) -> Decimal:
+    """Valor de inventario de un producto (precio * cantidad)"""
+    return Decimal(str(precio or 0)) * (cantidad or 0)
+
+
+class ValoracionService:
+    """
+    Servicio para el valor total del inventario (sum(precio * cantidad)).
+    El total se mantiene aplicando deltas en cada escritura de stock, de modo
+    que consultarlo no requiere recorrer StockItem.
+    """
+    
+    FRAGMENTOS = 8
+    
+    @staticmethod
+    def expresion_valor():
+        """Expresión SQL del valor de una fila de StockItem"""
+        return ExpressionWrapper(
+            F('precio') * F('cantidad'),
+            output_field=DecimalField(max_digits=20, decimal_places=2),
+        )
+    
+    def aplicar_delta(
+        self,
+        delta: Decimal,
+        unidades: int = 0,
+        productos: int = 0,
+        using: str = DEFAULT_DB_ALIAS
+    ) -> None:
+        """
+        Suma un delta a los totales mantenidos (en un fragmento al azar). Si
+        el fragmento no existe se crea con el delta: nunca se pierde.
+        
+        Args:
+            delta: Cambio de valor (puede ser negativo)
+            unidades: Cambio de la suma de cantidades
+            productos: Cambio de la cantidad de productos
+            using: Alias de la BD (el de la unidad de trabajo que lo aplica)
+        """
+        if not (delta or unidades or productos):
+            return
+        fragmento = random.randrange(self.FRAGMENTOS)  # nosec B311 - reparto de carga, no criptografía
+        fragmentos = ValorInventario.objects.using(using).filter(fragmento=fragmento)
+        cambios = {
+            'valor_total': F('valor_total') + delta,
+            'unidades': F('unidades') + unidades,
+            'productos': F('productos') + productos,
+        }
+        if fragmentos.update(**cambios):
+            return
+        _, creado = ValorInventario.objects.using(using).get_or_create(
+            fragmento=fragmento,
+            defaults={'valor_total': delta, 'unidades': unidades, 'productos': productos},
+        )
+        if not creado:
+            # Otro proceso lo creó entre el UPDATE y el INSERT
+            fragmentos.update(**cambios)
+    
+    def registrar_cambio(
+        self,
+        precio_anterior,
+        cantidad_anterior: int,
+        precio_nuevo,
+        cantidad_nueva: int
+    ) -> None:
+        """Aplica el delta de valor de un producto que cambió de precio/cantidad"""
+        self.aplicar_delta(
+            valor_item(precio_nuevo, cantidad_nueva)
+            - valor_item(precio_anterior, cantidad_anterior)
+        )
+    
+    def obtener_total(self) -> Decimal:
+        """Valor total mantenido (suma de los fragmentos)"""
+        total = ValorInventario.objects.aggregate(total=Sum('valor_total'))['total']
+        return Decimal(total or 0).quantize(Decimal('0.01'))
+    
+    def obtener_totales(self) -> Dict[str, Any]:
+        """Valor, unidades y cantidad de productos mantenidos (una consulta)"""
+        totales = ValorInventario.objects.aggregate(
+            valor=Sum('valor_total'), unidades=Sum('unidades'), productos=Sum('productos'),
+        )
+        return {
+            'valor': Decimal(totales['valor'] or 0).quantize(Decimal('0.01')),
+            'unidades': int(totales['unidades'] or 0),
+            'productos': int(totales['productos'] or 0),
+        }
+    
+    def recalcular_total(self) -> Decimal:
+        """Valor total calculado desde cero sobre StockItem"""
+        total = StockItem.objects.aggregate(total=Sum(self.expresion_valor()))['total']
+        return Decimal(total or 0).quantize(Decimal('0.01'))
+    
+    def desglose_por_producto(self):
+        """QuerySet de productos anotado con su valor"""
+        return StockItem.objects.annotate(valor=self.expresion_valor()).order_by('id')
+    
+    @transaction.atomic
+    def verificar(self, corregir: bool = False) -> Dict[str, Any]:
+        """
+        Compara el valor mantenido con uno recalculado desde cero.
+        
+        Args:
+            corregir: Si hay diferencia, reemplaza el valor mantenido
+            
+        Returns:
+            Dict con valor mantenido, recalculado, deriva (también de unidades
+            y productos) y si se corrigió
+        """
+        # Bloquear los fragmentos evita que un delta concurrente altere la comparación
+        list(ValorInventario.objects.select_for_update().all())
+        mantenidos = self.obtener_totales()
+        mantenido = mantenidos['valor']
+        recalculado = self.recalcular_total()
+        deriva = mantenido - recalculado
+        conteo = StockItem.objects.aggregate(unidades=Sum('cantidad'), productos=Count('id'))
+        deriva_unidades = mantenidos['unidades'] - (conteo['unidades'] or 0)
+        deriva_productos = mantenidos['productos'] - conteo['productos']
+        
+        corregido = False
+        hay_deriva = deriva or deriva_unidades or deriva_productos
+        if corregir and (hay_deriva or ValorInventario.objects.count() != self.FRAGMENTOS):
+            ValorInventario.objects.all().delete()
+            ValorInventario.objects.bulk_create([
+                ValorInventario(fragmento=0, valor_total=recalculado,
+                                unidades=conteo['unidades'] or 0, productos=conteo['productos'])
+            ] + [ValorInventario(fragmento=i) for i in range(1, self.FRAGMENTOS)])
+            corregido = True
+            logger.warning(
+                f"Valoración corregida. Deriva: {deriva} "
+                f"(unidades {deriva_unidades}, productos {deriva_productos})"
+            )
+        
+        return {
+            'valor_mantenido': mantenido,
+            'valor_recalculado': recalculado,
+            'deriva': deriva,
+            'deriva_unidades': deriva_unidades,
+            'deriva_productos': deriva_productos,
+            'corregido': corregido,
+        }
+
+
+def prefijo_confirmado(anterior: int, filas: List[Tuple[int, datetime]]) -> int:
+    """
+    Cuántas filas posteriores a una marca de agua sobre IDs se pueden dar
+    por definitivas. El ID se asigna al insertar pero la fila se ve al
+    confirmar: un hueco en la secuencia puede ser una transacción aún
+    abierta cuya fila aparecería después por debajo de la marca. Se corta
+    en el primer hueco, salvo que la fila que lo sigue tenga más de
+    STOCK_HUECOS_ESPERA_SEGUNDOS (el hueco es de una transacción revertida,
+    de filas borradas o un ID que el motor descartó).
+    
+    Args:
+        anterior: Último ID ya entregado o procesado
+        filas: (id, fecha) de las filas siguientes, en orden de ID
+        
+    Returns:
+        Largo del prefijo de filas que se puede procesar
+    """
+    espera = getattr(settings, 'STOCK_HUECOS_ESPERA_SEGUNDOS', 90)
+    limite = timezone.now() - timedelta(seconds=espera)
+    esperado = anterior + 1
+    for indice, (pk, fecha) in enumerate(filas):
+        if pk != esperado and fecha > limite:
+            return indice
+        esperado = pk + 1
+    return len(filas)
+
+
+class ResumenMovimientosService:
+    """
+    Servicio para los resúmenes (rollups) horarios y diarios de movimientos.
+    Los resúmenes se mantienen por un proceso incremental que avanza una
+    marca de agua sobre Movimiento.id (tareas periódicas del trabajador o
+    manage.py actualizar_resumenes); los reportes leen solo los resúmenes.
+    """
+    
+    MARCA = 'resumen_movimientos'
+    GRANULARIDADES = {
+        'hora': (ResumenMovimientoHora, TruncHour),
+        'dia': (ResumenMovimientoDia, TruncDate),
+    }
+    
+    def ponerse_al_dia(self, lote: int = 50000) -> int:
+        """
+        Resume los movimientos posteriores a la marca de agua.
+        
+        La marca no pasa un hueco de IDs reciente (ver prefijo_confirmado),
+        para no saltar movimientos de transacciones aún sin confirmar.
+        
+        Args:
+            lote: Máximo de movimientos procesados por transacción
+            
+        Returns:
+            Cantidad de movimientos resumidos
+        """
+        procesados = 0
+        while True:
+            procesados_lote = self._procesar_lote(lote)
+            procesados += procesados_lote
+            if procesados_lote < lote:
+                return procesados
+    
+    @transaction.atomic
+    def _procesar_lote(self, lote: int) -> int:
+        MarcaDeAgua.objects.get_or_create(nombre=self.MARCA)
+        # El bloqueo serializa procesos concurrentes de actualización
+        marca = MarcaDeAgua.objects.select_for_update().get(nombre=self.MARCA)
+        
+        filas = list(
+            Movimiento.objects
+            .filter(id__gt=marca.ultimo_id)
+            .order_by('id')
+            .values_list('id', 'fecha')[:lote]
+        )
+        ids = [pk for pk, _ in filas[:prefijo_confirmado(marca.ultimo_id, filas)]]
+        if not ids:
+            return 0
+        
+        pendientes = Movimiento.objects.filter(id__gt=marca.ultimo_id, id__lte=ids[-1])
+        for modelo, truncar in self.GRANULARIDADES.values():
+            filas = (
+                pendientes
+                .annotate(bucket=truncar('fecha'))
+                .values('producto_id', 'tipo', 'bucket')
+                .annotate(total=Sum('cantidad'), n=Count('id'))
+            )
+            self._acumular(modelo, list(filas))
+        
+        marca.ultimo_id = ids[-1]
+        marca.save(update_fields=['ultimo_id', 'actualizado'])
+        logger.info(f"Resúmenes actualizados hasta Movimiento.id={ids[-1]} ({len(ids)} movimientos)")
+        return len(ids)
+    
+    def _acumular(self, modelo, filas: List[Dict[str, Any]]) -> None:
+        """
+        Suma las filas agregadas a los resúmenes: lee los existentes de esos
+        productos, tipos y periodos y los actualiza o crea en bloque. Es
+        seguro leer y escribir sin bloquearlos porque el bloqueo de la marca
+        de agua serializa a los procesos que los modifican.
+        """
+        periodos_por_producto: Dict[int, set] = {}
+        for fila in filas:
+            periodos_por_producto.setdefault(fila['producto_id'], set()).add(fila['bucket'])
+        productos = sorted(periodos_por_producto)
+        tipos = sorted({fila['tipo'] for fila in filas})
+        existentes = {}
+        for inicio in range(0, len(productos), 500):
+            lote = productos[inicio:inicio + 500]
+            periodos = sorted(set().union(*(periodos_por_producto[producto] for producto in lote)))
+            for resumen in modelo.objects.filter(producto_id__in=lote, tipo__in=tipos, periodo__in=periodos):
+                existentes[(resumen.producto_id, resumen.tipo, resumen.periodo)] = resumen
+        
+        nuevos = []
+        modificados = []
+        for fila in filas:
+            resumen = existentes.get((fila['producto_id'], fila['tipo'], fila['bucket']))
+            if resumen is None:
+                nuevos.append(modelo(
+                    producto_id=fila['producto_id'],
+                    tipo=fila['tipo'],
+                    periodo=fila['bucket'],
+                    cantidad_total=fila['total'],
+                    num_movimientos=fila['n'],
+                ))
+            else:
+                resumen.cantidad_total += fila['total']
+                resumen.num_movimientos += fila['n']
+                modificados.append(resumen)
+        
+        modelo.objects.bulk_create(nuevos, batch_size=1000)
+        modelo.objects.bulk_update(
+            modificados, ['cantidad_total', 'num_movimientos'], batch_size=1000
+        )
+    
+    @transaction.atomic
+    def conciliar(self, dias: int = 2) -> int:
+        """
+        Recalcula los resúmenes de los últimos días desde los movimientos ya
+        resumidos (ID hasta la marca de agua). Corrige lo que la marca haya
+        saltado: un movimiento cuya transacción confirmó después de
+        STOCK_HUECOS_ESPERA_SEGUNDOS.
+        
+        Args:
+            dias: Días recalculados, incluido el de hoy
+            
+        Returns:
+            Cantidad de movimientos resumidos de nuevo
+        """
+        MarcaDeAgua.objects.get_or_create(nombre=self.MARCA)
+        marca = MarcaDeAgua.objects.select_for_update().get(nombre=self.MARCA)
+        
+        desde = timezone.localdate() - timedelta(days=max(1, dias) - 1)
+        inicio = timezone.make_aware(datetime.combine(desde, time.min), timezone.get_current_timezone())
+        ResumenMovimientoHora.objects.filter(periodo__gte=inicio).delete()
+        ResumenMovimientoDia.objects.filter(periodo__gte=desde).delete()
+        
+        resumidos = Movimiento.objects.filter(fecha__gte=inicio, id__lte=marca.ultimo_id)
+        for modelo, truncar in self.GRANULARIDADES.values():
+            filas = (
+                resumidos
+                .annotate(bucket=truncar('fecha'))
+                .values('producto_id', 'tipo', 'bucket')
+                .annotate(total=Sum('cantidad'), n=Count('id'))
+            )
+            self._acumular(modelo, list(filas))
+        cantidad = resumidos.count()
+        logger.info(f"Resúmenes conciliados desde {desde} ({cantidad} movimientos)")
+        return cantidad
+    
+    @transaction.atomic
+    def reconstruir(self) -> int:
+        """
+        Borra los resúmenes y los recalcula desde cero.
+        
+        Returns:
+            Cantidad de movimientos resumidos
+        """
+        ResumenMovimientoHora.objects.all().delete()
+        ResumenMovimientoDia.objects.all().delete()
+        MarcaDeAgua.objects.update_or_create(
+            nombre=self.MARCA, defaults={'ultimo_id': 0}
+        )
+        return self.ponerse_al_dia()
+    
+    def reporte(
+        self,
+        granularidad: str,
+        desde: date,
+        hasta: date,
+        producto_id: Optional[int] = None,
+        por_producto: bool = True
+    ):
+        """
+        Consulta un rango de resúmenes (ambos extremos incluidos).
+        
+        Args:
+            granularidad: 'hora' o 'dia'
+            desde: Primer día del rango
+            hasta: Último día del rango
+            producto_id: Filtrar por un producto (opcional)
+            por_producto: Si es False, totaliza toda la tienda por periodo y tipo
+            
+        Returns:
+            QuerySet de dicts con periodo, tipo, cantidad y movimientos
+            
+        Raises:
+            ValidationError: Si la granularidad o el rango no son válidos
+        """
+        if granularidad not in self.GRANULARIDADES:
+            raise ValidationError(
+                f"Granularidad inválida. Valores permitidos: {', '.join(self.GRANULARIDADES)}"
+            )
+        if desde > hasta:
+            raise ValidationError("La fecha 'desde' no puede ser posterior a 'hasta'")
+        
+        modelo = self.GRANULARIDADES[granularidad][0]
+        if granularidad == 'hora':
+            zona = timezone.get_current_timezone()
+            inicio = timezone.make_aware(datetime.combine(desde, time.min), zona)
+            fin = timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min), zona)
+            queryset = modelo.objects.filter(periodo__gte=inicio, periodo__lt=fin)
+        else:
+            queryset = modelo.objects.filter(periodo__gte=desde, periodo__lte=hasta)
+        
+        if producto_id is not None:
+            queryset = queryset.filter(producto_id=producto_id)
+        
+        if por_producto:
+            return queryset.order_by('periodo', 'producto_id', 'tipo').values(
+                'periodo', 'producto_id', 'tipo',
+                cantidad=F('cantidad_total'), movimientos=F('num_movimientos'),
+            )
+        
+        return queryset.values('periodo', 'tipo').annotate(
+            cantidad=Sum('cantidad_total'), movimientos=Sum('num_movimientos'),
+        ).order_by('periodo', 'tipo')
+
+
+class CambiosService:
+    """
+    Feed de cambios para clientes que mantienen una copia local del
+    catálogo. El token "<seq>.<movimiento_id>" indica lo último entregado:
+    seq de CambioProducto (altas, cambios y bajas de productos) e ID de
+    Movimiento (de solo inserción; los movimientos de un producto dado de
+    baja se eliminan junto con él).
+    """
+    
+    LIMITE_MAXIMO = 5000
+    
+    @staticmethod
+    def datos_producto(item: StockItem) -> Dict[str, Any]:
+        """Estado del producto tal como se guarda en el registro de cambios"""
+        return {
+            'id': item.pk,
+            'codigo': item.codigo,
+            'nombre': item.nombre,
+            'descripcion': item.descripcion,
+            'precio': str(Decimal(str(item.precio)).quantize(Decimal('0.01'))),
+            'cantidad': item.cantidad,
+            'version': item.version,
+        }
+    
+    def registrar(self, productos: List[Tuple[StockItem, str]], eliminados: list, using=None) -> None:
+        """
+        Agrega al registro los cambios de una transacción (un solo INSERT).
+        
+        Args:
+            productos: Lista de (producto, operacion) con operacion 'crear' o 'actualizar'
+            eliminados: IDs de productos dados de baja
+        """
+        registros = [
+            CambioProducto(producto_id=item.pk, operacion=operacion, datos=self.datos_producto(item))
+            for item, operacion in productos
+        ]
+        registros += [
+            CambioProducto(producto_id=pk, operacion='eliminar', datos=None)
+            for pk in eliminados
+        ]
+        CambioProducto.objects.using(using or 'default').bulk_create(registros)
+    
+    @staticmethod
+    def leer_token(token: Optional[str]) -> Tuple[int, int]:
+        """
+        Raises:
+            ValidationError: Si el token no tiene el formato "<seq>.<movimiento_id>"
+        """
+        if not token:
+            return 0, 0
+        try:
+            seq, movimiento_id = (int(parte) for parte in token.split('.'))
+        except ValueError:
+            raise ValidationError('Token de sincronización inválido')
+        if seq < 0 or movimiento_id < 0:
+            raise ValidationError('Token de sincronización inválido')
+        return seq, movimiento_id
+    
+    def cambios_desde(self, token: Optional[str] = None, limite: int = 500) -> Dict[str, Any]:
+        """
+        Cambios posteriores al token, compactados por producto (solo el
+        último estado de cada uno dentro de la respuesta).
+        
+        Args:
+            token: Token devuelto por la llamada anterior (None: desde el inicio)
+            limite: Máximo de cambios y de movimientos a leer
+            
+        Returns:
+            Dict con productos (estado actual), eliminados (IDs), movimientos
+            (instancias), token nuevo y hay_mas
+            
+        Raises:
+            ValidationError: Si el token es inválido
+        """
+        seq, movimiento_id = self.leer_token(token)
+        limite = max(1, min(limite, self.LIMITE_MAXIMO))
+        alias = alias_lectura()
+        
+        cambios = list(
+            CambioProducto.objects.using(alias).filter(seq__gt=seq).order_by('seq')[:limite + 1]
+        )
+        movimientos = list(
+            Movimiento.objects.using(alias).select_related('producto')
+            .filter(pk__gt=movimiento_id).order_by('pk')[:limite + 1]
+        )
+        # Nada después de un hueco reciente de seq/ID: una transacción aún
+        # sin confirmar quedaría por debajo del token (ver prefijo_confirmado)
+        n_cambios = prefijo_confirmado(seq, [(c.seq, c.fecha) for c in cambios[:limite]])
+        n_movimientos = prefijo_confirmado(movimiento_id, [(m.pk, m.fecha) for m in movimientos[:limite]])
+        # Tras un corte por hueco no conviene volver a consultar enseguida
+        hay_mas = (
+            (len(cambios) > limite and n_cambios == limite)
+            or (len(movimientos) > limite and n_movimientos == limite)
+        )
+        cambios, movimientos = cambios[:n_cambios], movimientos[:n_movimientos]
+        
+        ultimos = {}
+        for cambio in cambios:
+            ultimos[cambio.producto_id] = cambio
+        productos, eliminados = [], []
+        for cambio in ultimos.values():
+            if cambio.operacion == 'eliminar':
+                eliminados.append(cambio.producto_id)
+            else:
+                productos.append(cambio.datos)
+        
+        if cambios:
+            seq = cambios[-1].seq
+        if movimientos:
+            movimiento_id = movimientos[-1].pk
+        return {
+            'token': f'{seq}.{movimiento_id}',
+            'hay_mas': hay_mas,
+            'productos': productos,
+            'eliminados': eliminados,
+            'movimientos': movimientos,
+        }
+
+
+class PronosticoService:
+    """
+    Pronóstico de demanda y sugerencias de reorden de todos los productos en
+    una sola pasada vectorizada (NumPy) sobre las salidas diarias.
+    
+    Las salidas se agregan por producto y día en la BD (sin las filas de
+    transferencias entre ubicaciones, que no son demanda); con NumPy se
+    calculan, para todos los productos a la vez:
+    
+    - demanda_diaria: media de salidas por día de la ventana (los días sin
+      salidas cuentan como 0) y su desviación estándar
+    - dias_cobertura: stock / demanda_diaria (None sin demanda)
+    - punto_reorden: demanda durante el plazo de reposición más un stock de
+      seguridad z * desviación * raíz(plazo)
+    - cantidad_sugerida: lo necesario para cubrir plazo + periodo de
+      revisión (con su stock de seguridad) cuando el stock está en o bajo el
+      punto de reorden
+    
+    El resultado se materializa en PronosticoProducto (por lotes, como el
+    análisis ABC), así que lo comparten todos los procesos. Pasados
+    STOCK_PRONOSTICO_TTL segundos se sigue sirviendo el anterior y se encola
+    el recálculo para el trabajador. 'manage.py calcular_pronostico' lo
+    recalcula de forma programada (cron).
+    """
+    
+    CLAVE_CACHE = 'stock:pronostico'
+    LOTE_ESCRITURA = 5000
+    
+    @staticmethod
+    def _parametros() -> Dict[str, Any]:
+        return {
+            'dias': getattr(settings, 'STOCK_PRONOSTICO_DIAS', 90),
+            'plazo_dias': getattr(settings, 'STOCK_PRONOSTICO_PLAZO_DIAS', 7),
+            'revision_dias': getattr(settings, 'STOCK_PRONOSTICO_REVISION_DIAS', 7),
+            'z': getattr(settings, 'STOCK_PRONOSTICO_NIVEL_SERVICIO_Z', 1.65),
+        }
+    
+    def calcular(self, hoy: Optional[date] = None) -> Dict[str, Any]:
+        """
+        Calcula el pronóstico de todos los productos y lo guarda en caché.
+        
+        Args:
+            hoy: Día en curso (excluido: solo se usan días completos)
+            
+        Returns:
+            Dict con 'calculado', 'parametros', 'productos' (pronosticados) y
+            'a_reponer'
+        """
+        # Import diferido: NumPy solo se carga en los procesos que pronostican
+        import numpy as np
+        
+        parametros = self._parametros()
+        dias = parametros['dias']
+        hoy = hoy or timezone.localdate()
+        zona = timezone.get_current_timezone()
+        inicio = timezone.make_aware(datetime.combine(hoy - timedelta(days=dias), time.min), zona)
+        fin = timezone.make_aware(datetime.combine(hoy, time.min), zona)
+        alias = alias_lectura()
+        
+        productos = np.array(
+            list(StockItem.objects.using(alias).order_by('id').values_list('id', 'cantidad')),
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        ids, stock = productos[:, 0], productos[:, 1].astype(np.float64)
+        
+        # Una fila por (producto, día) con salidas
+        salidas = np.array(
+            list(
+                Movimiento.objects.using(alias)
+                .filter(tipo='salida', transferencia__isnull=True, fecha__gte=inicio, fecha__lt=fin)
+                .annotate(dia=TruncDate('fecha'))
+                .values('producto_id', 'dia')
+                .annotate(total=Sum('cantidad'))
+                .values_list('producto_id', 'total')
+            ),
+            dtype=np.float64,
+        ).reshape(-1, 2)
+        posiciones = np.searchsorted(ids, salidas[:, 0].astype(np.int64))
+        cantidades = salidas[:, 1]
+        
+        suma = np.bincount(posiciones, weights=cantidades, minlength=len(ids))[:len(ids)]
+        suma_cuadrados = np.bincount(posiciones, weights=cantidades ** 2, minlength=len(ids))[:len(ids)]
+        demanda = suma / dias
+        desviacion = np.sqrt(np.maximum(suma_cuadrados - dias * demanda ** 2, 0) / max(dias - 1, 1))
+        
+        with np.errstate(divide='ignore'):
+            cobertura = np.where(demanda > 0, stock / np.where(demanda > 0, demanda, 1), np.inf)
+        plazo, revision, z = parametros['plazo_dias'], parametros['revision_dias'], parametros['z']
+        punto_reorden = demanda * plazo + z * desviacion * math.sqrt(plazo)
+        nivel_objetivo = demanda * (plazo + revision) + z * desviacion * math.sqrt(plazo + revision)
+        reponer = (demanda > 0) & (stock <= punto_reorden)
+        sugerida = np.where(reponer, np.ceil(np.maximum(nivel_objetivo - stock, 0)), 0).astype(np.int64)
+        
+        ahora = timezone.now()
+        for inicio in range(0, len(ids), self.LOTE_ESCRITURA):
+            fin = min(inicio + self.LOTE_ESCRITURA, len(ids))
+            filas = [
+                PronosticoProducto(
+                    producto_id=int(ids[i]),
+                    stock=int(productos[i, 1]),
+                    demanda_diaria=float(demanda[i]),
+                    desviacion=float(desviacion[i]),
+                    dias_cobertura=None if math.isinf(cobertura[i]) else float(cobertura[i]),
+                    punto_reorden=float(punto_reorden[i]),
+                    cantidad_sugerida=int(sugerida[i]),
+                    calculado=ahora,
+                )
+                for i in range(inicio, fin)
+            ]
+            # Cada lote reemplaza sus filas en una transacción: las lecturas
+            # nunca encuentran la tabla vacía
+            with transaction.atomic():
+                PronosticoProducto.objects.filter(
+                    producto_id__gte=int(ids[inicio]), producto_id__lte=int(ids[fin - 1])
+                ).delete()
+                PronosticoProducto.objects.bulk_create(filas, batch_size=1000)
+        
+        a_reponer = int(reponer.sum())
+        logger.info(f"Pronóstico calculado: {len(ids)} productos, {a_reponer} a reponer")
+        return {
+            'calculado': ahora,
+            'parametros': parametros,
+            'productos': len(ids),
+            'a_reponer': a_reponer,
+        }
+    
+    def _recalcular_en_segundo_plano(self) -> None:
+        """Encola el recálculo para el trabajador (uno pendiente a la vez entre todos los procesos)"""
+        # Evita consultar la cola en cada request mientras el trabajo espera
+        if not cache.add(f'{self.CLAVE_CACHE}:solicitado', True, 60):
+            return
+        # Import diferido: trabajos importa este módulo
+        from .trabajos import encolar
+        pendientes = Trabajo.objects.filter(
+            tipo='calcular_pronostico', estado__in=('pendiente', 'en_curso')
+        )
+        if not pendientes.exists():
+            encolar('calcular_pronostico')
+    
+    def obtener(self) -> Dict[str, Any]:
+        """
+        Fecha y parámetros del pronóstico materializado. Si nunca se calculó
+        se calcula ahora (una vez: queda en la tabla para todos los
+        procesos); vencido, se encola el recálculo y se sirve el anterior.
+        """
+        calculado = PronosticoProducto.objects.using(alias_lectura()).aggregate(
+            calculado=Max('calculado')
+        )['calculado']
+        if calculado is None:
+            resultado = self.calcular()
+            return {'calculado': resultado['calculado'], 'parametros': resultado['parametros']}
+        if (timezone.now() - calculado).total_seconds() > getattr(settings, 'STOCK_PRONOSTICO_TTL', 3600):
+            self._recalcular_en_segundo_plano()
+        return {'calculado': calculado, 'parametros': self._parametros()}
+    
+    @staticmethod
+    def fila(pronostico: PronosticoProducto) -> Dict[str, Any]:
+        """Pronóstico de un producto como dict (con su producto ya cargado)"""
+        cobertura = pronostico.dias_cobertura
+        return {
+            'producto': pronostico.producto_id,
+            'nombre': pronostico.producto.nombre,
+            'stock': pronostico.stock,
+            'demanda_diaria': round(pronostico.demanda_diaria, 3),
+            'desviacion': round(pronostico.desviacion, 3),
+            'dias_cobertura': None if cobertura is None else round(cobertura, 1),
+            'punto_reorden': round(pronostico.punto_reorden, 1),
+            'cantidad_sugerida': pronostico.cantidad_sugerida,
+        }
+    
+    def sugerencias(self):
+        """
+        Productos con cantidad sugerida de reorden, de menor a mayor
+        cobertura (los que se agotan antes primero).
+        
+        Returns:
+            QuerySet de PronosticoProducto con su producto
+        """
+        return (
+            PronosticoProducto.objects.using(alias_lectura())
+            .filter(cantidad_sugerida__gt=0)
+            .select_related('producto')
+            .order_by('dias_cobertura', 'producto_id')
+        )
+    
+    def pronostico_producto(self, producto_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Pronóstico de un producto. None si no existía al calcular: en ese
+        caso se pide el recálculo en segundo plano (nunca dentro del request).
+        """
+        self.obtener()
+        pronostico = (
+            PronosticoProducto.objects.using(alias_lectura())
+            .select_related('producto')
+            .filter(pk=producto_id)
+            .first()
+        )
+        if pronostico is None:
+            self._recalcular_en_segundo_plano()
+            return None
+        return self.fila(pronostico)
+
+
+class AnalisisService:
+    """
+    Análisis ABC y de rotación del catálogo, materializado en AnalisisProducto.
+    
+    El catálogo se recorre por lotes de IDs consecutivos (STOCK_ANALISIS_LOTE
+    productos). Por lote, una sola consulta agregada en la BD (GROUP BY
+    producto sobre el rango de IDs) devuelve las unidades de salida de la
+    ventana, sin transferencias, y la fecha del último movimiento. En memoria
+    solo quedan columnas NumPy de tamaño fijo por producto: la memoria
+    depende de la cantidad de productos, no de movimientos.
+    
+    Con las columnas completas se clasifica por valor movido (unidades *
+    precio actual), de mayor a menor:
+    
+    - A: productos dentro del primer corte del valor acumulado (80%)
+    - B: dentro del segundo corte (95%)
+    - C: el resto, incluidos los productos sin salidas
+    
+    El resultado se escribe por lotes (cada lote reemplaza sus filas en una
+    transacción), así que las lecturas nunca encuentran la tabla vacía.
+    'manage.py calcular_analisis' lo recalcula de forma programada (cron).
+    """
+    
+    CLASES = ('A', 'B', 'C')
+    ORDENES = {
+        'valor': ('-valor_movido', 'producto_id'),
+        'rotacion': (F('rotacion').desc(nulls_last=True), 'producto_id'),
+        'inactividad': (F('ultimo_movimiento').asc(nulls_first=True), 'producto_id'),
+    }
+    
+    @staticmethod
+    def _parametros() -> Dict[str, Any]:
+        return {
+            'dias': getattr(settings, 'STOCK_ANALISIS_DIAS', 365),
+            'cortes': list(getattr(settings, 'STOCK_ANALISIS_CORTES', (0.8, 0.95))),
+        }
+    
+    def _extraer(self, np, inicio: datetime, lote: int) -> Dict[str, Any]:
+        """
+        Columnas por producto (id, precio en centavos, stock, unidades de
+        salida desde inicio, último movimiento), leídas por lotes de IDs.
+        """
+        alias = alias_lectura()
+        partes = []
+        ultimo_id = 0
+        while True:
+            productos = list(
+                StockItem.objects.using(alias)
+                .filter(id__gt=ultimo_id)
+                .order_by('id')
+                .values_list('id', 'precio', 'cantidad')[:lote]
+            )
+            if not productos:
+                break
+            ultimo_id = productos[-1][0]
+            
+            ids = np.array([fila[0] for fila in productos], dtype=np.int64)
+            columnas = {
+                'id': ids,
+                'centavos': np.array([int(fila[1] * 100) for fila in productos], dtype=np.int64),
+                'stock': np.array([fila[2] for fila in productos], dtype=np.int64),
+                'unidades': np.zeros(len(ids), dtype=np.int64),
+                'ultimo': np.full(len(ids), np.datetime64('NaT'), dtype='datetime64[us]'),
+            }
+            
+            agregados = list(
+                Movimiento.objects.using(alias)
+                .filter(producto_id__gte=productos[0][0], producto_id__lte=ultimo_id)
+                .values('producto_id')
+                .annotate(
+                    unidades=Sum('cantidad', filter=Q(
+                        tipo='salida', transferencia__isnull=True, fecha__gte=inicio
+                    )),
+                    ultimo=Max('fecha'),
+                )
+                .values_list('producto_id', 'unidades', 'ultimo')
+            )
+            if agregados:
+                posiciones = np.searchsorted(ids, [fila[0] for fila in agregados])
+                columnas['unidades'][posiciones] = [fila[1] or 0 for fila in agregados]
+                columnas['ultimo'][posiciones] = [
+                    np.datetime64(fila[2].astimezone(dt_timezone.utc).replace(tzinfo=None), 'us')
+                    for fila in agregados
+                ]
+            partes.append(columnas)
+        
+        if not partes:
+            return {
+                'id': np.zeros(0, dtype=np.int64), 'centavos': np.zeros(0, dtype=np.int64),
+                'stock': np.zeros(0, dtype=np.int64), 'unidades': np.zeros(0, dtype=np.int64),
+                'ultimo': np.zeros(0, dtype='datetime64[us]'),
+            }
+        return {clave: np.concatenate([parte[clave] for parte in partes]) for clave in partes[0]}
+    
+    @staticmethod
+    def _clasificar(np, valor, ids, cortes) -> Any:
+        """Índice de clase (0=A, 1=B, 2=C) por producto según el valor acumulado"""
+        orden = np.lexsort((ids, -valor))
+        ordenado = valor[orden]
+        acumulado = np.cumsum(ordenado)
+        total = acumulado[-1] if len(acumulado) else 0
+        clases = np.full(len(valor), 2, dtype=np.int8)
+        if total:
+            # Participación acumulada antes de cada producto: el primero siempre es A
+            previo = (acumulado - ordenado) / total
+            clase_ordenada = np.where(previo < cortes[0], 0, np.where(previo < cortes[1], 1, 2))
+            clases[orden] = np.where(ordenado > 0, clase_ordenada, 2)
+        return clases
+    
+    def calcular(self, lote: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Recalcula el análisis de todos los productos y lo materializa.
+        
+        Args:
+            lote: Productos por consulta y por transacción de escritura
+            
+        Returns:
+            Resumen por clase (ver obtener_resumen)
+        """
+        # Import diferido: NumPy solo se carga en los procesos que analizan
+        import numpy as np
+        
+        parametros = self._parametros()
+        lote = lote or getattr(settings, 'STOCK_ANALISIS_LOTE', 50000)
+        ahora = timezone.now()
+        columnas = self._extraer(np, ahora - timedelta(days=parametros['dias']), lote)
+        ids, stock, unidades = columnas['id'], columnas['stock'], columnas['unidades']
+        
+        valor = unidades * columnas['centavos']
+        clases = self._clasificar(np, valor, ids, parametros['cortes'])
+        anual = unidades * (365 / parametros['dias'])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rotacion = np.where(stock > 0, anual / np.where(stock > 0, stock, 1), np.nan)
+        ultimos = columnas['ultimo'].astype(object)
+        
+        for inicio in range(0, len(ids), lote):
+            fin = min(inicio + lote, len(ids))
+            filas = [
+                AnalisisProducto(
+                    producto_id=int(ids[i]),
+                    clase=self.CLASES[clases[i]],
+                    valor_movido=Decimal(int(valor[i])).scaleb(-2),
+                    unidades_salida=int(unidades[i]),
+                    rotacion=None if math.isnan(rotacion[i]) else round(float(rotacion[i]), 4),
+                    ultimo_movimiento=(
+                        None if ultimos[i] is None else ultimos[i].replace(tzinfo=dt_timezone.utc)
+                    ),
+                    calculado=ahora,
+                )
+                for i in range(inicio, fin)
+            ]
+            with transaction.atomic():
+                AnalisisProducto.objects.filter(
+                    producto_id__gte=int(ids[inicio]), producto_id__lte=int(ids[fin - 1])
+                ).delete()
+                AnalisisProducto.objects.bulk_create(filas, batch_size=1000)
+        
+        total = int(valor.sum())
+        resumen = {
+            'calculado': ahora,
+            'parametros': parametros,
+            'productos': len(ids),
+            'valor_movido': Decimal(total).scaleb(-2),
+            'clases': {
+                clase: {
+                    'productos': int((clases == indice).sum()),
+                    'valor_movido': Decimal(int(valor[clases == indice].sum())).scaleb(-2),
+                    'porcentaje_valor': round(100 * int(valor[clases == indice].sum()) / total, 1) if total else 0,
+                }
+                for indice, clase in enumerate(self.CLASES)
+            },
+        }
+        logger.info(
+            f"Análisis ABC calculado: {len(ids)} productos "
+            f"(A={resumen['clases']['A']['productos']}, B={resumen['clases']['B']['productos']})"
+        )
+        return resumen
+    
+    def obtener_resumen(self) -> Dict[str, Any]:
+        """
+        Resumen por clase del último cálculo, agregado en cada llamada desde
+        la tabla materializada (un GROUP BY por clase). No se cachea: así
+        todos los procesos ven el cálculo apenas termina, sin importar
+        dónde corrió 'calcular_analisis'.
+        """
+        filas = {
+            fila['clase']: fila
+            for fila in AnalisisProducto.objects.values('clase').annotate(
+                productos=Count('producto'), valor=Sum('valor_movido'), calculado=Max('calculado')
+            )
+        }
+        total = sum((fila['valor'] for fila in filas.values()), Decimal('0'))
+        resumen = {
+            'calculado': max((fila['calculado'] for fila in filas.values()), default=None),
+            'parametros': self._parametros(),
+            'productos': sum(fila['productos'] for fila in filas.values()),
+            'valor_movido': total,
+            'clases': {
+                clase: {
+                    'productos': filas.get(clase, {}).get('productos', 0),
+                    'valor_movido': filas.get(clase, {}).get('valor', Decimal('0')),
+                    'porcentaje_valor': (
+                        round(float(100 * filas[clase]['valor'] / total), 1)
+                        if total and clase in filas else 0
+                    ),
+                }
+                for clase in self.CLASES
+            },
+        }
+        return resumen
+    
+    def listar(self, clase: Optional[str] = None, orden: str = 'valor'):
+        """
+        Análisis materializado por producto.
+        
+        Args:
+            clase: Filtrar por clase 'A', 'B' o 'C' (opcional)
+            orden: 'valor' (mayor valor movido), 'rotacion' (mayor rotación)
+                o 'inactividad' (más tiempo sin movimientos)
+            
+        Returns:
+            QuerySet de AnalisisProducto con su producto
+            
+        Raises:
+            ValidationError: Si la clase o el orden no son válidos
+        """
+        if orden not in self.ORDENES:
+            raise ValidationError(
+                f"Orden inválido. Valores permitidos: {', '.join(self.ORDENES)}"
+            )
+        queryset = AnalisisProducto.objects.select_related('producto')
+        if clase is not None:
+            if clase not in self.CLASES:
+                raise ValidationError(
+                    f"Clase inválida. Valores permitidos: {', '.join(self.CLASES)}"
+                )
+            queryset = queryset.filter(clase=clase)
+        return queryset.order_by(*self.ORDENES[orden])
+
+
+class TableroService:
+    """
+    Resumen del tablero (dashboard) en una sola llamada, leído de los
+    agregados mantenidos en lugar de recorrer productos y movimientos:
+    
+    - productos, unidades y valor: fragmentos de ValorInventario (deltas)
+    - bajo stock: conteo y primeros productos por el índice de cantidad
+    - entradas/salidas de hoy: resumen diario más la cola de movimientos
+      posteriores a su marca de agua (aún no resumidos)
+    - últimos movimientos: índice por fecha
+    
+    La respuesta completa se cachea STOCK_TABLERO_CACHE_TTL segundos, de modo
+    que refrescos seguidos de varios clientes no llegan a la base de datos.
+    """
+    
+    CLAVE_CACHE = 'stock:tablero'
+    
+    def resumen(self, ultimos: int = 10, umbral: int = 10) -> Dict[str, Any]:
+        """
+        Arma (o devuelve de caché) el resumen del tablero.
+        
+        Args:
+            ultimos: Cantidad de movimientos recientes (y de productos con
+                bajo stock) a incluir
+            umbral: Stock por debajo del cual un producto está bajo stock
+            
+        Returns:
+            Dict con totales, bajo stock, movimientos de hoy y últimos movimientos
+        """
+        ttl = getattr(settings, 'STOCK_TABLERO_CACHE_TTL', 5)
+        clave = f'{self.CLAVE_CACHE}:{ultimos}:{umbral}'
+        if ttl:
+            resultado = cache.get(clave)
+            if resultado is not None:
+                return resultado
+        
+        alias = alias_lectura()
+        totales = ValoracionService().obtener_totales()
+        bajo_stock = StockItem.objects.using(alias).filter(cantidad__lt=umbral)
+        hoy = timezone.localdate()
+        
+        resultado = {
+            'generado': timezone.now(),
+            'productos': totales['productos'],
+            'unidades': totales['unidades'],
+            'valor_total': totales['valor'],
+            'bajo_stock': {
+                'umbral': umbral,
+                'total': bajo_stock.count(),
+                'productos': list(
+                    bajo_stock.order_by('cantidad', 'id').values('id', 'codigo', 'nombre', 'cantidad')[:ultimos]
+                ),
+            },
+            'hoy': {'fecha': hoy, **self._movimientos_del_dia(hoy, alias)},
+            'ultimos_movimientos': list(
+                Movimiento.objects.using(alias)
+                .order_by('-fecha', '-hora', '-id')
+                .values(
+                    'id', 'tipo', 'producto_id', 'cantidad', 'fecha', 'hora', 'ubicacion_id',
+                    producto_nombre=F('producto__nombre'),
+                )[:ultimos]
+            ),
+        }
+        if ttl:
+            cache.set(clave, resultado, ttl)
+        return resultado
+    
+    @staticmethod
+    def _movimientos_del_dia(dia: date, alias: str) -> Dict[str, int]:
+        """
+        Entradas y salidas de un día: lo ya resumido en ResumenMovimientoDia
+        más los movimientos del día con ID posterior a la marca de agua. Va en
+        una sola sentencia (UNION ALL) para que la marca leída sea la misma en
+        ambas partes aunque el proceso de resúmenes avance entre medio.
+        """
+        marca = Coalesce(
+            Subquery(
+                MarcaDeAgua.objects.filter(nombre=ResumenMovimientosService.MARCA).values('ultimo_id')[:1]
+            ),
+            0,
+        )
+        inicio = timezone.make_aware(datetime.combine(dia, time.min), timezone.get_current_timezone())
+        resumido = (
+            ResumenMovimientoDia.objects.using(alias)
+            .filter(periodo=dia)
+            .values('tipo')
+            .annotate(total=Sum('cantidad_total'))
+        )
+        pendiente = (
+            Movimiento.objects.using(alias)
+            .filter(fecha__gte=inicio, fecha__lt=inicio + timedelta(days=1), id__gt=marca)
+            .values('tipo')
+            .annotate(total=Sum('cantidad'))
+        )
+        totales = {'entrada': 0, 'salida': 0}
+        for fila in resumido.union(pendiente, all=True):
+            if fila['tipo'] in totales:
+                totales[fila['tipo']] += fila['total'] or 0
+        return {'entradas': totales['entrada'], 'salidas': totales['salida']}
+
+
 class AdministradorService:
     """
     Servicio para manejar operaciones de administradores.
@@ -354,5 +2000,7 @@ class AdministradorService:
             admin.is_staff = is_staff
             admin.save()
         
+        # Puede haber un "no existe" cacheado para este ID
+        invalidar_usuario(admin.pk)
         logger.info(f"Administrador creado: {username}")
         return admin
\ No newline at end of file
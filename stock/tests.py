@@ -3,22 +3,32 @@ Test Suite - Pruebas unitarias y de integración
 Cobertura completa de funcionalidad del sistema de inventario
 """
 
+from datetime import date, timedelta
 from decimal import Decimal
-from django.test import TestCase
+from django.db.models import Count, Max, Min, Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
 from django.core.exceptions import ValidationError
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from django.urls import reverse
 
-from .models import StockItem, Movimiento, Administrador
+from .models import (
+    StockItem, Movimiento, Administrador, ResumenMovimientoDia, CambioProducto,
+    Ubicacion, StockUbicacion, MarcaDeAgua, ValorInventario,
+)
 from .services import (
     StockService, 
     MovimientoService, 
     AdministradorService,
+    ResumenMovimientosService,
+    ValoracionService,
     StockInsuficienteError,
-    ProductoNoEncontradoError
+    ProductoNoEncontradoError,
+    ExistenciasService,
+    ConflictoDeVersionError
 )
-from .validators import StockValidator, MovimientoValidator, AdministradorValidator
+from .validators import StockValidator, MovimientoValidator, AdministradorValidator, ValidatorFactory
 
 
 # ==============================================================================
@@ -404,4 +414,2369 @@ class AuthenticationAPITest(APITestCase):
         url = reverse('stockitem-list')
         response = self.client.get(url)
         
-        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+# ==============================================================================
+# TESTS DE FORMATOS DE RESPUESTA
+# ==============================================================================
+
+class FormatosRespuestaTest(APITestCase):
+    """Pruebas de negociación MessagePack / JSON columnar"""
+    
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        self.client = APIClient()
+        StockItem.objects.create(nombre="Producto A", precio=Decimal("10.00"), cantidad=5)
+        StockItem.objects.create(nombre="Producto B", precio=Decimal("20.00"), cantidad=7)
+    
+    def test_listado_msgpack(self):
+        """Test: Accept: application/msgpack devuelve MessagePack"""
+        import msgpack
+        response = self.client.get(
+            reverse('stockitem-list'), HTTP_ACCEPT='application/msgpack'
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        datos = msgpack.unpackb(response.content, raw=False)
+        self.assertEqual(len(datos['results']), 2)
+    
+    def test_listado_columnar(self):
+        """Test: JSON columnar devuelve un arreglo por campo"""
+        import json
+        response = self.client.get(
+            reverse('stockitem-list'),
+            HTTP_ACCEPT='application/vnd.stock.columnar+json'
+        )
+        
+        datos = json.loads(response.content)
+        self.assertEqual(
+            sorted(datos['results']['nombre']), ['Producto A', 'Producto B']
+        )
+        self.assertEqual(len(datos['results']['cantidad']), 2)
+    
+    def test_columnar_sin_filas_de_objetos(self):
+        """Test: Listas que no son de objetos se devuelven como JSON normal"""
+        import json
+        from .renderers import ColumnarJSONRenderer
+        renderer = ColumnarJSONRenderer()
+        
+        for datos in (['Error de validación'], {'results': [1, 2], 'next': None}, [{'id': 1}, 'x']):
+            self.assertEqual(json.loads(renderer.render(datos)), datos)
+        self.assertEqual(json.loads(renderer.render([{'id': 1}, {'id': 2}])), {'id': [1, 2]})
+        
+        # Resultado de un trabajo que es una lista de valores sueltos
+        from .models import Trabajo
+        trabajo = Trabajo.objects.create(tipo='verificar_valoracion', estado='completado', resultado=[3, 'x'])
+        admin = Administrador.objects.create_superuser(username='admin', password='admin123')
+        self.client.force_authenticate(user=admin)
+        response = self.client.get(reverse('trabajo-resultado', args=[trabajo.pk]), {'format': 'columnar'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content), [3, 'x'])
+    
+    def test_crear_producto_msgpack(self):
+        """Test: POST con Content-Type application/msgpack crea producto"""
+        import msgpack
+        cuerpo = msgpack.packb({'nombre': 'Producto C', 'precio': '5.00', 'cantidad': 3})
+        response = self.client.post(
+            reverse('stockitem-list'), cuerpo, content_type='application/msgpack'
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(StockItem.objects.filter(nombre='Producto C').exists())
+    
+    def test_columnas_de_distinta_longitud(self):
+        """Test: El parser columnar rechaza columnas desiguales"""
+        from rest_framework.exceptions import ParseError
+        from .parsers import columnas_a_filas
+        with self.assertRaises(ParseError):
+            columnas_a_filas({'nombre': ['a', 'b'], 'cantidad': [1]})
+
+
+# ==============================================================================
+# TESTS DE PAGINACIÓN
+# ==============================================================================
+
+class PaginacionSinConteoTest(APITestCase):
+    """Pruebas para PaginacionSinConteo"""
+    
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        from django.core.cache import cache
+        cache.clear()
+        self.client = APIClient()
+        for i in range(5):
+            StockItem.objects.create(
+                nombre=f"Producto {i}", precio=Decimal("10.00"), cantidad=i
+            )
+    
+    def test_sin_conteo_por_defecto(self):
+        """Test: Por defecto no se ejecuta COUNT(*) y count es null"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        url = reverse('stockitem-list')
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url, {'page_size': 2})
+        
+        self.assertIsNone(response.data['count'])
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+        self.assertFalse(
+            any('COUNT(' in q['sql'].upper() for q in consultas.captured_queries)
+        )
+    
+    def test_ultima_pagina_sin_siguiente(self):
+        """Test: La última página no tiene enlace siguiente"""
+        url = reverse('stockitem-list')
+        response = self.client.get(url, {'page_size': 2, 'page': 3})
+        
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+        self.assertIsNotNone(response.data['previous'])
+    
+    def test_conteo_exacto_opcional(self):
+        """Test: ?conteo=exacto devuelve el total"""
+        url = reverse('stockitem-list')
+        response = self.client.get(url, {'conteo': 'exacto'})
+        
+        self.assertEqual(response.data['count'], 5)
+    
+    def test_conteo_estimado_cacheado(self):
+        """Test: ?conteo=estimado reutiliza el conteo cacheado"""
+        url = reverse('stockitem-list')
+        primera = self.client.get(url, {'conteo': 'estimado'})
+        StockItem.objects.create(nombre="Nuevo", precio=Decimal("1.00"), cantidad=1)
+        segunda = self.client.get(url, {'conteo': 'estimado'})
+        
+        self.assertEqual(primera.data['count'], 5)
+        self.assertEqual(segunda.data['count'], 5)
+    
+    def test_pagina_fuera_de_rango(self):
+        """Test: Una página vacía más allá del final devuelve 404"""
+        url = reverse('stockitem-list')
+        response = self.client.get(url, {'page': 50})
+        
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+# ==============================================================================
+# TESTS DE RESÚMENES DE MOVIMIENTOS
+# ==============================================================================
+
+@override_settings(STOCK_HUECOS_ESPERA_SEGUNDOS=0)
+class ResumenMovimientosServiceTest(TestCase):
+    """Pruebas para ResumenMovimientosService"""
+    
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        self.service = ResumenMovimientosService()
+        self.producto = StockItem.objects.create(
+            nombre="Producto Test", precio=Decimal("10.00"), cantidad=100
+        )
+        Movimiento.objects.create(producto=self.producto, tipo='entrada', cantidad=10)
+        Movimiento.objects.create(producto=self.producto, tipo='entrada', cantidad=5)
+        Movimiento.objects.create(producto=self.producto, tipo='salida', cantidad=3)
+    
+    def test_ponerse_al_dia_agrega_por_tipo(self):
+        """Test: Los resúmenes diarios agregan por producto y tipo"""
+        procesados = self.service.ponerse_al_dia()
+        
+        self.assertEqual(procesados, 3)
+        entrada = ResumenMovimientoDia.objects.get(producto=self.producto, tipo='entrada')
+        self.assertEqual(entrada.cantidad_total, 15)
+        self.assertEqual(entrada.num_movimientos, 2)
+    
+    def test_ponerse_al_dia_es_incremental(self):
+        """Test: Una segunda pasada solo procesa movimientos nuevos"""
+        self.service.ponerse_al_dia()
+        Movimiento.objects.create(producto=self.producto, tipo='salida', cantidad=2)
+        
+        self.assertEqual(self.service.ponerse_al_dia(), 1)
+        salida = ResumenMovimientoDia.objects.get(producto=self.producto, tipo='salida')
+        self.assertEqual(salida.cantidad_total, 5)
+    
+    def test_acumular_solo_lee_los_productos_del_lote(self):
+        """Test: Los resúmenes existentes se leen acotados a los productos del lote"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        otro = StockItem.objects.create(nombre="Otro", precio=Decimal("1.00"), cantidad=1)
+        Movimiento.objects.create(producto=otro, tipo='salida', cantidad=4)
+        self.service.ponerse_al_dia()
+        Movimiento.objects.create(producto=self.producto, tipo='salida', cantidad=2)
+        
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.service.ponerse_al_dia(), 1)
+        
+        tabla = ResumenMovimientoDia._meta.db_table
+        lecturas = [
+            q['sql'] for q in consultas.captured_queries
+            if q['sql'].startswith('SELECT') and f'FROM "{tabla}"' in q['sql']
+        ]
+        self.assertEqual(len(lecturas), 1)
+        self.assertIn('"producto_id" IN', lecturas[0])
+        self.assertEqual(ResumenMovimientoDia.objects.get(producto=self.producto, tipo='salida').cantidad_total, 5)
+        self.assertEqual(ResumenMovimientoDia.objects.get(producto=otro, tipo='salida').cantidad_total, 4)
+    
+    def test_reconstruir_no_duplica(self):
+        """Test: Reconstruir deja los mismos totales"""
+        self.service.ponerse_al_dia()
+        self.service.reconstruir()
+        
+        entrada = ResumenMovimientoDia.objects.get(producto=self.producto, tipo='entrada')
+        self.assertEqual(entrada.cantidad_total, 15)
+    
+    def test_reporte_api_por_tienda(self):
+        """Test: GET /api/reportes/movimientos/ totaliza la tienda"""
+        StockItem.objects.create(nombre="Otro", precio=Decimal("1.00"), cantidad=1)
+        otro = StockItem.objects.get(nombre="Otro")
+        Movimiento.objects.create(producto=otro, tipo='salida', cantidad=4)
+        self.service.ponerse_al_dia()
+        
+        response = self.client.get(
+            reverse('reporte-movimientos-list'),
+            {'agrupar': 'tienda', 'granularidad': 'hora'}
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        salidas = [f for f in response.data['resultados'] if f['tipo'] == 'salida']
+        self.assertEqual(sum(f['cantidad'] for f in salidas), 7)
+    
+    def test_reporte_api_no_escribe(self):
+        """Test: El GET del reporte solo lee los resúmenes (no los pone al día)"""
+        response = self.client.get(reverse('reporte-movimientos-list'))
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['resultados'], [])
+        self.assertFalse(ResumenMovimientoDia.objects.exists())
+    
+    @override_settings(STOCK_HUECOS_ESPERA_SEGUNDOS=90)
+    def test_marca_no_pasa_un_hueco_reciente(self):
+        """Test: Un ID sin confirmar detiene la marca hasta que vence la espera"""
+        primero, hueco, ultimo = Movimiento.objects.order_by('id')
+        MarcaDeAgua.objects.create(nombre=ResumenMovimientosService.MARCA, ultimo_id=primero.id - 1)
+        # La fila del medio aún no es visible: transacción abierta
+        hueco.delete()
+        
+        self.assertEqual(self.service.ponerse_al_dia(), 1)
+        Movimiento.objects.filter(pk=ultimo.pk).update(fecha=timezone.now() - timedelta(seconds=120))
+        self.assertEqual(self.service.ponerse_al_dia(), 1)
+        salida = ResumenMovimientoDia.objects.get(producto=self.producto, tipo='salida')
+        self.assertEqual(salida.cantidad_total, 3)
+    
+    def test_conciliar_recupera_lo_saltado(self):
+        """Test: La conciliación suma un movimiento que confirmó por debajo de la marca"""
+        self.service.ponerse_al_dia()
+        tardio = Movimiento.objects.create(producto=self.producto, tipo='salida', cantidad=7)
+        marca = MarcaDeAgua.objects.get(nombre=ResumenMovimientosService.MARCA)
+        marca.ultimo_id = tardio.id
+        marca.save()
+        
+        self.assertEqual(self.service.conciliar(dias=1), 4)
+        salida = ResumenMovimientoDia.objects.get(producto=self.producto, tipo='salida')
+        self.assertEqual((salida.cantidad_total, salida.num_movimientos), (10, 2))
+        entrada = ResumenMovimientoDia.objects.get(producto=self.producto, tipo='entrada')
+        self.assertEqual(entrada.cantidad_total, 15)
+    
+    @override_settings(
+        STOCK_RESUMEN_INTERVALO=60, STOCK_RESUMEN_CONCILIACION_INTERVALO=0, STOCK_TRABAJOS_PURGA_INTERVALO=0
+    )
+    def test_trabajador_programa_los_resumenes(self):
+        """Test: La tarea periódica se encola una vez por intervalo y pone al día los resúmenes"""
+        from . import trabajos
+        
+        encolados = trabajos.programar_periodicas()
+        self.assertEqual([trabajo.tipo for trabajo in encolados], ['actualizar_resumenes'])
+        self.assertEqual(trabajos.programar_periodicas(), [])
+        
+        trabajo = trabajos.ejecutar(trabajos.tomar('test'))
+        self.assertEqual((trabajo.estado, trabajo.resultado), ('completado', {'resumidos': 3}))
+        self.assertEqual(trabajos.programar_periodicas(), [])
+    
+    def test_reporte_granularidad_invalida(self):
+        """Test: Granularidad desconocida devuelve 400"""
+        response = self.client.get(
+            reverse('reporte-movimientos-list'), {'granularidad': 'semana'}
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+# ==============================================================================
+# TESTS DE VALORACIÓN DE INVENTARIO
+# ==============================================================================
+
+class ValoracionTest(APITestCase):
+    """Pruebas para el valor de inventario mantenido por deltas"""
+    
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        self.client = APIClient()
+        self.service = ValoracionService()
+        response = self.client.post(
+            reverse('stockitem-list'),
+            {'nombre': 'Producto', 'precio': '10.00', 'cantidad': 5},
+            format='json'
+        )
+        self.producto = StockItem.objects.get(pk=response.data['id'])
+    
+    def assertSinDeriva(self):
+        self.assertEqual(self.service.obtener_total(), self.service.recalcular_total())
+    
+    def test_crear_producto_suma_valor(self):
+        """Test: Crear un producto suma precio * cantidad"""
+        self.assertEqual(self.service.obtener_total(), Decimal("50.00"))
+    
+    def test_operaciones_mantienen_valor(self):
+        """Test: Restar, reponer, editar y borrar mantienen el total sin deriva"""
+        self.client.put(reverse('stockitem-subtract-stock', args=[self.producto.id]), {'cantidad': 2})
+        self.assertSinDeriva()
+        self.client.put(reverse('stockitem-restock', args=[self.producto.id]), {'cantidad': 4})
+        self.assertSinDeriva()
+        self.client.patch(
+            reverse('stockitem-detail', args=[self.producto.id]),
+            {'precio': '12.50', 'cantidad': 3}, format='json'
+        )
+        self.assertSinDeriva()
+        StockService().agregar_stock(self.producto.id, 1)
+        self.assertSinDeriva()
+        self.client.delete(reverse('stockitem-detail', args=[self.producto.id]))
+        self.assertEqual(self.service.obtener_total(), Decimal("0.00"))
+    
+    def test_fragmento_inexistente_se_crea_con_el_delta(self):
+        """Test: Si falta el fragmento elegido se crea en el momento, sin perder el delta"""
+        ValorInventario.objects.all().delete()
+        ValorInventario.objects.create(fragmento=0, valor_total=Decimal("50.00"), unidades=5, productos=1)
+        
+        for _ in range(10):
+            self.client.put(reverse('stockitem-restock', args=[self.producto.id]), {'cantidad': 1})
+        
+        self.assertSinDeriva()
+        self.assertEqual(self.service.obtener_totales()['unidades'], 15)
+        self.assertGreater(ValorInventario.objects.count(), 1)
+    
+    def test_verificar_detecta_y_corrige_deriva(self):
+        """Test: verificar reporta la deriva y la corrige"""
+        StockItem.objects.filter(pk=self.producto.pk).update(cantidad=6)
+        
+        resultado = self.service.verificar(corregir=True)
+        
+        self.assertEqual(resultado['deriva'], Decimal("-10.00"))
+        self.assertTrue(resultado['corregido'])
+        self.assertSinDeriva()
+    
+    def test_endpoint_valoracion(self):
+        """Test: GET /api/valoracion/ devuelve total y desglose"""
+        response = self.client.get(reverse('valoracion-list'))
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['valor_total'], Decimal("50.00"))
+        self.assertEqual(response.data['results'][0]['valor'], Decimal("50.00"))
+
+
+# ==============================================================================
+# TESTS DE PIPELINES DE VALIDACIÓN Y OPERACIONES POR LOTE
+# ==============================================================================
+
+class ValidationPipelineTest(TestCase):
+    """Pruebas para los pipelines precompilados de ValidatorFactory"""
+    
+    def test_pipeline_compartido(self):
+        """Test: El pipeline se construye una sola vez"""
+        self.assertIs(
+            ValidatorFactory.pipeline('producto'), ValidatorFactory.pipeline('producto')
+        )
+    
+    def test_validate_convierte_valores(self):
+        """Test: validate devuelve los valores convertidos"""
+        limpio = ValidatorFactory.pipeline('ajuste').validate(
+            {'id': '3', 'tipo': 'salida', 'cantidad': '4'}
+        )
+        self.assertEqual(limpio, {'id': 3, 'tipo': 'salida', 'cantidad': 4})
+    
+    def test_validate_batch_errores_por_fila(self):
+        """Test: validate_batch recoge errores por fila sin detenerse"""
+        resultado = ValidatorFactory.pipeline('ajuste').validate_batch([
+            {'id': 1, 'tipo': 'entrada', 'cantidad': 5},
+            {'id': 2, 'tipo': 'invalido', 'cantidad': -1},
+            {'tipo': 'salida', 'cantidad': 1},
+        ])
+        
+        self.assertEqual([indice for indice, _ in resultado.validos], [0])
+        self.assertEqual(set(resultado.errores[1]), {'tipo', 'cantidad'})
+        self.assertIn('id', resultado.errores[2])
+    
+    def test_validate_batch_rechaza_valores_no_numericos_por_fila(self):
+        """Test: NaN, Infinity, "--5" y dígitos no ASCII son errores de fila, no excepciones"""
+        productos = ValidatorFactory.pipeline('producto').validate_batch([
+            {'nombre': 'A', 'precio': 'NaN'},
+            {'nombre': 'B', 'precio': 'sNaN'},
+            {'nombre': 'C', 'precio': 'Infinity'},
+            {'nombre': 'D', 'precio': '1.00', 'cantidad': '--5'},
+            {'nombre': 'E', 'precio': '1.00', 'cantidad': '²'},
+            {'nombre': 'F', 'precio': '1.00', 'cantidad': '-3'},
+        ])
+        self.assertEqual(productos.validos, [])
+        self.assertEqual(set(productos.errores), {0, 1, 2, 3, 4, 5})
+        self.assertIn('precio', productos.errores[1])
+        self.assertIn('cantidad', productos.errores[4])
+        
+        ajustes = ValidatorFactory.pipeline('ajuste').validate_batch([
+            {'id': '²', 'tipo': 'entrada', 'cantidad': 1},
+            {'id': '-1', 'tipo': 'entrada', 'cantidad': 1},
+            {'id': '7', 'tipo': 'entrada', 'cantidad': '--5'},
+            {'id': '7', 'tipo': 'entrada', 'cantidad': '5'},
+        ])
+        self.assertEqual([indice for indice, _ in ajustes.validos], [3])
+        self.assertIn('id', ajustes.errores[0])
+        self.assertIn('id', ajustes.errores[1])
+        self.assertIn('cantidad', ajustes.errores[2])
+    
+    def test_validar_precio_no_finito(self):
+        """Test: validar_precio rechaza NaN e infinito con ValidationError"""
+        validator = StockValidator()
+        for precio in (Decimal('NaN'), Decimal('sNaN'), float('inf')):
+            with self.assertRaises(ValidationError):
+                validator.validar_precio(precio)
+    
+    def test_pipeline_inexistente(self):
+        """Test: Un pipeline desconocido lanza ValueError"""
+        with self.assertRaises(ValueError):
+            ValidatorFactory.pipeline('desconocido')
+
+
+class OperacionesPorLoteTest(APITestCase):
+    """Pruebas de importación y ajustes por lote"""
+    
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        self.client = APIClient()
+        self.producto = StockItem.objects.create(
+            codigo="SKU-1", nombre="Producto", precio=Decimal("10.00"), cantidad=10
+        )
+    
+    def test_importar_productos(self):
+        """Test: POST /api/stock/importar/ crea las filas válidas"""
+        response = self.client.post(reverse('stockitem-importar'), [
+            {'codigo': 'SKU-2', 'nombre': 'Nuevo', 'precio': '5.00', 'cantidad': '3'},
+            {'codigo': 'SKU-1', 'nombre': 'Duplicado', 'precio': '5.00'},
+            {'codigo': 'SKU-3', 'nombre': 'Sin precio'},
+        ], format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['creados'], 1)
+        self.assertEqual(set(response.data['errores']), {1, 2})
+        nuevo = StockItem.objects.get(codigo='SKU-2')
+        self.assertEqual(nuevo.movimientos.get().cantidad, 3)
+        self.assertEqual(ValoracionService().obtener_total(), Decimal("15.00"))
+    
+    def test_lotes_con_numeros_invalidos_dan_errores_por_fila(self):
+        """Test: precio NaN o cantidades como "--5" y "²" no provocan un 500"""
+        response = self.client.post(reverse('stockitem-importar'), [
+            {'codigo': 'SKU-N', 'nombre': 'NaN', 'precio': 'NaN'},
+            {'codigo': 'SKU-M', 'nombre': 'Doble signo', 'precio': '1.00', 'cantidad': '--5'},
+            {'codigo': 'SKU-O', 'nombre': 'Valido', 'precio': '1.00', 'cantidad': '2'},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['creados'], 1)
+        self.assertEqual(set(response.data['errores']), {0, 1})
+        
+        response = self.client.post(reverse('stockitem-ajustes'), {'ajustes': [
+            {'id': '²', 'tipo': 'entrada', 'cantidad': 1},
+            {'id': self.producto.id, 'tipo': 'entrada', 'cantidad': '--5'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.data['errores']), {0, 1})
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 10)
+    
+    def test_ajustar_lote(self):
+        """Test: POST /api/stock/ajustes/ aplica entradas y salidas"""
+        response = self.client.post(reverse('stockitem-ajustes'), {'ajustes': [
+            {'id': self.producto.id, 'tipo': 'salida', 'cantidad': 4},
+            {'id': self.producto.id, 'tipo': 'entrada', 'cantidad': 1},
+            {'id': 99999, 'tipo': 'entrada', 'cantidad': 1},
+        ]}, format='json')
+        
+        self.assertEqual(response.data['aplicados'], 2)
+        self.assertIn(2, response.data['errores'])
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 7)
+        self.assertEqual(Movimiento.objects.filter(producto=self.producto).count(), 2)
+    
+    def test_ajustar_lote_todo_o_nada(self):
+        """Test: Con todo_o_nada un error impide aplicar el lote"""
+        response = self.client.post(reverse('stockitem-ajustes'), {
+            'todo_o_nada': True,
+            'ajustes': [
+                {'id': self.producto.id, 'tipo': 'entrada', 'cantidad': 5},
+                {'id': self.producto.id, 'tipo': 'salida', 'cantidad': 500},
+            ],
+        }, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 10)
+
+
+# ==============================================================================
+# TESTS DE UNIDAD DE TRABAJO
+# ==============================================================================
+
+class UnidadDeTrabajoTest(TestCase):
+    """Pruebas para UnidadDeTrabajo"""
+    
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        self.producto = StockItem.objects.create(
+            nombre="Producto Test", precio=Decimal("10.00"), cantidad=100
+        )
+    
+    def test_combina_escrituras(self):
+        """Test: Varios cambios del mismo producto generan un UPDATE y un INSERT"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .unit_of_work import UnidadDeTrabajo
+        
+        with CaptureQueriesContext(connection) as consultas:
+            with UnidadDeTrabajo() as uow:
+                for _ in range(3):
+                    self.producto.cantidad -= 1
+                    uow.registrar_cambio(self.producto, 'cantidad')
+                    uow.registrar_movimiento(self.producto, 'salida', 1)
+        
+        # El INSERT del registro de cambios (feed de sincronización) va aparte
+        sentencias = [
+            q['sql'] for q in consultas.captured_queries
+            if q['sql'].startswith(('UPDATE', 'INSERT')) and 'stock_cambioproducto' not in q['sql']
+        ]
+        self.assertEqual(len(sentencias), 2)
+        self.assertEqual(uow.reporte()['sentencias_ahorradas'], 4)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 97)
+        self.assertEqual(Movimiento.objects.count(), 3)
+    
+    def test_excepcion_no_escribe(self):
+        """Test: Si la unidad falla no se escribe nada"""
+        from .unit_of_work import UnidadDeTrabajo
+        
+        with self.assertRaises(RuntimeError):
+            with UnidadDeTrabajo() as uow:
+                self.producto.cantidad = 1
+                uow.registrar_cambio(self.producto, 'cantidad')
+                uow.registrar_movimiento(self.producto, 'salida', 99)
+                raise RuntimeError("fallo")
+        
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 100)
+        self.assertFalse(Movimiento.objects.exists())
+    
+    def test_servicios_comparten_unidad(self):
+        """Test: Servicios llamados dentro de una unidad escriben al final"""
+        from .unit_of_work import UnidadDeTrabajo
+        
+        with UnidadDeTrabajo() as uow:
+            StockService().restar_stock(self.producto.id, 10)
+            StockService().agregar_stock(self.producto.id, 4)
+            self.assertFalse(Movimiento.objects.exists())
+        
+        self.assertEqual(len(uow.movimientos_creados), 2)
+        self.assertEqual(uow.reporte()['transacciones_anidadas_evitadas'], 4)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 94)
+    
+    def test_bloquear_relee_la_copia_sin_bloqueo(self):
+        """Test: Pedir bloqueo de un producto leído sin bloqueo lo relee con FOR UPDATE"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .unit_of_work import UnidadDeTrabajo
+        
+        with UnidadDeTrabajo() as uow:
+            sin_bloqueo = uow.obtener_producto(self.producto.id, bloquear=False)
+            # Otro proceso escribe entre la lectura y el bloqueo
+            StockItem.objects.filter(pk=self.producto.id).update(cantidad=80, version=2)
+            
+            bloqueado = uow.obtener_producto(self.producto.id)
+            self.assertIsNot(bloqueado, sin_bloqueo)
+            self.assertEqual((bloqueado.cantidad, bloqueado.version), (80, 2))
+            with CaptureQueriesContext(connection) as consultas:
+                self.assertIs(uow.obtener_producto(self.producto.id), bloqueado)
+                self.assertIs(uow.obtener_producto(self.producto.id, bloquear=False), bloqueado)
+            self.assertEqual(consultas.captured_queries, [])
+    
+    def test_ajuste_todo_o_nada_no_revierte_la_unidad_externa(self):
+        """Test: Un lote todo_o_nada rechazado dentro de una unidad solo revierte el lote"""
+        from .unit_of_work import UnidadDeTrabajo
+        otro = StockItem.objects.create(nombre="Otro", precio=Decimal("1.00"), cantidad=5)
+        
+        with UnidadDeTrabajo():
+            StockService().restar_stock(self.producto.id, 10)
+            resultado = StockService().ajustar_lote(
+                [{'id': otro.id, 'tipo': 'entrada', 'cantidad': 3},
+                 {'id': otro.id, 'tipo': 'salida', 'cantidad': 100}],
+                todo_o_nada=True,
+            )
+        
+        self.assertEqual(resultado['aplicados'], 0)
+        self.producto.refresh_from_db()
+        otro.refresh_from_db()
+        self.assertEqual((self.producto.cantidad, otro.cantidad), (90, 5))
+        self.assertEqual(Movimiento.objects.filter(producto=self.producto).count(), 1)
+    
+    def test_actualizacion_api_sin_doble_lectura(self):
+        """Test: PATCH lee el producto una vez y escribe solo campos cambiados"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        url = reverse('stockitem-detail', args=[self.producto.id])
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.patch(
+                url, {'cantidad': 90, 'precio': '12.00'}, content_type='application/json'
+            )
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        sql = [q['sql'] for q in consultas.captured_queries]
+        self.assertEqual(
+            len([q for q in sql if q.startswith('SELECT') and 'stock_stockitem' in q]), 1
+        )
+        update = next(q for q in sql if q.startswith('UPDATE "stock_stockitem"'))
+        self.assertNotIn('"nombre"', update)
+        self.assertEqual(Movimiento.objects.filter(producto=self.producto).count(), 2)
+
+
+# ==============================================================================
+# TESTS DE CONCURRENCIA OPTIMISTA
+# ==============================================================================
+
+class ConcurrenciaOptimistaTest(APITestCase):
+    """Pruebas para el control de versión de StockItem"""
+    
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        self.producto = StockItem.objects.create(
+            nombre="Producto Test", precio=Decimal("10.00"), cantidad=100
+        )
+        self.url = reverse('stockitem-detail', args=[self.producto.id])
+    
+    def test_get_devuelve_etag(self):
+        """Test: El detalle incluye la versión como ETag"""
+        response = self.client.get(self.url)
+        
+        self.assertEqual(response['ETag'], '"1"')
+        self.assertEqual(response.data['version'], 1)
+    
+    def test_actualizacion_incrementa_version(self):
+        """Test: Cada escritura incrementa la versión y devuelve el nuevo ETag"""
+        response = self.client.patch(
+            self.url, {'cantidad': 90}, format='json', HTTP_IF_MATCH='"1"'
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], '"2"')
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.version, 2)
+        
+        StockService().restar_stock(self.producto.id, 5)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.version, 3)
+    
+    def test_if_match_desactualizado_devuelve_409(self):
+        """Test: Editar una versión anterior devuelve 409 y no escribe"""
+        StockService().restar_stock(self.producto.id, 5)
+        
+        response = self.client.patch(
+            self.url, {'cantidad': 50}, format='json', HTTP_IF_MATCH='"1"'
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 95)
+        self.assertEqual(Movimiento.objects.filter(tipo='entrada').count(), 0)
+    
+    def test_version_en_cuerpo(self):
+        """Test: La versión esperada también puede enviarse en el cuerpo"""
+        response = self.client.patch(
+            self.url, {'precio': '11.00', 'version': 7}, format='json'
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+    
+    def test_escritura_concurrente_detectada_al_escribir(self):
+        """Test: Si la fila cambia entre la lectura y el UPDATE no se pisa el cambio"""
+        from .unit_of_work import UnidadDeTrabajo
+        
+        with self.assertRaises(ConflictoDeVersionError):
+            with UnidadDeTrabajo() as uow:
+                item = uow.obtener_producto(self.producto.id, bloquear=False)
+                # Otro proceso escribe después de nuestra lectura
+                StockItem.objects.filter(pk=item.pk).update(cantidad=80, version=2)
+                item.cantidad = 50
+                uow.registrar_cambio(item, 'cantidad')
+                uow.registrar_movimiento(item, 'salida', 50)
+        
+        # Nada de la unidad se escribió (el UPDATE concurrente del test se
+        # revierte con ella porque comparte conexión)
+        self.producto.refresh_from_db()
+        self.assertNotEqual(self.producto.cantidad, 50)
+        self.assertFalse(Movimiento.objects.exists())
+    
+    def test_eliminar_con_version_desactualizada(self):
+        """Test: DELETE con If-Match desactualizado devuelve 409"""
+        admin = Administrador.objects.create_user(username="admin", password="admin123")
+        self.client.force_authenticate(user=admin)
+        
+        response = self.client.delete(self.url, HTTP_IF_MATCH='"3"')
+        
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertTrue(StockItem.objects.filter(pk=self.producto.id).exists())
+
+
+# ==============================================================================
+# TESTS DE EVENTOS EN TIEMPO REAL
+# ==============================================================================
+
+class EventosStockTest(APITestCase):
+    """Pruebas para la publicación de cambios y el stream SSE"""
+    
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        from .eventos import obtener_hub
+        self.hub = obtener_hub()
+        self.producto = StockItem.objects.create(
+            nombre="Producto Test", precio=Decimal("10.00"), cantidad=100
+        )
+    
+    def test_publica_al_confirmar(self):
+        """Test: Restar stock publica el nuevo nivel y el movimiento tras el COMMIT"""
+        suscripcion, _ = self.hub.suscribir()
+        self.addCleanup(self.hub.cancelar, suscripcion)
+        
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            StockService().restar_stock(self.producto.id, 10)
+        self.assertIsNone(suscripcion.siguiente(timeout=0))
+        
+        for callback in callbacks:
+            callback()
+        stock = suscripcion.siguiente(timeout=0)
+        movimiento = suscripcion.siguiente(timeout=0)
+        self.assertEqual((stock.tipo, stock.datos['cantidad']), ('stock', 90))
+        self.assertEqual((movimiento.tipo, movimiento.datos['cantidad']), ('movimiento', 10))
+    
+    def test_rollback_no_publica(self):
+        """Test: Una operación fallida no publica nada"""
+        suscripcion, _ = self.hub.suscribir()
+        self.addCleanup(self.hub.cancelar, suscripcion)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(StockInsuficienteError):
+                StockService().restar_stock(self.producto.id, 1000)
+        
+        self.assertIsNone(suscripcion.siguiente(timeout=0))
+    
+    @override_settings(STOCK_EVENTOS_DURACION_MAX=0)
+    def test_stream_reanuda_desde_last_event_id(self):
+        """Test: El stream reenvía los eventos posteriores a Last-Event-ID"""
+        primero = self.hub.publicar('stock', {'id': 1})
+        segundo = self.hub.publicar('stock', {'id': 2})
+        
+        response = self.client.get(reverse('eventos-stock'), HTTP_LAST_EVENT_ID=str(primero.id))
+        
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        cuerpo = b''.join(response.streaming_content).decode()
+        self.assertIn(f'id: {segundo.id}\n', cuerpo)
+        self.assertNotIn(f'id: {primero.id}\n', cuerpo)
+    
+    @override_settings(STOCK_EVENTOS_DURACION_MAX=0)
+    def test_cupo_de_streams_por_worker(self):
+        """Test: Con el cupo de streams lleno se responde 503 en lugar de ocupar otro hilo"""
+        from unittest import mock
+        
+        ocupados = [self.hub.suscribir()[0] for _ in range(2)]
+        for suscripcion in ocupados:
+            self.addCleanup(self.hub.cancelar, suscripcion)
+        
+        with mock.patch.object(self.hub, 'max_suscripciones', 2):
+            response = self.client.get(reverse('eventos-stock'))
+            self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+            self.assertIn('Retry-After', response)
+            
+            self.hub.cancelar(ocupados[0])
+            response = self.client.get(reverse('eventos-stock'))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            b''.join(response.streaming_content)
+        self.assertEqual(self.hub.metricas()['suscriptores'], 1)
+
+
+# ==============================================================================
+# TESTS DEL FEED DE CAMBIOS
+# ==============================================================================
+
+@override_settings(STOCK_HUECOS_ESPERA_SEGUNDOS=0)
+class FeedCambiosTest(APITestCase):
+    """Pruebas para la sincronización incremental (/api/cambios/)"""
+    
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        self.url = reverse('cambios-list')
+        self.service = StockService()
+        self.producto = self.service.crear_producto(
+            {'nombre': 'Producto A', 'precio': Decimal('10.00'), 'cantidad': 5}
+        )
+    
+    def test_sincronizacion_inicial_y_token(self):
+        """Test: Sin token se recibe todo; con el token devuelto, nada"""
+        response = self.client.get(self.url)
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([p['id'] for p in response.data['productos']], [self.producto.id])
+        self.assertFalse(response.data['hay_mas'])
+        
+        response = self.client.get(self.url, {'desde': response.data['token']})
+        self.assertEqual(response.data['productos'], [])
+        self.assertEqual(response.data['movimientos'], [])
+    
+    def test_solo_cambios_posteriores_compactados(self):
+        """Test: Tras el token llega el último estado de cada producto y los movimientos"""
+        token = self.client.get(self.url).data['token']
+        self.service.restar_stock(self.producto.id, 1)
+        self.service.restar_stock(self.producto.id, 2)
+        
+        response = self.client.get(self.url, {'desde': token})
+        
+        self.assertEqual(len(response.data['productos']), 1)
+        self.assertEqual(response.data['productos'][0]['cantidad'], 2)
+        self.assertEqual([m['cantidad'] for m in response.data['movimientos']], [1, 2])
+        self.assertEqual(CambioProducto.objects.filter(producto_id=self.producto.id).count(), 3)
+    
+    def test_baja_genera_lapida(self):
+        """Test: Eliminar un producto se informa en 'eliminados'"""
+        token = self.client.get(self.url).data['token']
+        admin = Administrador.objects.create_user(username="admin", password="admin123")
+        self.client.force_authenticate(user=admin)
+        self.client.delete(reverse('stockitem-detail', args=[self.producto.id]))
+        
+        response = self.client.get(self.url, {'desde': token})
+        
+        self.assertEqual(response.data['eliminados'], [self.producto.id])
+        self.assertEqual(response.data['productos'], [])
+    
+    def test_paginacion_por_limite(self):
+        """Test: Con limite se entrega por partes hasta hay_mas=false"""
+        for i in range(3):
+            self.service.crear_producto({'nombre': f'P{i}', 'precio': Decimal('1.00'), 'cantidad': 1})
+        
+        vistos, token, hay_mas = [], '', True
+        while hay_mas:
+            datos = self.client.get(self.url, {'desde': token, 'limite': 2}).data
+            vistos += [p['id'] for p in datos['productos']]
+            token, hay_mas = datos['token'], datos['hay_mas']
+        
+        self.assertEqual(len(vistos), 4)
+    
+    @override_settings(STOCK_HUECOS_ESPERA_SEGUNDOS=90)
+    def test_hueco_reciente_detiene_el_token(self):
+        """Test: Un seq/ID sin confirmar no queda por debajo del token hasta que vence la espera"""
+        token = self.client.get(self.url).data['token']
+        self.service.restar_stock(self.producto.id, 1)
+        self.service.restar_stock(self.producto.id, 2)
+        # La primera escritura aún no es visible: transacción abierta
+        CambioProducto.objects.order_by('seq').reverse()[1].delete()
+        Movimiento.objects.order_by('id').first().delete()
+        
+        response = self.client.get(self.url, {'desde': token})
+        self.assertEqual(response.data['token'], token)
+        self.assertEqual((response.data['productos'], response.data['movimientos']), ([], []))
+        self.assertFalse(response.data['hay_mas'])
+        
+        antes = timezone.now() - timedelta(seconds=120)
+        CambioProducto.objects.update(fecha=antes)
+        Movimiento.objects.update(fecha=antes)
+        response = self.client.get(self.url, {'desde': token})
+        self.assertEqual(response.data['productos'][0]['cantidad'], 2)
+        self.assertEqual([m['cantidad'] for m in response.data['movimientos']], [2])
+    
+    def test_token_invalido(self):
+        """Test: Un token mal formado devuelve 400"""
+        response = self.client.get(self.url, {'desde': 'abc'})
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+# ==============================================================================
+# TESTS DE AUTENTICACIÓN CACHEADA
+# ==============================================================================
+
+class AutenticacionCacheadaTest(APITestCase):
+    """Pruebas para CachedJWTAuthentication"""
+    
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        from .authentication import invalidar_usuario
+        invalidar_usuario()
+        self.admin = Administrador.objects.create_superuser(username="admin", password="admin123")
+        self.otro = Administrador.objects.create_superuser(username="otro", password="otro123")
+        self.url = reverse('metricas-list')
+    
+    def _autenticar(self, username, password):
+        response = self.client.post(
+            reverse('token_obtain_pair'), {'username': username, 'password': password}, format='json'
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+    
+    def test_segundo_request_sin_consultas(self):
+        """Test: Con la caché caliente autenticar no consulta la BD"""
+        self._autenticar('admin', 'admin123')
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+    
+    def test_baja_por_viewset_invalida_cache(self):
+        """Test: Eliminar un administrador por la API invalida su estado cacheado"""
+        self._autenticar('otro', 'otro123')
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        token_otro = self.client._credentials['HTTP_AUTHORIZATION']
+        
+        self._autenticar('admin', 'admin123')
+        self.client.delete(reverse('administrador-detail', args=[self.otro.id]))
+        
+        self.client.credentials(HTTP_AUTHORIZATION=token_otro)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+    
+    @override_settings(STOCK_AUTH_CACHE_TTL=0)
+    def test_estado_inactivo_tras_expirar(self):
+        """Test: Un usuario desactivado deja de autenticar al expirar la caché"""
+        self._autenticar('admin', 'admin123')
+        Administrador.objects.filter(pk=self.admin.pk).update(is_active=False)
+        
+        response = self.client.get(self.url)
+        
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+# ==============================================================================
+# TESTS DE LIMITACIÓN DE TASA Y DESCARTE DE CARGA
+# ==============================================================================
+
+class LimitacionCargaTest(APITestCase):
+    """Pruebas para el token bucket, la concurrencia por producto y el descarte"""
+    
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        from .throttling import _almacen_memoria, medidor_latencia
+        _almacen_memoria.limpiar()
+        medidor_latencia.reiniciar()
+        self.addCleanup(_almacen_memoria.limpiar)
+        self.addCleanup(medidor_latencia.reiniciar)
+        self.producto = StockItem.objects.create(
+            nombre="Producto Test", precio=Decimal("10.00"), cantidad=100
+        )
+        self.url = reverse('stockitem-restock', args=[self.producto.id])
+    
+    @override_settings(STOCK_LIMITES_TASA={'lectura': (100, 10.0), 'escritura': (2, 0.01)})
+    def test_bucket_vacio_devuelve_429(self):
+        """Test: Agotada la ráfaga se responde 429 con Retry-After"""
+        for _ in range(2):
+            response = self.client.put(self.url, {'cantidad': 1}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        response = self.client.put(self.url, {'cantidad': 1}, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertGreater(int(response['Retry-After']), 0)
+        # Otro endpoint y otro cliente tienen su propio bucket
+        self.assertEqual(self.client.get(reverse('stockitem-list')).status_code, status.HTTP_200_OK)
+        response = self.client.put(self.url, {'cantidad': 1}, format='json', REMOTE_ADDR='10.0.0.9')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+    
+    @override_settings(STOCK_LIMITES_TASA={'lectura': (100, 10.0), 'escritura': (1, 0.01)})
+    def test_x_forwarded_for_inventado_no_renueva_el_bucket(self):
+        """Test: Cambiar X-Forwarded-For no da un bucket nuevo; solo cuenta lo que agrega el proxy"""
+        from django.conf import settings
+        
+        def restock(reenviada, remota='10.0.0.1'):
+            return self.client.put(
+                self.url, {'cantidad': 1}, format='json',
+                REMOTE_ADDR=remota, HTTP_X_FORWARDED_FOR=reenviada,
+            ).status_code
+        
+        # Sin proxies de confianza la cabecera se ignora: cuenta REMOTE_ADDR
+        self.assertEqual(restock('1.1.1.1'), status.HTTP_200_OK)
+        self.assertEqual(restock('2.2.2.2'), status.HTTP_429_TOO_MANY_REQUESTS)
+        
+        # Detrás de un proxy, la última IP (la que agrega el proxy) es el cliente
+        with self.settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}):
+            self.assertEqual(restock('9.9.9.9, 3.3.3.3', remota='10.0.0.2'), status.HTTP_200_OK)
+            self.assertEqual(
+                restock('8.8.8.8, 3.3.3.3', remota='10.0.0.2'), status.HTTP_429_TOO_MANY_REQUESTS
+            )
+            self.assertEqual(restock('4.4.4.4', remota='10.0.0.2'), status.HTTP_200_OK)
+    
+    @override_settings(STOCK_LIMITES_MAX_CLAVES=2)
+    def test_almacen_memoria_olvida_los_buckets_menos_usados(self):
+        """Test: Superado el máximo de claves se olvida el bucket menos usado, no todos"""
+        from .throttling import AlmacenMemoria
+        almacen = AlmacenMemoria()
+        
+        self.assertEqual(almacen.consumir('a', 1, 0.001), 0)
+        self.assertEqual(almacen.consumir('b', 1, 0.001), 0)
+        self.assertGreater(almacen.consumir('a', 1, 0.001), 0)
+        self.assertEqual(almacen.consumir('c', 1, 0.001), 0)
+        
+        self.assertEqual(list(almacen._buckets), ['a', 'c'])
+        # 'a' sigue limitado; 'b' se olvidó y vuelve lleno
+        self.assertGreater(almacen.consumir('a', 1, 0.001), 0)
+        self.assertEqual(almacen.consumir('b', 1, 0.001), 0)
+        self.assertEqual(len(almacen._buckets), 2)
+    
+    @override_settings(STOCK_CONCURRENCIA_POR_PRODUCTO=1)
+    def test_concurrencia_por_producto(self):
+        """Test: Una escritura sobre un producto ocupado se rechaza sin esperar el bloqueo"""
+        from .throttling import proteger_escritura
+        
+        with proteger_escritura(self.producto.id):
+            response = self.client.put(self.url, {'cantidad': 1}, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertIn('Retry-After', response)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 100)
+        # Liberado el producto, la escritura pasa
+        response = self.client.put(self.url, {'cantidad': 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+    
+    @override_settings(STOCK_LATENCIA_MAX_MS=100)
+    def test_descarte_por_latencia(self):
+        """Test: Con la latencia por encima del umbral se descartan escrituras"""
+        from unittest.mock import patch
+        from .throttling import medidor_latencia
+        
+        for _ in range(20):
+            medidor_latencia.registrar(1.0)
+        with patch('stock.throttling.random.random', return_value=0.0):
+            response = self.client.put(self.url, {'cantidad': 1}, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        
+        medidor_latencia.reiniciar()
+        response = self.client.put(self.url, {'cantidad': 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+# ==============================================================================
+# TESTS DEL GENERADOR DE DATOS SINTÉTICOS
+# ==============================================================================
+
+@override_settings(STOCK_HUECOS_ESPERA_SEGUNDOS=0)
+class GeneradorDatosTest(TestCase):
+    """Pruebas para el comando generar_datos"""
+    
+    def _generar(self, **opciones):
+        from io import StringIO
+        from django.core.management import call_command
+        
+        opciones = {'productos': 50, 'movimientos': 2000, 'lote': 300, 'procesos': 1,
+                    'dias': 30, 'hasta': date(2024, 6, 30), **opciones}
+        call_command('generar_datos', stdout=StringIO(), **opciones)
+    
+    def _historial(self, prefijo):
+        """(número de producto, tipo, cantidad, fecha) de los movimientos generados"""
+        return sorted(
+            (codigo[len(prefijo):], tipo, cantidad, fecha)
+            for codigo, tipo, cantidad, fecha in Movimiento.objects.filter(
+                producto__codigo__startswith=prefijo
+            ).values_list('producto__codigo', 'tipo', 'cantidad', 'fecha')
+        )
+    
+    def test_genera_productos_movimientos_y_resumenes(self):
+        """Test: Crea los productos y movimientos pedidos y deja los resúmenes al día"""
+        self._generar()
+        
+        self.assertEqual(StockItem.objects.filter(codigo__startswith='SIM42-').count(), 50)
+        self.assertEqual(Movimiento.objects.count(), 2000)
+        self.assertEqual(CambioProducto.objects.filter(operacion='crear').count(), 50)
+        resumen = ResumenMovimientoDia.objects.aggregate(
+            n=Sum('num_movimientos'), total=Sum('cantidad_total')
+        )
+        self.assertEqual(resumen['n'], 2000)
+        self.assertEqual(resumen['total'], Movimiento.objects.aggregate(t=Sum('cantidad'))['t'])
+        self.assertEqual(ValoracionService().verificar()['deriva'], 0)
+        
+        fechas = Movimiento.objects.aggregate(primera=Min('fecha'), ultima=Max('fecha'))
+        self.assertGreaterEqual(timezone.localdate(fechas['primera']), date(2024, 6, 1))
+        self.assertLessEqual(timezone.localdate(fechas['ultima']), date(2024, 6, 30))
+    
+    def test_popularidad_sesgada(self):
+        """Test: Unos pocos productos concentran buena parte de los movimientos"""
+        self._generar()
+        
+        conteos = sorted(
+            Movimiento.objects.values('producto').annotate(n=Count('id')).values_list('n', flat=True),
+            reverse=True,
+        )
+        self.assertGreater(sum(conteos[:5]), 2000 * 0.4)
+    
+    def test_reproducible_con_la_misma_semilla(self):
+        """Test: La misma semilla genera el mismo historial (con otro prefijo de códigos)"""
+        self._generar(prefijo='A-', sin_resumenes=True)
+        self._generar(prefijo='B-', sin_resumenes=True)
+        
+        self.assertEqual(self._historial('A-'), self._historial('B-'))
+    
+    def test_prefijo_existente(self):
+        """Test: No se reutilizan códigos de una generación anterior"""
+        from django.core.management.base import CommandError
+        
+        self._generar(movimientos=0, sin_resumenes=True)
+        with self.assertRaises(CommandError):
+            self._generar(movimientos=0, sin_resumenes=True)
+
+
+# ==============================================================================
+# TESTS DE STOCK POR UBICACIÓN
+# ==============================================================================
+
+class ExistenciasPorUbicacionTest(APITestCase):
+    """Pruebas para el stock por ubicación y las transferencias"""
+    
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        self.producto = StockItem.objects.create(
+            nombre="Producto Test", precio=Decimal("10.00"), cantidad=0
+        )
+        self.centro = Ubicacion.objects.create(codigo='CEN', nombre='Tienda Centro')
+        self.norte = Ubicacion.objects.create(codigo='NOR', nombre='Tienda Norte')
+        self.restock_url = reverse('stockitem-restock', args=[self.producto.id])
+        self.subtract_url = reverse('stockitem-subtract-stock', args=[self.producto.id])
+        self.transferir_url = reverse('stockitem-transferir', args=[self.producto.id])
+    
+    def _existencia(self, ubicacion):
+        return StockUbicacion.objects.get(producto=self.producto, ubicacion=ubicacion).cantidad
+    
+    def test_restock_y_subtract_por_ubicacion(self):
+        """Test: Las operaciones con ubicación ajustan la ubicación y mantienen el total"""
+        response = self.client.put(
+            self.restock_url, {'cantidad': 30, 'ubicacion': self.centro.id}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['nuevo_stock'], 30)
+        self.client.put(self.restock_url, {'cantidad': 5, 'ubicacion': self.norte.id}, format='json')
+        response = self.client.put(
+            self.subtract_url, {'cantidad': 12, 'ubicacion': self.centro.id}, format='json'
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['nuevo_stock'], 18)
+        self.assertEqual(self._existencia(self.centro), 18)
+        self.assertEqual(self._existencia(self.norte), 5)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 23)
+        self.assertEqual(self.producto.version, 4)
+        movimiento = Movimiento.objects.get(id=response.data['movimiento_id'])
+        self.assertEqual((movimiento.tipo, movimiento.ubicacion_id), ('salida', self.centro.id))
+        self.assertEqual(ValoracionService().obtener_total(), Decimal('230.00'))
+        self.assertEqual(CambioProducto.objects.filter(producto_id=self.producto.id).last().datos['cantidad'], 23)
+    
+    def test_stock_insuficiente_en_la_ubicacion(self):
+        """Test: El stock de otra ubicación no cubre una salida"""
+        self.client.put(self.restock_url, {'cantidad': 5, 'ubicacion': self.norte.id}, format='json')
+        
+        response = self.client.put(
+            self.subtract_url, {'cantidad': 1, 'ubicacion': self.centro.id}, format='json'
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 5)
+        self.assertEqual(Movimiento.objects.filter(tipo='salida').count(), 0)
+    
+    def test_transferencia_crea_movimientos_pareados(self):
+        """Test: Una transferencia mueve stock sin cambiar el total"""
+        self.client.put(self.restock_url, {'cantidad': 20, 'ubicacion': self.centro.id}, format='json')
+        self.producto.refresh_from_db()
+        version = self.producto.version
+        
+        response = self.client.post(
+            self.transferir_url,
+            {'origen': self.centro.id, 'destino': self.norte.id, 'cantidad': 8},
+            format='json',
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['origen']['nuevo_stock'], 12)
+        self.assertEqual(response.data['destino']['nuevo_stock'], 8)
+        salida, entrada = Movimiento.objects.filter(id__in=response.data['movimiento_ids']).order_by('id')
+        self.assertEqual((salida.tipo, salida.ubicacion_id), ('salida', self.centro.id))
+        self.assertEqual((entrada.tipo, entrada.ubicacion_id), ('entrada', self.norte.id))
+        self.assertIsNotNone(salida.transferencia)
+        self.assertEqual(salida.transferencia, entrada.transferencia)
+        self.producto.refresh_from_db()
+        self.assertEqual((self.producto.cantidad, self.producto.version), (20, version))
+    
+    def test_transferencia_invalida(self):
+        """Test: Transferencias a la misma ubicación o sin stock en el origen se rechazan"""
+        response = self.client.post(
+            self.transferir_url,
+            {'origen': self.centro.id, 'destino': self.centro.id, 'cantidad': 1},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        response = self.client.post(
+            self.transferir_url,
+            {'origen': self.centro.id, 'destino': self.norte.id, 'cantidad': 1},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(StockUbicacion.objects.filter(cantidad__gt=0).exists())
+    
+    def test_ubicacion_inexistente_o_inactiva(self):
+        """Test: Una ubicación inactiva o inexistente responde 404"""
+        self.norte.activa = False
+        self.norte.save()
+        
+        for ubicacion in (self.norte.id, 9999):
+            response = self.client.put(
+                self.restock_url, {'cantidad': 1, 'ubicacion': ubicacion}, format='json'
+            )
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 0)
+    
+    def test_consulta_de_existencias(self):
+        """Test: Existencias por producto y por ubicación"""
+        self.client.put(self.restock_url, {'cantidad': 7, 'ubicacion': self.centro.id}, format='json')
+        self.client.put(self.restock_url, {'cantidad': 3, 'ubicacion': self.norte.id}, format='json')
+        
+        response = self.client.get(reverse('stockitem-existencias', args=[self.producto.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total'], 10)
+        self.assertEqual(
+            [(fila['ubicacion_codigo'], fila['cantidad']) for fila in response.data['ubicaciones']],
+            [('CEN', 7), ('NOR', 3)],
+        )
+        
+        response = self.client.get(reverse('ubicacion-existencias', args=[self.norte.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(fila['producto'], fila['cantidad']) for fila in response.data['results']],
+            [(self.producto.id, 3)],
+        )
+
+    
+    def _total_y_suma(self):
+        self.producto.refresh_from_db()
+        suma = StockUbicacion.objects.filter(producto=self.producto).aggregate(s=Sum('cantidad'))['s']
+        return self.producto.cantidad, suma
+    
+    def test_escrituras_sin_ubicacion_no_descuadran_el_total(self):
+        """Test: Con existencias por ubicación, subtract sin ubicación no resta stock ubicado"""
+        self.client.put(self.restock_url, {'cantidad': 5, 'ubicacion': self.centro.id}, format='json')
+        
+        response = self.client.put(self.subtract_url, {'cantidad': 5}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.put(
+            self.subtract_url, {'cantidad': 5, 'ubicacion': self.centro.id}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._total_y_suma(), (0, 0))
+    
+    def test_stock_sin_ubicar_pasa_a_la_ubicacion_predeterminada(self):
+        """Test: El total previo y las escrituras sin ubicación van a la ubicación predeterminada"""
+        StockItem.objects.filter(pk=self.producto.pk).update(cantidad=10)
+        self.client.put(self.restock_url, {'cantidad': 5, 'ubicacion': self.centro.id}, format='json')
+        general = ExistenciasService.ubicacion_predeterminada()
+        self.assertEqual(self._existencia(general), 10)
+        self.assertEqual(self._total_y_suma(), (15, 15))
+        
+        response = self.client.put(self.subtract_url, {'cantidad': 4}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['nuevo_stock'], 11)
+        self.assertEqual(Movimiento.objects.latest('id').ubicacion_id, general.id)
+        
+        resultado = StockService().ajustar_lote([
+            {'id': self.producto.id, 'tipo': 'salida', 'cantidad': 7},
+            {'id': self.producto.id, 'tipo': 'entrada', 'cantidad': 2},
+        ])
+        self.assertEqual((resultado['aplicados'], list(resultado['errores'])), (1, [0]))
+        self.assertEqual(self._existencia(general), 8)
+        
+        response = self.client.patch(
+            reverse('stockitem-detail', args=[self.producto.id]), {'cantidad': 20}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._existencia(general), 15)
+        self.assertEqual(self._existencia(self.centro), 5)
+        self.assertEqual(self._total_y_suma(), (20, 20))
+    
+    def test_delta_relativo_no_deja_el_total_negativo(self):
+        """Test: El UPDATE relativo del total se rechaza si lo dejaría en negativo"""
+        from .unit_of_work import UnidadDeTrabajo
+        with self.assertRaises(StockInsuficienteError):
+            with UnidadDeTrabajo() as uow:
+                uow.registrar_delta_cantidad(self.producto, -1)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 0)
+
+# ==============================================================================
+# TESTS DEL PRONÓSTICO DE DEMANDA
+# ==============================================================================
+
+@override_settings(STOCK_PRONOSTICO_DIAS=10, STOCK_PRONOSTICO_PLAZO_DIAS=7,
+                   STOCK_PRONOSTICO_REVISION_DIAS=7, STOCK_PRONOSTICO_NIVEL_SERVICIO_Z=1.65)
+class PronosticoDemandaTest(APITestCase):
+    """Pruebas para PronosticoService y las sugerencias de reorden"""
+    
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        import uuid
+        from django.core.cache import cache
+        cache.clear()
+        self.hoy = timezone.localdate()
+        self.vendido = StockItem.objects.create(
+            nombre="Producto Vendido", precio=Decimal("10.00"), cantidad=5
+        )
+        self.quieto = StockItem.objects.create(
+            nombre="Producto Quieto", precio=Decimal("10.00"), cantidad=5
+        )
+        # Salidas diarias de la ventana (10 días): 4 ayer, 6 anteayer (en dos
+        # movimientos), 0 el resto
+        self._salida(self.vendido, 4, dias_atras=1)
+        self._salida(self.vendido, 2, dias_atras=2)
+        self._salida(self.vendido, 4, dias_atras=2)
+        # Fuera de la ventana, de hoy, entradas o transferencias: no son demanda
+        self._salida(self.vendido, 50, dias_atras=11)
+        self._salida(self.vendido, 50, dias_atras=0)
+        self._salida(self.vendido, 50, dias_atras=1, tipo='entrada')
+        self._salida(self.vendido, 50, dias_atras=1, transferencia=uuid.uuid4())
+    
+    def _salida(self, producto, cantidad, dias_atras, tipo='salida', transferencia=None):
+        from datetime import datetime, time, timedelta
+        
+        movimiento = Movimiento.objects.create(
+            producto=producto, tipo=tipo, cantidad=cantidad, transferencia=transferencia
+        )
+        fecha = timezone.make_aware(
+            datetime.combine(self.hoy - timedelta(days=dias_atras), time(12))
+        )
+        Movimiento.objects.filter(pk=movimiento.pk).update(fecha=fecha)
+    
+    def test_estadisticas_por_producto(self):
+        """Test: Media, desviación, cobertura y cantidad sugerida por producto"""
+        import math
+        import statistics
+        from .services import PronosticoService
+        
+        service = PronosticoService()
+        service.calcular(self.hoy)
+        vendido = service.pronostico_producto(self.vendido.id)
+        quieto = service.pronostico_producto(self.quieto.id)
+        
+        serie = [4, 6] + [0] * 8
+        media, desviacion = statistics.mean(serie), statistics.stdev(serie)
+        self.assertEqual(vendido['demanda_diaria'], round(media, 3))
+        self.assertEqual(vendido['desviacion'], round(desviacion, 3))
+        self.assertEqual(vendido['dias_cobertura'], 5.0)
+        self.assertEqual(
+            vendido['punto_reorden'], round(media * 7 + 1.65 * desviacion * math.sqrt(7), 1)
+        )
+        self.assertEqual(
+            vendido['cantidad_sugerida'],
+            math.ceil(media * 14 + 1.65 * desviacion * math.sqrt(14) - 5),
+        )
+        self.assertEqual(quieto['demanda_diaria'], 0)
+        self.assertIsNone(quieto['dias_cobertura'])
+        self.assertEqual(quieto['cantidad_sugerida'], 0)
+    
+    def test_sin_movimientos(self):
+        """Test: Sin historial no se sugiere reponer nada"""
+        from .services import PronosticoService
+        
+        Movimiento.objects.all().delete()
+        service = PronosticoService()
+        self.assertEqual(service.calcular(self.hoy)['a_reponer'], 0)
+        self.assertEqual(service.sugerencias().count(), 0)
+    
+    def test_endpoint_sugerencias_reorden(self):
+        """Test: El endpoint lista solo los productos a reponer, con su pronóstico"""
+        otro = StockItem.objects.create(nombre="Producto Urgente", precio=Decimal("1.00"), cantidad=1)
+        self._salida(otro, 10, dias_atras=3)
+        
+        response = self.client.get(reverse('stockitem-sugerencias-reorden'))
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNotNone(response.data['calculado'])
+        # Primero el que se agota antes (1 día de cobertura frente a 5)
+        self.assertEqual(
+            [(fila['producto'], fila['nombre']) for fila in response.data['results']],
+            [(otro.id, "Producto Urgente"), (self.vendido.id, "Producto Vendido")],
+        )
+        self.assertGreater(response.data['results'][0]['cantidad_sugerida'], 0)
+    
+    def test_sugerencias_reorden_con_conteo(self):
+        """Test: ?conteo=estimado y ?conteo=exacto cuentan las sugerencias"""
+        for modo in ('estimado', 'exacto'):
+            response = self.client.get(reverse('stockitem-sugerencias-reorden'), {'conteo': modo})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['count'], 1)
+    
+    def test_endpoint_pronostico_y_cache(self):
+        """Test: El pronóstico se sirve del último cálculo hasta recalcularse"""
+        url = reverse('stockitem-pronostico', args=[self.vendido.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['demanda_diaria'], 1.0)
+        
+        self._salida(self.vendido, 10, dias_atras=1)
+        self.assertEqual(self.client.get(url).data['demanda_diaria'], 1.0)
+        
+        from .services import PronosticoService
+        PronosticoService().calcular()
+        self.assertEqual(self.client.get(url).data['demanda_diaria'], 2.0)
+        
+        # Un producto posterior al cálculo queda pendiente: el recálculo se
+        # pide en segundo plano, no dentro del request
+        from unittest import mock
+        
+        nuevo = StockItem.objects.create(nombre="Nuevo", precio=Decimal("1.00"), cantidad=0)
+        url_nuevo = reverse('stockitem-pronostico', args=[nuevo.id])
+        with mock.patch.object(PronosticoService, 'calcular') as calcular, \
+                mock.patch.object(PronosticoService, '_recalcular_en_segundo_plano') as recalcular:
+            response = self.client.get(url_nuevo)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data, {'producto': nuevo.id, 'nombre': "Nuevo", 'pendiente': True})
+        recalcular.assert_called_once_with()
+        calcular.assert_not_called()
+        
+        PronosticoService().calcular()
+        response = self.client.get(url_nuevo)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['cantidad_sugerida'], 0)
+    
+    def test_pronostico_compartido_y_recalculo_encolado(self):
+        """Test: Lo calculado por otro proceso se sirve sin recalcular; vencido, se encola un trabajo"""
+        from datetime import timedelta
+        from unittest import mock
+        from django.core.cache import cache
+        from .models import PronosticoProducto, Trabajo
+        from .services import PronosticoService
+        
+        # Como el comando o el trabajador: el resultado no depende de la caché del proceso
+        PronosticoService().calcular()
+        cache.clear()
+        url = reverse('stockitem-pronostico', args=[self.vendido.id])
+        with mock.patch.object(PronosticoService, 'calcular') as calcular:
+            response = self.client.get(url)
+            self.client.get(reverse('stockitem-sugerencias-reorden'))
+        self.assertEqual(response.data['demanda_diaria'], 1.0)
+        calcular.assert_not_called()
+        self.assertFalse(Trabajo.objects.exists())
+        
+        PronosticoProducto.objects.update(calculado=timezone.now() - timedelta(days=1))
+        for _ in range(2):
+            cache.clear()
+            with mock.patch.object(PronosticoService, 'calcular') as calcular:
+                self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+            calcular.assert_not_called()
+        self.assertEqual(
+            list(Trabajo.objects.values_list('tipo', 'estado')), [('calcular_pronostico', 'pendiente')]
+        )
+    
+    def test_endpoint_bajo_stock(self):
+        """Test: El endpoint de bajo stock filtra por el umbral"""
+        response = self.client.get(reverse('stockitem-bajo-stock'), {'umbral': 6})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+        
+        response = self.client.get(reverse('stockitem-bajo-stock'), {'umbral': 'x'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+# ==============================================================================
+# TESTS DEL ANÁLISIS ABC
+# ==============================================================================
+
+class AnalisisABCTest(APITestCase):
+    """Pruebas para AnalisisService y el endpoint de análisis"""
+    
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        import uuid
+        from django.core.cache import cache
+        cache.clear()
+        self.principal = self._producto("Principal", "10.00", 40)
+        self.medio = self._producto("Medio", "1.00", 0)
+        self.menor = self._producto("Menor", "5.00", 10)
+        self.inactivo = self._producto("Inactivo", "3.00", 7)
+        # Valor movido: 800 + 150 + 50 = 1000
+        self._movimiento(self.principal, 'salida', 30, dias_atras=1)
+        self._movimiento(self.principal, 'salida', 50, dias_atras=20)
+        self._movimiento(self.medio, 'salida', 150, dias_atras=3)
+        self._movimiento(self.menor, 'salida', 10, dias_atras=5)
+        # No cuentan como valor movido: entradas, transferencias y salidas antiguas
+        self._movimiento(self.menor, 'entrada', 500, dias_atras=2)
+        self._movimiento(self.menor, 'salida', 500, dias_atras=2, transferencia=uuid.uuid4())
+        self._movimiento(self.inactivo, 'salida', 500, dias_atras=400)
+    
+    def _producto(self, nombre, precio, cantidad):
+        return StockItem.objects.create(nombre=nombre, precio=Decimal(precio), cantidad=cantidad)
+    
+    def _movimiento(self, producto, tipo, cantidad, dias_atras, transferencia=None):
+        from datetime import timedelta
+        
+        movimiento = Movimiento.objects.create(
+            producto=producto, tipo=tipo, cantidad=cantidad, transferencia=transferencia
+        )
+        Movimiento.objects.filter(pk=movimiento.pk).update(
+            fecha=timezone.now() - timedelta(days=dias_atras)
+        )
+    
+    def _analisis(self):
+        from .models import AnalisisProducto
+        return {
+            fila.producto_id: fila
+            for fila in AnalisisProducto.objects.all()
+        }
+    
+    def test_clases_rotacion_y_ultimo_movimiento(self):
+        """Test: Clasificación por valor acumulado, rotación anual y último movimiento"""
+        from .services import AnalisisService
+        
+        resumen = AnalisisService().calcular()
+        analisis = self._analisis()
+        
+        self.assertEqual(
+            {pk: fila.clase for pk, fila in analisis.items()},
+            {self.principal.id: 'A', self.medio.id: 'B', self.menor.id: 'C', self.inactivo.id: 'C'},
+        )
+        self.assertEqual(analisis[self.principal.id].valor_movido, Decimal('800.00'))
+        self.assertEqual(analisis[self.principal.id].unidades_salida, 80)
+        self.assertEqual(analisis[self.principal.id].rotacion, 2.0)
+        self.assertIsNone(analisis[self.medio.id].rotacion)
+        self.assertEqual(analisis[self.inactivo.id].valor_movido, Decimal('0.00'))
+        self.assertEqual(
+            (timezone.now() - analisis[self.inactivo.id].ultimo_movimiento).days, 400
+        )
+        self.assertEqual(resumen['valor_movido'], Decimal('1000.00'))
+        self.assertEqual(resumen['clases']['A'], {
+            'productos': 1, 'valor_movido': Decimal('800.00'), 'porcentaje_valor': 80.0,
+        })
+    
+    def test_resultado_independiente_del_lote(self):
+        """Test: Calcular por lotes pequeños da el mismo resultado y reemplaza las filas"""
+        from .services import AnalisisService
+        
+        AnalisisService().calcular(lote=1000)
+        completo = {
+            pk: (fila.clase, fila.valor_movido, fila.rotacion, fila.ultimo_movimiento)
+            for pk, fila in self._analisis().items()
+        }
+        AnalisisService().calcular(lote=1)
+        por_lotes = {
+            pk: (fila.clase, fila.valor_movido, fila.rotacion, fila.ultimo_movimiento)
+            for pk, fila in self._analisis().items()
+        }
+        
+        self.assertEqual(completo, por_lotes)
+    
+    def test_sin_movimientos(self):
+        """Test: Sin salidas todos los productos son clase C"""
+        from .services import AnalisisService
+        
+        Movimiento.objects.all().delete()
+        resumen = AnalisisService().calcular()
+        
+        self.assertEqual(resumen['clases']['C']['productos'], 4)
+        self.assertEqual({fila.clase for fila in self._analisis().values()}, {'C'})
+    
+    def test_endpoint_analisis(self):
+        """Test: El endpoint filtra por clase, ordena e incluye el resumen"""
+        from .services import AnalisisService
+        
+        url = reverse('analisis-list')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [])
+        self.assertIsNone(response.data['resumen']['calculado'])
+        
+        AnalisisService().calcular()
+        
+        response = self.client.get(url, {'clase': 'C', 'orden': 'inactividad'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [fila['producto'] for fila in response.data['results']],
+            [self.inactivo.id, self.menor.id],
+        )
+        self.assertEqual(response.data['results'][0]['dias_sin_movimiento'], 400)
+        self.assertEqual(response.data['results'][0]['producto_nombre'], "Inactivo")
+        self.assertEqual(response.data['resumen']['productos'], 4)
+        self.assertEqual(response.data['resumen']['clases']['B']['porcentaje_valor'], 15.0)
+        
+        response = self.client.get(reverse('analisis-detail', args=[self.principal.id]))
+        self.assertEqual(response.data['clase'], 'A')
+        
+        response = self.client.get(url, {'clase': 'D'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_resumen_refleja_calculos_de_otro_proceso(self):
+        """Test: El resumen se agrega de la tabla, no de una caché del proceso"""
+        from .models import AnalisisProducto
+        from .services import AnalisisService
+        
+        service = AnalisisService()
+        service.calcular()
+        self.assertEqual(service.obtener_resumen()['clases']['A']['productos'], 1)
+        
+        # Otro proceso (cron) recalcula y reemplaza las filas materializadas
+        calculado = timezone.now() + timedelta(minutes=5)
+        AnalisisProducto.objects.update(clase='C', calculado=calculado)
+        
+        resumen = service.obtener_resumen()
+        self.assertEqual(resumen['calculado'], calculado)
+        self.assertEqual(resumen['clases']['A']['productos'], 0)
+        self.assertEqual(resumen['clases']['C']['productos'], 4)
+
+
+# ==============================================================================
+# TESTS DEL ADMIN
+# ==============================================================================
+
+class AdminListadosTest(TestCase):
+    """Pruebas para los listados del admin de productos y movimientos"""
+    
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        from datetime import timedelta
+        from django.core.cache import cache
+        cache.clear()
+        self.client.force_login(
+            Administrador.objects.create_superuser(username='admin', password='clave-admin')
+        )
+        self.tornillo = StockItem.objects.create(
+            codigo='TOR-1', nombre="Tornillo", precio=Decimal("1.00"), cantidad=10
+        )
+        self.tuerca = StockItem.objects.create(
+            codigo='TUE-1', nombre="Tuerca", precio=Decimal("1.00"), cantidad=10
+        )
+        self.reciente = Movimiento.objects.create(producto=self.tornillo, tipo='entrada', cantidad=1)
+        self.antiguo = Movimiento.objects.create(producto=self.tuerca, tipo='salida', cantidad=2)
+        Movimiento.objects.filter(pk=self.antiguo.pk).update(
+            fecha=timezone.now() - timedelta(days=60)
+        )
+        self.url = reverse('admin:stock_movimiento_changelist')
+    
+    def _ids(self, response):
+        return [movimiento.pk for movimiento in response.context['cl'].result_list]
+    
+    def test_movimientos_acotados_a_la_ultima_semana(self):
+        """Test: Por defecto solo se listan los movimientos de los últimos 7 días"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._ids(response), [self.reciente.pk])
+        
+        response = self.client.get(self.url, {'periodo': 'todos'})
+        self.assertEqual(self._ids(response), [self.reciente.pk, self.antiguo.pk])
+        
+        # La jerarquía de fechas reemplaza el filtro por defecto
+        anio = timezone.localtime(Movimiento.objects.get(pk=self.antiguo.pk).fecha).year
+        response = self.client.get(self.url, {'fecha__year': anio})
+        self.assertIn(self.antiguo.pk, self._ids(response))
+    
+    def test_movimientos_sin_consultas_por_fila(self):
+        """Test: El listado no hace una consulta por movimiento"""
+        for _ in range(20):
+            Movimiento.objects.create(producto=self.tuerca, tipo='entrada', cantidad=1)
+        self.client.get(self.url)
+        
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as pocos:
+            self.client.get(self.url)
+        for _ in range(20):
+            Movimiento.objects.create(producto=self.tornillo, tipo='entrada', cantidad=1)
+        with CaptureQueriesContext(connection) as muchos:
+            self.client.get(self.url)
+        self.assertEqual(len(pocos), len(muchos))
+    
+    def test_busqueda_por_prefijo(self):
+        """Test: La búsqueda es por prefijo de código o nombre del producto"""
+        response = self.client.get(self.url, {'q': 'TOR', 'periodo': 'todos'})
+        self.assertEqual(self._ids(response), [self.reciente.pk])
+        
+        response = self.client.get(self.url, {'q': 'uerca', 'periodo': 'todos'})
+        self.assertEqual(self._ids(response), [])
+        
+        response = self.client.get(
+            reverse('admin:stock_stockitem_changelist'), {'q': 'Tue'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item.pk for item in response.context['cl'].result_list], [self.tuerca.pk])
+
+
+# ==============================================================================
+# TESTS DE TRABAJOS EN SEGUNDO PLANO
+# ==============================================================================
+
+class TrabajosTest(APITestCase):
+    """Pruebas para la cola de trabajos y sus endpoints"""
+    
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        from unittest import mock
+        from . import trabajos
+        self.trabajos = trabajos
+        self.fallos = 0
+        
+        def falla(contexto, veces=99):
+            self.fallos += 1
+            if self.fallos <= veces:
+                raise RuntimeError("falla de prueba")
+            return {'ok': True}
+        
+        def se_cancela(contexto):
+            trabajos.cancelar(contexto.trabajo)
+            contexto.avanzar(1, 2)
+            return {'ok': True}
+        
+        registro = mock.patch.dict(trabajos._TAREAS, {
+            'prueba_falla': {'funcion': falla, 'max_intentos': 3},
+            'prueba_cancela': {'funcion': se_cancela, 'max_intentos': 3},
+        })
+        registro.start()
+        self.addCleanup(registro.stop)
+        self.admin = Administrador.objects.create_superuser(username='admin', password='admin123')
+        self.client.force_authenticate(user=self.admin)
+    
+    def _ejecutar_siguiente(self):
+        trabajo = self.trabajos.tomar('test')
+        self.assertIsNotNone(trabajo)
+        return self.trabajos.ejecutar(trabajo)
+    
+    def _filas(self, cantidad, invalidas=()):
+        return [
+            {'codigo': f'TRB-{i}', 'nombre': f'Producto {i}',
+             'precio': '-1' if i in invalidas else '2.50', 'cantidad': 1}
+            for i in range(cantidad)
+        ]
+    
+    def test_encolar_ejecutar_y_resultado(self):
+        """Test: Un trabajo encolado por la API se ejecuta y expone su resultado"""
+        response = self.client.post(
+            reverse('trabajo-list'),
+            {'tipo': 'importar_productos', 'parametros': {'filas': self._filas(5, invalidas={3}), 'lote': 2}},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertTrue(response['Location'].endswith(reverse('trabajo-detail', args=[response.data['id']])))
+        resultado_url = reverse('trabajo-resultado', args=[response.data['id']])
+        self.assertEqual(self.client.get(resultado_url).status_code, status.HTTP_202_ACCEPTED)
+        
+        trabajo = self._ejecutar_siguiente()
+        
+        self.assertEqual((trabajo.estado, trabajo.progreso, trabajo.intentos), ('completado', 1.0, 1))
+        response = self.client.get(resultado_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['creados'], 4)
+        # Índices de fila del lote completo, no del bloque
+        self.assertEqual(list(response.data['errores']), ['3'])
+        self.assertEqual(StockItem.objects.filter(codigo__startswith='TRB-').count(), 4)
+    
+    def test_solo_administradores(self):
+        """Test: Sin autenticar o sin ser administrador los trabajos no son accesibles"""
+        from .models import Trabajo
+        trabajo = self.trabajos.encolar('verificar_valoracion')
+        usuario = Administrador.objects.create_user(username='operador', password='operador123')
+        
+        for autenticado in (None, usuario):
+            self.client.force_authenticate(user=autenticado)
+            self.assertIn(
+                self.client.get(reverse('trabajo-detail', args=[trabajo.pk])).status_code,
+                (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN),
+            )
+            response = self.client.post(reverse('trabajo-list'), {'tipo': 'verificar_valoracion'}, format='json')
+            self.assertIn(response.status_code, (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
+        self.assertEqual(Trabajo.objects.count(), 1)
+    
+    def test_tipo_invalido(self):
+        """Test: Un tipo de trabajo desconocido se rechaza"""
+        response = self.client.post(reverse('trabajo-list'), {'tipo': 'no_existe'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('importar_productos', self.client.get(reverse('trabajo-tipos')).data['tipos'])
+    
+    def test_reintentos_con_espera(self):
+        """Test: Un fallo se reintenta tras una espera creciente hasta max_intentos"""
+        from datetime import timedelta
+        from .models import Trabajo
+        
+        trabajo = self.trabajos.encolar('prueba_falla')
+        esperas = []
+        for intento in range(1, 4):
+            trabajo = self._ejecutar_siguiente()
+            self.assertEqual(trabajo.intentos, intento)
+            if intento < 3:
+                self.assertEqual(trabajo.estado, 'pendiente')
+                esperas.append(trabajo.disponible_desde - timezone.now())
+                # Aún no está disponible
+                self.assertIsNone(self.trabajos.tomar('test'))
+                Trabajo.objects.filter(pk=trabajo.pk).update(disponible_desde=timezone.now())
+        
+        self.assertEqual(trabajo.estado, 'fallido')
+        self.assertIn('falla de prueba', trabajo.error)
+        self.assertGreater(esperas[0], timedelta(seconds=1))
+        self.assertGreater(esperas[1], esperas[0] - timedelta(seconds=1))
+        self.assertEqual(
+            self.client.get(reverse('trabajo-resultado', args=[trabajo.pk])).status_code,
+            status.HTTP_409_CONFLICT,
+        )
+        
+        response = self.client.post(reverse('trabajo-reintentar', args=[trabajo.pk]))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual((response.data['estado'], response.data['intentos']), ('pendiente', 0))
+    
+    def test_parametros_validados_al_encolar(self):
+        """Test: Parámetros que no coinciden con la tarea se rechazan al encolar"""
+        from .models import Trabajo
+        
+        response = self.client.post(
+            reverse('trabajo-list'),
+            {'tipo': 'prueba_falla', 'parametros': {'desconocido': 1}},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        with self.assertRaises(ValidationError):
+            self.trabajos.encolar('importar_productos', {})
+        self.assertFalse(Trabajo.objects.exists())
+        self.assertEqual(self.trabajos.encolar('prueba_falla', {'veces': 0}).estado, 'pendiente')
+    
+    def test_errores_permanentes_no_se_reintentan(self):
+        """Test: TypeError y ValidationError marcan el trabajo fallido sin reintentos"""
+        from unittest import mock
+        
+        def invalida(contexto):
+            raise ValidationError("dato inválido")
+        
+        with mock.patch.dict(self.trabajos._TAREAS, {
+            'prueba_invalida': {'funcion': invalida, 'max_intentos': 3},
+        }):
+            self.trabajos.encolar('prueba_invalida')
+            trabajo = self._ejecutar_siguiente()
+            self.assertEqual((trabajo.estado, trabajo.intentos), ('fallido', 1))
+            self.assertIn('dato inválido', trabajo.error)
+            
+            # Parámetros guardados antes de un cambio de firma de la tarea
+            trabajo = self.trabajos.encolar('prueba_falla')
+            type(trabajo).objects.filter(pk=trabajo.pk).update(parametros={'sobrante': 1})
+            trabajo = self._ejecutar_siguiente()
+            self.assertEqual((trabajo.estado, trabajo.intentos), ('fallido', 1))
+            self.assertTrue(trabajo.error.startswith('TypeError'))
+            self.assertEqual(self.fallos, 0)
+    
+    def test_cancelacion(self):
+        """Test: Un trabajo pendiente se cancela al instante y uno en curso al avanzar"""
+        pendiente = self.trabajos.encolar('verificar_valoracion')
+        response = self.client.post(reverse('trabajo-cancelar', args=[pendiente.pk]))
+        self.assertEqual(response.data['estado'], 'cancelado')
+        self.assertIsNone(self.trabajos.tomar('test'))
+        
+        self.trabajos.encolar('prueba_cancela')
+        trabajo = self._ejecutar_siguiente()
+        self.assertEqual((trabajo.estado, trabajo.progreso), ('cancelado', 0.5))
+    
+    def test_trabajos_abandonados_vuelven_a_la_cola(self):
+        """Test: Un trabajo en curso sin latido reciente se reencola"""
+        from datetime import timedelta
+        from .models import Trabajo
+        
+        trabajo = self.trabajos.encolar('verificar_valoracion')
+        self.trabajos.tomar('caido')
+        Trabajo.objects.filter(pk=trabajo.pk).update(latido=timezone.now() - timedelta(hours=1))
+        
+        self.assertEqual(self.trabajos.reencolar_abandonados(), 1)
+        trabajo = self._ejecutar_siguiente()
+        self.assertEqual((trabajo.estado, trabajo.intentos), ('completado', 2))
+    
+    def test_importar_asincrono(self):
+        """Test: ?asincrono=true encola la importación en lugar de ejecutarla"""
+        response = self.client.post(
+            reverse('stockitem-importar') + '?asincrono=true', self._filas(3), format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['tipo'], 'importar_productos')
+        self.assertFalse(StockItem.objects.filter(codigo__startswith='TRB-').exists())
+        
+        self._ejecutar_siguiente()
+        self.assertEqual(StockItem.objects.filter(codigo__startswith='TRB-').count(), 3)
+    
+    def test_ajustes_asincrono_conserva_omitir_bloqueados(self):
+        """Test: ?asincrono=true pasa omitir_bloqueados al trabajo y al servicio"""
+        from unittest import mock
+        from .models import Trabajo
+        producto = StockItem.objects.create(codigo='AJU-1', nombre="Ajustado", precio=Decimal("1.00"), cantidad=5)
+        response = self.client.post(
+            reverse('stockitem-ajustes') + '?asincrono=true',
+            {'ajustes': [{'id': producto.pk, 'tipo': 'entrada', 'cantidad': 2}], 'omitir_bloqueados': True},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertTrue(Trabajo.objects.get(pk=response.data['id']).parametros['omitir_bloqueados'])
+        
+        original = StockService.ajustar_lote
+        with mock.patch.object(StockService, 'ajustar_lote', autospec=True, side_effect=original) as ajustar:
+            trabajo = self._ejecutar_siguiente()
+        
+        self.assertEqual(trabajo.estado, 'completado')
+        self.assertTrue(ajustar.call_args.kwargs['omitir_bloqueados'])
+        producto.refresh_from_db()
+        self.assertEqual(producto.cantidad, 7)
+    
+    @override_settings(STOCK_TRABAJOS_RETENCION_DIAS=7)
+    def test_purga_trabajos_y_archivos_vencidos(self):
+        """Test: La purga borra trabajos terminados y archivos pasada la retención, no lo reciente"""
+        import os
+        import tempfile
+        from datetime import timedelta
+        from .models import Trabajo
+        
+        viejo = self.trabajos.encolar('verificar_valoracion')
+        reciente = self.trabajos.encolar('verificar_valoracion')
+        pendiente = self.trabajos.encolar('verificar_valoracion')
+        hace_un_mes = timezone.now() - timedelta(days=30)
+        Trabajo.objects.filter(pk__in=[viejo.pk, pendiente.pk]).update(creado=hace_un_mes)
+        Trabajo.objects.filter(pk=viejo.pk).update(estado='completado', terminado=hace_un_mes)
+        Trabajo.objects.filter(pk=reciente.pk).update(estado='completado', terminado=timezone.now())
+        
+        with tempfile.TemporaryDirectory() as directorio, self.settings(STOCK_TRABAJOS_DIR=directorio):
+            for nombre in ('movimientos-1.csv', 'movimientos-2.csv'):
+                open(os.path.join(directorio, nombre), 'w').close()
+            os.utime(os.path.join(directorio, 'movimientos-1.csv'), (hace_un_mes.timestamp(),) * 2)
+            
+            self.assertEqual(self.trabajos.purgar_terminados(), {'trabajos': 1, 'archivos': 1})
+            self.assertEqual(os.listdir(directorio), ['movimientos-2.csv'])
+        
+        self.assertEqual(
+            set(Trabajo.objects.values_list('pk', flat=True)), {reciente.pk, pendiente.pk}
+        )
+    
+    def test_exportar_movimientos(self):
+        """Test: La exportación genera un CSV descargable desde el resultado"""
+        import csv
+        import io
+        import tempfile
+        
+        producto = StockItem.objects.create(codigo='EXP-1', nombre="Exportado", precio=Decimal("1.00"))
+        for cantidad in (1, 2, 3):
+            Movimiento.objects.create(producto=producto, tipo='entrada', cantidad=cantidad)
+        
+        with tempfile.TemporaryDirectory() as directorio, self.settings(STOCK_TRABAJOS_DIR=directorio):
+            trabajo = self.trabajos.encolar('exportar_movimientos', {'producto_id': producto.pk})
+            self._ejecutar_siguiente()
+            response = self.client.get(reverse('trabajo-resultado', args=[trabajo.pk]))
+            contenido = b''.join(response.streaming_content).decode('utf-8')
+            response.close()
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        filas = list(csv.reader(io.StringIO(contenido)))
+        self.assertEqual(filas[0][:3], ['id', 'producto', 'codigo'])
+        self.assertEqual([fila[4] for fila in filas[1:]], ['1', '2', '3'])
+
+
+class TrabajadorComandoTest(TransactionTestCase):
+    """Pruebas para el comando trabajador (pool de hilos)"""
+    
+    @override_settings(
+        STOCK_RESUMEN_INTERVALO=0, STOCK_RESUMEN_CONCILIACION_INTERVALO=0, STOCK_TRABAJOS_PURGA_INTERVALO=0
+    )
+    def test_procesa_la_cola(self):
+        """Test: El trabajador ejecuta todo lo pendiente en su pool y termina"""
+        from io import StringIO
+        from django.core.management import call_command
+        from . import trabajos
+        from .models import Trabajo
+        
+        for i in range(4):
+            trabajos.encolar('importar_productos', {'filas': [
+                {'codigo': f'CMD-{i}', 'nombre': 'Producto', 'precio': '1.00', 'cantidad': 2}
+            ]})
+        
+        salida = StringIO()
+        # Un hilo: SQLite en memoria bloquea tablas entre escritores concurrentes
+        call_command('trabajador', una_vez=True, concurrencia=1, intervalo=0.01, stdout=salida)
+        
+        self.assertIn('4 trabajos procesados', salida.getvalue())
+        self.assertEqual(
+            list(Trabajo.objects.values_list('estado', flat=True).distinct()), ['completado']
+        )
+        self.assertEqual(StockItem.objects.filter(codigo__startswith='CMD-').count(), 4)
+
+
+@override_settings(STOCK_TABLERO_CACHE_TTL=0, STOCK_HUECOS_ESPERA_SEGUNDOS=0)
+class TableroTest(APITestCase):
+    """Pruebas para el resumen del tablero (/api/tablero/)"""
+    
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        from django.core.cache import cache
+        cache.clear()
+        self.client = APIClient()
+        self.service = StockService()
+        self.a = self.service.crear_producto({'codigo': 'TAB-A', 'nombre': 'A', 'precio': Decimal('2.00'), 'cantidad': 20})
+        self.b = self.service.crear_producto({'codigo': 'TAB-B', 'nombre': 'B', 'precio': Decimal('5.00'), 'cantidad': 3})
+        self.service.restar_stock(self.a.id, 4)
+        self.service.agregar_stock(self.b.id, 2)
+    
+    def test_totales_desde_agregados_mantenidos(self):
+        """Test: Productos, unidades y valor coinciden con lo recalculado"""
+        response = self.client.get(reverse('tablero-list'))
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['productos'], 2)
+        self.assertEqual(response.data['unidades'], 16 + 5)
+        self.assertEqual(response.data['valor_total'], Decimal('57.00'))
+        self.assertEqual(response.data['bajo_stock']['total'], 1)
+        self.assertEqual(response.data['bajo_stock']['productos'][0]['codigo'], 'TAB-B')
+        ultimos = response.data['ultimos_movimientos']
+        self.assertEqual([m['tipo'] for m in ultimos[:2]], ['entrada', 'salida'])
+        self.assertEqual(ultimos[0]['producto_nombre'], 'B')
+    
+    def test_bajas_y_ediciones_actualizan_totales(self):
+        """Test: Editar y borrar productos mantiene unidades y productos sin deriva"""
+        self.client.patch(
+            reverse('stockitem-detail', args=[self.a.id]), {'cantidad': 30}, format='json'
+        )
+        self.client.delete(reverse('stockitem-detail', args=[self.b.id]))
+        
+        response = self.client.get(reverse('tablero-list'))
+        self.assertEqual(response.data['productos'], 1)
+        self.assertEqual(response.data['unidades'], 30)
+        resultado = ValoracionService().verificar()
+        self.assertEqual((resultado['deriva_unidades'], resultado['deriva_productos']), (0, 0))
+    
+    def test_movimientos_de_hoy_sin_doble_conteo(self):
+        """Test: Entradas/salidas de hoy iguales antes y después de resumir"""
+        # crear_producto no registra movimiento de entrada
+        esperado = {'entradas': 2, 'salidas': 4}
+        antes = self.client.get(reverse('tablero-list')).data['hoy']
+        
+        ResumenMovimientosService().ponerse_al_dia()
+        self.service.restar_stock(self.b.id, 1)
+        despues = self.client.get(reverse('tablero-list')).data['hoy']
+        
+        self.assertEqual({k: antes[k] for k in esperado}, esperado)
+        self.assertEqual(despues['salidas'], 5)
+        self.assertEqual(despues['entradas'], esperado['entradas'])
+    
+    def test_respuesta_cacheada_y_parametros(self):
+        """Test: Con TTL la segunda llamada no consulta la BD; parámetros inválidos dan 400"""
+        with self.settings(STOCK_TABLERO_CACHE_TTL=60):
+            self.client.get(reverse('tablero-list'), {'ultimos': 5})
+            with self.assertNumQueries(0):
+                response = self.client.get(reverse('tablero-list'), {'ultimos': 5})
+        self.assertEqual(response.data['productos'], 2)
+        
+        response = self.client.get(reverse('tablero-list'), {'umbral': 'x'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class MovimientoFiltrosTest(APITestCase):
+    """Pruebas para los filtros y el orden de /api/movimientos/"""
+    
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        self.client = APIClient()
+        service = StockService()
+        self.a = service.crear_producto({'codigo': 'FIL-A', 'nombre': 'A', 'precio': Decimal('1.00'), 'cantidad': 50})
+        self.b = service.crear_producto({'codigo': 'FIL-B', 'nombre': 'B', 'precio': Decimal('1.00'), 'cantidad': 50})
+        service.restar_stock(self.a.id, 1)
+        service.restar_stock(self.a.id, 2)
+        service.agregar_stock(self.a.id, 3)
+        service.restar_stock(self.b.id, 4)
+        # Una salida de A de hace una semana
+        self.vieja = Movimiento.objects.filter(producto=self.a, tipo='salida').order_by('id').first()
+        Movimiento.objects.filter(pk=self.vieja.pk).update(
+            fecha=timezone.now() - timezone.timedelta(days=7)
+        )
+    
+    def listar(self, **params):
+        response = self.client.get(reverse('movimiento-list'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return response.data['results']
+    
+    def test_filtra_por_producto_tipo_y_rango(self):
+        """Test: Salidas de un producto en los últimos días"""
+        desde = (timezone.localdate() - timezone.timedelta(days=2)).isoformat()
+        resultados = self.listar(producto=self.a.id, tipo='salida', desde=desde)
+        
+        self.assertEqual([m['cantidad'] for m in resultados], [2])
+        self.assertEqual(len(self.listar(producto=self.a.id, tipo='salida')), 2)
+        self.assertEqual(len(self.listar(tipo='entrada')), 1)
+    
+    def test_hasta_con_fecha_incluye_el_dia(self):
+        """Test: hasta=YYYY-MM-DD incluye todo ese día; con hora es exacto"""
+        hoy = timezone.localdate().isoformat()
+        self.assertEqual(len(self.listar(hasta=hoy)), 4)
+        
+        antes = self.listar(hasta=(timezone.now() - timezone.timedelta(days=1)).isoformat())
+        self.assertEqual([m['id'] for m in antes], [self.vieja.id])
+    
+    def test_orden_lista_blanca(self):
+        """Test: orden=fecha invierte el listado; otros valores dan 400"""
+        recientes = [m['id'] for m in self.listar()]
+        antiguos = [m['id'] for m in self.listar(orden='fecha')]
+        
+        self.assertEqual(antiguos, list(reversed(recientes)))
+        self.assertEqual(antiguos[0], self.vieja.id)
+        response = self.client.get(reverse('movimiento-list'), {'orden': 'producto__nombre'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_parametros_invalidos(self):
+        """Test: Tipo, producto o fechas inválidos responden 400"""
+        for params in ({'tipo': 'robo'}, {'producto': 'x'}, {'desde': 'ayer'},
+                       {'desde': '2025-02-01', 'hasta': '2025-01-01'}):
+            response = self.client.get(reverse('movimiento-list'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+
+class TrazasTest(APITestCase):
+    """Pruebas para las trazas de requests (backend.trazas)"""
+    
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        import json
+        import os
+        import tempfile
+        self.json = json
+        self.client = APIClient()
+        self.producto = StockService().crear_producto(
+            {'codigo': 'TRZ-1', 'nombre': 'Trazado', 'precio': Decimal('1.00'), 'cantidad': 5}
+        )
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.archivo = os.path.join(directorio.name, 'trazas.json')
+    
+    def eventos(self):
+        with open(self.archivo, encoding='utf-8') as archivo:
+            # Arreglo sin cerrar (formato Trace Event): se cierra para leerlo
+            return self.json.loads(archivo.read().rstrip().rstrip(',') + ']')
+    
+    def test_restock_muestreado_registra_spans_anidados(self):
+        """Test: Una request muestreada exporta request, vista, servicio, bloqueo, SQL y COMMIT"""
+        with self.settings(STOCK_TRAZAS_MUESTREO=1.0, STOCK_TRAZAS_ARCHIVO=self.archivo):
+            response = self.client.put(
+                reverse('stockitem-restock', args=[self.producto.id]), {'cantidad': 3}, format='json'
+            )
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        eventos = self.eventos()
+        por_nombre = {evento['name']: evento for evento in eventos}
+        raiz = eventos[0]
+        self.assertEqual(raiz['cat'], 'http')
+        self.assertEqual(raiz['args']['trace_id'], response['X-Trace-Id'])
+        self.assertEqual(raiz['args']['status'], 200)
+        for nombre in ('StockViewSet.restock', 'StockService.agregar_stock',
+                       'StockValidator.validar_cantidad_positiva', 'select_for_update StockItem',
+                       'UnidadDeTrabajo.flush', 'COMMIT', 'INSERT'):
+            self.assertIn(nombre, por_nombre)
+        self.assertEqual({evento['ph'] for evento in eventos}, {'X'})
+        
+        # Cada span queda dentro de la request y el servicio dentro de la vista
+        def contiene(padre, hijo):
+            return padre['ts'] <= hijo['ts'] and hijo['ts'] + hijo['dur'] <= padre['ts'] + padre['dur'] + 1
+        fuera = [evento for evento in eventos if not contiene(raiz, evento)]
+        self.assertEqual(fuera, [])
+        vista = por_nombre['StockViewSet.restock']
+        self.assertTrue(contiene(vista, por_nombre['StockService.agregar_stock']))
+        # La vista abre la unidad de trabajo: su escritura y el COMMIT son parte del dispatch
+        self.assertTrue(contiene(vista, por_nombre['COMMIT']))
+    
+    def test_sin_muestreo_solo_cabecera(self):
+        """Test: Sin muestreo no se exporta nada pero la respuesta lleva X-Trace-Id"""
+        import os
+        with self.settings(STOCK_TRAZAS_MUESTREO=0.0, STOCK_TRAZAS_ARCHIVO=self.archivo):
+            response = self.client.get(reverse('stockitem-list'))
+            propagada = self.client.get(reverse('stockitem-list'), HTTP_X_TRACE_ID='abcdef0123456789')
+        
+        self.assertRegex(response['X-Trace-Id'], r'^[0-9a-f]{16}$')
+        self.assertEqual(propagada['X-Trace-Id'], 'abcdef0123456789')
+        self.assertFalse(os.path.exists(self.archivo))
+    
+    def test_trazas_se_agregan_al_mismo_archivo(self):
+        """Test: Varias requests muestreadas se agregan a un único arreglo válido"""
+        with self.settings(STOCK_TRAZAS_MUESTREO=1.0, STOCK_TRAZAS_ARCHIVO=self.archivo):
+            ids = {self.client.get(reverse('stockitem-list'))['X-Trace-Id'] for _ in range(2)}
+        
+        raices = [evento for evento in self.eventos() if evento['cat'] == 'http']
+        self.assertEqual({evento['args']['trace_id'] for evento in raices}, ids)
+        self.assertEqual(len(ids), 2)
+
+
+@override_settings(STOCK_REINTENTOS_MAX=2, STOCK_REINTENTOS_BASE_MS=0)
+class ReintentosTest(TransactionTestCase):
+    """Pruebas para los reintentos ante deadlocks y lock wait timeouts"""
+    
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        from django.db import OperationalError
+        from . import reintentos
+        self.reintentos = reintentos
+        self.deadlock = OperationalError(1213, 'Deadlock found when trying to get lock')
+        self.timeout = OperationalError(1205, 'Lock wait timeout exceeded')
+        self.ocupado = OperationalError(3572, 'Statement aborted because lock(s) could not be acquired immediately and NOWAIT is set.')
+        self.client = APIClient()
+        self.producto = StockService().crear_producto(
+            {'codigo': 'RET-1', 'nombre': 'Reintento', 'precio': Decimal('2.00'), 'cantidad': 10}
+        )
+    
+    def fallar_primero(self, *errores):
+        """Patch de obtener_producto que lanza los errores dados y luego lee de verdad"""
+        from unittest import mock
+        from .unit_of_work import UnidadDeTrabajo
+        original = UnidadDeTrabajo.obtener_producto
+        pendientes = list(errores)
+        llamadas = []
+        
+        def obtener(unidad, *args, **kwargs):
+            llamadas.append(kwargs)
+            if pendientes:
+                raise pendientes.pop(0)
+            return original(unidad, *args, **kwargs)
+        
+        return mock.patch.object(UnidadDeTrabajo, 'obtener_producto', obtener), llamadas
+    
+    def test_clasifica_errores(self):
+        """Test: Deadlock y timeout son reintentables; NOWAIT ocupado no"""
+        self.assertTrue(self.reintentos.es_reintentable(self.deadlock))
+        self.assertTrue(self.reintentos.es_reintentable(self.timeout))
+        self.assertFalse(self.reintentos.es_reintentable(self.ocupado))
+        self.assertTrue(self.reintentos.es_bloqueo_ocupado(self.ocupado))
+        self.assertFalse(self.reintentos.es_reintentable(ValueError('x')))
+    
+    def test_repite_la_unidad_completa(self):
+        """Test: Tras dos deadlocks la operación se aplica una sola vez"""
+        antes = self.reintentos.estadisticas_reintentos()
+        parche, llamadas = self.fallar_primero(self.deadlock, self.timeout)
+        with parche:
+            response = self.client.put(
+                reverse('stockitem-restock', args=[self.producto.id]), {'cantidad': 5}, format='json'
+            )
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(llamadas), 3)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 15)
+        self.assertEqual(Movimiento.objects.filter(producto=self.producto).count(), 1)
+        despues = self.reintentos.estadisticas_reintentos()
+        self.assertEqual(despues['reintentos'] - antes['reintentos'], 2)
+        self.assertEqual(despues['recuperadas'] - antes['recuperadas'], 1)
+    
+    def test_reintentos_agotados_responden_503(self):
+        """Test: Si el deadlock persiste se responde 503 con Retry-After, no 500"""
+        parche, llamadas = self.fallar_primero(*[self.deadlock] * 5)
+        with parche:
+            response = self.client.put(
+                reverse('stockitem-subtract-stock', args=[self.producto.id]), {'cantidad': 1}, format='json'
+            )
+        
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(len(llamadas), 3)
+    
+    def test_pool_agotado_responde_503(self):
+        """Test: Sin conexiones libres en el pool se responde 503 con Retry-After, sin reintentar"""
+        from backend.mysql_pool.pool import PoolAgotadoError
+        parche, llamadas = self.fallar_primero(PoolAgotadoError('Sin conexiones libres tras 10s'))
+        with parche:
+            response = self.client.put(
+                reverse('stockitem-subtract-stock', args=[self.producto.id]), {'cantidad': 1}, format='json'
+            )
+        
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(len(llamadas), 1)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 10)
+    
+    def test_sin_espera_responde_409(self):
+        """Test: ?sin_espera=true pide NOWAIT y un bloqueo ocupado da 409 sin reintentar"""
+        parche, llamadas = self.fallar_primero(self.ocupado)
+        with parche:
+            response = self.client.put(
+                reverse('stockitem-restock', args=[self.producto.id]) + '?sin_espera=true',
+                {'cantidad': 1}, format='json'
+            )
+        
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(llamadas, [{'sin_espera': True}])
+    
+    def test_no_reintenta_dentro_de_transaccion_ajena(self):
+        """Test: Dentro de un atomic externo el error sube sin reintentar"""
+        from django.db import OperationalError, transaction
+        parche, llamadas = self.fallar_primero(self.deadlock)
+        with parche, self.assertRaises(OperationalError), transaction.atomic():
+            StockService().agregar_stock(self.producto.id, 1)
+        self.assertEqual(len(llamadas), 1)
+    
+    def fallar_flush(self, error):
+        """Patch de UnidadDeTrabajo.flush que lanza error en la primera llamada"""
+        from unittest import mock
+        from .unit_of_work import UnidadDeTrabajo
+        original = UnidadDeTrabajo.flush
+        llamadas = []
+        
+        def flush(unidad):
+            llamadas.append(unidad)
+            if len(llamadas) == 1:
+                raise error
+            return original(unidad)
+        
+        return mock.patch.object(UnidadDeTrabajo, 'flush', flush), llamadas
+    
+    def test_put_no_se_reintenta_con_el_serializer_modificado(self):
+        """Test: Un lock wait timeout en el PUT responde 503 sin perder ni aplicar a medias la edición"""
+        parche, llamadas = self.fallar_flush(self.timeout)
+        url = reverse('stockitem-detail', args=[self.producto.id])
+        with parche:
+            response = self.client.patch(url, {'cantidad': 14}, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(len(llamadas), 1)
+        self.producto.refresh_from_db()
+        self.assertEqual((self.producto.cantidad, self.producto.version), (10, 1))
+        self.assertFalse(Movimiento.objects.filter(producto=self.producto).exists())
+        
+        # El reintento del cliente parte de una request nueva y se aplica entero
+        response = self.client.patch(url, {'cantidad': 14}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 14)
+        self.assertEqual(Movimiento.objects.filter(producto=self.producto).count(), 1)
+    
+    def test_post_no_confirma_un_alta_revertida(self):
+        """Test: Un deadlock en el POST responde 503 y no deja producto ni registro de cambios"""
+        parche, llamadas = self.fallar_flush(self.deadlock)
+        cambios = CambioProducto.objects.count()
+        with parche:
+            response = self.client.post(reverse('stockitem-list'), {
+                'codigo': 'RET-2', 'nombre': 'Alta', 'precio': '1.00', 'cantidad': 3,
+            }, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(len(llamadas), 1)
+        self.assertFalse(StockItem.objects.filter(codigo='RET-2').exists())
+        self.assertEqual(CambioProducto.objects.count(), cambios)
+    
+    def test_presupuesto_limita_reintentos(self):
+        """Test: Sin presupuesto no se reintenta aunque queden intentos"""
+        presupuesto = self.reintentos.PresupuestoReintentos(proporcion=0.5, maximo=1)
+        self.assertTrue(presupuesto.retirar())
+        self.assertFalse(presupuesto.retirar())
+        presupuesto.depositar()
+        presupuesto.depositar()
+        self.assertTrue(presupuesto.retirar())
+        
+        with self.settings(STOCK_REINTENTOS_PRESUPUESTO=0, STOCK_REINTENTOS_PRESUPUESTO_MAX=0):
+            parche, llamadas = self.fallar_primero(self.deadlock)
+            with parche, self.assertRaises(self.reintentos.ContencionDeBloqueosError):
+                StockService().agregar_stock(self.producto.id, 1)
+        self.assertEqual(len(llamadas), 1)
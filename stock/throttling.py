@@ -0,0 +1,255 @@
+"""
+Limitación de tasa y descarte de carga
+Los endpoints de stock son públicos y subtract/restock toman bloqueos de
+fila, así que un cliente mal comportado puede saturar la BD. Aquí hay tres
+defensas:
+
+- TokenBucketThrottle: un token bucket por cliente y endpoint (429 con
+  Retry-After al vaciarse). Almacén en memoria del proceso o, con
+  STOCK_LIMITES_ALMACEN='cache', en la caché de Django compartida.
+- Límite de concurrencia por producto: más de N escrituras simultáneas
+  sobre el mismo producto se rechazan en lugar de encolarse en su bloqueo.
+- Descarte adaptativo: si la latencia media de las escrituras con bloqueo
+  supera STOCK_LATENCIA_MAX_MS, se rechaza (503 con Retry-After) una
+  fracción de ellas proporcional al exceso hasta que la latencia baja.
+"""
+
+import math
+import random
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+
+
+class ServicioSaturado(APIException):
+    """
+    503 con Retry-After (custom_exception_handler conserva las cabeceras
+    que DRF agrega a partir de 'wait').
+    """
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Servicio saturado, intente nuevamente en unos segundos.'
+    default_code = 'servicio_saturado'
+
+    def __init__(self, wait: float = 1, detail=None):
+        super().__init__(detail)
+        self.wait = max(1, math.ceil(wait))
+
+
+# ==============================================================================
+# TOKEN BUCKET
+# ==============================================================================
+
+def _limites(tipo: str) -> Tuple[int, float]:
+    """(capacidad, tokens por segundo) para 'lectura' o 'escritura'"""
+    limites = getattr(settings, 'STOCK_LIMITES_TASA', {})
+    por_defecto = {'lectura': (120, 20.0), 'escritura': (30, 5.0)}
+    return limites.get(tipo, por_defecto[tipo])
+
+
+def _recargar(tokens: float, ultimo: float, ahora: float, capacidad: int, por_segundo: float) -> float:
+    return min(capacidad, tokens + (ahora - ultimo) * por_segundo)
+
+
+class AlmacenMemoria:
+    """
+    Buckets en memoria del proceso (cada worker limita por separado).
+    Guarda a lo sumo STOCK_LIMITES_MAX_CLAVES buckets: al superarlo se
+    olvidan los usados hace más tiempo (LRU), que son los que con más
+    probabilidad ya se recargaron del todo.
+    """
+
+    def __init__(self):
+        self._buckets: 'OrderedDict[str, Tuple[float, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consumir(self, clave: str, capacidad: int, por_segundo: float) -> float:
+        """
+        Consume un token.
+
+        Returns:
+            0 si se concedió; si no, segundos hasta que haya un token
+        """
+        ahora = time.monotonic()
+        maximo = getattr(settings, 'STOCK_LIMITES_MAX_CLAVES', 100000)
+        with self._lock:
+            # pop + inserción: el bucket queda al final (el más reciente)
+            tokens, ultimo = self._buckets.pop(clave, (capacidad, ahora))
+            tokens = _recargar(tokens, ultimo, ahora, capacidad, por_segundo)
+            concedido = tokens >= 1
+            if concedido:
+                tokens -= 1
+            self._buckets[clave] = (tokens, ahora)
+            while len(self._buckets) > maximo:
+                # Cota de memoria: un bucket olvidado vuelve lleno
+                self._buckets.popitem(last=False)
+        return 0 if concedido else (1 - tokens) / por_segundo
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+class AlmacenCache:
+    """
+    Buckets en la caché de Django (compartidos entre workers si la caché lo
+    es). get/set no es atómico: con ráfagas concurrentes del mismo cliente
+    el límite es aproximado, lo que basta para contener abusos.
+    """
+
+    def consumir(self, clave: str, capacidad: int, por_segundo: float) -> float:
+        clave = f'limite:{clave}'
+        ahora = time.time()
+        tokens, ultimo = cache.get(clave, (capacidad, ahora))
+        tokens = _recargar(tokens, ultimo, ahora, capacidad, por_segundo)
+        concedido = tokens >= 1
+        if concedido:
+            tokens -= 1
+        # Tras capacidad / por_segundo el bucket estaría lleno: puede expirar
+        cache.set(clave, (tokens, ahora), math.ceil(capacidad / por_segundo) + 1)
+        return 0 if concedido else (1 - tokens) / por_segundo
+
+
+_almacen_memoria = AlmacenMemoria()
+_almacen_cache = AlmacenCache()
+
+
+def obtener_almacen():
+    if getattr(settings, 'STOCK_LIMITES_ALMACEN', 'memoria') == 'cache':
+        return _almacen_cache
+    return _almacen_memoria
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Un bucket por cliente (usuario autenticado o IP) y endpoint
+    (viewset + acción). Lecturas y escrituras tienen límites distintos
+    (STOCK_LIMITES_TASA). La IP es la de get_ident: solo se toma de
+    X-Forwarded-For lo agregado por los NUM_PROXIES proxies de confianza.
+    """
+
+    def allow_request(self, request, view):
+        tipo = 'lectura' if request.method in SAFE_METHODS else 'escritura'
+        capacidad, por_segundo = _limites(tipo)
+        if request.user and request.user.is_authenticated:
+            cliente = f'usuario:{request.user.pk}'
+        else:
+            cliente = self.get_ident(request)
+        endpoint = f"{getattr(view, 'basename', view.__class__.__name__)}:{getattr(view, 'action', request.method)}"
+
+        self.espera = obtener_almacen().consumir(f'{cliente}:{endpoint}', capacidad, por_segundo)
+        return self.espera == 0
+
+    def wait(self):
+        return self.espera
+
+
+# ==============================================================================
+# CONCURRENCIA POR PRODUCTO Y DESCARTE ADAPTATIVO
+# ==============================================================================
+
+class MedidorLatencia:
+    """
+    Media móvil exponencial de la latencia de las escrituras con bloqueo.
+    Decae con el tiempo sin muestras, para que el descarte se relaje solo
+    aunque no entren escrituras.
+    """
+
+    def __init__(self, vida_media: float = 5.0):
+        self.vida_media = vida_media
+        self._media = 0.0
+        self._ultima = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _decaer(self, ahora: float) -> None:
+        self._media *= 0.5 ** ((ahora - self._ultima) / self.vida_media)
+        self._ultima = ahora
+
+    def registrar(self, segundos: float) -> None:
+        with self._lock:
+            self._decaer(time.monotonic())
+            self._media += 0.2 * (segundos - self._media)
+
+    def media(self) -> float:
+        with self._lock:
+            self._decaer(time.monotonic())
+            return self._media
+
+    def reiniciar(self) -> None:
+        with self._lock:
+            self._media = 0.0
+            self._ultima = time.monotonic()
+
+
+medidor_latencia = MedidorLatencia()
+
+_en_curso: Dict[str, int] = {}
+_en_curso_lock = threading.Lock()
+_estadisticas = {'rechazadas_concurrencia': 0, 'descartadas_latencia': 0}
+
+
+def _descartar_por_latencia() -> None:
+    umbral = getattr(settings, 'STOCK_LATENCIA_MAX_MS', 500) / 1000
+    media = medidor_latencia.media()
+    if media <= umbral:
+        return
+    # Fracción rechazada proporcional al exceso (siempre pasa algo de tráfico
+    # para seguir midiendo)
+    probabilidad = min(0.9, (media - umbral) / umbral)
+    if random.random() < probabilidad:  # nosec B311 - muestreo, no seguridad
+        with _en_curso_lock:
+            _estadisticas['descartadas_latencia'] += 1
+        raise ServicioSaturado(wait=media * 2)
+
+
+@contextmanager
+def proteger_escritura(producto_id=None):
+    """
+    Envuelve una escritura que toma bloqueos de fila: aplica el descarte por
+    latencia y el límite de escrituras simultáneas sobre el producto, y
+    mide la duración para el descarte.
+
+    Raises:
+        ServicioSaturado: Si la escritura se rechaza
+    """
+    _descartar_por_latencia()
+
+    if producto_id is not None:
+        producto_id = str(producto_id)
+        limite = getattr(settings, 'STOCK_CONCURRENCIA_POR_PRODUCTO', 4)
+        with _en_curso_lock:
+            if _en_curso.get(producto_id, 0) >= limite:
+                _estadisticas['rechazadas_concurrencia'] += 1
+                raise ServicioSaturado(
+                    wait=1, detail='Demasiadas operaciones simultáneas sobre este producto.'
+                )
+            _en_curso[producto_id] = _en_curso.get(producto_id, 0) + 1
+
+    inicio = time.monotonic()
+    try:
+        yield
+    finally:
+        medidor_latencia.registrar(time.monotonic() - inicio)
+        if producto_id is not None:
+            with _en_curso_lock:
+                restantes = _en_curso[producto_id] - 1
+                if restantes:
+                    _en_curso[producto_id] = restantes
+                else:
+                    del _en_curso[producto_id]
+
+
+def estadisticas_carga() -> Dict[str, float]:
+    with _en_curso_lock:
+        datos = dict(_estadisticas)
+        datos['escrituras_en_curso'] = sum(_en_curso.values())
+    datos['latencia_media_ms'] = round(medidor_latencia.media() * 1000, 1)
+    return datos
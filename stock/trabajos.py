@@ -0,0 +1,514 @@
+"""
+Trabajos en segundo plano
+Las operaciones pesadas (importaciones, ajustes masivos, conciliación,
+exportaciones, reportes) no deben ocupar un worker de gunicorn. Se encolan
+en la tabla Trabajo y las ejecuta 'manage.py trabajador' con un pool de
+hilos o de procesos, sin broker externo:
+
+- Reclamo: SELECT ... FOR UPDATE SKIP LOCKED y un UPDATE condicional, así
+  dos trabajadores nunca toman el mismo trabajo.
+- Progreso: la tarea informa su avance con contexto.avanzar(); ahí mismo
+  se atiende una cancelación pedida mientras corre.
+- Reintentos: un fallo vuelve a encolar el trabajo con espera exponencial
+  (con jitter) hasta agotar max_intentos. Los errores de parámetros
+  (TypeError, ValidationError) no se reintentan: fallarían igual.
+- Latido: el trabajador renueva el latido de lo que ejecuta; un trabajo en
+  curso sin latido reciente (trabajador caído) vuelve a la cola.
+- Periódicas: el trabajador encola las tareas de PERIODICAS cuando vence
+  su intervalo (resúmenes de movimientos, su conciliación y la purga de
+  trabajos terminados y archivos exportados pasada la retención).
+
+Las tareas se registran con @tarea('nombre') y reciben el contexto y los
+parámetros del trabajo; lo que devuelven (JSON) queda en 'resultado'.
+"""
+
+import csv
+import inspect
+import logging
+import os
+import random
+import time
+from datetime import timedelta
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Movimiento, Trabajo
+from .services import (
+    AnalisisService,
+    PronosticoService,
+    ResumenMovimientosService,
+    StockService,
+    ValoracionService,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class TrabajoCancelado(Exception):
+    """La cancelación se pidió mientras la tarea estaba en curso"""
+    pass
+
+
+# Errores que repetirían el mismo resultado en cada intento
+ERRORES_PERMANENTES = (TypeError, ValidationError)
+
+
+# ==============================================================================
+# REGISTRO DE TAREAS
+# ==============================================================================
+
+_TAREAS: Dict[str, Dict[str, Any]] = {}
+
+
+def tarea(nombre: str, max_intentos: int = 3):
+    """
+    Registra una función como tarea ejecutable en segundo plano.
+
+    Args:
+        nombre: Tipo de trabajo con el que se encola
+        max_intentos: Intentos por defecto (1 para tareas que no pueden
+            repetirse sin efectos duplicados)
+    """
+    def registrar(funcion: Callable) -> Callable:
+        _TAREAS[nombre] = {'funcion': funcion, 'max_intentos': max_intentos}
+        return funcion
+    return registrar
+
+
+def tipos_disponibles() -> list:
+    return sorted(_TAREAS)
+
+
+class ContextoTrabajo:
+    """
+    Lo que recibe la tarea para informar su avance. Las escrituras de
+    progreso se espacian (INTERVALO segundos) para no cargar la BD.
+    """
+    INTERVALO = 0.5
+
+    def __init__(self, trabajo: Trabajo):
+        self.trabajo = trabajo
+        self._ultimo_aviso = None
+
+    def avanzar(self, hechos: int, total: int, mensaje: str = '') -> None:
+        """
+        Guarda el progreso y renueva el latido.
+
+        Raises:
+            TrabajoCancelado: Si se pidió cancelar el trabajo
+        """
+        progreso = min(1.0, hechos / total) if total else 1.0
+        ahora = time.monotonic()
+        if (self._ultimo_aviso is not None and ahora - self._ultimo_aviso < self.INTERVALO
+                and progreso < 1):
+            return
+        self._ultimo_aviso = ahora
+
+        Trabajo.objects.filter(pk=self.trabajo.pk).update(
+            progreso=progreso, mensaje=mensaje[:200], latido=timezone.now()
+        )
+        if Trabajo.objects.filter(pk=self.trabajo.pk, cancelar=True).exists():
+            raise TrabajoCancelado()
+
+
+# ==============================================================================
+# COLA
+# ==============================================================================
+
+def encolar(tipo: str, parametros: Optional[Dict[str, Any]] = None,
+            max_intentos: Optional[int] = None) -> Trabajo:
+    """
+    Encola un trabajo.
+
+    Args:
+        tipo: Tarea registrada (ver tipos_disponibles)
+        parametros: Argumentos de la tarea (JSON)
+        max_intentos: Intentos antes de darlo por fallido (por defecto, el de la tarea)
+
+    Returns:
+        Trabajo creado (pendiente)
+
+    Raises:
+        ValidationError: Si el tipo no existe o los parámetros no son un
+            objeto o no coinciden con los argumentos de la tarea
+    """
+    if tipo not in _TAREAS:
+        raise ValidationError(
+            f"Tipo de trabajo inválido. Valores permitidos: {', '.join(tipos_disponibles())}"
+        )
+    if parametros is not None and not isinstance(parametros, dict):
+        raise ValidationError("parametros debe ser un objeto")
+    try:
+        # El primer argumento de la tarea es el contexto
+        inspect.signature(_TAREAS[tipo]['funcion']).bind(None, **(parametros or {}))
+    except TypeError as exc:
+        raise ValidationError(f"Parámetros inválidos para {tipo}: {exc}")
+    trabajo = Trabajo.objects.create(
+        tipo=tipo,
+        parametros=parametros or {},
+        max_intentos=max_intentos or _TAREAS[tipo]['max_intentos'],
+    )
+    logger.info(f"Trabajo encolado: {trabajo}")
+    return trabajo
+
+
+def cancelar(trabajo: Trabajo) -> Trabajo:
+    """
+    Cancela un trabajo pendiente al instante; uno en curso se marca y se
+    detiene en su próximo avance. Los ya terminados no cambian.
+    """
+    ahora = timezone.now()
+    if Trabajo.objects.filter(pk=trabajo.pk, estado='pendiente').update(
+        estado='cancelado', cancelar=True, terminado=ahora
+    ) == 0:
+        Trabajo.objects.filter(pk=trabajo.pk, estado='en_curso').update(cancelar=True)
+    trabajo.refresh_from_db()
+    return trabajo
+
+
+def reintentar(trabajo: Trabajo) -> Trabajo:
+    """
+    Vuelve a encolar un trabajo fallido o cancelado, con intentos nuevos.
+
+    Raises:
+        ValidationError: Si el trabajo no está fallido ni cancelado
+    """
+    if not Trabajo.objects.filter(pk=trabajo.pk, estado__in=['fallido', 'cancelado']).update(
+        estado='pendiente', cancelar=False, intentos=0, progreso=0, mensaje='', error='',
+        resultado=None, disponible_desde=timezone.now(), terminado=None,
+    ):
+        raise ValidationError("Solo se pueden reintentar trabajos fallidos o cancelados")
+    trabajo.refresh_from_db()
+    return trabajo
+
+
+def espera_reintento(intentos: int) -> float:
+    """Segundos antes del siguiente intento: exponencial con jitter"""
+    base = getattr(settings, 'STOCK_TRABAJOS_REINTENTO_BASE', 5)
+    maximo = getattr(settings, 'STOCK_TRABAJOS_REINTENTO_MAX', 600)
+    espera = min(maximo, base * 2 ** max(0, intentos - 1))
+    return espera * random.uniform(0.5, 1)  # nosec B311 - jitter, no seguridad
+
+
+def tomar(trabajador: str) -> Optional[Trabajo]:
+    """
+    Reclama el próximo trabajo disponible para este trabajador.
+
+    SKIP LOCKED evita que trabajadores concurrentes esperen la misma fila;
+    el UPDATE condicional garantiza la exclusividad también en motores
+    sin bloqueos de fila.
+    """
+    ahora = timezone.now()
+    with transaction.atomic():
+        candidato = (
+            Trabajo.objects.select_for_update(skip_locked=True)
+            .filter(estado='pendiente', disponible_desde__lte=ahora)
+            .order_by('disponible_desde', 'id')
+            .first()
+        )
+        if candidato is None:
+            return None
+        tomado = Trabajo.objects.filter(pk=candidato.pk, estado='pendiente').update(
+            estado='en_curso',
+            intentos=candidato.intentos + 1,
+            trabajador=trabajador,
+            iniciado=ahora,
+            latido=ahora,
+        )
+    if not tomado:
+        return None
+    candidato.refresh_from_db()
+    return candidato
+
+
+def ejecutar(trabajo: Trabajo) -> Trabajo:
+    """Ejecuta un trabajo ya reclamado y registra su resultado, fallo o cancelación"""
+    tarea_registrada = _TAREAS.get(trabajo.tipo)
+    cambios: Dict[str, Any]
+    try:
+        if tarea_registrada is None:
+            raise ValidationError(f"Tipo de trabajo desconocido: {trabajo.tipo}")
+        resultado = tarea_registrada['funcion'](ContextoTrabajo(trabajo), **trabajo.parametros)
+    except TrabajoCancelado:
+        logger.info(f"Trabajo cancelado: {trabajo}")
+        cambios = {'estado': 'cancelado', 'terminado': timezone.now()}
+    except Exception as exc:
+        error = f"{type(exc).__name__}: {exc}"
+        if trabajo.intentos < trabajo.max_intentos and not isinstance(exc, ERRORES_PERMANENTES):
+            espera = espera_reintento(trabajo.intentos)
+            logger.warning(f"Trabajo {trabajo} falló ({error}); reintento en {espera:.0f} s")
+            cambios = {
+                'estado': 'pendiente',
+                'error': error,
+                'disponible_desde': timezone.now() + timedelta(seconds=espera),
+            }
+        else:
+            logger.exception(f"Trabajo fallido tras {trabajo.intentos} intentos: {trabajo}")
+            cambios = {'estado': 'fallido', 'error': error, 'terminado': timezone.now()}
+    else:
+        cambios = {
+            'estado': 'completado', 'resultado': resultado, 'progreso': 1.0,
+            'error': '', 'terminado': timezone.now(),
+        }
+
+    # Solo si sigue siendo nuestro (no se reencoló por falta de latido)
+    Trabajo.objects.filter(pk=trabajo.pk, estado='en_curso', intentos=trabajo.intentos).update(**cambios)
+    trabajo.refresh_from_db()
+    return trabajo
+
+
+def ejecutar_por_id(trabajo_id: int) -> None:
+    """Punto de entrada en los hilos/procesos del trabajador"""
+    try:
+        ejecutar(Trabajo.objects.get(pk=trabajo_id))
+    finally:
+        # Cada hilo/proceso abre su propia conexión: se libera al terminar
+        connections.close_all()
+
+
+def renovar_latidos(ids: Iterable[int]) -> None:
+    ids = list(ids)
+    if ids:
+        Trabajo.objects.filter(pk__in=ids, estado='en_curso').update(latido=timezone.now())
+
+
+def reencolar_abandonados() -> int:
+    """
+    Devuelve a la cola los trabajos en curso sin latido reciente (su
+    trabajador se cayó); los que ya agotaron sus intentos quedan fallidos.
+
+    Returns:
+        Cantidad de trabajos recuperados
+    """
+    limite = timezone.now() - timedelta(seconds=getattr(settings, 'STOCK_TRABAJOS_LATIDO_MAX', 120))
+    abandonados = Trabajo.objects.filter(estado='en_curso', latido__lt=limite)
+    error = 'Trabajador sin latido: el trabajo se interrumpió'
+    cancelados = abandonados.filter(cancelar=True).update(
+        estado='cancelado', error=error, terminado=timezone.now()
+    )
+    fallidos = abandonados.filter(intentos__gte=F('max_intentos')).update(
+        estado='fallido', error=error, terminado=timezone.now()
+    )
+    reencolados = abandonados.update(estado='pendiente', error=error, disponible_desde=timezone.now())
+    if cancelados or fallidos or reencolados:
+        logger.warning(
+            f"Trabajos abandonados: {reencolados} reencolados, {fallidos} fallidos, "
+            f"{cancelados} cancelados"
+        )
+    return cancelados + fallidos + reencolados
+
+
+def purgar_terminados() -> Dict[str, int]:
+    """
+    Borra los trabajos terminados (completados, fallidos o cancelados) hace
+    más de STOCK_TRABAJOS_RETENCION_DIAS y los archivos de STOCK_TRABAJOS_DIR
+    modificados antes de ese límite.
+
+    Returns:
+        Dict con la cantidad de trabajos y de archivos borrados
+    """
+    dias = getattr(settings, 'STOCK_TRABAJOS_RETENCION_DIAS', 7)
+    limite = timezone.now() - timedelta(days=dias)
+    borrados, _ = Trabajo.objects.filter(
+        estado__in=('completado', 'fallido', 'cancelado'), terminado__lt=limite
+    ).delete()
+
+    archivos = 0
+    directorio = settings.STOCK_TRABAJOS_DIR
+    if os.path.isdir(directorio):
+        for entrada in os.scandir(directorio):
+            try:
+                if entrada.is_file() and entrada.stat().st_mtime < limite.timestamp():
+                    os.remove(entrada.path)
+                    archivos += 1
+            except FileNotFoundError:
+                # Otro trabajador lo borró primero
+                continue
+    if borrados or archivos:
+        logger.info(f"Purga de trabajos: {borrados} trabajos y {archivos} archivos borrados")
+    return {'trabajos': borrados, 'archivos': archivos}
+
+
+# Tipo de trabajo -> (setting con el intervalo en segundos, intervalo por defecto)
+PERIODICAS = {
+    'actualizar_resumenes': ('STOCK_RESUMEN_INTERVALO', 60),
+    'conciliar_resumenes': ('STOCK_RESUMEN_CONCILIACION_INTERVALO', 3600),
+    'purgar_trabajos': ('STOCK_TRABAJOS_PURGA_INTERVALO', 3600),
+}
+
+
+def programar_periodicas() -> list:
+    """
+    Encola las tareas periódicas cuyo intervalo venció: ninguna pendiente o
+    en curso del mismo tipo y ninguna creada dentro del intervalo. Si dos
+    trabajadores encolan la misma a la vez no hay daño: las tareas
+    periódicas se serializan con su propio bloqueo.
+
+    Returns:
+        Trabajos encolados
+    """
+    ahora = timezone.now()
+    encolados = []
+    for tipo, (ajuste, por_defecto) in PERIODICAS.items():
+        intervalo = getattr(settings, ajuste, por_defecto)
+        if intervalo <= 0:
+            continue
+        recientes = Trabajo.objects.filter(tipo=tipo).filter(
+            Q(estado__in=('pendiente', 'en_curso')) | Q(creado__gte=ahora - timedelta(seconds=intervalo))
+        )
+        if not recientes.exists():
+            encolados.append(encolar(tipo))
+    return encolados
+
+
+# ==============================================================================
+# TAREAS
+# ==============================================================================
+
+def _por_bloques(filas: list, lote: int):
+    for inicio in range(0, len(filas), lote):
+        yield inicio, filas[inicio:inicio + lote]
+
+
+@tarea('importar_productos')
+def importar_productos(contexto: ContextoTrabajo, filas: list, lote: int = 500) -> Dict[str, Any]:
+    """
+    StockService.importar_productos por bloques (una transacción por bloque).
+    Repetirla es seguro: los códigos ya importados se reportan como error.
+    """
+    creados = 0
+    errores = {}
+    for inicio, bloque in _por_bloques(filas, lote):
+        resultado = StockService().importar_productos(bloque)
+        creados += resultado['creados']
+        errores.update({inicio + indice: error for indice, error in resultado['errores'].items()})
+        contexto.avanzar(inicio + len(bloque), len(filas), f"{creados} productos creados")
+    return {'creados': creados, 'errores': errores}
+
+
+@tarea('ajustar_lote', max_intentos=1)
+def ajustar_lote(contexto: ContextoTrabajo, ajustes: list, todo_o_nada: bool = False,
+                 omitir_bloqueados: bool = False, lote: int = 500) -> Dict[str, Any]:
+    """
+    StockService.ajustar_lote; con todo_o_nada en una sola transacción, si
+    no por bloques. Sin reintentos: repetirla duplicaría los ajustes.
+    """
+    if todo_o_nada:
+        resultado = StockService().ajustar_lote(
+            ajustes, todo_o_nada=True, omitir_bloqueados=omitir_bloqueados
+        )
+        contexto.avanzar(len(ajustes), len(ajustes))
+        return resultado
+
+    aplicados = 0
+    errores = {}
+    for inicio, bloque in _por_bloques(ajustes, lote):
+        resultado = StockService().ajustar_lote(bloque, omitir_bloqueados=omitir_bloqueados)
+        aplicados += resultado['aplicados']
+        errores.update({inicio + indice: error for indice, error in resultado['errores'].items()})
+        contexto.avanzar(inicio + len(bloque), len(ajustes), f"{aplicados} ajustes aplicados")
+    return {'aplicados': aplicados, 'errores': errores}
+
+
+@tarea('verificar_valoracion')
+def verificar_valoracion(contexto: ContextoTrabajo, corregir: bool = False) -> Dict[str, Any]:
+    """Conciliación del valor del inventario (ValoracionService.verificar)"""
+    return ValoracionService().verificar(corregir=corregir)
+
+
+def _fecha(valor: Optional[str], nombre: str):
+    if valor is None:
+        return None
+    fecha = parse_date(valor)
+    if fecha is None:
+        raise ValueError(f"{nombre} inválida: {valor}. Use el formato YYYY-MM-DD")
+    return fecha
+
+
+@tarea('actualizar_resumenes')
+def actualizar_resumenes(contexto: ContextoTrabajo) -> Dict[str, Any]:
+    """Resume los movimientos nuevos (ResumenMovimientosService.ponerse_al_dia)"""
+    return {'resumidos': ResumenMovimientosService().ponerse_al_dia()}
+
+
+@tarea('conciliar_resumenes')
+def conciliar_resumenes(contexto: ContextoTrabajo, dias: Optional[int] = None) -> Dict[str, Any]:
+    """Recalcula los resúmenes de los últimos días (ResumenMovimientosService.conciliar)"""
+    dias = dias or getattr(settings, 'STOCK_RESUMEN_CONCILIACION_DIAS', 2)
+    return {'dias': dias, 'resumidos': ResumenMovimientosService().conciliar(dias)}
+
+
+@tarea('purgar_trabajos')
+def purgar_trabajos(contexto: ContextoTrabajo) -> Dict[str, Any]:
+    """Borra trabajos terminados y archivos exportados pasada la retención (purgar_terminados)"""
+    return purgar_terminados()
+
+
+@tarea('reporte_movimientos')
+def reporte_movimientos(contexto: ContextoTrabajo, desde: str, hasta: str, granularidad: str = 'dia',
+                        producto_id: Optional[int] = None, por_producto: bool = True) -> Dict[str, Any]:
+    """Reporte de movimientos por periodo (ResumenMovimientosService.reporte)"""
+    service = ResumenMovimientosService()
+    service.ponerse_al_dia()
+    filas = list(service.reporte(
+        granularidad, _fecha(desde, 'desde'), _fecha(hasta, 'hasta'),
+        producto_id=producto_id, por_producto=por_producto,
+    ))
+    return {'granularidad': granularidad, 'desde': desde, 'hasta': hasta, 'resultados': filas}
+
+
+@tarea('exportar_movimientos')
+def exportar_movimientos(contexto: ContextoTrabajo, desde: Optional[str] = None,
+                         hasta: Optional[str] = None, producto_id: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Exporta movimientos a CSV en STOCK_TRABAJOS_DIR, leyéndolos por bloques
+    (sin cargar el historial en memoria). El archivo se descarga desde el
+    resultado del trabajo.
+    """
+    queryset = Movimiento.objects.order_by('id')
+    if desde:
+        queryset = queryset.filter(fecha__date__gte=_fecha(desde, 'desde'))
+    if hasta:
+        queryset = queryset.filter(fecha__date__lte=_fecha(hasta, 'hasta'))
+    if producto_id is not None:
+        queryset = queryset.filter(producto_id=producto_id)
+
+    directorio = settings.STOCK_TRABAJOS_DIR
+    os.makedirs(directorio, exist_ok=True)
+    archivo = f"movimientos-{contexto.trabajo.pk}.csv"
+    total = queryset.count()
+    filas = 0
+    with open(os.path.join(directorio, archivo), 'w', newline='', encoding='utf-8') as destino:
+        escritor = csv.writer(destino)
+        columnas = ['id', 'producto_id', 'producto__codigo', 'tipo', 'cantidad', 'fecha', 'ubicacion_id']
+        escritor.writerow(['id', 'producto', 'codigo', 'tipo', 'cantidad', 'fecha', 'ubicacion'])
+        for fila in queryset.values_list(*columnas).iterator(chunk_size=2000):
+            escritor.writerow(fila)
+            filas += 1
+            if filas % 2000 == 0:
+                contexto.avanzar(filas, total, f"{filas} movimientos exportados")
+    contexto.avanzar(filas, filas)
+    return {'archivo': archivo, 'filas': filas}
+
+
+@tarea('calcular_analisis')
+def calcular_analisis(contexto: ContextoTrabajo) -> Dict[str, Any]:
+    """Recalcula el análisis ABC (AnalisisService.calcular)"""
+    return AnalisisService().calcular()
+
+
+@tarea('calcular_pronostico')
+def calcular_pronostico(contexto: ContextoTrabajo) -> Dict[str, Any]:
+    """Recalcula el pronóstico de demanda (PronosticoService.calcular)"""
+    resultado = PronosticoService().calcular()
+    return {
+        'calculado': resultado['calculado'],
+        'productos': resultado['productos'],
+        'a_reponer': resultado['a_reponer'],
+    }
@@ -0,0 +1,434 @@
+"""
+Unit of Work - Coalescencia de escrituras por request
+Las vistas y los servicios registran aquí los cambios en lugar de escribir
+directamente; al final de la unidad se escriben en una sola transacción:
+
+- un UPDATE por producto modificado, solo con los campos cambiados y
+  condicionado a la versión leída (compare-and-swap)
+- un UPDATE relativo (cantidad = cantidad + delta) por producto cuyo total
+  cambió sin leerlo bloqueado (operaciones por ubicación)
+- un INSERT (bulk_create) para todos los movimientos pendientes
+- un UPDATE para el delta acumulado del valor del inventario (y de sus
+  unidades y cantidad de productos)
+
+- un INSERT en el registro de cambios del catálogo (CambioProducto)
+
+Tras el COMMIT se publican los cambios en el hub de eventos (ver eventos.py).
+Las unidades abiertas con en_unidad_de_trabajo o @transaccional(reintentar=True)
+se repiten completas ante deadlocks y lock wait timeouts (ver reintentos.py).
+"""
+
+import contextvars
+import functools
+import logging
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F
+
+from backend.trazas import span
+from .eventos import publicar_cambios
+from .models import StockItem, Movimiento
+from .reintentos import con_reintentos
+
+logger = logging.getLogger(__name__)
+
+
+_unidad_actual = contextvars.ContextVar('unidad_de_trabajo', default=None)
+
+# Acumulado del proceso, para diagnóstico
+_estadisticas = {
+    'unidades': 0,
+    'sentencias_sin_unidad': 0,
+    'sentencias_ejecutadas': 0,
+}
+
+
+def unidad_de_trabajo_actual() -> Optional['UnidadDeTrabajo']:
+    """Devuelve la unidad de trabajo activa en este contexto (o None)"""
+    return _unidad_actual.get()
+
+
+def estadisticas_globales() -> Dict[str, int]:
+    """Totales acumulados de sentencias del proceso"""
+    datos = dict(_estadisticas)
+    datos['sentencias_ahorradas'] = datos['sentencias_sin_unidad'] - datos['sentencias_ejecutadas']
+    return datos
+
+
+class UnidadDeTrabajo:
+    """
+    Unidad de trabajo: abre una transacción, acumula cambios y los escribe
+    todos juntos al salir. Si ocurre una excepción no se escribe nada.
+
+    Uso:
+        with UnidadDeTrabajo() as uow:
+            item.cantidad -= 5
+            uow.registrar_cambio(item, 'cantidad')
+            uow.registrar_movimiento(item, 'salida', 5)
+    """
+
+    def __init__(self, using: str = DEFAULT_DB_ALIAS):
+        self.using = using
+        self._cambios: Dict[Any, Dict[str, Any]] = {}
+        # Versión de cada producto cuando se registró su primer cambio
+        self._versiones: Dict[Any, int] = {}
+        # Mapa de identidad: productos cargados o modificados en la unidad
+        self._instancias: Dict[Any, StockItem] = {}
+        # Productos del mapa leídos con SELECT ... FOR UPDATE
+        self._bloqueados: set = set()
+        self._movimientos: List[Movimiento] = []
+        # Deltas de StockItem.cantidad aplicados sin bloquear el producto
+        self._deltas_cantidad: Dict[Any, int] = {}
+        self._delta_valor = Decimal('0')
+        self._delta_unidades = 0
+        self._delta_productos = 0
+        # Productos escritos fuera de registrar_cambio (altas, bulk_update) y bajas
+        self._notificar: Dict[Any, Tuple[StockItem, str]] = {}
+        self._eliminados: List[Any] = []
+        self.movimientos_creados: List[Movimiento] = []
+        self.productos_actualizados: List[StockItem] = []
+        self.sentencias_sin_unidad = 0
+        self.sentencias_ejecutadas = 0
+        self.transacciones_anidadas_evitadas = 0
+        # Llamadas @transaccional en curso que reutilizan esta unidad
+        self.anidamiento = 0
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    def __enter__(self):
+        self._token = _unidad_actual.set(self)
+        self._atomic = transaction.atomic(using=self.using)
+        self._atomic.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                try:
+                    with span('UnidadDeTrabajo.flush', 'unidad_de_trabajo'):
+                        self.flush()
+                except BaseException as exc:
+                    self._atomic.__exit__(type(exc), exc, exc.__traceback__)
+                    raise
+                with span('COMMIT', 'unidad_de_trabajo'):
+                    return self._atomic.__exit__(exc_type, exc_value, traceback)
+            return self._atomic.__exit__(exc_type, exc_value, traceback)
+        finally:
+            _unidad_actual.reset(self._token)
+            if exc_type is None:
+                self._registrar_estadisticas()
+
+    # ------------------------------------------------------------------
+    # Registro de cambios
+    # ------------------------------------------------------------------
+
+    def obtener_producto(self, pk, bloquear: bool = True, sin_espera: bool = False) -> StockItem:
+        """
+        Devuelve el producto desde el mapa de identidad de la unidad; si aún
+        no se cargó, lo lee (con SELECT ... FOR UPDATE si bloquear=True).
+        Así varias operaciones sobre el mismo producto ven los cambios
+        pendientes de las anteriores. Si se pide bloquear un producto que
+        el mapa tiene sin bloqueo, se vuelve a leer con FOR UPDATE.
+
+        Args:
+            sin_espera: FOR UPDATE NOWAIT: si otra transacción tiene el
+                producto bloqueado, falla de inmediato en lugar de esperar
+
+        Raises:
+            StockItem.DoesNotExist: Si el producto no existe
+            RecursoBloqueadoError: Con sin_espera, si el producto está bloqueado
+        """
+        pk = StockItem._meta.pk.to_python(pk)
+        cargado = self._instancias.get(pk)
+        if cargado is not None and (not bloquear or pk in self._bloqueados):
+            return cargado
+        queryset = StockItem.objects.using(self.using)
+        if not bloquear:
+            item = queryset.get(pk=pk)
+        else:
+            # Incluye la espera por el bloqueo de otra transacción
+            with span('select_for_update StockItem', 'bloqueo', pk=pk):
+                item = queryset.select_for_update(nowait=sin_espera).get(pk=pk)
+            self._bloqueados.add(pk)
+            if cargado is not None and pk in self._cambios:
+                # Cambios pendientes sobre la copia sin bloqueo: se conservan y
+                # el UPDATE condicionado a la versión leída detecta si quedó vieja
+                return cargado
+        self._instancias[pk] = item
+        return item
+
+    def registrar_cambio(self, item: StockItem, *campos: str) -> None:
+        """
+        Marca campos de un producto como modificados. Varios registros del
+        mismo producto se combinan en un solo UPDATE.
+
+        Args:
+            item: Producto modificado (ya con los valores nuevos)
+            campos: Nombres de los campos modificados
+        """
+        self.sentencias_sin_unidad += 1
+        if not campos:
+            return
+        self._versiones.setdefault(item.pk, item.version)
+        valores = self._cambios.setdefault(item.pk, {})
+        for campo in campos:
+            valores[campo] = getattr(item, campo)
+        self._instancias[item.pk] = item
+
+    def registrar_movimiento(
+        self,
+        producto: StockItem,
+        tipo: str,
+        cantidad: int,
+        ubicacion=None,
+        transferencia=None,
+    ) -> Movimiento:
+        """
+        Agrega un movimiento pendiente de inserción.
+
+        Args:
+            ubicacion: Ubicación afectada (None: movimiento sobre el total)
+            transferencia: UUID compartido por las dos filas de una transferencia
+
+        Returns:
+            Instancia de Movimiento (tendrá ID después de escribir la unidad)
+        """
+        self.sentencias_sin_unidad += 1
+        movimiento = Movimiento(
+            producto=producto, tipo=tipo, cantidad=cantidad,
+            ubicacion=ubicacion, transferencia=transferencia,
+        )
+        self._movimientos.append(movimiento)
+        return movimiento
+
+    def registrar_delta_cantidad(self, item: StockItem, delta: int) -> None:
+        """
+        Acumula un cambio del total StockItem.cantidad que se aplica al final
+        con un UPDATE relativo, sin haber bloqueado el producto: el bloqueo
+        de la fila dura solo hasta el COMMIT.
+        """
+        if delta:
+            self.sentencias_sin_unidad += 1
+            self._deltas_cantidad[item.pk] = self._deltas_cantidad.get(item.pk, 0) + delta
+            self._instancias.setdefault(item.pk, item)
+
+    def registrar_delta_valor(self, delta: Decimal, unidades: int = 0, productos: int = 0) -> None:
+        """
+        Acumula un cambio de los totales del inventario (se aplica una vez).
+
+        Args:
+            delta: Cambio del valor (precio * cantidad)
+            unidades: Cambio de la suma de StockItem.cantidad
+            productos: Altas (+1) y bajas (-1) de productos
+        """
+        if delta or unidades or productos:
+            self.sentencias_sin_unidad += 1
+            self._delta_valor += delta
+            self._delta_unidades += unidades
+            self._delta_productos += productos
+
+    def notificar_producto(self, item: StockItem, operacion: str = 'actualizar') -> None:
+        """
+        Registra en el log de cambios y publica al confirmar un producto
+        escrito sin registrar_cambio (altas, bulk_update).
+
+        Args:
+            item: Producto con su estado final
+            operacion: 'crear' o 'actualizar'
+        """
+        anterior = self._notificar.get(item.pk)
+        if anterior is not None and anterior[1] == 'crear':
+            operacion = 'crear'
+        self._notificar[item.pk] = (item, operacion)
+
+    def notificar_eliminacion(self, pk) -> None:
+        """Registra y publica la baja del producto (lápida) al confirmar"""
+        self._notificar.pop(pk, None)
+        self._eliminados.append(pk)
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+
+    def flush(self) -> None:
+        """
+        Escribe todos los cambios pendientes (se llama automáticamente al salir).
+
+        Raises:
+            ConflictoDeVersionError: Si otro proceso modificó o eliminó un
+                producto desde que se leyó (la transacción se revierte)
+            StockInsuficienteError: Si un delta relativo dejaría un total negativo
+        """
+        productos = dict(self._notificar)
+        movimientos = list(self._movimientos)
+        for pk, valores in self._cambios.items():
+            version = self._versiones[pk]
+            actualizadas = StockItem.objects.using(self.using).filter(
+                pk=pk, version=version
+            ).update(version=F('version') + 1, **valores)
+            self.sentencias_ejecutadas += 1
+            if not actualizadas:
+                # Import diferido: services importa este módulo
+                from .services import ConflictoDeVersionError
+                raise ConflictoDeVersionError(
+                    f"El producto con ID {pk} fue modificado por otro proceso "
+                    f"(versión leída: {version})"
+                )
+            item = self._instancias[pk]
+            item.version = version + 1
+            self.productos_actualizados.append(item)
+            productos[pk] = (item, productos.get(pk, (item, 'actualizar'))[1])
+        self._cambios = {}
+        self._versiones = {}
+
+        deltas = {pk: delta for pk, delta in self._deltas_cantidad.items() if delta}
+        self._deltas_cantidad = {}
+        if deltas:
+            # El UPDATE bloquea la fila del producto hasta el COMMIT. No deja
+            # el total en negativo: las ubicaciones ya lo garantizan, esto lo
+            # protege si alguna escritura se saltó ese control
+            for pk, delta in deltas.items():
+                filas = StockItem.objects.using(self.using).filter(pk=pk)
+                if delta < 0:
+                    filas = filas.filter(cantidad__gte=-delta)
+                if not filas.update(cantidad=F('cantidad') + delta, version=F('version') + 1):
+                    # Import diferido: services importa este módulo
+                    from .services import StockInsuficienteError
+                    raise StockInsuficienteError(
+                        f"Stock insuficiente en el total del producto con ID {pk} "
+                        f"(solicitado: {-delta})"
+                    )
+            self.sentencias_ejecutadas += len(deltas)
+            # Estado resultante para el registro de cambios y los eventos
+            for pk, cantidad, version in StockItem.objects.using(self.using).filter(
+                pk__in=deltas
+            ).values_list('pk', 'cantidad', 'version'):
+                item = self._instancias[pk]
+                item.cantidad, item.version = cantidad, version
+                productos[pk] = (item, productos.get(pk, (item, 'actualizar'))[1])
+            self.sentencias_ejecutadas += 1
+
+        # Después de los UPDATE (que pueden esperar el bloqueo del producto):
+        # la fecha y el ID de los movimientos quedan cerca del COMMIT, como
+        # suponen las marcas de agua de los resúmenes y del feed de cambios
+        if self._movimientos:
+            if len(self._movimientos) == 1:
+                # Un solo INSERT igualmente; save() garantiza el ID en todos los motores
+                self._movimientos[0].save(using=self.using)
+            else:
+                Movimiento.objects.using(self.using).bulk_create(self._movimientos)
+            self.sentencias_ejecutadas += 1
+            self.movimientos_creados.extend(self._movimientos)
+            self._movimientos = []
+
+        if self._delta_valor or self._delta_unidades or self._delta_productos:
+            # Import diferido: services importa este módulo
+            from .services import ValoracionService
+            ValoracionService().aplicar_delta(
+                self._delta_valor, self._delta_unidades, self._delta_productos, using=self.using
+            )
+            self.sentencias_ejecutadas += 1
+            self._delta_valor = Decimal('0')
+            self._delta_unidades = self._delta_productos = 0
+
+        eliminados = self._eliminados
+        self._notificar, self._eliminados = {}, []
+        if productos or eliminados:
+            from .services import CambiosService
+            CambiosService().registrar(list(productos.values()), eliminados, using=self.using)
+            # Sin unidad sería un INSERT por cambio; aquí uno para todos
+            self.sentencias_sin_unidad += len(productos) + len(eliminados)
+            self.sentencias_ejecutadas += 1
+        if productos or movimientos or eliminados:
+            transaction.on_commit(
+                functools.partial(
+                    publicar_cambios,
+                    [item for item, _ in productos.values()], movimientos, eliminados,
+                ),
+                using=self.using,
+            )
+
+    # ------------------------------------------------------------------
+    # Diagnóstico
+    # ------------------------------------------------------------------
+
+    def reporte(self) -> Dict[str, int]:
+        """Sentencias que se habrían ejecutado sin la unidad frente a las ejecutadas"""
+        # Cada transacción anidada evitada ahorra un SAVEPOINT y su RELEASE
+        sin_unidad = self.sentencias_sin_unidad + 2 * self.transacciones_anidadas_evitadas
+        return {
+            'sentencias_sin_unidad': sin_unidad,
+            'sentencias_ejecutadas': self.sentencias_ejecutadas,
+            'sentencias_ahorradas': sin_unidad - self.sentencias_ejecutadas,
+            'transacciones_anidadas_evitadas': self.transacciones_anidadas_evitadas,
+        }
+
+    def _registrar_estadisticas(self) -> None:
+        reporte = self.reporte()
+        _estadisticas['unidades'] += 1
+        _estadisticas['sentencias_sin_unidad'] += reporte['sentencias_sin_unidad']
+        _estadisticas['sentencias_ejecutadas'] += reporte['sentencias_ejecutadas']
+        if reporte['sentencias_sin_unidad']:
+            logger.debug(
+                "Unidad de trabajo: %(sentencias_ejecutadas)s sentencias ejecutadas, "
+                "%(sentencias_ahorradas)s ahorradas "
+                "(%(transacciones_anidadas_evitadas)s transacciones anidadas evitadas)",
+                reporte,
+            )
+
+
+def en_unidad_de_trabajo(func, *args, **kwargs) -> Tuple[Any, UnidadDeTrabajo]:
+    """
+    Ejecuta func(*args, **kwargs) en una unidad de trabajo nueva y la
+    escribe. Ante un deadlock o lock wait timeout se repite todo (unidad
+    nueva incluida) según la política de reintentos, así que func debe
+    volver a leer en cada intento todo lo que modifica.
+
+    Returns:
+        Tupla (resultado de func, unidad de trabajo del intento que se confirmó)
+
+    Raises:
+        RecursoBloqueadoError: Si un bloqueo NOWAIT estaba tomado
+        ContencionDeBloqueosError: Si se agotaron los reintentos
+    """
+    def intento():
+        with UnidadDeTrabajo() as unidad:
+            return func(*args, **kwargs), unidad
+    return con_reintentos(intento)
+
+
+def transaccional(func=None, *, reintentar: bool = False):
+    """
+    Ejecuta la función dentro de la unidad de trabajo activa; si no hay
+    ninguna, abre una propia (con su transacción) y la escribe al terminar.
+    Reemplaza a @transaction.atomic en vistas y servicios.
+
+    Con reintentar=True la unidad propia se repite completa ante deadlocks y
+    lock wait timeouts. Solo es correcto si la función vuelve a leer todo lo
+    que modifica en cada intento (servicios que reciben IDs o datos planos):
+    una función que recibe instancias o serializers ya modificados por el
+    intento fallido los escribiría con el estado equivocado.
+    Uso: @transaccional o @transaccional(reintentar=True)
+    """
+    if func is None:
+        return functools.partial(transaccional, reintentar=reintentar)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        unidad = _unidad_actual.get()
+        if unidad is not None:
+            unidad.transacciones_anidadas_evitadas += 1
+            unidad.anidamiento += 1
+            try:
+                return func(*args, **kwargs)
+            finally:
+                unidad.anidamiento -= 1
+        if reintentar:
+            return en_unidad_de_trabajo(func, *args, **kwargs)[0]
+        with UnidadDeTrabajo():
+            return func(*args, **kwargs)
+    return wrapper
@@ -1,15 +1,37 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import StockViewSet, AdministradorViewSet,MovimientoViewSet
+from .views import (
+    StockViewSet,
+    AdministradorViewSet,
+    MovimientoViewSet,
+    UbicacionViewSet,
+    ReporteMovimientosViewSet,
+    ValoracionViewSet,
+    AnalisisViewSet,
+    CambiosViewSet,
+    TableroViewSet,
+    TrabajoViewSet,
+    MetricasViewSet,
+    eventos_stock,
+)
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 router = DefaultRouter()
 router.register(r'stock', StockViewSet)
 router.register(r'administradores', AdministradorViewSet)
 router.register(r'movimientos', MovimientoViewSet)
+router.register(r'ubicaciones', UbicacionViewSet)
+router.register(r'valoracion', ValoracionViewSet, basename='valoracion')
+router.register(r'analisis', AnalisisViewSet, basename='analisis')
+router.register(r'cambios', CambiosViewSet, basename='cambios')
+router.register(r'tablero', TableroViewSet, basename='tablero')
+router.register(r'trabajos', TrabajoViewSet, basename='trabajo')
+router.register(r'metricas', MetricasViewSet, basename='metricas')
+router.register(r'reportes/movimientos', ReporteMovimientosViewSet, basename='reporte-movimientos')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('eventos/', eventos_stock, name='eventos-stock'),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 ]
@@ -3,9 +3,12 @@ Validators - Validación de datos de negocio
 Implementa el patrón Chain of Responsibility para validaciones
 """
 
-from decimal import Decimal
+import re
+from decimal import Decimal, InvalidOperation
 from django.core.exceptions import ValidationError
-from typing import Any
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Tuple
+
+from backend.trazas import trazar_metodos
 
 
 class BaseValidator:
@@ -68,6 +71,7 @@ class MaximumValueValidator(BaseValidator):
             )
 
 
+@trazar_metodos('validacion')
 class StockValidator:
     """
     Validador específico para operaciones de stock.
@@ -90,6 +94,22 @@ class StockValidator:
         if cantidad <= 0:
             raise ValidationError("La cantidad debe ser mayor que cero")
     
+    def validar_cantidad_no_negativa(self, cantidad: int) -> None:
+        """
+        Valida que la cantidad sea un entero mayor o igual a cero.
+        
+        Args:
+            cantidad: Cantidad a validar
+            
+        Raises:
+            ValidationError: Si la cantidad no es válida
+        """
+        if not isinstance(cantidad, int):
+            raise ValidationError("La cantidad debe ser un número entero")
+        
+        if cantidad < 0:
+            raise ValidationError("La cantidad no puede ser negativa")
+    
     def validar_precio(self, precio: Decimal) -> None:
         """
         Valida que el precio sea válido.
@@ -103,15 +123,20 @@ class StockValidator:
         if not isinstance(precio, (Decimal, float, int)):
             raise ValidationError("El precio debe ser un número")
         
-        precio = Decimal(str(precio))
-        
-        if precio <= 0:
-            raise ValidationError("El precio debe ser mayor que cero")
-        
-        if precio > Decimal('9999999.99'):
-            raise ValidationError(
-                "El precio excede el máximo permitido (9999999.99)"
-            )
+        try:
+            precio = Decimal(str(precio))
+            if not precio.is_finite():
+                raise ValidationError("El precio debe ser un número")
+            
+            if precio <= 0:
+                raise ValidationError("El precio debe ser mayor que cero")
+            
+            if precio > Decimal('9999999.99'):
+                raise ValidationError(
+                    "El precio excede el máximo permitido (9999999.99)"
+                )
+        except InvalidOperation:
+            raise ValidationError("El precio debe ser un número")
     
     def validar_stock_suficiente(
         self, 
@@ -135,6 +160,7 @@ class StockValidator:
             )
 
 
+@trazar_metodos('validacion')
 class MovimientoValidator:
     """
     Validador específico para movimientos de inventario.
@@ -237,6 +263,179 @@ class AdministradorValidator:
             )
 
 
+# ==============================================================================
+# PIPELINES DE VALIDACIÓN (REUTILIZABLES Y POR LOTE)
+# ==============================================================================
+
+def a_entero(value: Any) -> int:
+    """Convierte enteros enviados como texto ("5"); rechaza decimales"""
+    if isinstance(value, bool):
+        raise ValidationError("La cantidad debe ser un número entero")
+    if isinstance(value, int):
+        return value
+    # Solo dígitos ASCII con signo opcional: isdigit() acepta "²" y lstrip('-') "--5"
+    if isinstance(value, str) and re.fullmatch(r'-?[0-9]+', value.strip()):
+        return int(value)
+    raise ValidationError("La cantidad debe ser un número entero")
+
+
+def a_decimal(value: Any) -> Decimal:
+    """Convierte precios enviados como texto o número a Decimal"""
+    if isinstance(value, bool):
+        raise ValidationError("El precio debe ser un número")
+    try:
+        valor = Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        raise ValidationError("El precio debe ser un número")
+    if not valor.is_finite():
+        # NaN, sNaN e Infinity: no se pueden comparar ni guardar
+        raise ValidationError("El precio debe ser un número")
+    return valor
+
+
+def texto_no_vacio(value: Any) -> str:
+    """Valida un texto obligatorio (sin espacios sobrantes)"""
+    if not isinstance(value, str) or not value.strip():
+        raise ValidationError("Este campo no puede estar vacío")
+    return value.strip()
+
+
+def id_positivo(value: Any) -> int:
+    """Valida un identificador de producto (entero positivo)"""
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValidationError("El ID debe ser un número entero")
+    if isinstance(value, str) and not re.fullmatch(r'[0-9]+', value.strip()):
+        raise ValidationError("El ID debe ser un número entero")
+    value = int(value)
+    if value <= 0:
+        raise ValidationError("El ID debe ser mayor que cero")
+    return value
+
+
+class ResultadoLote(NamedTuple):
+    """Resultado de validar un lote: filas válidas y errores por fila"""
+    validos: List[Tuple[int, Dict[str, Any]]]
+    errores: Dict[int, Dict[str, List[str]]]
+
+
+@trazar_metodos('validacion')
+class ValidationPipeline:
+    """
+    Pipeline de validación precompilado.
+    Se construye una sola vez (ver ValidatorFactory.pipeline) y no guarda
+    estado entre llamadas, por lo que puede compartirse entre requests e
+    hilos. Cada campo tiene una secuencia de pasos: un paso recibe el
+    valor, lanza ValidationError si es inválido y puede devolver el valor
+    convertido (None = sin cambios).
+    """
+    
+    def __init__(
+        self,
+        pasos: Dict[str, Iterable[Callable[[Any], Any]]],
+        requeridos: Iterable[str] = ()
+    ):
+        self._pasos = tuple((campo, tuple(funciones)) for campo, funciones in pasos.items())
+        self._requeridos = frozenset(requeridos)
+    
+    def _validar_fila(self, payload: Dict[str, Any]):
+        limpio = dict(payload)
+        errores = {}
+        for campo, funciones in self._pasos:
+            if campo not in payload:
+                if campo in self._requeridos:
+                    errores[campo] = ["Este campo es requerido"]
+                continue
+            valor = payload[campo]
+            try:
+                for funcion in funciones:
+                    convertido = funcion(valor)
+                    if convertido is not None:
+                        valor = convertido
+            except ValidationError as exc:
+                errores[campo] = exc.messages
+                continue
+            limpio[campo] = valor
+        return limpio, errores
+    
+    def validate(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Valida un payload.
+        
+        Args:
+            payload: Diccionario a validar
+            
+        Returns:
+            Copia del payload con los valores convertidos
+            
+        Raises:
+            ValidationError: Con un dict {campo: [mensajes]} si hay errores
+        """
+        limpio, errores = self._validar_fila(payload)
+        if errores:
+            raise ValidationError(errores)
+        return limpio
+    
+    def validate_batch(self, payloads: Iterable[Dict[str, Any]]) -> ResultadoLote:
+        """
+        Valida un lote completo en una pasada, sin detenerse en el primer error.
+        
+        Args:
+            payloads: Filas a validar
+            
+        Returns:
+            ResultadoLote con (índice, fila limpia) válidas y errores por índice
+        """
+        validos = []
+        errores = {}
+        for indice, payload in enumerate(payloads):
+            if not isinstance(payload, dict):
+                errores[indice] = {'non_field_errors': ["Cada fila debe ser un objeto"]}
+                continue
+            limpio, errores_fila = self._validar_fila(payload)
+            if errores_fila:
+                errores[indice] = errores_fila
+            else:
+                validos.append((indice, limpio))
+        return ResultadoLote(validos, errores)
+
+
+def _pipeline_producto() -> ValidationPipeline:
+    stock = ValidatorFactory.compartido('stock')
+    return ValidationPipeline(
+        {
+            'codigo': [texto_no_vacio],
+            'nombre': [texto_no_vacio],
+            'precio': [a_decimal, stock.validar_precio],
+            'cantidad': [a_entero, stock.validar_cantidad_no_negativa],
+        },
+        requeridos=['codigo', 'nombre', 'precio'],
+    )
+
+
+def _pipeline_ajuste() -> ValidationPipeline:
+    stock = ValidatorFactory.compartido('stock')
+    movimiento = ValidatorFactory.compartido('movimiento')
+    return ValidationPipeline(
+        {
+            'id': [id_positivo],
+            'tipo': [movimiento.validar_tipo_movimiento],
+            'cantidad': [a_entero, stock.validar_cantidad_positiva],
+        },
+        requeridos=['id', 'tipo', 'cantidad'],
+    )
+
+
+def _pipeline_movimiento() -> ValidationPipeline:
+    movimiento = ValidatorFactory.compartido('movimiento')
+    return ValidationPipeline(
+        {
+            'tipo': [movimiento.validar_tipo_movimiento],
+            'cantidad': [movimiento.validar_cantidad_positiva],
+        },
+        requeridos=['tipo', 'cantidad'],
+    )
+
+
 # ==============================================================================
 # FACTORY PATTERN PARA VALIDADORES
 # ==============================================================================
@@ -253,6 +452,16 @@ class ValidatorFactory:
         'administrador': AdministradorValidator,
     }
     
+    _pipeline_builders = {
+        'producto': _pipeline_producto,
+        'ajuste': _pipeline_ajuste,
+        'movimiento': _pipeline_movimiento,
+    }
+    
+    # Instancias compartidas: los validadores no guardan estado
+    _compartidos = {}
+    _pipelines = {}
+    
     @classmethod
     def create(cls, validator_type: str):
         """
@@ -286,4 +495,58 @@ class ValidatorFactory:
             name: Nombre del validador
             validator_class: Clase del validador
         """
-        cls._validators[name.lower()] = validator_class
\ No newline at end of file
+        cls._validators[name.lower()] = validator_class
+        cls._compartidos.pop(name.lower(), None)
+    
+    @classmethod
+    def compartido(cls, validator_type: str):
+        """
+        Devuelve una instancia compartida del validador (se crea una sola vez).
+        
+        Args:
+            validator_type: Tipo de validador
+            
+        Returns:
+            Instancia reutilizable del validador
+        """
+        clave = validator_type.lower()
+        if clave not in cls._compartidos:
+            cls._compartidos[clave] = cls.create(clave)
+        return cls._compartidos[clave]
+    
+    @classmethod
+    def pipeline(cls, name: str) -> ValidationPipeline:
+        """
+        Devuelve el pipeline de validación precompilado con ese nombre.
+        
+        Args:
+            name: Nombre del pipeline ('producto', 'ajuste', 'movimiento')
+            
+        Returns:
+            ValidationPipeline compartido
+            
+        Raises:
+            ValueError: Si el pipeline no existe
+        """
+        clave = name.lower()
+        if clave not in cls._pipelines:
+            builder = cls._pipeline_builders.get(clave)
+            if not builder:
+                raise ValueError(
+                    f"Pipeline '{name}' no existe. "
+                    f"Pipelines disponibles: {', '.join(cls._pipeline_builders.keys())}"
+                )
+            cls._pipelines[clave] = builder()
+        return cls._pipelines[clave]
+    
+    @classmethod
+    def register_pipeline(cls, name: str, builder: Callable[[], ValidationPipeline]):
+        """
+        Registra un constructor de pipeline.
+        
+        Args:
+            name: Nombre del pipeline
+            builder: Función sin argumentos que construye el ValidationPipeline
+        """
+        cls._pipeline_builders[name.lower()] = builder
+        cls._pipelines.pop(name.lower(), None)
\ No newline at end of file
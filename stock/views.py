@@ -1,164 +1,763 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAdminUser
+from rest_framework.permissions import AllowAny, IsAdminUser, SAFE_METHODS
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views.decorators.http import require_GET
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import datetime, timedelta
 import logging
+import os
+import time
 
-from .models import Administrador, StockItem, Movimiento
-from .serializers import StockSerializer, AdministradorSerializer, MovimientoSerializer
+from backend.db_router import leer_de_replica
+
+from .authentication import estadisticas_cache, invalidar_usuario
+from .eventos import EventosSaturados, obtener_hub
+from .models import Administrador, StockItem, Movimiento, Ubicacion, Trabajo
+from .serializers import (
+    StockSerializer, AdministradorSerializer, MovimientoSerializer,
+    UbicacionSerializer, StockUbicacionSerializer, AnalisisProductoSerializer, TrabajoSerializer,
+)
+from .pagination import PaginacionSinConteo
+from .services import (
+    StockService, MovimientoService, ExistenciasService, ResumenMovimientosService, ValoracionService,
+    CambiosService, PronosticoService, AnalisisService, TableroService, ConflictoDeVersionError,
+    valor_item,
+)
+from . import trabajos
+from .throttling import TokenBucketThrottle, estadisticas_carga, proteger_escritura
+from .reintentos import estadisticas_reintentos
+from .unit_of_work import (
+    en_unidad_de_trabajo,
+    estadisticas_globales,
+    transaccional,
+    unidad_de_trabajo_actual,
+)
 
 logger = logging.getLogger(__name__)
 
 
+class LecturaReplicaMixin:
+    """
+    Las peticiones de solo lectura del viewset pueden leerse de una réplica
+    (ver backend.db_router); las escrituras siguen yendo a la primaria.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            with leer_de_replica():
+                return super().dispatch(request, *args, **kwargs)
+        return super().dispatch(request, *args, **kwargs)
+
+
 class StockViewSet(viewsets.ModelViewSet):
     """
     ViewSet para operaciones CRUD de productos en stock.
     """
-    queryset = StockItem.objects.all()
+    queryset = StockItem.objects.all().order_by('id')
     serializer_class = StockSerializer
     permission_classes = [AllowAny]
+    pagination_class = PaginacionSinConteo
+    throttle_classes = [TokenBucketThrottle]
+
+    @staticmethod
+    def _etag(version) -> str:
+        return f'"{version}"'
+
+    def _versiones_esperadas(self):
+        """
+        Versiones aceptadas por el cliente: cabecera If-Match (ETag de un GET
+        previo) o campo 'version' del cuerpo. None si no exige ninguna.
+        """
+        if_match = self.request.headers.get('If-Match')
+        if if_match:
+            if if_match.strip() == '*':
+                return None
+            versiones = set()
+            for etag in if_match.split(','):
+                etag = etag.strip()
+                if etag.startswith('W/'):
+                    etag = etag[2:]
+                try:
+                    versiones.add(int(etag.strip('"')))
+                except ValueError:
+                    raise ValidationError(f'If-Match inválido: {etag}')
+            return versiones
 
+        version = self.request.data.get('version') if isinstance(self.request.data, dict) else None
+        if version in (None, ''):
+            return None
+        try:
+            return {int(version)}
+        except (TypeError, ValueError):
+            raise ValidationError('version debe ser un número entero')
+
+    def _verificar_version(self, item):
+        """
+        Raises:
+            ConflictoDeVersionError: Si el cliente editó una versión anterior
+        """
+        versiones = self._versiones_esperadas()
+        if versiones is not None and item.version not in versiones:
+            raise ConflictoDeVersionError(
+                f"El producto con ID {item.pk} cambió: versión actual {item.version}"
+            )
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if (
+            self.action in ('retrieve', 'update', 'partial_update')
+            and response.status_code == status.HTTP_200_OK
+            and isinstance(response.data, dict)
+            and 'version' in response.data
+        ):
+            response['ETag'] = self._etag(response.data['version'])
+        return response
+
+    @transaccional
     def perform_create(self, serializer):
         item = serializer.save()
+        uow = unidad_de_trabajo_actual()
+        uow.notificar_producto(item, 'crear')
         if item.cantidad and item.cantidad != 0:
-            Movimiento.objects.create(producto=item, tipo='entrada', cantidad=item.cantidad)
+            uow.registrar_movimiento(item, 'entrada', item.cantidad)
+        uow.registrar_delta_valor(
+            valor_item(item.precio, item.cantidad), unidades=item.cantidad, productos=1
+        )
 
+    @transaccional
     def perform_update(self, serializer):
-        item = self.get_object()
+        # Sin bloqueo: el UPDATE solo se aplica si la fila sigue en la versión
+        # leída por get_object(), así que los valores anteriores son los que
+        # tenía la fila al escribir y el delta del movimiento es exacto
+        item = serializer.instance
+        self._verificar_version(item)
         old_cantidad = item.cantidad
         old_precio = item.precio
         updated_item = serializer.save()
+        uow = unidad_de_trabajo_actual()
+        uow.registrar_delta_valor(
+            valor_item(updated_item.precio, updated_item.cantidad)
+            - valor_item(old_precio, old_cantidad),
+            unidades=updated_item.cantidad - old_cantidad,
+        )
 
-        # Registrar cambio de cantidad
+        # Registrar cambio de cantidad (en la ubicación predeterminada si el
+        # producto tiene existencias por ubicación)
         delta = updated_item.cantidad - old_cantidad
         if delta != 0:
-            Movimiento.objects.create(
-                producto=updated_item,
-                tipo='entrada' if delta > 0 else 'salida',
-                cantidad=abs(delta)
+            ubicacion = ExistenciasService().mover_sin_ubicacion(uow, updated_item, delta)
+            uow.registrar_movimiento(
+                updated_item, 'entrada' if delta > 0 else 'salida', abs(delta), ubicacion=ubicacion
             )
 
         # Registrar cambio de precio
         if updated_item.precio != old_precio:
-            Movimiento.objects.create(
-                producto=updated_item,
-                tipo='ajuste',
-                cantidad=0
+            uow.registrar_movimiento(updated_item, 'ajuste', 0)
+
+    @transaccional
+    def perform_destroy(self, instance):
+        self._verificar_version(instance)
+        valor = valor_item(instance.precio, instance.cantidad)
+        cantidad = instance.cantidad
+        # Mismo compare-and-swap que las actualizaciones
+        eliminados, _ = StockItem.objects.filter(pk=instance.pk, version=instance.version).delete()
+        if not eliminados:
+            raise ConflictoDeVersionError(
+                f"El producto con ID {instance.pk} fue modificado por otro proceso"
             )
+        uow = unidad_de_trabajo_actual()
+        uow.registrar_delta_valor(-valor, unidades=-cantidad, productos=-1)
+        uow.notificar_eliminacion(instance.pk)
+
+    @staticmethod
+    def _cantidad(request):
+        cantidad = request.data.get('cantidad')
+
+        if cantidad is None:
+            return None, Response(
+                {'error': 'Se requiere cantidad'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            return int(cantidad), None
+        except (TypeError, ValueError):
+            return None, Response(
+                {'error': 'Cantidad debe ser un número entero'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+    @staticmethod
+    def _respuesta_ubicacion(mensaje, resultado):
+        return Response({
+            'mensaje': mensaje,
+            'ubicacion': resultado['ubicacion'],
+            'nuevo_stock': resultado['nuevo_stock'],
+            'movimiento_id': resultado['movimiento'].id
+        }, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['put'], url_path='subtract')
     def subtract_stock(self, request, pk=None):
         """
-        Resta stock de un producto y crea movimiento de SALIDA
+        Resta stock de un producto y crea movimiento de SALIDA.
+        Con 'ubicacion' en el cuerpo resta de esa ubicación.
         """
-        try:
-            item = self.get_object()
-            cantidad = request.data.get('cantidad')
-
-            if cantidad is None:
-                return Response(
-                    {'error': 'Se requiere cantidad'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-            try:
-                cantidad = int(cantidad)
-            except ValueError:
-                return Response(
-                    {'error': 'Cantidad debe ser un número entero'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-            if item.cantidad < cantidad:
-                return Response(
-                    {'error': 'Stock insuficiente'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-            # Restar stock
-            item.cantidad -= cantidad
-            item.save()
-
-            # ✅ CREAR MOVIMIENTO DE SALIDA
-            movimiento = Movimiento.objects.create(
-                producto=item,
-                tipo='salida',
-                cantidad=cantidad
-            )
+        cantidad, error = self._cantidad(request)
+        if error:
+            return error
 
-            logger.info(f"Stock reducido: {item.nombre} - {cantidad} unidades. Movimiento ID: {movimiento.id}")
+        ubicacion = request.data.get('ubicacion')
+        if ubicacion is not None:
+            # Solo compite con otras escrituras del mismo producto en la misma ubicación
+            with proteger_escritura(f'{pk}@{ubicacion}'):
+                resultado = ExistenciasService().restar(pk, ubicacion, cantidad)
+            return self._respuesta_ubicacion('Stock reducido', resultado)
 
-            return Response({
-                'mensaje': 'Stock reducido',
-                'nuevo_stock': item.cantidad,
-                'movimiento_id': movimiento.id
-            }, status=status.HTTP_200_OK)
-
-        except StockItem.DoesNotExist:
-            return Response(
-                {'error': 'Producto no encontrado'},
-                status=status.HTTP_404_NOT_FOUND
+        # Bloqueo, validación de stock y escritura en una sola unidad de trabajo
+        # (reintentada ante deadlocks); producto inexistente / stock insuficiente
+        # se traducen en custom_exception_handler.
+        # Con la BD lenta o el producto muy disputado se responde 503 en vez de esperar el bloqueo
+        with proteger_escritura(pk):
+            resultado, uow = en_unidad_de_trabajo(
+                StockService().restar_stock, pk, cantidad, sin_espera=self._sin_espera(request)
             )
+        movimiento = uow.movimientos_creados[-1]
+
+        logger.info(f"Stock reducido: {resultado['producto']} - {cantidad} unidades. Movimiento ID: {movimiento.id}")
+
+        return Response({
+            'mensaje': 'Stock reducido',
+            'nuevo_stock': resultado['nuevo_stock'],
+            'movimiento_id': movimiento.id
+        }, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['put'], url_path='restock')
     def restock(self, request, pk=None):
         """
-        Agrega stock a un producto y crea movimiento de ENTRADA
+        Agrega stock a un producto y crea movimiento de ENTRADA.
+        Con 'ubicacion' en el cuerpo agrega en esa ubicación.
         """
-        try:
-            item = self.get_object()
-            cantidad = request.data.get('cantidad')
-
-            if cantidad is None:
-                return Response(
-                    {'error': 'Se requiere cantidad'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-            try:
-                cantidad = int(cantidad)
-            except ValueError:
-                return Response(
-                    {'error': 'Cantidad debe ser un número entero'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-            # Agregar stock
-            item.cantidad += cantidad
-            item.save()
-
-            # ✅ CREAR MOVIMIENTO DE ENTRADA
-            movimiento = Movimiento.objects.create(
-                producto=item,
-                tipo='entrada',
-                cantidad=cantidad
+        cantidad, error = self._cantidad(request)
+        if error:
+            return error
+
+        ubicacion = request.data.get('ubicacion')
+        if ubicacion is not None:
+            with proteger_escritura(f'{pk}@{ubicacion}'):
+                resultado = ExistenciasService().agregar(pk, ubicacion, cantidad)
+            return self._respuesta_ubicacion('Stock actualizado', resultado)
+
+        with proteger_escritura(pk):
+            resultado, uow = en_unidad_de_trabajo(
+                StockService().agregar_stock, pk, cantidad, sin_espera=self._sin_espera(request)
             )
+        movimiento = uow.movimientos_creados[-1]
 
-            logger.info(f"Stock agregado: {item.nombre} + {cantidad} unidades. Movimiento ID: {movimiento.id}")
+        logger.info(f"Stock agregado: {resultado['producto']} + {cantidad} unidades. Movimiento ID: {movimiento.id}")
 
-            return Response({
-                'mensaje': 'Stock actualizado',
-                'nuevo_stock': item.cantidad,
-                'movimiento_id': movimiento.id
-            }, status=status.HTTP_200_OK)
+        return Response({
+            'mensaje': 'Stock actualizado',
+            'nuevo_stock': resultado['nuevo_stock'],
+            'movimiento_id': movimiento.id
+        }, status=status.HTTP_200_OK)
 
-        except StockItem.DoesNotExist:
+    @action(detail=True, methods=['post'], url_path='transferir')
+    def transferir(self, request, pk=None):
+        """
+        Transfiere stock entre ubicaciones: {origen, destino, cantidad}.
+        Crea un movimiento de salida en el origen y uno de entrada en el destino.
+        """
+        cantidad, error = self._cantidad(request)
+        if error:
+            return error
+        origen, destino = request.data.get('origen'), request.data.get('destino')
+        if origen is None or destino is None:
             return Response(
-                {'error': 'Producto no encontrado'},
-                status=status.HTTP_404_NOT_FOUND
+                {'error': 'Se requieren origen y destino'},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
+        with proteger_escritura(f'{pk}@{origen}'):
+            resultado = ExistenciasService().transferir(pk, origen, destino, cantidad)
+        salida, entrada = resultado.pop('movimientos')
+        resultado['movimiento_ids'] = [salida.id, entrada.id]
+        return Response(resultado, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'], url_path='existencias')
+    def existencias(self, request, pk=None):
+        """Stock del producto por ubicación y total"""
+        item = self.get_object()
+        existencias = ExistenciasService().existencias_producto(item.pk)
+        return Response({
+            'producto': item.pk,
+            'total': item.cantidad,
+            'ubicaciones': StockUbicacionSerializer(existencias, many=True).data,
+        })
+
+    @action(detail=False, methods=['get'], url_path='bajo-stock')
+    def bajo_stock(self, request):
+        """Productos con stock bajo el umbral (?umbral=10), de menor a mayor stock"""
+        try:
+            umbral = int(request.query_params.get('umbral', 10))
+        except ValueError:
+            raise ValidationError("umbral debe ser un número entero")
+        pagina = self.paginate_queryset(StockService().obtener_productos_bajo_stock(umbral))
+        return self.get_paginated_response(self.get_serializer(pagina, many=True).data)
+
+    @action(detail=False, methods=['get'], url_path='sugerencias-reorden')
+    def sugerencias_reorden(self, request):
+        """
+        Productos a reponer según el pronóstico de demanda, primero los que
+        se agotan antes. El pronóstico se recalcula periódicamente ('calculado').
+        """
+        service = PronosticoService()
+        estado = service.obtener()
+        pagina = self.paginate_queryset(service.sugerencias())
+        response = self.get_paginated_response([service.fila(pronostico) for pronostico in pagina])
+        response.data['calculado'] = estado['calculado']
+        response.data['parametros'] = estado['parametros']
+        return response
+
+    @action(detail=True, methods=['get'], url_path='pronostico')
+    def pronostico(self, request, pk=None):
+        """Pronóstico de demanda del producto"""
+        item = self.get_object()
+        service = PronosticoService()
+        datos = service.pronostico_producto(item.pk)
+        if datos is None:
+            # Producto creado después del último cálculo: ya se está
+            # recalculando en segundo plano
+            return Response(
+                {'producto': item.pk, 'nombre': item.nombre, 'pendiente': True},
+                status=status.HTTP_202_ACCEPTED,
+            )
+        return Response(datos)
+
+    @staticmethod
+    def _filas_lote(data, clave):
+        """Acepta una lista de filas, {clave: [...]} o una sola fila (JSON columnar de 1 fila)"""
+        if isinstance(data, list):
+            return data
+        if clave in data:
+            filas = data[clave]
+            if not isinstance(filas, list):
+                raise ValidationError(f"'{clave}' debe ser una lista")
+            return filas
+        return [data]
+
+    @staticmethod
+    def _asincrono(request) -> bool:
+        return request.query_params.get('asincrono', '').lower() in ('1', 'true', 'si')
+
+    @staticmethod
+    def _sin_espera(request) -> bool:
+        """?sin_espera=true: 409 inmediato si el producto está bloqueado (NOWAIT)"""
+        return request.query_params.get('sin_espera', '').lower() in ('1', 'true', 'si')
+
+    @staticmethod
+    def _trabajo_encolado(request, trabajo):
+        """202 con el trabajo y su URL de estado"""
+        url = request.build_absolute_uri(reverse('trabajo-detail', args=[trabajo.pk]))
+        return Response(
+            TrabajoSerializer(trabajo).data, status=status.HTTP_202_ACCEPTED, headers={'Location': url}
+        )
+
+    @action(detail=False, methods=['post'], url_path='importar')
+    def importar(self, request):
+        """
+        Importación masiva de productos. Devuelve creados y errores por fila.
+        Con ?asincrono=true se encola como trabajo y responde 202.
+        """
+        filas = self._filas_lote(request.data, 'filas')
+        if self._asincrono(request):
+            return self._trabajo_encolado(request, trabajos.encolar('importar_productos', {'filas': filas}))
+        resultado = StockService().importar_productos(filas)
+        codigo = status.HTTP_400_BAD_REQUEST if filas and not resultado['creados'] else status.HTTP_200_OK
+        return Response(resultado, status=codigo)
+
+    @action(detail=False, methods=['post'], url_path='ajustes')
+    def ajustes(self, request):
+        """
+        Entradas/salidas por lote: [{id, tipo, cantidad}, ...].
+        Con todo_o_nada=true no se aplica nada si alguna fila falla.
+        Con omitir_bloqueados=true los productos bloqueados por otra operación
+        se reportan como error en lugar de esperarlos (SKIP LOCKED).
+        Con ?asincrono=true se encola como trabajo y responde 202.
+        """
+        ajustes = self._filas_lote(request.data, 'ajustes')
+        todo_o_nada = isinstance(request.data, dict) and bool(request.data.get('todo_o_nada'))
+        omitir_bloqueados = isinstance(request.data, dict) and bool(request.data.get('omitir_bloqueados'))
+        if self._asincrono(request):
+            return self._trabajo_encolado(request, trabajos.encolar(
+                'ajustar_lote',
+                {'ajustes': ajustes, 'todo_o_nada': todo_o_nada, 'omitir_bloqueados': omitir_bloqueados},
+            ))
+        with proteger_escritura():
+            resultado = StockService().ajustar_lote(
+                ajustes, todo_o_nada=todo_o_nada, omitir_bloqueados=omitir_bloqueados
+            )
+        codigo = status.HTTP_400_BAD_REQUEST if ajustes and not resultado['aplicados'] else status.HTTP_200_OK
+        return Response(resultado, status=codigo)
+
 
 class AdministradorViewSet(viewsets.ModelViewSet):
     queryset = Administrador.objects.all()
     serializer_class = AdministradorSerializer
     permission_classes = [IsAdminUser]
 
+    # La autenticación cachea el estado de cada administrador (ver authentication.py)
+    def perform_create(self, serializer):
+        admin = serializer.save()
+        invalidar_usuario(admin.pk)
+
+    def perform_update(self, serializer):
+        admin = serializer.save()
+        invalidar_usuario(admin.pk)
+
+    def perform_destroy(self, instance):
+        pk = instance.pk
+        instance.delete()
+        invalidar_usuario(pk)
 
-class MovimientoViewSet(viewsets.ReadOnlyModelViewSet):
+
+class UbicacionViewSet(viewsets.ModelViewSet):
+    """
+    ViewSet para las ubicaciones (tiendas, bodegas) y sus existencias.
+    """
+    queryset = Ubicacion.objects.all().order_by('codigo')
+    serializer_class = UbicacionSerializer
+    permission_classes = [AllowAny]
+    pagination_class = PaginacionSinConteo
+
+    @action(detail=True, methods=['get'], url_path='existencias')
+    def existencias(self, request, pk=None):
+        """Existencias de la ubicación por producto (paginadas)"""
+        ubicacion = self.get_object()
+        pagina = self.paginate_queryset(ExistenciasService().existencias_ubicacion(ubicacion.pk))
+        return self.get_paginated_response(StockUbicacionSerializer(pagina, many=True).data)
+
+
+class MovimientoViewSet(LecturaReplicaMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet de solo lectura para consultar movimientos.
+
+    Parámetros (listado): producto=<id>, tipo=entrada|salida|ajuste,
+    desde/hasta (YYYY-MM-DD o fecha y hora ISO 8601; una fecha sola en
+    'hasta' incluye ese día completo), orden=-fecha|fecha
     """
-    queryset = Movimiento.objects.all().order_by('-fecha', '-hora')
+    # MovimientoSerializer incluye campos del producto: se traen en la misma consulta
+    queryset = Movimiento.objects.select_related('producto').order_by('-fecha', '-hora')
     serializer_class = MovimientoSerializer
     permission_classes = [AllowAny]
+    pagination_class = PaginacionSinConteo
+
+    def get_queryset(self):
+        if self.action != 'list':
+            return super().get_queryset()
+        params = self.request.query_params
+        producto = params.get('producto')
+        if producto is not None and not producto.isdigit():
+            raise ValidationError("producto debe ser un ID numérico")
+        return MovimientoService.compartido().filtrar_movimientos(
+            producto_id=int(producto) if producto else None,
+            tipo=params.get('tipo') or None,
+            desde=self._instante(params.get('desde')),
+            hasta=self._instante(params.get('hasta'), fin_del_dia=True),
+            orden=params.get('orden', '-fecha'),
+        )
+
+    @staticmethod
+    def _instante(valor, fin_del_dia=False):
+        """Fecha y hora ISO 8601 o fecha sola (su inicio, o el del día siguiente)"""
+        if not valor:
+            return None
+        try:
+            # parse_datetime también acepta una fecha sola: se prueba primero esta
+            dia = parse_date(valor)
+            if dia is not None:
+                instante = datetime.combine(dia + timedelta(days=1 if fin_del_dia else 0), datetime.min.time())
+            else:
+                instante = parse_datetime(valor)
+                if instante is None:
+                    raise ValueError
+        except ValueError:
+            raise ValidationError(
+                f"Fecha inválida: {valor}. Use YYYY-MM-DD o YYYY-MM-DDTHH:MM[:SS]"
+            )
+        if timezone.is_naive(instante):
+            instante = timezone.make_aware(instante)
+        return instante
+
+
+class ReporteMovimientosViewSet(LecturaReplicaMixin, viewsets.ViewSet):
+    """
+    Reportes de entradas/salidas por periodo, servidos desde los resúmenes
+    horarios/diarios (nunca agrega filas crudas de Movimiento). Solo los lee:
+    los mantiene al día el trabajador (tarea periódica actualizar_resumenes)
+    o manage.py actualizar_resumenes.
+
+    Parámetros: granularidad=dia|hora, desde, hasta (YYYY-MM-DD),
+    producto=<id>, agrupar=producto|tienda
+    """
+    permission_classes = [AllowAny]
+
+    def list(self, request):
+        params = request.query_params
+        hasta = self._fecha(params.get('hasta'), timezone.localdate())
+        desde = self._fecha(params.get('desde'), hasta - timedelta(days=30))
+        granularidad = params.get('granularidad', 'dia')
+        producto = params.get('producto')
+
+        if producto is not None and not producto.isdigit():
+            raise ValidationError("producto debe ser un ID numérico")
+
+        filas = ResumenMovimientosService().reporte(
+            granularidad,
+            desde,
+            hasta,
+            producto_id=int(producto) if producto else None,
+            por_producto=params.get('agrupar', 'producto') != 'tienda',
+        )
+
+        return Response({
+            'granularidad': granularidad,
+            'desde': desde,
+            'hasta': hasta,
+            'resultados': list(filas),
+        })
+
+    @staticmethod
+    def _fecha(valor, por_defecto):
+        if not valor:
+            return por_defecto
+        fecha = parse_date(valor)
+        if fecha is None:
+            raise ValidationError(f"Fecha inválida: {valor}. Use el formato YYYY-MM-DD")
+        return fecha
+
+
+class ValoracionViewSet(LecturaReplicaMixin, viewsets.GenericViewSet):
+    """
+    Valor del inventario: total mantenido por deltas (sin recorrer StockItem)
+    y desglose paginado por producto.
+    """
+    permission_classes = [AllowAny]
+    pagination_class = PaginacionSinConteo
+
+    def list(self, request):
+        service = ValoracionService()
+        productos = self.paginate_queryset(
+            service.desglose_por_producto().values(
+                'id', 'codigo', 'nombre', 'precio', 'cantidad', 'valor'
+            )
+        )
+        response = self.get_paginated_response(productos)
+        response.data['valor_total'] = service.obtener_total()
+        return response
+
+
+class AnalisisViewSet(LecturaReplicaMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Análisis ABC y de rotación por producto, leído de la tabla materializada
+    (se recalcula con 'manage.py calcular_analisis'). El listado incluye el
+    resumen por clase.
+
+    Parámetros: clase=A|B|C, orden=valor|rotacion|inactividad
+    """
+    serializer_class = AnalisisProductoSerializer
+    permission_classes = [AllowAny]
+    pagination_class = PaginacionSinConteo
+
+    def get_queryset(self):
+        params = self.request.query_params
+        return AnalisisService().listar(params.get('clase'), params.get('orden', 'valor'))
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        response.data['resumen'] = AnalisisService().obtener_resumen()
+        return response
+
+
+class TableroViewSet(LecturaReplicaMixin, viewsets.ViewSet):
+    """
+    Resumen del tablero en una sola respuesta: cantidad de productos,
+    unidades, valor del inventario, productos con bajo stock, entradas y
+    salidas de hoy y últimos movimientos. Se arma con los agregados
+    mantenidos y se cachea unos segundos (STOCK_TABLERO_CACHE_TTL).
+
+    Parámetros: ultimos=<n> (máx. 50), umbral=<stock mínimo>
+    """
+    permission_classes = [AllowAny]
+    MAX_ULTIMOS = 50
+
+    def list(self, request):
+        params = request.query_params
+        try:
+            ultimos = int(params.get('ultimos', 10))
+            umbral = int(params.get('umbral', 10))
+        except ValueError:
+            raise ValidationError("ultimos y umbral deben ser números enteros")
+        if ultimos < 0:
+            raise ValidationError("ultimos no puede ser negativo")
+        return Response(TableroService().resumen(min(ultimos, self.MAX_ULTIMOS), umbral))
+
+
+class TrabajoViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Trabajos en segundo plano (los ejecuta 'manage.py trabajador').
+
+    POST {tipo, parametros, max_intentos} encola y responde 202; el estado y
+    el progreso se consultan en el detalle y el resultado en /resultado/.
+    Solo para administradores: los trabajos y sus resultados exponen datos
+    de todo el inventario.
+    """
+    queryset = Trabajo.objects.order_by('-id')
+    serializer_class = TrabajoSerializer
+    permission_classes = [IsAdminUser]
+    pagination_class = PaginacionSinConteo
+
+    def create(self, request):
+        max_intentos = request.data.get('max_intentos')
+        if max_intentos is not None and (not isinstance(max_intentos, int) or max_intentos < 1):
+            raise ValidationError("max_intentos debe ser un entero positivo")
+        trabajo = trabajos.encolar(
+            request.data.get('tipo'), request.data.get('parametros'), max_intentos
+        )
+        return StockViewSet._trabajo_encolado(request, trabajo)
+
+    @action(detail=False, methods=['get'])
+    def tipos(self, request):
+        """Tipos de trabajo disponibles"""
+        return Response({'tipos': trabajos.tipos_disponibles()})
+
+    @action(detail=True, methods=['post'])
+    def cancelar(self, request, pk=None):
+        """Cancela un trabajo pendiente, o lo detiene en su próximo avance si está en curso"""
+        trabajo = trabajos.cancelar(self.get_object())
+        return Response(TrabajoSerializer(trabajo).data)
+
+    @action(detail=True, methods=['post'])
+    def reintentar(self, request, pk=None):
+        """Vuelve a encolar un trabajo fallido o cancelado"""
+        trabajo = trabajos.reintentar(self.get_object())
+        return Response(TrabajoSerializer(trabajo).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['get'])
+    def resultado(self, request, pk=None):
+        """
+        Resultado de un trabajo completado (los archivos exportados se
+        descargan). 202 mientras no termina; 409 si falló o se canceló.
+        """
+        trabajo = self.get_object()
+        if trabajo.estado in ('pendiente', 'en_curso'):
+            return Response(TrabajoSerializer(trabajo).data, status=status.HTTP_202_ACCEPTED)
+        if trabajo.estado != 'completado':
+            return Response(TrabajoSerializer(trabajo).data, status=status.HTTP_409_CONFLICT)
+        archivo = trabajo.resultado.get('archivo') if isinstance(trabajo.resultado, dict) else None
+        if archivo:
+            ruta = os.path.join(settings.STOCK_TRABAJOS_DIR, os.path.basename(archivo))
+            if not os.path.exists(ruta):
+                return Response({'detail': 'El archivo ya no está disponible'}, status=status.HTTP_410_GONE)
+            return FileResponse(open(ruta, 'rb'), as_attachment=True, filename=archivo)
+        return Response(trabajo.resultado)
+
+
+class CambiosViewSet(LecturaReplicaMixin, viewsets.ViewSet):
+    """
+    Sincronización incremental del catálogo: altas/cambios de productos,
+    bajas (lápidas) y movimientos nuevos desde el token de la consulta
+    anterior. Mientras hay_mas sea true, repetir con el token devuelto.
+
+    Parámetros: desde=<token> (vacío: todo), limite (máx. 5000)
+    """
+    permission_classes = [AllowAny]
+
+    def list(self, request):
+        try:
+            limite = int(request.query_params.get('limite', 500))
+        except ValueError:
+            raise ValidationError("limite debe ser un número entero")
+
+        resultado = CambiosService().cambios_desde(request.query_params.get('desde'), limite)
+        resultado['movimientos'] = MovimientoSerializer(resultado['movimientos'], many=True).data
+        return Response(resultado)
+
+
+class MetricasViewSet(viewsets.ViewSet):
+    """
+    Métricas internas del proceso (pool de conexiones, unidad de trabajo,
+    eventos, caché de autenticación, limitación de carga, reintentos).
+    Cada worker reporta solo las suyas.
+    """
+    permission_classes = [IsAdminUser]
+
+    def list(self, request):
+        pools = {}
+        if any(db['ENGINE'] == 'backend.mysql_pool' for db in settings.DATABASES.values()):
+            from backend.mysql_pool.base import metricas_pools
+            pools = metricas_pools()
+
+        return Response({
+            'pool_conexiones': pools,
+            'unidad_de_trabajo': estadisticas_globales(),
+            'eventos': obtener_hub().metricas(),
+            'cache_autenticacion': estadisticas_cache(),
+            'carga': estadisticas_carga(),
+            'reintentos': estadisticas_reintentos(),
+        })
+
+
+def _stream_eventos(hub, suscripcion, pendientes):
+    latido = getattr(settings, 'STOCK_EVENTOS_LATIDO', 15)
+    limite = time.monotonic() + getattr(settings, 'STOCK_EVENTOS_DURACION_MAX', 300)
+    try:
+        yield 'retry: 3000\n\n'
+        for evento in pendientes:
+            yield evento.a_sse()
+        # Un cliente desbordado se desconecta; al reconectar con
+        # Last-Event-ID recupera lo perdido desde el buffer del hub
+        while not suscripcion.desbordada and time.monotonic() < limite:
+            evento = suscripcion.siguiente(timeout=latido)
+            yield evento.a_sse() if evento else ': latido\n\n'
+    finally:
+        hub.cancelar(suscripcion)
+
+
+@require_GET
+def eventos_stock(request):
+    """
+    Stream Server-Sent Events con los cambios de stock ('stock',
+    'stock_eliminado') y los movimientos nuevos ('movimiento') a medida
+    que se confirman. Acepta Last-Event-ID (o ?ultimo_id=) para reanudar.
+    Con el cupo de streams del worker lleno responde 503 y el cliente
+    reintenta (y puede caer en otro worker).
+    """
+    ultimo = request.headers.get('Last-Event-ID') or request.GET.get('ultimo_id')
+    try:
+        desde = int(ultimo) if ultimo else None
+    except ValueError:
+        desde = None
+
+    hub = obtener_hub()
+    try:
+        suscripcion, pendientes = hub.suscribir(desde)
+    except EventosSaturados as exc:
+        response = JsonResponse(
+            {'error': 'Servicio saturado', 'detail': str(exc), 'success': False},
+            status=503,
+        )
+        response['Retry-After'] = '3'
+        return response
+    response = StreamingHttpResponse(
+        _stream_eventos(hub, suscripcion, pendientes), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Sin buffering en proxies (nginx)
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,220 @@
+import time
+from decimal import Decimal
+from unittest import mock
+
+import pytest
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from backend import db_router
+from stock.models import StockItem, Movimiento
+
+
+@pytest.fixture
+def replicas(settings, monkeypatch):
+    settings.DATABASE_REPLICAS = ["replica_1", "replica_2"]
+    settings.DATABASE_REPLICA_MAX_LAG = 5
+    lags = {"replica_1": 0, "replica_2": 0}
+    monkeypatch.setattr(db_router, "_lag_segundos", lambda alias: lags[alias])
+    monkeypatch.setattr(db_router, "_salud", {})
+    # Otras pruebas pueden haber escrito (y fijado la primaria) en este hilo
+    token = db_router._primaria_fijada.set(False)
+    yield lags
+    db_router._primaria_fijada.reset(token)
+
+
+@pytest.fixture
+def router():
+    return db_router.ReplicaRouter()
+
+
+def test_reads_outside_replica_context_use_primary(replicas, router):
+    assert router.db_for_read(Movimiento) == DEFAULT_DB_ALIAS
+
+
+def test_read_only_context_uses_a_replica(replicas, router):
+    with db_router.leer_de_replica():
+        assert router.db_for_read(Movimiento) in ("replica_1", "replica_2")
+
+
+def test_writes_and_locked_reads_pin_primary(replicas, router):
+    def run():
+        with db_router.leer_de_replica():
+            assert router.db_for_write(StockItem) == DEFAULT_DB_ALIAS
+            # Después de escribir, el resto del contexto lee de la primaria
+            return router.db_for_read(Movimiento)
+
+    import contextvars
+    assert contextvars.copy_context().run(run) == DEFAULT_DB_ALIAS
+
+
+def test_lagging_replica_is_skipped(replicas, router):
+    replicas["replica_1"] = 60
+    with db_router.leer_de_replica():
+        assert {router.db_for_read(Movimiento) for _ in range(20)} == {"replica_2"}
+
+
+def test_all_replicas_unhealthy_falls_back_to_primary(replicas, router):
+    replicas["replica_1"] = None
+    replicas["replica_2"] = 60
+    with db_router.leer_de_replica():
+        assert router.db_for_read(Movimiento) == DEFAULT_DB_ALIAS
+
+
+def test_replicas_are_not_migrated(replicas, router):
+    assert router.allow_migrate("replica_1", "stock") is False
+    assert router.allow_migrate(DEFAULT_DB_ALIAS, "stock") is True
+
+
+def test_read_after_write_window_pins_client(replicas):
+    from django.http import HttpResponse
+    from django.test import RequestFactory
+
+    elegidos = []
+
+    def vista(request):
+        elegidos.append(db_router.alias_lectura())
+        return HttpResponse(status=201 if request.method == "POST" else 200)
+
+    middleware = db_router.ReplicaMiddleware(vista)
+    factory = RequestFactory()
+    cookie = middleware(factory.post("/api/stock/", REMOTE_ADDR="10.0.0.1")).cookies[middleware.COOKIE]
+    factory.cookies[middleware.COOKIE] = cookie.value
+    middleware(factory.get("/api/movimientos/", REMOTE_ADDR="10.0.0.9"))
+    del factory.cookies[middleware.COOKIE]
+    # Misma IP sin la cookie (otro cliente detrás del mismo NAT)
+    middleware(factory.get("/api/movimientos/", REMOTE_ADDR="10.0.0.1"))
+
+    # El cliente que escribió lee de la primaria aunque cambie de IP; otro, de una réplica
+    assert elegidos[1] == DEFAULT_DB_ALIAS
+    assert elegidos[2] in ("replica_1", "replica_2")
+
+
+def test_read_after_write_window_expires_and_rejects_forged_cookie(replicas, settings):
+    from django.http import HttpResponse
+    from django.test import RequestFactory
+
+    elegidos = []
+
+    def vista(request):
+        elegidos.append(db_router.alias_lectura())
+        return HttpResponse(status=201 if request.method == "POST" else 200)
+
+    middleware = db_router.ReplicaMiddleware(vista)
+    factory = RequestFactory()
+    cookie = middleware(factory.post("/api/stock/")).cookies[middleware.COOKIE].value
+    settings.DATABASE_REPLICA_VENTANA = 5
+    with mock.patch("django.core.signing.time.time", return_value=time.time() + 6):
+        factory.cookies[middleware.COOKIE] = cookie
+        middleware(factory.get("/api/movimientos/"))
+    factory.cookies[middleware.COOKIE] = "1:falsa:firma"
+    middleware(factory.get("/api/movimientos/"))
+
+    assert elegidos[1] in ("replica_1", "replica_2")
+    assert elegidos[2] in ("replica_1", "replica_2")
+
+
+def test_one_replica_per_request(replicas):
+    from django.http import HttpResponse
+    from django.test import RequestFactory
+
+    elegidos = []
+
+    def vista(request):
+        elegidos.append({db_router.alias_lectura() for _ in range(20)})
+        return HttpResponse()
+
+    middleware = db_router.ReplicaMiddleware(vista)
+    for _ in range(5):
+        middleware(RequestFactory().get("/api/movimientos/"))
+
+    assert all(len(alias) == 1 for alias in elegidos)
+    # Fuera del request no queda ninguna réplica elegida
+    assert db_router._replica_request.get() is None
+
+
+class RealRouterWithMirrorReplicaTest(TransactionTestCase):
+    """
+    Router real con un alias replica_1 espejo de default (TEST MIRROR, como
+    lo configura settings con DB_REPLICA_HOSTS): lee lo confirmado en la
+    primaria, así que se puede comprobar a qué alias va cada consulta.
+    """
+
+    databases = {DEFAULT_DB_ALIAS, "replica_1"}
+
+    @classmethod
+    def setUpClass(cls):
+        primaria = connections[DEFAULT_DB_ALIAS].settings_dict
+        connections.settings["replica_1"] = {**primaria, "TEST": {**primaria["TEST"], "MIRROR": DEFAULT_DB_ALIAS}}
+        cls.addClassCleanup(cls._quitar_replica)
+        super().setUpClass()
+
+    @classmethod
+    def _quitar_replica(cls):
+        connections["replica_1"].close()
+        del connections["replica_1"]
+        del connections.settings["replica_1"]
+
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        self.enterContext(override_settings(
+            DATABASE_REPLICAS=["replica_1"],
+            STOCK_LIMITES_TASA={"lectura": (1000, 1000.0), "escritura": (1000, 1000.0)},
+        ))
+        self.enterContext(mock.patch.object(db_router, "_salud", {}))
+        self.producto = StockItem.objects.create(nombre="Replicado", precio=Decimal("1.00"), cantidad=5)
+        Movimiento.objects.create(producto=self.producto, tipo="entrada", cantidad=5)
+        self.replica = connections["replica_1"]
+        self.primaria = connections[DEFAULT_DB_ALIAS]
+
+    @staticmethod
+    def _consultas(captura, texto):
+        return [q["sql"] for q in captura.captured_queries if texto in q["sql"]]
+
+    def test_read_only_viewset_reads_replica_and_writes_go_to_primary(self):
+        lector = APIClient(REMOTE_ADDR="10.0.0.1")
+        escritor = APIClient(REMOTE_ADDR="10.0.0.2")
+
+        with CaptureQueriesContext(self.replica) as en_replica, CaptureQueriesContext(self.primaria) as en_primaria:
+            response = lector.get(reverse("movimiento-list"))
+        assert response.status_code == 200
+        assert [fila["cantidad"] for fila in response.data["results"]] == [5]
+        assert self._consultas(en_replica, "stock_movimiento")
+        assert not self._consultas(en_primaria, "stock_movimiento")
+
+        db_router._primaria_fijada.set(False)
+        with CaptureQueriesContext(self.replica) as en_replica, CaptureQueriesContext(self.primaria) as en_primaria:
+            response = escritor.put(
+                reverse("stockitem-restock", args=[self.producto.pk]), {"cantidad": 2}, format="json"
+            )
+        assert response.status_code == 200
+        assert en_replica.captured_queries == []
+        assert self._consultas(en_primaria, "UPDATE")
+        # El fijado de la primaria por la escritura no sale del request
+        assert db_router._primaria_fijada.get() is False
+
+        # Dentro de la ventana el que escribió lee de la primaria; el otro, de la réplica
+        with CaptureQueriesContext(self.replica) as en_replica:
+            assert len(escritor.get(reverse("movimiento-list")).data["results"]) == 2
+        assert not self._consultas(en_replica, "stock_movimiento")
+        with CaptureQueriesContext(self.replica) as en_replica:
+            assert len(lector.get(reverse("movimiento-list")).data["results"]) == 2
+        assert self._consultas(en_replica, "stock_movimiento")
+
+
+@pytest.mark.django_db
+def test_primary_pin_does_not_leak_without_replicas(settings):
+    settings.DATABASE_REPLICAS = []
+    producto = StockItem.objects.create(nombre="Sin replicas", precio=Decimal("1.00"), cantidad=5)
+    token = db_router._primaria_fijada.set(False)
+    try:
+        response = APIClient().put(reverse("stockitem-restock", args=[producto.pk]), {"cantidad": 1}, format="json")
+        assert response.status_code == 200
+        assert db_router._primaria_fijada.get() is False
+    finally:
+        db_router._primaria_fijada.reset(token)
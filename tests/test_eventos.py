@@ -0,0 +1,82 @@
+import socket
+import time
+
+from stock.eventos import HubEventos, TransporteUnix
+
+
+def test_subscriber_receives_published_events():
+    hub = HubEventos()
+    suscripcion, pendientes = hub.suscribir()
+
+    evento = hub.publicar("stock", {"id": 1, "cantidad": 5})
+
+    assert pendientes == []
+    assert suscripcion.siguiente(timeout=0) == evento
+    assert evento.a_sse() == f'id: {evento.id}\nevent: stock\ndata: {{"id":1,"cantidad":5}}\n\n'
+
+
+def test_event_ids_are_increasing():
+    hub = HubEventos()
+    ids = [hub.publicar("stock", {}).id for _ in range(100)]
+    assert ids == sorted(set(ids))
+
+
+def test_last_event_id_replays_missed_events():
+    hub = HubEventos(tamano_buffer=3)
+    eventos = [hub.publicar("movimiento", {"n": n}) for n in range(5)]
+
+    _, pendientes = hub.suscribir(desde_id=eventos[2].id)
+
+    assert [e.datos["n"] for e in pendientes] == [3, 4]
+
+
+def test_slow_subscriber_is_dropped_without_blocking_publisher():
+    hub = HubEventos(tamano_cola=2)
+    lento, _ = hub.suscribir()
+    rapido, _ = hub.suscribir()
+
+    inicio = time.monotonic()
+    for n in range(10):
+        hub.publicar("stock", {"n": n})
+        rapido.siguiente(timeout=0)
+
+    assert time.monotonic() - inicio < 1
+    assert lento.desbordada
+    assert not rapido.desbordada
+
+
+def test_cancelled_subscription_stops_receiving():
+    hub = HubEventos()
+    suscripcion, _ = hub.suscribir()
+    hub.cancelar(suscripcion)
+
+    hub.publicar("stock", {})
+
+    assert suscripcion.siguiente(timeout=0) is None
+    assert hub.metricas()["suscriptores"] == 0
+
+
+def test_unix_transport_fans_out_between_hubs(tmp_path):
+    emisor, receptor = HubEventos(), HubEventos()
+    emisor.transporte = TransporteUnix(emisor, str(tmp_path), nombre="worker-1")
+    receptor.transporte = TransporteUnix(receptor, str(tmp_path), nombre="worker-2")
+    suscripcion, _ = receptor.suscribir()
+
+    evento = emisor.publicar("stock", {"id": 7})
+
+    recibido = suscripcion.siguiente(timeout=2)
+    assert recibido is not None
+    assert (recibido.id, recibido.tipo, recibido.datos) == (evento.id, "stock", {"id": 7})
+
+
+def test_unix_transport_removes_dead_worker_sockets(tmp_path):
+    muerto = tmp_path / "99999.sock"
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    s.bind(str(muerto))
+    s.close()
+    hub = HubEventos()
+    hub.transporte = TransporteUnix(hub, str(tmp_path))
+
+    hub.publicar("stock", {})
+
+    assert not muerto.exists()
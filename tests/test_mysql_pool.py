@@ -0,0 +1,92 @@
+import threading
+
+import pytest
+
+from backend.mysql_pool.pool import PoolAgotadoError, PoolDeConexiones
+
+
+class FakeConnection:
+    def __init__(self, n):
+        self.n = n
+        self.alive = True
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool(**kwargs):
+    created = []
+
+    def crear():
+        conn = FakeConnection(len(created))
+        created.append(conn)
+        return conn
+
+    pool = PoolDeConexiones(crear, validar=lambda c: c.alive, **kwargs)
+    return pool, created
+
+
+def test_reuses_returned_connection():
+    pool, created = make_pool()
+    conn = pool.obtener()
+    pool.devolver(conn)
+    assert pool.obtener() is conn
+    assert len(created) == 1
+
+
+def test_bounded_size_times_out():
+    pool, _ = make_pool(tamano_maximo=1, timeout_espera=0.05)
+    pool.obtener()
+    with pytest.raises(PoolAgotadoError):
+        pool.obtener()
+    assert pool.metricas()['agotado'] == 1
+
+
+def test_waiter_gets_connection_when_returned():
+    pool, created = make_pool(tamano_maximo=1, timeout_espera=2)
+    conn = pool.obtener()
+    result = {}
+
+    def worker():
+        result['conn'] = pool.obtener()
+
+    t = threading.Thread(target=worker)
+    t.start()
+    threading.Timer(0.05, pool.devolver, args=[conn]).start()
+    t.join(3)
+    assert result['conn'] is conn
+    assert pool.metricas()['esperas'] == 1
+    assert len(created) == 1
+
+
+def test_pre_ping_discards_dead_connection():
+    pool, created = make_pool(ping_tras_inactividad=0)
+    conn = pool.obtener()
+    pool.devolver(conn)
+    conn.alive = False
+    fresh = pool.obtener()
+    assert fresh is not conn
+    assert conn.closed
+    assert pool.metricas()['descartadas_por_ping'] == 1
+    assert pool.metricas()['tamano'] == 1
+
+
+def test_idle_connections_are_evicted():
+    pool, created = make_pool(max_inactividad=0)
+    conn = pool.obtener()
+    pool.devolver(conn)
+    fresh = pool.obtener()
+    assert fresh is not conn
+    assert conn.closed
+    assert pool.metricas()['desalojadas'] == 1
+
+
+def test_failed_connect_releases_slot():
+    def crear():
+        raise OSError("connection refused")
+
+    pool = PoolDeConexiones(crear, tamano_maximo=1)
+    with pytest.raises(OSError):
+        pool.obtener()
+    assert pool.metricas()['tamano'] == 0
@@ -0,0 +1,250 @@
+"""
+Query and latency budgets per API route and service method.
+
+Every entry in BUDGETS declares the maximum number of queries and the
+maximum latency (ms) of one call. Each entry is measured against seeded
+datasets of increasing size (DATASET_SIZES products, MOVEMENTS_PER_PRODUCT
+movements each) and, where it applies, with several page/batch sizes. The
+test fails if a budget is exceeded or if the query count changes with the
+dataset size or the page/batch size (an N+1 shows up as growth).
+
+Each run writes a JSON report (sorted keys, one value per line) to
+QUERY_BUDGET_REPORT (default: reports/query_budgets.json) so runs can be
+diffed. QUERY_BUDGET_LATENCY_FACTOR scales the latency budgets for slow
+machines.
+"""
+
+import itertools
+import json
+import os
+import statistics
+import time
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from typing import Callable, NamedTuple, Tuple
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from stock.models import StockItem, StockUbicacion, Ubicacion
+from stock.serializers import MovimientoSerializer
+from stock.services import ExistenciasService, MovimientoService, StockService
+
+DATASET_SIZES = (10, 100, 400)
+MOVEMENTS_PER_PRODUCT = 4
+REPETITIONS = 3
+
+REPORT_PATH = Path(os.environ.get(
+    "QUERY_BUDGET_REPORT",
+    Path(__file__).resolve().parent.parent / "reports" / "query_budgets.json",
+))
+LATENCY_FACTOR = float(os.environ.get("QUERY_BUDGET_LATENCY_FACTOR", "1"))
+
+_report = {}
+_codes = itertools.count()
+
+
+class Budget(NamedTuple):
+    name: str
+    queries: int
+    ms: float
+    run: Callable
+    # Page or batch sizes; the query count must not depend on them
+    variants: Tuple = (None,)
+
+
+class Context:
+    def __init__(self):
+        self.client = APIClient()
+        products = StockItem.objects.order_by("codigo")
+        self.product = products.first().pk
+        self.products = list(products.values_list("pk", flat=True)[:50])
+        self.locations = [
+            Ubicacion.objects.get_or_create(codigo=codigo, defaults={"nombre": codigo})[0].pk
+            for codigo in ("BUDGET-A", "BUDGET-B")
+        ]
+        # Total = sum of its locations; writes without a location go to the default one
+        default = ExistenciasService.ubicacion_predeterminada().pk
+        for location in (*self.locations, default):
+            StockUbicacion.objects.update_or_create(
+                producto_id=self.product, ubicacion_id=location, defaults={"cantidad": 10_000}
+            )
+        StockItem.objects.filter(pk=self.product).update(cantidad=30_000)
+
+
+def _api(method, url_name, data=None, detail=False, **query):
+    def run(ctx, variant):
+        url = reverse(url_name, args=[ctx.product] if detail else [])
+        call = getattr(ctx.client, method)
+        if data is not None:
+            response = call(url, data(ctx, variant) if callable(data) else data, format="json")
+        else:
+            params = dict(query) if variant is None else {**query, "page_size": variant}
+            response = call(url, params)
+        assert response.status_code < 300, (url_name, response.status_code, response.data)
+    return run
+
+
+def _import_rows(ctx, batch):
+    return [
+        {"codigo": f"QB-{next(_codes)}", "nombre": "Budget", "precio": "2.50", "cantidad": 3}
+        for _ in range(batch)
+    ]
+
+
+def _adjustments(ctx, batch):
+    return [
+        {"id": ctx.products[i % len(ctx.products)], "tipo": "entrada", "cantidad": 1}
+        for i in range(batch)
+    ]
+
+
+def _movements_of_product(ctx, variant):
+    queryset = MovimientoService().obtener_movimientos_por_producto(ctx.product)
+    MovimientoSerializer(queryset[:50], many=True).data
+
+
+BUDGETS = [
+    # API routes
+    Budget("GET stock list", 1, 150, _api("get", "stockitem-list"), variants=(5, 50)),
+    Budget("GET stock detail", 1, 100, _api("get", "stockitem-detail", detail=True)),
+    Budget("PATCH stock detail", 3, 200,
+           _api("patch", "stockitem-detail", data={"descripcion": "budget"}, detail=True)),
+    Budget("PUT stock subtract", 9, 200,
+           _api("put", "stockitem-subtract-stock", data={"cantidad": 1}, detail=True)),
+    Budget("PUT stock restock", 9, 200, _api("put", "stockitem-restock", data={"cantidad": 1}, detail=True)),
+    Budget("PUT stock subtract (ubicacion)", 11, 200,
+           _api("put", "stockitem-subtract-stock", detail=True,
+                data=lambda ctx, _: {"cantidad": 1, "ubicacion": ctx.locations[0]})),
+    Budget("POST stock transferir", 10, 200,
+           _api("post", "stockitem-transferir", detail=True,
+                data=lambda ctx, _: {"origen": ctx.locations[0], "destino": ctx.locations[1], "cantidad": 1})),
+    Budget("GET stock existencias", 2, 100, _api("get", "stockitem-existencias", detail=True)),
+    Budget("GET ubicacion existencias", 2, 150,
+           lambda ctx, page_size: ctx.client.get(
+               reverse("ubicacion-existencias", args=[ctx.locations[0]]), {"page_size": page_size}),
+           variants=(5, 50)),
+    Budget("POST stock ajustes", 10, 300,
+           _api("post", "stockitem-ajustes", data=_adjustments), variants=(5, 50)),
+    Budget("POST stock importar", 8, 300,
+           _api("post", "stockitem-importar", data=_import_rows), variants=(5, 50)),
+    Budget("GET stock bajo-stock", 1, 150,
+           _api("get", "stockitem-bajo-stock", umbral=20_000), variants=(5, 50)),
+    Budget("GET stock sugerencias-reorden", 2, 150,
+           _api("get", "stockitem-sugerencias-reorden"), variants=(5, 50)),
+    Budget("GET movimientos list", 1, 150, _api("get", "movimiento-list"), variants=(5, 50)),
+    Budget("GET movimientos list (filtros)", 1, 150,
+           lambda ctx, page_size: ctx.client.get(reverse("movimiento-list"), {
+               "producto": ctx.product, "tipo": "salida", "desde": "2000-01-01", "hasta": "2100-01-01",
+               "page_size": page_size,
+           }),
+           variants=(5, 50)),
+    Budget("GET valoracion list", 2, 150, _api("get", "valoracion-list"), variants=(5, 50)),
+    Budget("GET analisis list", 2, 150, _api("get", "analisis-list"), variants=(5, 50)),
+    Budget("GET tablero", 5, 150, _api("get", "tablero-list", ultimos=50)),
+    Budget("GET cambios list", 2, 200, _api("get", "cambios-list")),
+    Budget("GET reportes movimientos", 1, 150,
+           _api("get", "reporte-movimientos-list", desde="2000-01-01", hasta="2100-01-01")),
+    # Services
+    Budget("StockService.restar_stock", 9, 150,
+           lambda ctx, _: StockService().restar_stock(ctx.product, 1)),
+    Budget("StockService.agregar_stock", 9, 150,
+           lambda ctx, _: StockService().agregar_stock(ctx.product, 1)),
+    Budget("StockService.ajustar_lote", 10, 300,
+           lambda ctx, batch: StockService().ajustar_lote(_adjustments(ctx, batch)),
+           variants=(5, 50)),
+    Budget("StockService.importar_productos", 8, 300,
+           lambda ctx, batch: StockService().importar_productos(_import_rows(ctx, batch)),
+           variants=(5, 50)),
+    Budget("StockService.crear_producto", 5, 150,
+           lambda ctx, _: StockService().crear_producto(
+               {**_import_rows(ctx, 1)[0], "precio": Decimal("2.50")})),
+    Budget("StockService.obtener_productos_bajo_stock", 1, 150,
+           lambda ctx, _: list(StockService().obtener_productos_bajo_stock(umbral=50)[:50])),
+    Budget("MovimientoService.crear_movimiento", 4, 150,
+           lambda ctx, _: MovimientoService().crear_movimiento(
+               StockItem.objects.get(pk=ctx.product), "entrada", 1)),
+    Budget("MovimientoService.obtener_movimientos_por_producto", 1, 150, _movements_of_product),
+    Budget("MovimientoService.obtener_resumen_movimientos", 1, 100,
+           lambda ctx, _: MovimientoService().obtener_resumen_movimientos(ctx.product)),
+]
+
+
+def _seed(total_products):
+    """Grows the dataset to total_products (generar_datos, one seed per step)"""
+    missing = total_products - StockItem.objects.filter(codigo__startswith="SIM").count()
+    call_command(
+        "generar_datos", productos=missing, movimientos=missing * MOVEMENTS_PER_PRODUCT,
+        semilla=total_products, procesos=1, dias=30, stdout=StringIO(),
+    )
+    # Enough stock for repeated subtractions
+    StockItem.objects.update(cantidad=10_000)
+
+
+def _measure(budget, ctx, variant):
+    # Warm-up call: catches up rollups, fills caches, etc.
+    budget.run(ctx, variant)
+    timings = []
+    for _ in range(REPETITIONS):
+        start = time.perf_counter()
+        with CaptureQueriesContext(connection) as captured:
+            budget.run(ctx, variant)
+        timings.append((time.perf_counter() - start) * 1000)
+    return len(captured.captured_queries), statistics.median(timings), captured
+
+
+@pytest.fixture(scope="module", autouse=True)
+def budget_report():
+    yield
+    if _report:
+        REPORT_PATH.parent.mkdir(parents=True, exist_ok=True)
+        REPORT_PATH.write_text(json.dumps(_report, indent=1, sort_keys=True) + "\n")
+
+
+@pytest.fixture
+def generous_rate_limits(settings):
+    settings.STOCK_LIMITES_TASA = {"lectura": (10**6, 10**6), "escritura": (10**6, 10**6)}
+    settings.STOCK_HUECOS_ESPERA_SEGUNDOS = 0
+    # Medir las consultas, no la caché
+    settings.STOCK_TABLERO_CACHE_TTL = 0
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("budget", BUDGETS, ids=[budget.name for budget in BUDGETS])
+def test_query_and_latency_budget(budget, generous_rate_limits):
+    results = {}
+    for size in DATASET_SIZES:
+        _seed(size)
+        ctx = Context()
+        for variant in budget.variants:
+            queries, ms, captured = _measure(budget, ctx, variant)
+            key = f"products={size}" + ("" if variant is None else f" size={variant}")
+            results[key] = (queries, ms, captured)
+
+    _report[budget.name] = {
+        "budget": {"queries": budget.queries, "ms": budget.ms},
+        "queries": {key: queries for key, (queries, _, _) in results.items()},
+        "ms": {key: round(ms, 1) for key, (_, ms, _) in results.items()},
+    }
+
+    def sql(captured):
+        return "\n".join(query["sql"] for query in captured.captured_queries)
+
+    for key, (queries, ms, captured) in results.items():
+        assert queries <= budget.queries, (
+            f"{budget.name} [{key}]: {queries} queries > budget {budget.queries}\n{sql(captured)}"
+        )
+        assert ms <= budget.ms * LATENCY_FACTOR, (
+            f"{budget.name} [{key}]: {ms:.1f} ms > budget {budget.ms * LATENCY_FACTOR:.0f} ms"
+        )
+
+    counts = {queries for queries, _, _ in results.values()}
+    assert len(counts) == 1, (
+        f"{budget.name}: query count depends on dataset/page size "
+        f"{ {key: queries for key, (queries, _, _) in results.items()} }"
+    )